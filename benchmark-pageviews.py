@@ -0,0 +1,161 @@
+"""Measures pageview dump parsing and temp_pageviews loading throughput.
+
+Generates a synthetic bz2 pageview dump (two interface lines per page, in the
+format of the monthly pageview_complete dumps) and reports lines/sec for
+scores.pageview_components, decompressing with --processes worker
+processes. With --load, the parsed rows are also loaded into
+temp_pageviews one row at a time, with multi-row INSERTs, and (with
+--load-data-infile) with LOAD DATA LOCAL INFILE, and rows/sec is reported for
+each. temp_pageviews is truncated afterwards.
+
+Loading writes to the WP10 database of the current environment, so it refuses
+to run in production.
+
+Usage:
+
+    pipenv run python benchmark-pageviews.py --pages 500000 [--processes 4] \
+        [--load] [--load-data-infile] [--batch-size 50000]
+"""
+
+import argparse
+import bz2
+import logging
+import os
+import tempfile
+import time
+
+from wp1 import app_logging, scores
+from wp1.credentials import ENV
+from wp1.environment import Environment
+from wp1.wp10_db import connect as wp10_connect
+
+logger = logging.getLogger(__name__)
+
+LANGS = (b"af", b"de", b"en", b"fr")
+
+
+def write_synthetic_dump(path, pages):
+    """Writes a dump with two lines per page and returns the number of lines."""
+    with bz2.open(path, "wb") as f:
+        for lang in LANGS:
+            lines = []
+            for i in range(pages // len(LANGS)):
+                lines.append(
+                    b"%s.wikipedia Benchmark_article_%d %d desktop %d A1\n"
+                    % (lang, i, i + 1, i % 97 + 1)
+                )
+                lines.append(
+                    b"%s.wikipedia Benchmark_article_%d %d mobile-web %d B1\n"
+                    % (lang, i, i + 1, i % 89 + 1)
+                )
+            f.write(b"".join(lines))
+    return pages // len(LANGS) * len(LANGS) * 2
+
+
+def report(label, count, unit, elapsed):
+    logger.info(
+        "%-28s %10d %s in %7.2fs = %10.0f %s/sec",
+        label,
+        count,
+        unit,
+        elapsed,
+        count / elapsed,
+        unit,
+    )
+
+
+def parse(path, processes):
+    n = 0
+    for _ in scores.pageview_components(path=path, processes=processes):
+        n += 1
+    return n
+
+
+def load_per_row(wp10db, path, batch_size):
+    for batch in scores.pageview_batches(batch_size, path=path):
+        for row in batch:
+            scores.insert_temp_pageviews(wp10db, *row)
+        wp10db.commit()
+
+
+def load_batched(load_batch):
+
+    def load(wp10db, path, batch_size):
+        for batch in scores.pageview_batches(batch_size, path=path):
+            load_batch(wp10db, batch)
+            wp10db.commit()
+
+    return load
+
+
+def benchmark_load(label, rows, wp10db, load, path, batch_size):
+    scores.truncate_temp_pageviews(wp10db)
+    start = time.perf_counter()
+    load(wp10db, path, batch_size)
+    report(label, rows, "rows", time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pages", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument(
+        "--load",
+        action="store_true",
+        help="Also benchmark loading the rows into temp_pageviews",
+    )
+    parser.add_argument(
+        "--load-data-infile",
+        action="store_true",
+        help="Include LOAD DATA LOCAL INFILE in the load benchmark",
+    )
+    args = parser.parse_args()
+
+    app_logging.configure_logging()
+    if args.load and ENV == Environment.PRODUCTION:
+        raise ValueError("Refusing to run the pageview load benchmark in production")
+
+    fd, path = tempfile.mkstemp(suffix=".bz2")
+    os.close(fd)
+    try:
+        lines = write_synthetic_dump(path, args.pages)
+
+        start = time.perf_counter()
+        rows = parse(path, args.processes)
+        report("parse", lines, "lines", time.perf_counter() - start)
+
+        if not args.load:
+            return
+
+        wp10db = wp10_connect(local_infile=args.load_data_infile)
+        try:
+            benchmark_load(
+                "per-row insert", rows, wp10db, load_per_row, path, args.batch_size
+            )
+            benchmark_load(
+                "multi-row insert",
+                rows,
+                wp10db,
+                load_batched(scores.insert_temp_pageviews_many),
+                path,
+                args.batch_size,
+            )
+            if args.load_data_infile:
+                benchmark_load(
+                    "load data infile",
+                    rows,
+                    wp10db,
+                    load_batched(scores.load_temp_pageviews_infile),
+                    path,
+                    args.batch_size,
+                )
+        finally:
+            scores.truncate_temp_pageviews(wp10db)
+            wp10db.close()
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
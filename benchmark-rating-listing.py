@@ -0,0 +1,162 @@
+"""Times the queries behind the project articles listing.
+
+Seeds a scratch project with synthetic ratings spread over the quality and
+importance classes of global_rankings, then times the first page, a deep page
+by page number and the same page reached through after tokens, for the
+unfiltered, quality filtered and importance filtered listings. It also logs
+the EXPLAIN plan of each listing, to check whether the ratings are read in
+index order or sorted with a filesort. The scratch project's ratings are
+deleted afterwards.
+
+This writes to the WP10 database of the current environment, so it refuses to
+run in production.
+
+Usage:
+
+    pipenv run python benchmark-rating-listing.py --rows 200000 --num-rows 100
+"""
+
+import argparse
+import itertools
+import logging
+import time
+
+from wp1 import app_logging
+from wp1.constants import AssessmentKind
+from wp1.credentials import ENV
+from wp1.environment import Environment
+from wp1.logic import rating as logic_rating
+from wp1.models.wp10.rating import Rating
+from wp1.wp10_db import connect as wp10_connect
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_PROJECT = b"__wp1_benchmark__"
+
+QUALITIES = (b"FA-Class", b"A-Class", b"B-Class", b"C-Class", b"Stub-Class")
+IMPORTANCES = (b"Top-Class", b"High-Class", b"Mid-Class", b"Low-Class")
+
+
+def seed_ratings(wp10db, rows):
+    writer = logic_rating.RatingWriter(wp10db)
+    classes = itertools.cycle(itertools.product(QUALITIES, IMPORTANCES))
+    for i, (quality, importance) in zip(range(rows), classes):
+        writer.add(
+            Rating(
+                r_project=BENCHMARK_PROJECT,
+                r_namespace=0,
+                r_article=b"Benchmark_article_%d" % i,
+                r_quality=quality,
+                r_quality_timestamp=b"2018-12-25T11:22:33Z",
+                r_importance=importance,
+                r_importance_timestamp=b"2018-12-25T11:22:33Z",
+            ),
+            AssessmentKind.BOTH,
+        )
+    writer.flush()
+
+
+def clear_benchmark_ratings(wp10db):
+    with wp10db.cursor() as cursor:
+        cursor.execute("DELETE FROM ratings WHERE r_project = %s", (BENCHMARK_PROJECT,))
+    wp10db.commit()
+
+
+def explain(wp10db, label, **kwargs):
+    query = logic_rating._project_rating_query(BENCHMARK_PROJECT, **kwargs)
+    params = {
+        "r_project": BENCHMARK_PROJECT,
+        "r_quality": kwargs.get("quality"),
+        "r_importance": kwargs.get("importance"),
+    }
+    with wp10db.cursor() as cursor:
+        cursor.execute("EXPLAIN " + query, params)
+        for row in cursor.fetchall():
+            logger.info(
+                "%-28s key=%s rows=%s extra=%s",
+                label,
+                row["key"],
+                row["rows"],
+                row["Extra"],
+            )
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    logger.info("%-28s %8.1fms", label, elapsed * 1000)
+
+
+def page_by_number(wp10db, page, limit, **kwargs):
+    logic_rating.get_project_rating_page(
+        wp10db, BENCHMARK_PROJECT, page=page, limit=limit, **kwargs
+    )
+
+
+def after_token_for_page(wp10db, page, limit, **kwargs):
+    after = None
+    for _ in range(page - 1):
+        _, after = logic_rating.get_project_rating_page(
+            wp10db, BENCHMARK_PROJECT, limit=limit, after=after, **kwargs
+        )
+    return after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--num-rows", type=int, default=100)
+    parser.add_argument(
+        "--page", type=int, default=None, help="Deep page to time, default the last"
+    )
+    args = parser.parse_args()
+
+    app_logging.configure_logging()
+    if ENV == Environment.PRODUCTION:
+        raise ValueError("Refusing to run the listing benchmark in production")
+
+    listings = (
+        ("all", {}),
+        ("quality", {"quality": QUALITIES[2]}),
+        ("importance", {"importance": IMPORTANCES[1]}),
+    )
+
+    wp10db = wp10_connect()
+    try:
+        clear_benchmark_ratings(wp10db)
+        seed_ratings(wp10db, args.rows)
+
+        for name, kwargs in listings:
+            total = logic_rating.get_project_rating_count_by_type(
+                wp10db, BENCHMARK_PROJECT, **kwargs
+            )
+            deep = args.page or max(1, -(-total // args.num_rows))
+            explain(wp10db, "%s plan" % name, limit=args.num_rows, **kwargs)
+
+            timed(
+                "%s first page" % name,
+                lambda: page_by_number(wp10db, 1, args.num_rows, **kwargs),
+            )
+            timed(
+                "%s page %d by number" % (name, deep),
+                lambda: page_by_number(wp10db, deep, args.num_rows, **kwargs),
+            )
+            after = after_token_for_page(wp10db, deep, args.num_rows, **kwargs)
+            timed(
+                "%s page %d by token" % (name, deep),
+                lambda: logic_rating.get_project_rating_page(
+                    wp10db,
+                    BENCHMARK_PROJECT,
+                    limit=args.num_rows,
+                    after=after,
+                    **kwargs,
+                ),
+            )
+    finally:
+        clear_benchmark_ratings(wp10db)
+        wp10db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Compares per-row and batched writes to the ratings table.
+
+Writes the same synthetic ratings twice into a scratch project, first one row
+at a time with logic.rating.insert_or_update (committing every
+MAX_ARTICLES_BEFORE_COMMIT rows, as the project updater used to) and then
+through logic.rating.RatingWriter, and reports rows/sec for both. The scratch
+project's ratings are deleted afterwards.
+
+This writes to the WP10 database of the current environment, so it refuses to
+run in production.
+
+Usage:
+
+    pipenv run python benchmark-rating-writes.py --rows 50000 --batch-size 1000
+"""
+
+import argparse
+import logging
+import time
+
+from wp1 import app_logging
+from wp1.constants import (
+    MAX_ARTICLES_BEFORE_COMMIT,
+    RATING_WRITE_BATCH_SIZE,
+    AssessmentKind,
+)
+from wp1.credentials import ENV
+from wp1.environment import Environment
+from wp1.logic import rating as logic_rating
+from wp1.models.wp10.rating import Rating
+from wp1.wp10_db import connect as wp10_connect
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_PROJECT = b"__wp1_benchmark__"
+
+
+def synthetic_ratings(rows, quality):
+    for i in range(rows):
+        yield Rating(
+            r_project=BENCHMARK_PROJECT,
+            r_namespace=0,
+            r_article=b"Benchmark_article_%d" % i,
+            r_quality=quality,
+            r_quality_timestamp=b"2018-12-25T11:22:33Z",
+        )
+
+
+def clear_benchmark_ratings(wp10db):
+    with wp10db.cursor() as cursor:
+        cursor.execute("DELETE FROM ratings WHERE r_project = %s", (BENCHMARK_PROJECT,))
+    wp10db.commit()
+
+
+def per_row(wp10db, rows, quality):
+    # Query the rankings once, as RatingWriter does, so that only the writes
+    # are compared.
+    rankings = logic_rating.get_global_rankings(wp10db)
+    n = 0
+    for rating in synthetic_ratings(rows, quality):
+        logic_rating.insert_or_update(
+            wp10db, rating, AssessmentKind.QUALITY, rankings=rankings
+        )
+        n += 1
+        if n % MAX_ARTICLES_BEFORE_COMMIT == 0:
+            wp10db.commit()
+    wp10db.commit()
+
+
+def batched(wp10db, rows, quality, batch_size):
+    writer = logic_rating.RatingWriter(wp10db, batch_size=batch_size)
+    for rating in synthetic_ratings(rows, quality):
+        writer.add(rating, AssessmentKind.QUALITY)
+    writer.flush()
+
+
+def report(label, rows, fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "%-28s %8d rows in %7.2fs = %10.0f rows/sec",
+        label,
+        rows,
+        elapsed,
+        rows / elapsed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=RATING_WRITE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    app_logging.configure_logging()
+    if ENV == Environment.PRODUCTION:
+        raise ValueError("Refusing to run the ratings benchmark in production")
+
+    wp10db = wp10_connect()
+    try:
+        clear_benchmark_ratings(wp10db)
+
+        # Fresh inserts, then the same keys again so that every row takes the
+        # ON DUPLICATE KEY UPDATE path.
+        report("per-row insert", args.rows, per_row, wp10db, args.rows, b"B-Class")
+        report("per-row update", args.rows, per_row, wp10db, args.rows, b"C-Class")
+        clear_benchmark_ratings(wp10db)
+
+        report(
+            "batched insert",
+            args.rows,
+            batched,
+            wp10db,
+            args.rows,
+            b"B-Class",
+            args.batch_size,
+        )
+        report(
+            "batched update",
+            args.rows,
+            batched,
+            wp10db,
+            args.rows,
+            b"C-Class",
+            args.batch_size,
+        )
+    finally:
+        clear_benchmark_ratings(wp10db)
+        wp10db.close()
+
+
+if __name__ == "__main__":
+    main()
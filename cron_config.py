@@ -13,27 +13,10 @@ from rq import cron
 from wp1 import constants, maintenance
 from wp1.credentials import ENV
 from wp1.environment import Environment
-from wp1.logic import rating as logic_rating
 
-# Keeps the (slow) all-projects assessment-numbers query warm in the cache.
-# The underlying ratings data is rebuilt once per day by the update that
-# starts at midnight UTC and takes ~8 hours, so there's no point recomputing
-# more than daily. We run at noon UTC, comfortably after that update finishes.
-# The cache TTL (see logic.rating.cache_assessment_numbers) is a bit over 24h
-# so each day's run refreshes the entry before it can expire.
-cron.register(
-    logic_rating.update_assessment_cache,
-    "assessment-cache",
-    cron="0 12 * * *",
-    # Without this, the job gets RQ's 180s default timeout, but the query
-    # takes minutes in production. Use the repo-wide job timeout.
-    job_timeout=constants.JOB_TIMEOUT,
-    failure_ttl=constants.JOB_FAILURE_TTL,
-)
-
-# The daily maintenance jobs only run in production (in dev there is no data
+# The maintenance jobs only run in production (in dev there is no data
 # pipeline to drive; this matches the old workers image, where dev ran no
-# system cron). All three go to the single-worker 'maintenance' queue, which
+# system cron). All of them go to the single-worker 'maintenance' queue, which
 # serializes them if one runs long.
 if ENV == Environment.PRODUCTION:
     cron.register(
@@ -57,3 +40,12 @@ if ENV == Environment.PRODUCTION:
         job_timeout=constants.JOB_TIMEOUT,
         failure_ttl=constants.JOB_FAILURE_TTL,
     )
+    # The dump of the previous month is published in the first days of the
+    # month. This job only spools it; the 'pageviews' workers load it.
+    cron.register(
+        maintenance.update_pageviews_sharded,
+        "maintenance",
+        cron="0 6 5 * *",
+        job_timeout=maintenance.UPDATE_PAGEVIEWS_JOB_TIMEOUT,
+        failure_ttl=constants.JOB_FAILURE_TTL,
+    )
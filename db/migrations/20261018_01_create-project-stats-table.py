@@ -0,0 +1,28 @@
+"""
+This migration creates the project_stats table, a materialized count of each
+project's ratings by quality and importance.
+"""
+
+from yoyo import step
+
+__depends__ = {"20260324_01_add_flavour_to_zim_schedules"}
+
+steps = [
+    step(
+        "CREATE TABLE project_stats ("
+        "  pst_project VARBINARY(63) NOT NULL,"
+        "  pst_quality VARBINARY(63) NOT NULL,"
+        "  pst_importance VARBINARY(63) NOT NULL,"
+        "  pst_count INTEGER UNSIGNED NOT NULL DEFAULT 0,"
+        "  PRIMARY KEY (pst_project, pst_quality, pst_importance)"
+        ")",
+        "DROP TABLE project_stats",
+    ),
+    step(
+        "INSERT INTO project_stats"
+        "  (pst_project, pst_quality, pst_importance, pst_count)"
+        " SELECT r_project, COALESCE(r_quality, 'NotA-Class'),"
+        "   COALESCE(r_importance, 'NotA-Class'), COUNT(*)"
+        " FROM ratings GROUP BY 1, 2, 3",
+    ),
+]
@@ -0,0 +1,23 @@
+"""
+This migration creates the global_article_changes table, the log of articles
+whose global_articles row needs to be recomputed, and indexes ratings by
+article so that those rows can be recomputed across all projects.
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_01_create-project-stats-table"}
+
+steps = [
+    step(
+        "CREATE TABLE global_article_changes ("
+        "  gac_article VARBINARY(255) NOT NULL PRIMARY KEY,"
+        # Bumped whenever the article is logged again.
+        "  gac_version INTEGER UNSIGNED NOT NULL DEFAULT 0)",
+        "DROP TABLE global_article_changes",
+    ),
+    step(
+        "ALTER TABLE ratings ADD INDEX r_namespace_article (r_namespace, r_article)",
+        "ALTER TABLE ratings DROP INDEX r_namespace_article",
+    ),
+]
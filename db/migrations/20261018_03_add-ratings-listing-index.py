@@ -0,0 +1,17 @@
+"""
+This migration indexes ratings by project, quality, importance and article, in
+the order that the project articles listing pages through them, so that a page
+filtered by quality and importance reads just its rows.
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_02_create-global-article-changes-table"}
+
+steps = [
+    step(
+        "ALTER TABLE ratings ADD INDEX r_project_quality_importance"
+        " (r_project, r_quality, r_importance, r_article, r_namespace)",
+        "ALTER TABLE ratings DROP INDEX r_project_quality_importance",
+    ),
+]
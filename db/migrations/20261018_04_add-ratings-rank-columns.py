@@ -0,0 +1,53 @@
+"""
+This migration adds the r_quality_rank and r_importance_rank columns to
+ratings, the global rankings of each rating's quality and importance, and
+backfills them from global_rankings. A rating without a global ranking gets -1
+(constants.UNRANKED).
+
+The project articles listing sorts on these columns instead of joining
+global_rankings twice, and the new indexes hold the ratings of a project in
+listing order: unfiltered, filtered by quality and filtered by importance.
+Servers that ignore DESC in index definitions still use them to find a
+project's ratings, but then sort the rows themselves.
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_03_add-ratings-listing-index"}
+
+steps = [
+    step(
+        "ALTER TABLE ratings"
+        "  ADD COLUMN r_quality_rank INTEGER NOT NULL DEFAULT -1,"
+        "  ADD COLUMN r_importance_rank INTEGER NOT NULL DEFAULT -1",
+        "ALTER TABLE ratings"
+        "  DROP COLUMN r_quality_rank,"
+        "  DROP COLUMN r_importance_rank",
+    ),
+    step(
+        "UPDATE ratings"
+        "  JOIN global_rankings"
+        "    ON gr_type = 'quality' AND gr_rating = r_quality"
+        "  SET r_quality_rank = gr_ranking"
+    ),
+    step(
+        "UPDATE ratings"
+        "  JOIN global_rankings"
+        "    ON gr_type = 'importance' AND gr_rating = r_importance"
+        "  SET r_importance_rank = gr_ranking"
+    ),
+    step(
+        "ALTER TABLE ratings"
+        "  ADD INDEX r_project_rank"
+        "    (r_project, r_quality_rank DESC, r_importance_rank DESC, r_article,"
+        "     r_namespace),"
+        "  ADD INDEX r_project_quality_rank"
+        "    (r_project, r_quality, r_importance_rank DESC, r_article, r_namespace),"
+        "  ADD INDEX r_project_importance_rank"
+        "    (r_project, r_importance, r_quality_rank DESC, r_article, r_namespace)",
+        "ALTER TABLE ratings"
+        "  DROP INDEX r_project_rank,"
+        "  DROP INDEX r_project_quality_rank,"
+        "  DROP INDEX r_project_importance_rank",
+    ),
+]
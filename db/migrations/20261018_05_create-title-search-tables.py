@@ -0,0 +1,36 @@
+"""
+This migration creates the trigram search index of article titles used by
+the articlePattern filter of the project articles listing (see
+logic.title_search). The index starts empty, and each project's titles are
+added by its next update.
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_04_add-ratings-rank-columns"}
+
+steps = [
+    step(
+        "CREATE TABLE title_trigrams ("
+        "  tt_trigram VARBINARY(3) NOT NULL,"
+        "  tt_namespace INTEGER UNSIGNED NOT NULL,"
+        "  tt_article VARBINARY(255) NOT NULL,"
+        "  PRIMARY KEY (tt_trigram, tt_namespace, tt_article)"
+        ")",
+        "DROP TABLE title_trigrams",
+    ),
+    step(
+        "CREATE TABLE title_search_articles ("
+        "  tsa_namespace INTEGER UNSIGNED NOT NULL,"
+        "  tsa_article VARBINARY(255) NOT NULL,"
+        "  PRIMARY KEY (tsa_namespace, tsa_article)"
+        ")",
+        "DROP TABLE title_search_articles",
+    ),
+    step(
+        "CREATE TABLE title_search_projects ("
+        "  tsp_project VARBINARY(63) NOT NULL PRIMARY KEY"
+        ")",
+        "DROP TABLE title_search_projects",
+    ),
+]
@@ -0,0 +1,50 @@
+"""
+This migration scopes the trigram search index of article titles by project
+(see logic.title_search), so that a search only reads the postings of its own
+project. The index is rebuilt from scratch: the tables are recreated empty,
+and each project's titles are added by its next update.
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_05_create-title-search-tables"}
+
+steps = [
+    step("DELETE FROM title_search_projects"),
+    step(
+        "DROP TABLE title_trigrams",
+        "CREATE TABLE title_trigrams ("
+        "  tt_trigram VARBINARY(3) NOT NULL,"
+        "  tt_namespace INTEGER UNSIGNED NOT NULL,"
+        "  tt_article VARBINARY(255) NOT NULL,"
+        "  PRIMARY KEY (tt_trigram, tt_namespace, tt_article)"
+        ")",
+    ),
+    step(
+        "CREATE TABLE title_trigrams ("
+        "  tt_project VARBINARY(63) NOT NULL,"
+        "  tt_trigram VARBINARY(3) NOT NULL,"
+        "  tt_namespace INTEGER UNSIGNED NOT NULL,"
+        "  tt_article VARBINARY(255) NOT NULL,"
+        "  PRIMARY KEY (tt_project, tt_trigram, tt_namespace, tt_article)"
+        ")",
+        "DROP TABLE title_trigrams",
+    ),
+    step(
+        "DROP TABLE title_search_articles",
+        "CREATE TABLE title_search_articles ("
+        "  tsa_namespace INTEGER UNSIGNED NOT NULL,"
+        "  tsa_article VARBINARY(255) NOT NULL,"
+        "  PRIMARY KEY (tsa_namespace, tsa_article)"
+        ")",
+    ),
+    step(
+        "CREATE TABLE title_search_articles ("
+        "  tsa_project VARBINARY(63) NOT NULL,"
+        "  tsa_namespace INTEGER UNSIGNED NOT NULL,"
+        "  tsa_article VARBINARY(255) NOT NULL,"
+        "  PRIMARY KEY (tsa_project, tsa_namespace, tsa_article)"
+        ")",
+        "DROP TABLE title_search_articles",
+    ),
+]
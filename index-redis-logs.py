@@ -0,0 +1,26 @@
+"""Indexes the project logs in Redis that were written without an index.
+
+Logs are indexed as they are written (see wp1.logic.log), so this only needs
+to run once, when deploying the log indexes. It SCANs every key in Redis.
+"""
+
+import logging
+
+from wp1 import app_logging
+from wp1.logic import log as logic_log
+from wp1.redis_db import connect as redis_connect
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    app_logging.configure_logging()
+
+    redis = redis_connect()
+
+    indexed = logic_log.index_existing_logs(redis)
+    logger.info("Indexed %s project logs", indexed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Enqueues a full rebuild of the global articles table.
+
+The rebuild runs on the single-worker maintenance queue, so it never overlaps
+the daily merge of changed articles (see maintenance.update_global_articles).
+
+Usage:
+
+    pipenv run python rebuild-global-articles.py [--workers 4]
+"""
+
+import argparse
+import logging
+
+from rq import Queue
+
+from wp1 import app_logging, constants, maintenance
+from wp1.redis_db import connect as redis_connect
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--workers", type=int, default=constants.GLOBAL_ARTICLES_REBUILD_WORKERS
+    )
+    args = parser.parse_args()
+
+    app_logging.configure_logging()
+    if args.workers < 1:
+        raise ValueError("--workers must be at least 1, got %r" % args.workers)
+
+    redis = redis_connect()
+    job = Queue("maintenance", connection=redis).enqueue(
+        maintenance.rebuild_global_articles,
+        args.workers,
+        job_timeout=maintenance.UPDATE_GLOBAL_JOB_TIMEOUT,
+        failure_ttl=constants.JOB_FAILURE_TTL,
+    )
+    logger.info("Enqueued global articles rebuild as job %s", job.id)
+
+
+if __name__ == "__main__":
+    main()
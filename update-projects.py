@@ -0,0 +1,62 @@
+"""Updates projects concurrently in this process instead of through RQ jobs.
+
+With no project names, every project returned by
+logic.project.project_names_to_update is updated. Per-project wall times and
+the overall throughput are logged at the end of the run.
+
+Usage:
+
+    pipenv run python update-projects.py --concurrency 8 [--enqueue-uploads] \
+        [--full] [Project_name ...]
+"""
+
+import argparse
+import logging
+
+import wp1.logic.project as logic_project
+from wp1 import app_logging, update_runner
+from wp1.constants import UPDATE_RUNNER_CONCURRENCY
+from wp1.wiki_db import connect as wiki_connect
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--concurrency", type=int, default=UPDATE_RUNNER_CONCURRENCY)
+    parser.add_argument(
+        "--enqueue-uploads",
+        action="store_true",
+        help="Enqueue the table and log uploads of each updated project",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Rescan every category instead of only the recently changed ones",
+    )
+    parser.add_argument("projects", nargs="*")
+    args = parser.parse_args()
+
+    app_logging.configure_logging()
+    logging.getLogger("mwclient").setLevel(logging.CRITICAL)
+    logging.getLogger("urllib3").setLevel(logging.CRITICAL)
+
+    # Job methods expect project names as bytes.
+    project_names = [n.encode("utf-8") for n in args.projects]
+    if not project_names:
+        wikidb = wiki_connect()
+        try:
+            project_names = list(logic_project.project_names_to_update(wikidb))
+        finally:
+            wikidb.close()
+
+    update_runner.update_projects(
+        project_names,
+        concurrency=args.concurrency,
+        enqueue_uploads=args.enqueue_uploads,
+        incremental=not args.full,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Recomputes the ranking columns of the ratings of every project.
+
+Rating writes set r_quality_rank and r_importance_rank from global_rankings,
+so this only needs to run after global_rankings itself is changed. Each
+project is updated and committed on its own.
+"""
+
+import logging
+
+from wp1 import app_logging
+from wp1.logic import project as logic_project
+from wp1.logic import rating as logic_rating
+from wp1.wp10_db import connect as wp10_connect
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    app_logging.configure_logging()
+
+    wp10db = wp10_connect()
+    try:
+        updated = 0
+        for project in logic_project.list_all_projects(wp10db):
+            updated += logic_rating.update_ranks_for_project(wp10db, project.p_project)
+            wp10db.commit()
+        logger.info("Updated the ranks of %s ratings", updated)
+    finally:
+        wp10db.close()
+
+
+if __name__ == "__main__":
+    main()
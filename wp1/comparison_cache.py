@@ -0,0 +1,112 @@
+"""Redis cache of the overlap of two projects' ratings.
+
+An entry holds the articles rated by both projects of a pair, with both
+ratings' quality and importance (see logic.comparison). The key includes the
+p_timestamp of both projects, and a per-project generation counter that is
+bumped at the end of every update of the project (see
+logic.project.update_project). The counter covers two updates of a project
+within the same second, which record the same p_timestamp. So an update of either project moves the pair to a new key,
+and entries of older updates are never read again and expire on their own.
+
+Like table_cache, entries are versioned JSON with bytes stored as str decoded
+with surrogateescape.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of the cached overlap changes.
+COMPARISON_CACHE_VERSION = 1
+COMPARISON_CACHE_TTL = timedelta(days=1)
+KEY_PREFIX = b"wp1:comparison_cache:v%d:" % COMPARISON_CACHE_VERSION
+
+
+def _generation_key(project_name):
+    return KEY_PREFIX + b"generation:" + project_name
+
+
+def bump_generation(redis, project_name):
+    """Moves every cached pair of the project to new keys."""
+    redis.incr(_generation_key(project_name))
+
+
+def pair_key(redis, project_a, project_b):
+    """Returns the key of the overlap of two Projects, for their current update."""
+    generations = redis.mget(
+        [_generation_key(project_a.p_project), _generation_key(project_b.p_project)]
+    )
+    digest = hashlib.sha1()
+    for part in (
+        project_a.p_project,
+        project_a.p_timestamp,
+        generations[0],
+        project_b.p_project,
+        project_b.p_timestamp,
+        generations[1],
+    ):
+        part = part or b""
+        # Length prefixed, so that no two pairs hash the same input.
+        digest.update(b"%d:" % len(part) + part)
+    return KEY_PREFIX + b"pair:" + digest.hexdigest().encode("ascii")
+
+
+def _to_str(b):
+    return None if b is None else b.decode("utf-8", "surrogateescape")
+
+
+def _to_bytes(s):
+    return None if s is None else s.encode("utf-8", "surrogateescape")
+
+
+def serialize(rows):
+    """Returns the overlap rows as compact JSON bytes.
+
+    rows is None for an overlap that is too large to be cached, which is
+    cached too, so that it isn't computed again on every request.
+    """
+    if rows is not None:
+        rows = [
+            [_to_str(article), namespace] + [_to_str(r) for r in ratings]
+            for article, namespace, *ratings in rows
+        ]
+    return json.dumps(
+        {"version": COMPARISON_CACHE_VERSION, "rows": rows}, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def deserialize(value):
+    """Returns (found, rows) for the cached value.
+
+    found is False if the value isn't a valid entry.
+    """
+    try:
+        entry = json.loads(value)
+    except ValueError:
+        logger.warning("Ignoring comparison cache entry that isn't valid JSON")
+        return False, None
+    if not isinstance(entry, dict) or entry.get("version") != COMPARISON_CACHE_VERSION:
+        return False, None
+
+    rows = entry["rows"]
+    if rows is not None:
+        rows = [
+            (_to_bytes(article), namespace) + tuple(_to_bytes(r) for r in ratings)
+            for article, namespace, *ratings in rows
+        ]
+    return True, rows
+
+
+def get_overlap(redis, key):
+    """Returns (found, rows) for the key, see deserialize."""
+    value = redis.get(key)
+    if value is None:
+        return False, None
+    return deserialize(value)
+
+
+def set_overlap(redis, key, rows):
+    redis.setex(key, COMPARISON_CACHE_TTL, value=serialize(rows))
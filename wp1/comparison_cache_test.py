@@ -0,0 +1,82 @@
+import unittest
+
+import fakeredis
+
+from wp1 import comparison_cache
+from wp1.models.wp10.project import Project
+
+ROWS = [
+    (b"Apple", 0, b"B-Class", b"High-Class", b"FA-Class", None),
+    (b"Caf\xc3\xa9_\xff", 1, None, b"Low-Class", b"C-Class", b"Mid-Class"),
+]
+
+
+class ComparisonCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        self.alpha = Project(p_project=b"Alpha", p_timestamp=b"20261018000000")
+        self.beta = Project(p_project=b"Beta", p_timestamp=b"20261018000000")
+
+    def test_round_trip(self):
+        self.assertEqual(
+            (True, ROWS),
+            comparison_cache.deserialize(comparison_cache.serialize(ROWS)),
+        )
+
+    def test_round_trip_too_large(self):
+        self.assertEqual(
+            (True, None),
+            comparison_cache.deserialize(comparison_cache.serialize(None)),
+        )
+
+    def test_deserialize_invalid(self):
+        for value in (b"not json", b"[1, 2]", b'{"version": 0, "rows": []}'):
+            with self.subTest(value=value):
+                self.assertEqual((False, None), comparison_cache.deserialize(value))
+
+    def test_get_missing(self):
+        key = comparison_cache.pair_key(self.redis, self.alpha, self.beta)
+
+        self.assertEqual((False, None), comparison_cache.get_overlap(self.redis, key))
+
+    def test_set_and_get(self):
+        key = comparison_cache.pair_key(self.redis, self.alpha, self.beta)
+
+        comparison_cache.set_overlap(self.redis, key, ROWS)
+
+        self.assertEqual((True, ROWS), comparison_cache.get_overlap(self.redis, key))
+        self.assertGreater(self.redis.ttl(key), 0)
+
+    def test_pair_key_is_ordered(self):
+        self.assertNotEqual(
+            comparison_cache.pair_key(self.redis, self.alpha, self.beta),
+            comparison_cache.pair_key(self.redis, self.beta, self.alpha),
+        )
+
+    def test_pair_key_changes_with_timestamp(self):
+        before = comparison_cache.pair_key(self.redis, self.alpha, self.beta)
+
+        self.beta.p_timestamp = b"20261019000000"
+
+        self.assertNotEqual(
+            before, comparison_cache.pair_key(self.redis, self.alpha, self.beta)
+        )
+
+    def test_pair_key_changes_with_generation(self):
+        before = comparison_cache.pair_key(self.redis, self.alpha, self.beta)
+        other = comparison_cache.pair_key(
+            self.redis, self.alpha, Project(p_project=b"Gamma", p_timestamp=None)
+        )
+
+        comparison_cache.bump_generation(self.redis, b"Beta")
+
+        self.assertNotEqual(
+            before, comparison_cache.pair_key(self.redis, self.alpha, self.beta)
+        )
+        self.assertEqual(
+            other,
+            comparison_cache.pair_key(
+                self.redis, self.alpha, Project(p_project=b"Gamma", p_timestamp=None)
+            ),
+        )
@@ -9,6 +9,70 @@ class AssessmentKind(enum.Enum):
 
 
 MAX_ARTICLES_BEFORE_COMMIT = 200
+# Global ranking stored in ratings.r_quality_rank and r_importance_rank for a
+# rating that has none, so that it sorts after every ranked rating.
+UNRANKED = -1
+# Number of ratings buffered by logic.rating.RatingWriter before they are
+# written with a single multi-row INSERT.
+RATING_WRITE_BATCH_SIZE = 1000
+# Number of ratings read per query when a project's ratings are streamed in
+# primary key order, see logic.rating.iter_project_ratings.
+RATING_READ_CHUNK_SIZE = 5000
+# Projects with at least this many ratings are updated with
+# logic.project.update_project_assessments_streaming by default.
+STREAMING_UPDATE_MIN_RATINGS = 100000
+# Projects with at least this many ratings fetch their category members in
+# page_id shards of CATEGORY_FETCH_SHARD_SIZE, see
+# logic.page.get_pages_by_categories_sharded.
+CATEGORY_FETCH_SHARD_MIN_RATINGS = 50000
+CATEGORY_FETCH_SHARD_SIZE = 2000000
+# Incremental project updates only look at category memberships changed since
+# the project's last update, minus this overlap to allow for replication lag.
+INCREMENTAL_UPDATE_OVERLAP_SECONDS = 60 * 60
+# Number of changed pages whose categories are fetched per replica query.
+INCREMENTAL_UPDATE_PAGE_CHUNK_SIZE = 1000
+# Every project gets a full update once per this many days, to pick up the
+# articles that were removed from its categories.
+FULL_UPDATE_INTERVAL_DAYS = 7
+# Maximum number of titles in a single MediaWiki API query.
+API_TITLES_PER_QUERY = 50
+# Number of unseen articles whose moves are resolved together, see
+# logic.page.get_move_data_many.
+MOVE_LOOKUP_BATCH_SIZE = 500
+# Number of concurrent move log lookups against the MediaWiki API.
+MOVE_LOOKUP_CONCURRENCY = 4
+# Maximum number of articles whose results of each kind of move lookup are
+# kept by a logic.page.MoveLookupCache.
+MOVE_LOOKUP_CACHE_MAX_SIZE = 100000
+# Number of changed articles whose global_articles rows are recomputed per
+# transaction, see logic.global_articles.merge_changes.
+GLOBAL_ARTICLES_MERGE_BATCH_SIZE = 1000
+# Number of workers, each with its own connection, that fill the shadow table
+# in a full rebuild of global_articles, see logic.global_articles.rebuild.
+GLOBAL_ARTICLES_REBUILD_WORKERS = 4
+# Number of a project's titles added to the trigram search index per
+# transaction, see logic.title_search.index_project_titles.
+TITLE_INDEX_CHUNK_SIZE = 1000
+# Most trigrams of an articlePattern looked up in the title search index. The
+# candidates are checked with LIKE anyway, so more would only add postings.
+TITLE_SEARCH_MAX_TRIGRAMS = 8
+# Largest overlap of two projects that is cached for the projectB listing, see
+# logic.comparison. Larger overlaps are paged with SQL.
+COMPARISON_CACHE_MAX_ROWS = 50000
+# Random ratings sampled from rating_sample_cache, and found deleted or
+# reassessed, before logic.rating.get_random_article falls back to SQL.
+RANDOM_ARTICLE_SAMPLE_ATTEMPTS = 3
+# Default number of projects updated at the same time by wp1.update_runner.
+UPDATE_RUNNER_CONCURRENCY = 4
+# Number of processes decompressing the monthly pageview dump in
+# scores.update_pageviews.
+PAGEVIEW_DECOMPRESS_PROCESSES = 4
+# Maximum number of per-language spool files kept open at once by
+# scores.spool_pageviews.
+PAGEVIEW_SPOOL_MAX_OPEN_FILES = 64
+# Retries, and the seconds between them, of a failed per-language pageview
+# load job (see scores.update_pageviews_for_lang).
+PAGEVIEW_LOAD_RETRY_INTERVALS = [60, 5 * 60, 30 * 60]
 
 CATEGORY_NS_INT = 14
 TALK_NS_INT = 1
@@ -30,6 +94,19 @@ ZIM_FILE_TTL = 2 * 7 * 24 * 60 * 60  # 2 weeks
 
 LOG_NS = 4
 MAX_LOGS_PER_DAY = 100000
+# Articles of a day with more than MAX_LOGS_PER_DAY logs rendered at a time,
+# and the maximum size in characters of each subpage they are saved to (see
+# logs.render_section_subpages).
+LOG_RENDER_CHUNK_SIZE = 1000
+LOG_SUBPAGE_MAX_SIZE = 1024 * 1024
+# Log hashes read per pipelined round trip by logic.log.get_logs.
+LOG_READ_BATCH_SIZE = 500
+# Logs buffered by logic.log.LogWriter before they are sent to Redis in one
+# pipelined transaction.
+LOG_WRITE_BATCH_SIZE = 1000
+# Pages, or moves, resolved per replica query when rendering a log section
+# (see logs.get_revids).
+REVID_LOOKUP_BATCH_SIZE = 500
 
 WIKI_BASE = "https://en.wikipedia.org/wiki/"
 FRONTEND_WIKI_BASE = "https://en.wikipedia.org/w/"
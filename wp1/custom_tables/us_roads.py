@@ -1,6 +1,7 @@
 import logging
 
 from wp1.custom_tables.base_custom_table import BaseCustomTable
+from wp1.logic import project_stats as logic_project_stats
 from wp1.templates import env as jinja_env
 
 logger = logging.getLogger(__name__)
@@ -12,6 +13,11 @@ class CustomTable(BaseCustomTable):
         self.params = kwargs
 
     def _query_project_article_count(self, wp10db, project_name):
+        counts = logic_project_stats.get_quality_counts(wp10db, project_name)
+        if counts:
+            return [{"n": n, "quality": quality} for quality, n in counts.items()]
+
+        # A project has no count matrix until the end of its first update.
         with wp10db.cursor() as cursor:
             cursor.execute(
                 "SELECT count(r_article) AS n, r_quality as quality FROM ratings WHERE r_project = %s "
@@ -89,3 +89,23 @@ class UsRoadsCustomTableTest(BaseWpOneDbTest):
         actual = custom.create_wikicode(table_data)
 
         self.assertEqual(self.expected_wikicode, actual)
+
+    def test_generate_reads_project_stats(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO project_stats"
+                "  (pst_project, pst_quality, pst_importance, pst_count)"
+                " VALUES ('Apple', 'FA-Class', 'Top-Class', 7),"
+                "  ('Apple', 'FA-Class', 'Low-Class', 3)"
+            )
+        custom = UsRoadsTable(
+            projects=[{"name": "Apple"}],
+            categories=["FA-Class", "A-Class", "Stub-Class"],
+            parent_project="Bar",
+            aggregate_name="Fruit",
+            template="us_roads.jinja2",
+        )
+
+        actual = custom.generate(self.wp10db)
+
+        self.assertEqual([10, 0, 0, 10, 0, "0.000"], actual["projects"][0]["data"])
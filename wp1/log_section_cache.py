@@ -0,0 +1,55 @@
+"""Redis cache of the rendered log page sections of each project.
+
+A section only depends on the logs of its day, so each (project, date) entry
+holds the rendered section together with a digest of the logs it was rendered
+from. An entry is used only while the digest of the day's logs still matches,
+so a day that gained or changed a log is rendered again, and the other days of
+the log page are reused as they are. The digest covers
+LOG_SECTION_CACHE_VERSION, so changing the section template or its data only
+needs a bump of the version. Entries outlive the 7 days of logs of a log page
+by a day, and then expire on their own.
+"""
+
+import hashlib
+import logging
+from datetime import timedelta
+
+import attr
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the rendering of a log section changes.
+LOG_SECTION_CACHE_VERSION = 1
+LOG_SECTION_CACHE_TTL = timedelta(days=8)
+KEY_PREFIX = b"wp1:log_section:"
+
+
+def section_key(project_name, dt):
+    return KEY_PREFIX + dt.strftime("%Y%m%d").encode("utf-8") + b":" + project_name
+
+
+def logs_digest(logs):
+    """Returns a digest of logs that doesn't depend on their order."""
+    digest = hashlib.sha256(b"v%d" % LOG_SECTION_CACHE_VERSION)
+    for line in sorted(repr(attr.astuple(log)).encode("utf-8") for log in logs):
+        digest.update(b"\n" + line)
+    return digest.hexdigest().encode("ascii")
+
+
+def get_section(redis, project_name, dt, digest):
+    """Returns the cached section of the date, or None if there is none for
+    the logs with the given digest."""
+    cached_digest, section = redis.hmget(
+        section_key(project_name, dt), ("digest", "section")
+    )
+    if cached_digest != digest or section is None:
+        return None
+    return section.decode("utf-8")
+
+
+def set_section(redis, project_name, dt, digest, section):
+    key = section_key(project_name, dt)
+    with redis.pipeline() as pipe:
+        pipe.hset(key, mapping={"digest": digest, "section": section})
+        pipe.expire(key, LOG_SECTION_CACHE_TTL)
+        pipe.execute()
@@ -0,0 +1,101 @@
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+import attr
+import fakeredis
+
+from wp1 import log_section_cache
+from wp1.models.wp10.log import Log
+
+LOGS = [
+    Log(
+        l_project=b"Alpha",
+        l_namespace=0,
+        l_article=b"Apple",
+        l_action=b"quality",
+        l_timestamp=b"20181225112233",
+        l_old=b"NotA-Class",
+        l_new=b"B-Class",
+        l_revision_timestamp=b"2018-12-25T08:22:33Z",
+    ),
+    Log(
+        l_project=b"Alpha",
+        l_namespace=0,
+        l_article=b"Banana",
+        l_action=b"moved",
+        l_timestamp=b"20181225112233",
+        l_old=None,
+        l_new=None,
+        l_revision_timestamp=b"2018-12-25T09:00:00Z",
+    ),
+]
+DAY = date(2018, 12, 25)
+
+
+class LogSectionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+
+    def test_digest_ignores_order(self):
+        self.assertEqual(
+            log_section_cache.logs_digest(LOGS),
+            log_section_cache.logs_digest(list(reversed(LOGS))),
+        )
+
+    def test_digest_changes_with_logs(self):
+        changed = [attr.evolve(LOGS[0], l_new=b"A-Class"), LOGS[1]]
+
+        self.assertNotEqual(
+            log_section_cache.logs_digest(LOGS),
+            log_section_cache.logs_digest(changed),
+        )
+
+    def test_digest_changes_with_version(self):
+        digest = log_section_cache.logs_digest(LOGS)
+
+        with patch.object(log_section_cache, "LOG_SECTION_CACHE_VERSION", 2):
+            self.assertNotEqual(digest, log_section_cache.logs_digest(LOGS))
+
+    def test_get_missing(self):
+        digest = log_section_cache.logs_digest(LOGS)
+
+        self.assertIsNone(
+            log_section_cache.get_section(self.redis, b"Alpha", DAY, digest)
+        )
+
+    def test_round_trip(self):
+        digest = log_section_cache.logs_digest(LOGS)
+        log_section_cache.set_section(
+            self.redis, b"Alpha", DAY, digest, "=== December 25, 2018 ===\nÉté"
+        )
+
+        self.assertEqual(
+            "=== December 25, 2018 ===\nÉté",
+            log_section_cache.get_section(self.redis, b"Alpha", DAY, digest),
+        )
+        self.assertGreater(
+            self.redis.ttl(log_section_cache.section_key(b"Alpha", DAY)), 0
+        )
+
+    def test_get_other_digest(self):
+        log_section_cache.set_section(
+            self.redis, b"Alpha", DAY, log_section_cache.logs_digest(LOGS), "section"
+        )
+
+        self.assertIsNone(
+            log_section_cache.get_section(
+                self.redis, b"Alpha", DAY, log_section_cache.logs_digest(LOGS[:1])
+            )
+        )
+
+    def test_key_per_project_and_date(self):
+        self.assertNotEqual(
+            log_section_cache.section_key(b"Alpha", DAY),
+            log_section_cache.section_key(b"Beta", DAY),
+        )
+        self.assertNotEqual(
+            log_section_cache.section_key(b"Alpha", DAY),
+            log_section_cache.section_key(b"Alpha", date(2018, 12, 26)),
+        )
@@ -6,7 +6,7 @@ from datetime import datetime
 import wp1.logic.util as logic_util
 from wp1.api import login as site_login
 from wp1.api import site
-from wp1.constants import TS_FORMAT
+from wp1.constants import API_TITLES_PER_QUERY, TS_FORMAT
 
 logger = logging.getLogger(__name__)
 RE_NAMESPACE = re.compile(r"^([^:]+:)")
@@ -50,7 +50,73 @@ def get_redirect(title_with_ns):
     }
 
 
+def get_redirects(titles_with_ns):
+    """Same as get_redirect, for up to API_TITLES_PER_QUERY titles at once.
+
+    Returns a dict mapping each of the given titles that is a redirect to the
+    same data get_redirect returns for it, or None if the API couldn't be
+    queried.
+    """
+    titles_with_ns = list(titles_with_ns)
+    if not titles_with_ns:
+        return {}
+    if len(titles_with_ns) > API_TITLES_PER_QUERY:
+        raise ValueError(
+            "At most %s titles can be queried at once, got %s"
+            % (API_TITLES_PER_QUERY, len(titles_with_ns))
+        )
+
+    logger.debug("Querying api for redirects for %s titles", len(titles_with_ns))
+    site_login()
+    if site is None or not site.logged_in:
+        return None
+
+    res = None
+    retries = 3
+    while retries:
+        try:
+            # rvlimit is only allowed for a single title, without it the
+            # latest revision of every page is returned.
+            res = site.api(
+                "query",
+                titles="|".join(titles_with_ns),
+                redirects=1,
+                prop="revisions",
+                rvprop="timestamp",
+            )
+            break
+        except:
+            logger.exception("Error contacting API for redirects, retrying...")
+            retries -= 1
+
+    if res is None:
+        logger.warning("Error contacting API, returning None")
+        return None
+
+    query = res.get("query", {})
+    normalized = {n["from"]: n["to"] for n in query.get("normalized", [])}
+    redirects = {r["from"]: r["to"] for r in query.get("redirects", []) if r["to"]}
+    pages = {page["title"]: page for page in query.get("pages", {}).values()}
+
+    ans = {}
+    for title_with_ns in titles_with_ns:
+        title = normalized.get(title_with_ns, title_with_ns)
+        page = pages.get(redirects.get(title))
+        if page is None or not page.get("revisions"):
+            continue
+        ans[title_with_ns] = {
+            "ns": page["ns"],
+            "title": page["title"].replace(" ", "_"),
+            "timestamp_dt": datetime.strptime(
+                page["revisions"][0]["timestamp"], TS_FORMAT
+            ),
+        }
+    return ans
+
+
 def get_moves(title_with_ns):
+    """Returns the moves of the page in its move log, an empty list if it has
+    none, or None if the API couldn't be queried."""
     logger.debug("Querying api for moves of page %s", title_with_ns)
     site_login()
     if site is None or not site.logged_in:
@@ -93,5 +159,6 @@ def get_moves(title_with_ns):
 
     if retries == 0:
         logger.warning("Error contacting continuation API, returning None")
+        return None
 
-    return ans or None
+    return ans
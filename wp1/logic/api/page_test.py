@@ -72,3 +72,87 @@ class TestApiPage(unittest.TestCase):
         self.assertEqual(14, actual[0]["ns"])
         self.assertEqual("Foo_Bar_Baz", actual[0]["title"])
         self.assertEqual(datetime(2018, 12, 25, 1, 2, 3), actual[0]["timestamp_dt"])
+
+    @patch("wp1.logic.api.page.site")
+    def test_get_moves_none(self, patched_site):
+        patched_site.logevents.return_value = []
+
+        self.assertEqual([], api_page.get_moves("0:Foo_Bar"))
+
+    @patch("wp1.logic.api.page.site")
+    def test_get_moves_not_logged_in(self, patched_site):
+        patched_site.logged_in = False
+
+        self.assertIsNone(api_page.get_moves("0:Foo_Bar"))
+        patched_site.logevents.assert_not_called()
+
+    @patch("wp1.logic.api.page.site")
+    def test_get_redirects(self, patched_site):
+        patched_site.api.return_value = {
+            "query": {
+                "normalized": [
+                    {"from": ":Foo_Bar", "to": "Foo Bar"},
+                    {"from": ":Not_Redirect", "to": "Not Redirect"},
+                ],
+                "redirects": [
+                    {"from": "Foo Bar", "to": "Foo Bar Baz"},
+                    {"from": "Talk:Qux", "to": "Talk:Quux"},
+                ],
+                "pages": {
+                    "1": {
+                        "ns": 0,
+                        "title": "Foo Bar Baz",
+                        "revisions": [{"timestamp": "2018-12-25T01:02:03Z"}],
+                    },
+                    "2": {
+                        "ns": 1,
+                        "title": "Talk:Quux",
+                        "revisions": [{"timestamp": "2019-01-02T03:04:05Z"}],
+                    },
+                    "3": {
+                        "ns": 0,
+                        "title": "Not Redirect",
+                        "revisions": [{"timestamp": "2019-01-02T03:04:05Z"}],
+                    },
+                },
+            }
+        }
+
+        actual = api_page.get_redirects([":Foo_Bar", "Talk:Qux", ":Not_Redirect"])
+
+        self.assertEqual(
+            ":Foo_Bar|Talk:Qux|:Not_Redirect",
+            patched_site.api.call_args.kwargs["titles"],
+        )
+        self.assertEqual(
+            {
+                ":Foo_Bar": {
+                    "ns": 0,
+                    "title": "Foo_Bar_Baz",
+                    "timestamp_dt": datetime(2018, 12, 25, 1, 2, 3),
+                },
+                "Talk:Qux": {
+                    "ns": 1,
+                    "title": "Talk:Quux",
+                    "timestamp_dt": datetime(2019, 1, 2, 3, 4, 5),
+                },
+            },
+            actual,
+        )
+
+    @patch("wp1.logic.api.page.site")
+    def test_get_redirects_empty(self, patched_site):
+        self.assertEqual({}, api_page.get_redirects([]))
+        patched_site.api.assert_not_called()
+
+    @patch("wp1.logic.api.page.site")
+    def test_get_redirects_too_many_titles(self, patched_site):
+        with self.assertRaises(ValueError):
+            api_page.get_redirects([":Title_%d" % i for i in range(51)])
+
+    @patch("wp1.logic.api.page.site")
+    def test_get_redirects_api_error(self, patched_site):
+        patched_site.api.side_effect = Exception("API error")
+
+        self.assertIsNone(api_page.get_redirects([":Foo_Bar"]))
+        self.assertEqual(3, patched_site.api.call_count)
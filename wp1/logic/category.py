@@ -1,5 +1,6 @@
 import attr
 
+from wp1.logic import global_articles as logic_global_articles
 from wp1.models.wp10.category import Category
 
 
@@ -17,4 +18,18 @@ def insert_or_update(wp10db, category):
     """,
             attr.asdict(category),
         )
+        # The row count is 0 if the category was already stored as is.
+        if cursor.rowcount != 0:
+            logic_global_articles.log_project_rating_changed(
+                wp10db, category.c_project, category.c_type, category.c_rating
+            )
     wp10db.commit()
+
+
+def get_project_category_names(wp10db, project_name):
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            "SELECT c_category FROM categories WHERE c_project = %(c_project)s",
+            {"c_project": project_name},
+        )
+        return set(row["c_category"] for row in cursor.fetchall())
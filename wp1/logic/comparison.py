@@ -0,0 +1,188 @@
+"""Comparison of two projects, for the projectB listing of the articles endpoint.
+
+The overlap of projects A and B is the list of articles rated by both, as
+(article, namespace, A quality, A importance, B quality, B importance) tuples
+sorted like the SQL listing, by article then namespace. It is computed with one
+join per pair and update of either project, and cached in Redis (see
+comparison_cache). The count, filters and pages of every later request are
+then served from the cached list, and only the ratings of the returned page are
+read from the database.
+
+Overlaps of more than COMPARISON_CACHE_MAX_ROWS articles are too large to be
+read from Redis on every request. They are recorded as such, and
+get_comparison_page returns None for them, so that callers use the SQL
+listing of logic.rating instead.
+"""
+
+import bisect
+import logging
+
+from wp1 import comparison_cache
+from wp1.constants import COMPARISON_CACHE_MAX_ROWS
+from wp1.logic import rating as logic_rating
+from wp1.logic import title_search as logic_title_search
+
+logger = logging.getLogger(__name__)
+
+ASSESSED_CLASS = b"Assessed-Class"
+UNASSESSED_CLASS = b"Unassessed-Class"
+
+
+def compute_overlap(wp10db, project_a_name, project_b_name, max_rows):
+    """Returns the overlap of the two projects, or None if it has more than
+    max_rows articles."""
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            """
+        SELECT a.r_article AS article, a.r_namespace AS namespace,
+               a.r_quality AS q_a, a.r_importance AS i_a,
+               b.r_quality AS q_b, b.r_importance AS i_b
+        FROM ratings AS a
+        JOIN ratings AS b
+          ON b.r_project = %(r_project_b)s AND b.r_namespace = a.r_namespace AND
+             b.r_article = a.r_article
+        WHERE a.r_project = %(r_project)s
+        ORDER BY a.r_article, a.r_namespace
+        LIMIT %(limit)s
+    """,
+            {
+                "r_project": project_a_name,
+                "r_project_b": project_b_name,
+                "limit": max_rows + 1,
+            },
+        )
+        rows = [
+            (r["article"], r["namespace"], r["q_a"], r["i_a"], r["q_b"], r["i_b"])
+            for r in cursor.fetchall()
+        ]
+    if len(rows) > max_rows:
+        return None
+    return rows
+
+
+def get_overlap(
+    wp10db, redis, project_a, project_b, max_rows=COMPARISON_CACHE_MAX_ROWS
+):
+    """Returns the overlap of two Projects, from the cache if possible.
+
+    Returns None if the overlap is too large to be cached.
+    """
+    key = comparison_cache.pair_key(redis, project_a, project_b)
+    found, rows = comparison_cache.get_overlap(redis, key)
+    if found:
+        return rows
+
+    rows = compute_overlap(wp10db, project_a.p_project, project_b.p_project, max_rows)
+    if rows is None:
+        logger.info(
+            "Overlap of %s and %s is too large to cache",
+            project_a.p_project.decode("utf-8"),
+            project_b.p_project.decode("utf-8"),
+        )
+    comparison_cache.set_overlap(redis, key, rows)
+    return rows
+
+
+def _to_bytes(value):
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return value
+
+
+def _matches(value, wanted):
+    if wanted is None:
+        return True
+    if wanted == ASSESSED_CLASS:
+        # Like != in SQL, which is never true for NULL.
+        return value is not None and value != UNASSESSED_CLASS
+    return value == wanted
+
+
+def filter_overlap(
+    rows,
+    quality=None,
+    importance=None,
+    quality_b=None,
+    importance_b=None,
+    pattern=None,
+):
+    """Returns the overlap rows matching the filters of the SQL listing.
+
+    pattern is matched as a literal substring, see logic.title_search.
+    """
+    wanted = [_to_bytes(w) for w in (quality, importance, quality_b, importance_b)]
+    if pattern is not None:
+        pattern = logic_title_search.normalize_pattern(pattern)
+    return [
+        row
+        for row in rows
+        if all(_matches(value, w) for value, w in zip(row[2:], wanted))
+        and (pattern is None or pattern in row[0])
+    ]
+
+
+def get_comparison_page(
+    wp10db,
+    redis,
+    project_a,
+    project_b,
+    quality=None,
+    importance=None,
+    quality_b=None,
+    importance_b=None,
+    pattern=None,
+    page=None,
+    limit=100,
+    after=None,
+):
+    """Returns (total, page of rating pairs, next after token) of a comparison.
+
+    The page and after parameters are like those of
+    logic.rating.get_project_rating_page. Returns None if the overlap of the
+    projects is too large to be cached. Raises ValueError if after is invalid.
+    """
+    after_values = None
+    if after is not None:
+        after_values = logic_rating.decode_after(after)
+
+    rows = get_overlap(wp10db, redis, project_a, project_b)
+    if rows is None:
+        return None
+    rows = filter_overlap(
+        rows,
+        quality=quality,
+        importance=importance,
+        quality_b=quality_b,
+        importance_b=importance_b,
+        pattern=pattern,
+    )
+
+    if after_values is not None:
+        start = bisect.bisect_right(
+            rows,
+            (after_values["article"], after_values["namespace"]),
+            key=lambda row: (row[0], row[1]),
+        )
+    else:
+        start = (int(page or 1) - 1) * limit
+    page_rows = rows[start : start + limit]
+
+    titles = [(row[1], row[0]) for row in page_rows]
+    ratings_a = logic_rating.get_project_ratings_by_articles(
+        wp10db, project_a.p_project, titles
+    )
+    ratings_b = logic_rating.get_project_ratings_by_articles(
+        wp10db, project_b.p_project, titles
+    )
+    # A rating can be gone if either project is being updated, skip it then.
+    results = [
+        (ratings_a[title], ratings_b[title])
+        for title in titles
+        if title in ratings_a and title in ratings_b
+    ]
+
+    next_after = None
+    if page_rows and start + limit < len(rows):
+        last = page_rows[-1]
+        next_after = logic_rating.encode_after(None, None, last[0], last[1])
+    return len(rows), results, next_after
@@ -0,0 +1,202 @@
+import unittest
+from unittest.mock import patch
+
+from wp1.base_db_test import BaseWpOneDbTest
+from wp1.logic import comparison as logic_comparison
+from wp1.logic import rating as logic_rating
+from wp1.models.wp10.project import Project
+
+OVERLAP = [
+    (b"Apple", 0, b"FA-Class", b"High-Class", b"B-Class", b"Low-Class"),
+    (b"Apple", 1, b"Unassessed-Class", b"Low-Class", b"B-Class", b"Low-Class"),
+    (b"Green_apple", 0, None, b"High-Class", b"C-Class", b"Mid-Class"),
+]
+
+
+class FilterOverlapTest(unittest.TestCase):
+
+    def _articles(self, **kwargs):
+        return [
+            (row[0], row[1])
+            for row in logic_comparison.filter_overlap(OVERLAP, **kwargs)
+        ]
+
+    def test_no_filters(self):
+        self.assertEqual(OVERLAP, logic_comparison.filter_overlap(OVERLAP))
+
+    def test_filters(self):
+        self.assertEqual([(b"Apple", 0)], self._articles(quality=b"FA-Class"))
+        self.assertEqual(
+            [(b"Apple", 0), (b"Green_apple", 0)],
+            self._articles(importance=b"High-Class"),
+        )
+        self.assertEqual(
+            [(b"Green_apple", 0)],
+            self._articles(quality_b="C-Class", importance_b="Mid-Class"),
+        )
+
+    def test_assessed_class(self):
+        # NULL is never assessed, like in SQL.
+        self.assertEqual([(b"Apple", 0)], self._articles(quality=b"Assessed-Class"))
+
+    def test_pattern(self):
+        self.assertEqual([(b"Green_apple", 0)], self._articles(pattern="n app"))
+
+
+class ComparisonTest(BaseWpOneDbTest):
+    ratings = (
+        (b"Alpha", 0, b"Apple", b"FA-Class", b"High-Class"),
+        (b"Alpha", 0, b"Cherry", b"B-Class", b"Low-Class"),
+        (b"Alpha", 0, b"Banana", b"C-Class", b"Low-Class"),
+        (b"Alpha", 1, b"Apple", b"FA-Class", b"High-Class"),
+        (b"Alpha", 0, b"Date", b"B-Class", b"Low-Class"),
+        (b"Beta", 0, b"Apple", b"Stub-Class", b"Mid-Class"),
+        (b"Beta", 0, b"Banana", b"B-Class", b"Top-Class"),
+        (b"Beta", 0, b"Cherry", b"B-Class", b"Mid-Class"),
+        (b"Beta", 1, b"Apple", b"C-Class", b"Low-Class"),
+        (b"Beta", 0, b"Elderberry", b"B-Class", b"Low-Class"),
+    )
+
+    def setUp(self):
+        super().setUp()
+        with self.wp10db.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO ratings"
+                "  (r_project, r_namespace, r_article, r_quality, r_importance)"
+                " VALUES (%s, %s, %s, %s, %s)",
+                self.ratings,
+            )
+        self.wp10db.commit()
+        self.alpha = Project(p_project=b"Alpha", p_timestamp=b"20261018000000")
+        self.beta = Project(p_project=b"Beta", p_timestamp=b"20261018000000")
+
+    def test_compute_overlap(self):
+        actual = logic_comparison.compute_overlap(self.wp10db, b"Alpha", b"Beta", 10)
+
+        self.assertEqual(
+            [
+                (b"Apple", 0, b"FA-Class", b"High-Class", b"Stub-Class", b"Mid-Class"),
+                (b"Apple", 1, b"FA-Class", b"High-Class", b"C-Class", b"Low-Class"),
+                (b"Banana", 0, b"C-Class", b"Low-Class", b"B-Class", b"Top-Class"),
+                (b"Cherry", 0, b"B-Class", b"Low-Class", b"B-Class", b"Mid-Class"),
+            ],
+            actual,
+        )
+
+    def test_compute_overlap_too_large(self):
+        self.assertIsNone(
+            logic_comparison.compute_overlap(self.wp10db, b"Alpha", b"Beta", 3)
+        )
+
+    def test_get_overlap_cached(self):
+        expected = logic_comparison.get_overlap(
+            self.wp10db, self.redis, self.alpha, self.beta
+        )
+
+        with patch.object(logic_comparison, "compute_overlap") as compute:
+            actual = logic_comparison.get_overlap(
+                self.wp10db, self.redis, self.alpha, self.beta
+            )
+
+        compute.assert_not_called()
+        self.assertEqual(expected, actual)
+        self.assertEqual(4, len(actual))
+
+    def test_get_overlap_recomputed_after_update(self):
+        logic_comparison.get_overlap(self.wp10db, self.redis, self.alpha, self.beta)
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("DELETE FROM ratings WHERE r_article = 'Banana'")
+        self.wp10db.commit()
+
+        self.beta.p_timestamp = b"20261019000000"
+        actual = logic_comparison.get_overlap(
+            self.wp10db, self.redis, self.alpha, self.beta
+        )
+
+        self.assertNotIn(b"Banana", [row[0] for row in actual])
+
+    def test_get_overlap_too_large_cached(self):
+        actual = logic_comparison.get_overlap(
+            self.wp10db, self.redis, self.alpha, self.beta, max_rows=3
+        )
+
+        with patch.object(logic_comparison, "compute_overlap") as compute:
+            again = logic_comparison.get_overlap(
+                self.wp10db, self.redis, self.alpha, self.beta, max_rows=3
+            )
+
+        self.assertIsNone(actual)
+        self.assertIsNone(again)
+        compute.assert_not_called()
+
+    def test_get_comparison_page(self):
+        total, results, after = logic_comparison.get_comparison_page(
+            self.wp10db, self.redis, self.alpha, self.beta, limit=3
+        )
+
+        self.assertEqual(4, total)
+        self.assertEqual(
+            [(b"Apple", 0), (b"Apple", 1), (b"Banana", 0)],
+            [(a.r_article, a.r_namespace) for a, _ in results],
+        )
+        for rating_a, rating_b in results:
+            self.assertEqual(b"Alpha", rating_a.r_project)
+            self.assertEqual(b"Beta", rating_b.r_project)
+            self.assertEqual(rating_a.r_article, rating_b.r_article)
+        self.assertIsNotNone(after)
+
+        total, results, after = logic_comparison.get_comparison_page(
+            self.wp10db, self.redis, self.alpha, self.beta, limit=3, after=after
+        )
+
+        self.assertEqual(4, total)
+        self.assertEqual([b"Cherry"], [a.r_article for a, _ in results])
+        self.assertIsNone(after)
+
+    def test_get_comparison_page_number(self):
+        total, results, after = logic_comparison.get_comparison_page(
+            self.wp10db, self.redis, self.alpha, self.beta, page=2, limit=3
+        )
+
+        self.assertEqual([b"Cherry"], [a.r_article for a, _ in results])
+        self.assertIsNone(after)
+
+    def test_get_comparison_page_filtered(self):
+        total, results, _ = logic_comparison.get_comparison_page(
+            self.wp10db,
+            self.redis,
+            self.alpha,
+            self.beta,
+            importance=b"Low-Class",
+            quality_b="B-Class",
+        )
+
+        self.assertEqual(2, total)
+        self.assertEqual([b"Banana", b"Cherry"], [a.r_article for a, _ in results])
+
+    def test_get_comparison_page_matches_sql(self):
+        _, results, _ = logic_comparison.get_comparison_page(
+            self.wp10db, self.redis, self.alpha, self.beta
+        )
+
+        expected = logic_rating.get_project_rating_by_type(
+            self.wp10db, b"Alpha", project_b_name=b"Beta"
+        )
+        self.assertEqual(
+            [(a.r_article, a.r_namespace) for a, _ in expected],
+            [(a.r_article, a.r_namespace) for a, _ in results],
+        )
+
+    def test_get_comparison_page_too_large(self):
+        with patch.object(logic_comparison, "get_overlap", return_value=None):
+            actual = logic_comparison.get_comparison_page(
+                self.wp10db, self.redis, self.alpha, self.beta
+            )
+
+        self.assertIsNone(actual)
+
+    def test_get_comparison_page_invalid_after(self):
+        with self.assertRaises(ValueError):
+            logic_comparison.get_comparison_page(
+                self.wp10db, self.redis, self.alpha, self.beta, after="foo"
+            )
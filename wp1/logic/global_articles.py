@@ -0,0 +1,283 @@
+"""Incremental maintenance of the global_articles table.
+
+Every write that can raise the global quality, importance or score of an
+article (see logic.rating and logic.category) also records the article in the
+global_article_changes table, in the same transaction. merge_changes then
+recomputes global_articles for just those articles, so project updates can
+keep running while it does.
+
+An article's global row is the maximum of its existing row and of the mapped
+ratings of every project.
+
+Each change entry carries a version that is bumped whenever the article is
+logged again. merge_changes only deletes the entries whose version it read, so
+a change logged while an article is being merged is picked up by the next run.
+
+rebuild recomputes the whole table into a shadow table, with one worker per
+partition of the articles by hash, and renames it into place in one atomic
+RENAME TABLE. It leaves the change log alone, and must not run at the same
+time as merge_changes, or merged changes could be lost in the swap.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from wp1.constants import (
+    GLOBAL_ARTICLES_MERGE_BATCH_SIZE,
+    GLOBAL_ARTICLES_REBUILD_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+SHADOW_TABLE = "global_articles_shadow"
+OLD_TABLE = "global_articles_old"
+
+_LOG_ON_DUPLICATE = "ON DUPLICATE KEY UPDATE gac_version = gac_version + 1"
+
+
+def log_changed_articles(wp10db, articles):
+    """Records that the ratings of articles (titles in namespace 0) changed.
+
+    Does not commit, so the entries are committed with the rating writes. The
+    entries are written in sorted order, so that concurrent transactions lock
+    them in the same order.
+    """
+    articles = sorted(set(articles))
+    if not articles:
+        return
+    with wp10db.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO global_article_changes (gac_article) VALUES (%s) "
+            + _LOG_ON_DUPLICATE,
+            [(article,) for article in articles],
+        )
+
+
+def log_project_rating_changed(wp10db, project_name, kind, rating):
+    """Records every article of the project with the given rating of kind.
+
+    Used when the global ranking that the rating maps to may have changed.
+    kind is the AssessmentKind value, 'quality' or 'importance', and a rating
+    of None matches NULL. Does not commit.
+    """
+    if isinstance(kind, bytes):
+        kind = kind.decode("utf-8")
+    if kind == "quality":
+        column = "r_quality"
+    elif kind == "importance":
+        column = "r_importance"
+    else:
+        raise ValueError("kind was not quality or importance: %r" % kind)
+
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO global_article_changes (gac_article) "
+            "SELECT r_article FROM ratings "
+            "WHERE r_project = %s AND r_namespace = 0 AND "
+            + column
+            + " <=> %s "
+            + _LOG_ON_DUPLICATE,
+            (project_name, rating),
+        )
+
+
+def pending_count(wp10db):
+    with wp10db.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) AS cnt FROM global_article_changes")
+        return cursor.fetchone()["cnt"]
+
+
+def _read_changes(wp10db, after, batch_size):
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            """
+        SELECT gac_article, gac_version FROM global_article_changes
+        WHERE gac_article > %s
+        ORDER BY gac_article
+        LIMIT %s
+    """,
+            (after, batch_size),
+        )
+        return cursor.fetchall()
+
+
+def _merge_articles(wp10db, articles):
+    placeholders = ", ".join(["%s"] * len(articles))
+    with wp10db.cursor() as cursor:
+        # The rankings are stored as strings, so compare them as numbers.
+        cursor.execute(
+            """
+        INSERT INTO global_articles (a_article, a_quality, a_importance, a_score)
+        SELECT r_article, MAX(qual.gr_ranking), MAX(imp.gr_ranking), MAX(r_score)
+        FROM ratings
+        JOIN categories AS ci
+          ON r_project = ci.c_project AND ci.c_type = 'importance' AND
+             r_importance = ci.c_rating
+        JOIN categories AS cq
+          ON r_project = cq.c_project AND cq.c_type = 'quality' AND
+             r_quality = cq.c_rating
+        JOIN global_rankings AS qual
+          ON qual.gr_type = 'quality' AND qual.gr_rating = cq.c_replacement
+        JOIN global_rankings AS imp
+          ON imp.gr_type = 'importance' AND imp.gr_rating = ci.c_replacement
+        WHERE r_namespace = 0 AND r_article IN ("""
+            + placeholders
+            + """)
+        GROUP BY r_article
+        ON DUPLICATE KEY UPDATE
+          a_quality = GREATEST(CAST(a_quality AS UNSIGNED),
+                               CAST(VALUES(a_quality) AS UNSIGNED)),
+          a_importance = GREATEST(CAST(a_importance AS UNSIGNED),
+                                  CAST(VALUES(a_importance) AS UNSIGNED)),
+          a_score = GREATEST(a_score, VALUES(a_score))
+    """,
+            articles,
+        )
+
+
+def _delete_changes(wp10db, changes):
+    with wp10db.cursor() as cursor:
+        cursor.executemany(
+            "DELETE FROM global_article_changes "
+            "WHERE gac_article = %s AND gac_version = %s",
+            [(c["gac_article"], c["gac_version"]) for c in changes],
+        )
+
+
+def merge_changes(wp10db, batch_size=GLOBAL_ARTICLES_MERGE_BATCH_SIZE):
+    """Recomputes global_articles for every logged article.
+
+    Works through the log once, in article order, committing after every batch
+    of batch_size articles. Returns the number of articles merged.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive: %s" % batch_size)
+
+    merged = 0
+    after = b""
+    while True:
+        wp10db.ping()
+        changes = _read_changes(wp10db, after, batch_size)
+        if not changes:
+            break
+
+        _merge_articles(wp10db, [c["gac_article"] for c in changes])
+        _delete_changes(wp10db, changes)
+        wp10db.commit()
+
+        merged += len(changes)
+        after = changes[-1]["gac_article"]
+        logger.info("Merged %s changed global articles", merged)
+
+    return merged
+
+
+def _create_shadow(wp10db):
+    with wp10db.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS " + SHADOW_TABLE)
+        cursor.execute("CREATE TABLE " + SHADOW_TABLE + " LIKE global_articles")
+    wp10db.commit()
+
+
+def _drop_shadow(wp10db):
+    with wp10db.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS " + SHADOW_TABLE)
+
+
+def _fill_partition(wp10db, partitions, partition):
+    """Fills the shadow table with the articles whose hash is in partition."""
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO " + SHADOW_TABLE + """
+          (a_article, a_quality, a_importance, a_score)
+        SELECT art, MAX(qrating), MAX(irating), MAX(score)
+        FROM (
+          SELECT a_article AS art, CAST(a_quality AS UNSIGNED) AS qrating,
+                 CAST(a_importance AS UNSIGNED) AS irating, a_score AS score
+          FROM global_articles
+          WHERE MOD(CRC32(a_article), %(partitions)s) = %(partition)s
+          UNION ALL
+          SELECT r_article, qual.gr_ranking, imp.gr_ranking, r_score
+          FROM ratings
+          JOIN categories AS ci
+            ON r_project = ci.c_project AND ci.c_type = 'importance' AND
+               r_importance = ci.c_rating
+          JOIN categories AS cq
+            ON r_project = cq.c_project AND cq.c_type = 'quality' AND
+               r_quality = cq.c_rating
+          JOIN global_rankings AS qual
+            ON qual.gr_type = 'quality' AND qual.gr_rating = cq.c_replacement
+          JOIN global_rankings AS imp
+            ON imp.gr_type = 'importance' AND imp.gr_rating = ci.c_replacement
+          WHERE r_namespace = 0 AND
+                MOD(CRC32(r_article), %(partitions)s) = %(partition)s
+        ) AS t
+        GROUP BY art
+    """,
+            {"partitions": partitions, "partition": partition},
+        )
+        count = cursor.rowcount
+    wp10db.commit()
+    return count
+
+
+def _swap_shadow(wp10db):
+    with wp10db.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS " + OLD_TABLE)
+        # Renames the two tables atomically, readers see one or the other.
+        cursor.execute(
+            "RENAME TABLE global_articles TO "
+            + OLD_TABLE
+            + ", "
+            + SHADOW_TABLE
+            + " TO global_articles"
+        )
+        cursor.execute("DROP TABLE " + OLD_TABLE)
+
+
+def rebuild(connect, workers=GLOBAL_ARTICLES_REBUILD_WORKERS):
+    """Rebuilds global_articles from every project's ratings and swaps it in.
+
+    Like the incremental merge, every article keeps at least the rankings and
+    score of its current row. connect is called for one WP10 connection per
+    worker, plus one for creating and swapping the shadow table. Returns the
+    number of articles in the new table.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1, got %r" % workers)
+
+    wp10db = connect()
+    try:
+        _create_shadow(wp10db)
+        try:
+
+            def fill(partition):
+                conn = connect()
+                try:
+                    count = _fill_partition(conn, workers, partition)
+                finally:
+                    conn.close()
+                logger.info(
+                    "Filled global articles partition %s/%s with %s articles",
+                    partition + 1,
+                    workers,
+                    count,
+                )
+                return count
+
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="wp1-global"
+            ) as executor:
+                total = sum(executor.map(fill, range(workers)))
+
+            wp10db.ping()
+            _swap_shadow(wp10db)
+        except Exception:
+            wp10db.ping()
+            _drop_shadow(wp10db)
+            raise
+    finally:
+        wp10db.close()
+
+    logger.info("Rebuilt global articles with %s articles", total)
+    return total
@@ -0,0 +1,295 @@
+from unittest.mock import patch
+
+from wp1.base_db_test import BaseWpOneDbTest
+from wp1.constants import AssessmentKind
+from wp1.logic import category as logic_category
+from wp1.logic import global_articles as logic_global_articles
+from wp1.logic import rating as logic_rating
+from wp1.models.wp10.category import Category
+from wp1.models.wp10.rating import Rating
+
+
+class GlobalArticlesTest(BaseWpOneDbTest):
+    categories = (
+        (b"Alpha", b"quality", b"FA-Class", b"FA-Class"),
+        (b"Alpha", b"quality", b"B-Class", b"B-Class"),
+        (b"Alpha", b"importance", b"Top-Class", b"Top-Class"),
+        (b"Alpha", b"importance", b"Low-Class", b"Low-Class"),
+        (b"Beta", b"quality", b"Stub-Class", b"Stub-Class"),
+        (b"Beta", b"quality", b"Good-Class", b"GA-Class"),
+        (b"Beta", b"importance", b"Mid-Class", b"Mid-Class"),
+    )
+    ratings = (
+        (b"Alpha", 0, b"Apples", b"B-Class", b"Top-Class"),
+        (b"Beta", 0, b"Apples", b"Good-Class", b"Mid-Class"),
+        (b"Alpha", 0, b"Bananas", b"FA-Class", b"Low-Class"),
+        (b"Beta", 0, b"Cherries", b"Stub-Class", b"Mid-Class"),
+        (b"Alpha", 1, b"Dates", b"FA-Class", b"Top-Class"),
+    )
+
+    def setUp(self):
+        super().setUp()
+        with self.wp10db.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO categories"
+                "  (c_project, c_type, c_rating, c_replacement, c_category,"
+                "   c_ranking)"
+                " VALUES (%s, %s, %s, %s, '', 0)",
+                self.categories,
+            )
+            cursor.executemany(
+                "INSERT INTO ratings"
+                "  (r_project, r_namespace, r_article, r_quality, r_importance)"
+                " VALUES (%s, %s, %s, %s, %s)",
+                self.ratings,
+            )
+        self.wp10db.commit()
+
+    def _changes(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "SELECT gac_article, gac_version FROM global_article_changes"
+            )
+            return {r["gac_article"]: r["gac_version"] for r in cursor.fetchall()}
+
+    def _global_articles(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SELECT * FROM global_articles")
+            return {
+                r["a_article"]: (r["a_quality"], r["a_importance"], r["a_score"])
+                for r in cursor.fetchall()
+            }
+
+    def _log_all(self):
+        logic_global_articles.log_changed_articles(
+            self.wp10db, [b"Apples", b"Bananas", b"Cherries"]
+        )
+        self.wp10db.commit()
+
+    def test_log_changed_articles(self):
+        logic_global_articles.log_changed_articles(
+            self.wp10db, [b"Apples", b"Bananas", b"Apples"]
+        )
+        logic_global_articles.log_changed_articles(self.wp10db, [b"Bananas"])
+
+        self.assertEqual({b"Apples": 0, b"Bananas": 1}, self._changes())
+
+    def test_log_changed_articles_empty(self):
+        logic_global_articles.log_changed_articles(self.wp10db, [])
+
+        self.assertEqual({}, self._changes())
+
+    def test_log_project_rating_changed(self):
+        logic_global_articles.log_project_rating_changed(
+            self.wp10db, b"Alpha", b"importance", b"Top-Class"
+        )
+
+        # Dates is in the talk namespace.
+        self.assertEqual({b"Apples": 0}, self._changes())
+
+    def test_log_project_rating_changed_null(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE ratings SET r_quality = NULL WHERE r_article = 'Cherries'"
+            )
+
+        logic_global_articles.log_project_rating_changed(
+            self.wp10db, b"Beta", "quality", None
+        )
+
+        self.assertEqual({b"Cherries": 0}, self._changes())
+
+    def test_log_project_rating_changed_invalid_kind(self):
+        with self.assertRaises(ValueError):
+            logic_global_articles.log_project_rating_changed(
+                self.wp10db, b"Alpha", "both", b"FA-Class"
+            )
+
+    def test_rating_writer_logs_articles(self):
+        writer = logic_rating.RatingWriter(self.wp10db)
+        for namespace, article in ((0, b"Figs"), (1, b"Grapes")):
+            writer.add(
+                Rating(
+                    r_project=b"Alpha",
+                    r_namespace=namespace,
+                    r_article=article,
+                    r_quality=b"FA-Class",
+                    r_quality_timestamp=b"2018-04-01T12:30:00Z",
+                ),
+                AssessmentKind.QUALITY,
+            )
+        writer.flush()
+
+        self.assertEqual({b"Figs": 0}, self._changes())
+
+    def test_category_change_logs_articles(self):
+        category = Category(
+            c_project=b"Beta",
+            c_type=b"quality",
+            c_rating=b"Stub-Class",
+            c_replacement=b"Start-Class",
+            c_category=b"",
+            c_ranking=0,
+        )
+
+        logic_category.insert_or_update(self.wp10db, category)
+
+        self.assertEqual({b"Cherries": 0}, self._changes())
+
+    def test_unchanged_category_logs_nothing(self):
+        category = Category(
+            c_project=b"Beta",
+            c_type=b"quality",
+            c_rating=b"Stub-Class",
+            c_replacement=b"Stub-Class",
+            c_category=b"",
+            c_ranking=0,
+        )
+
+        logic_category.insert_or_update(self.wp10db, category)
+
+        self.assertEqual({}, self._changes())
+
+    def test_merge_changes(self):
+        self._log_all()
+
+        actual = logic_global_articles.merge_changes(self.wp10db)
+
+        self.assertEqual(3, actual)
+        self.assertEqual(
+            {
+                b"Apples": (b"400", b"400", 0),
+                b"Bananas": (b"500", b"100", 0),
+                b"Cherries": (b"100", b"200", 0),
+            },
+            self._global_articles(),
+        )
+        self.assertEqual({}, self._changes())
+
+    def test_merge_changes_only_logged_articles(self):
+        logic_global_articles.log_changed_articles(self.wp10db, [b"Bananas"])
+        self.wp10db.commit()
+
+        logic_global_articles.merge_changes(self.wp10db)
+
+        self.assertEqual([b"Bananas"], list(self._global_articles()))
+
+    def test_merge_changes_keeps_higher_existing(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO global_articles"
+                "  (a_article, a_quality, a_importance, a_score)"
+                " VALUES ('Apples', '80', '50', 42), ('Cherries', '480', '0', 7)"
+            )
+        self._log_all()
+
+        logic_global_articles.merge_changes(self.wp10db)
+
+        actual = self._global_articles()
+        # 400 only beats 80 when compared as numbers.
+        self.assertEqual((b"400", b"400", 42), actual[b"Apples"])
+        self.assertEqual((b"480", b"200", 7), actual[b"Cherries"])
+
+    def test_merge_changes_batches(self):
+        self._log_all()
+
+        actual = logic_global_articles.merge_changes(self.wp10db, batch_size=2)
+
+        self.assertEqual(3, actual)
+        self.assertEqual(3, len(self._global_articles()))
+        self.assertEqual(0, logic_global_articles.pending_count(self.wp10db))
+
+    def test_merge_changes_keeps_change_logged_during_merge(self):
+        self._log_all()
+        orig_merge = logic_global_articles._merge_articles
+
+        def merge_and_log(wp10db, articles):
+            orig_merge(wp10db, articles)
+            logic_global_articles.log_changed_articles(wp10db, [b"Bananas"])
+
+        with patch.object(
+            logic_global_articles, "_merge_articles", side_effect=merge_and_log
+        ):
+            logic_global_articles.merge_changes(self.wp10db)
+
+        self.assertEqual({b"Bananas": 1}, self._changes())
+
+    def test_merge_changes_invalid_batch_size(self):
+        with self.assertRaises(ValueError):
+            logic_global_articles.merge_changes(self.wp10db, batch_size=0)
+
+    def _connect(self):
+        return self.wp10db
+
+    def _table_exists(self, name):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SHOW TABLES LIKE %s", (name,))
+            return cursor.fetchone() is not None
+
+    def test_rebuild(self):
+        orig_close = self.wp10db.close
+        self.wp10db.close = lambda: True
+        self.addCleanup(setattr, self.wp10db, "close", orig_close)
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO global_articles"
+                "  (a_article, a_quality, a_importance, a_score)"
+                " VALUES ('Apples', '80', '50', 42), ('Elderberries', '100', '0', 3)"
+            )
+        self.wp10db.commit()
+
+        actual = logic_global_articles.rebuild(self._connect, workers=1)
+
+        self.assertEqual(4, actual)
+        self.assertEqual(
+            {
+                b"Apples": (b"400", b"400", 42),
+                b"Bananas": (b"500", b"100", 0),
+                b"Cherries": (b"100", b"200", 0),
+                b"Elderberries": (b"100", b"0", 3),
+            },
+            self._global_articles(),
+        )
+        self.assertFalse(self._table_exists(logic_global_articles.SHADOW_TABLE))
+        self.assertFalse(self._table_exists(logic_global_articles.OLD_TABLE))
+
+    def test_partitions_cover_all_articles(self):
+        logic_global_articles._create_shadow(self.wp10db)
+
+        counts = [
+            logic_global_articles._fill_partition(self.wp10db, 3, partition)
+            for partition in range(3)
+        ]
+        logic_global_articles._swap_shadow(self.wp10db)
+
+        self.assertEqual(3, sum(counts))
+        self.assertEqual(
+            [b"Apples", b"Bananas", b"Cherries"], sorted(self._global_articles())
+        )
+
+    def test_rebuild_failure_keeps_table(self):
+        orig_close = self.wp10db.close
+        self.wp10db.close = lambda: True
+        self.addCleanup(setattr, self.wp10db, "close", orig_close)
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO global_articles"
+                "  (a_article, a_quality, a_importance, a_score)"
+                " VALUES ('Apples', '80', '50', 42)"
+            )
+        self.wp10db.commit()
+
+        with patch.object(
+            logic_global_articles,
+            "_fill_partition",
+            side_effect=RuntimeError("lost connection"),
+        ):
+            with self.assertRaises(RuntimeError):
+                logic_global_articles.rebuild(self._connect, workers=1)
+
+        self.assertEqual({b"Apples": (b"80", b"50", 42)}, self._global_articles())
+        self.assertFalse(self._table_exists(logic_global_articles.SHADOW_TABLE))
+
+    def test_rebuild_invalid_workers(self):
+        with self.assertRaises(ValueError):
+            logic_global_articles.rebuild(self._connect, workers=0)
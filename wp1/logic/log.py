@@ -1,18 +1,72 @@
+"""Logs of the rating changes of each project, stored in Redis.
+
+Each log is a hash under gen_redis_log_key, holding the fields of a Log, and
+expires after LOG_TTL. insert_or_update, or a LogWriter for many logs, also
+indexes it in the same MULTI transaction:
+
+- the sorted set under gen_redis_log_index_key(project, date) holds the keys
+  of the project's logs of that day, scored by their l_timestamp;
+- the sorted set under gen_redis_log_dates_key(project) holds the days that
+  the project has an index for, scored by the date as a number. Days older
+  than LOG_TTL before the day of the log are dropped from it, since their
+  indexes have expired.
+
+get_logs for a project then reads its indexes and the indexed hashes, in
+pipelined batches, instead of SCANning every key in Redis. An index can
+outlive some of its logs, so hashes that are gone are skipped and removed from
+their index. Logs written before the indexes existed are indexed with
+index_existing_logs.
+"""
+
 import datetime
 
 import attr
 from redis import Redis
 
+from wp1.constants import LOG_READ_BATCH_SIZE, LOG_WRITE_BATCH_SIZE, TS_FORMAT_WP10
 from wp1.models.wp10.log import Log
-from wp1.redis_db import gen_redis_log_key
+from wp1.redis_db import (
+    gen_redis_log_dates_key,
+    gen_redis_log_index_key,
+    gen_redis_log_key,
+)
 
 # Redis does not allow None types. However if a log to be stored has a None
 # we convert it to this value while storing on Redis and back to None
 # when converting from Redis to python object
 REDIS_NULL = b"__redis__none__"
 
+LOG_TTL = datetime.timedelta(days=7)
 
-def insert_or_update(redis: Redis, log: Log):
+
+def _to_bytes(value: str | bytes) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+def _expired_before(day) -> int:
+    """The score of the oldest day that can still have an index, if logs are
+    being written on day."""
+    if isinstance(day, bytes):
+        day = day.decode("utf-8")
+    dt = datetime.datetime.strptime(day, "%Y%m%d") - LOG_TTL
+    return int(dt.strftime("%Y%m%d"))
+
+
+def _index(pipe, log_key, log: Log):
+    day = log.l_timestamp[:8]
+    index_key = gen_redis_log_index_key(project=log.l_project, date=day)
+    dates_key = gen_redis_log_dates_key(project=log.l_project)
+    pipe.zadd(index_key, {log_key: int(log.l_timestamp)})
+    pipe.expire(index_key, LOG_TTL)
+    pipe.zadd(dates_key, {day: int(day)})
+    # Logs are timestamped when they are written, so the indexes of the days
+    # before this one minus LOG_TTL are gone. Without this, the dates of an
+    # active project would never expire.
+    pipe.zremrangebyscore(dates_key, "-inf", "(%d" % _expired_before(day))
+    pipe.expire(dates_key, LOG_TTL)
+
+
+def _write(pipe, log: Log):
     # The date component keeps each day's log for an article in its own key.
     log_key = gen_redis_log_key(
         project=log.l_project,
@@ -21,25 +75,129 @@ def insert_or_update(redis: Redis, log: Log):
         article=log.l_article,
         date=log.l_timestamp[:8],
     )
+    mapping = {k: REDIS_NULL if v is None else v for k, v in attr.asdict(log).items()}
+    pipe.hset(log_key, mapping=mapping)
+    pipe.expire(log_key, LOG_TTL)
+    _index(pipe, log_key, log)
+
+
+def insert_or_update(redis: Redis, log: Log):
     with redis.pipeline() as pipe:
-        mapping = {
-            k: REDIS_NULL if v is None else v for k, v in attr.asdict(log).items()
-        }
-        pipe.hset(log_key, mapping=mapping)
-        pipe.expire(log_key, datetime.timedelta(days=7))
+        _write(pipe, log)
         pipe.execute()
 
 
-def get_logs(
-    redis: Redis,
-    *,
-    project: str | bytes = "*",
-    namespace: str | bytes = "*",
-    action: str | bytes = "*",
-    article: str | bytes = "*",
-    start_dt: datetime.datetime | None = None,
-) -> list[Log]:
-    """Retrieve logs from Redis matching the given filters."""
+class LogWriter:
+    """Buffers log writes and sends them to Redis in pipelined batches.
+
+    Each flush is one MULTI transaction holding the logs and their indexes.
+    Logs are written in the order they were added, so a later log of an article
+    still replaces an earlier one of the same day.
+    """
+
+    def __init__(self, redis: Redis, batch_size=LOG_WRITE_BATCH_SIZE):
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive: %s" % batch_size)
+        self.redis = redis
+        self.batch_size = batch_size
+        self.written = 0
+        self._pending: list[Log] = []
+
+    def add(self, log: Log):
+        # Copy the log now, so that later changes by the caller to the log
+        # object don't leak into the buffered write.
+        self._pending.append(attr.evolve(log))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+
+        with self.redis.pipeline() as pipe:
+            for log in self._pending:
+                _write(pipe, log)
+            pipe.execute()
+
+        self.written += len(self._pending)
+        self._pending = []
+
+
+def _to_log(data) -> Log:
+    # convert the data according to the field types of the Log object
+    log_dict = {
+        k.decode("utf-8"): v if v != REDIS_NULL else None for k, v in data.items()
+    }
+    if log_dict["l_namespace"] is not None:
+        log_dict["l_namespace"] = int(log_dict["l_namespace"])
+    return Log(**log_dict)
+
+
+def _read_hashes(redis: Redis, keys):
+    """Yields (key, data) of each hash, read in pipelined batches.
+
+    data is empty if the hash is gone.
+    """
+    for i in range(0, len(keys), LOG_READ_BATCH_SIZE):
+        batch = keys[i : i + LOG_READ_BATCH_SIZE]
+        with redis.pipeline(transaction=False) as pipe:
+            for key in batch:
+                pipe.hgetall(key)
+            yield from zip(batch, pipe.execute())
+
+
+def _indexed_log_keys(redis: Redis, project, start_dt):
+    """Returns [(index key, log key)] of the project's logs since start_dt."""
+    min_day = min_ts = "-inf"
+    if start_dt is not None:
+        min_day = int(start_dt.strftime("%Y%m%d"))
+        min_ts = int(start_dt.strftime(TS_FORMAT_WP10))
+
+    days = redis.zrangebyscore(
+        gen_redis_log_dates_key(project=project), min_day, "+inf"
+    )
+    index_keys = [gen_redis_log_index_key(project=project, date=day) for day in days]
+    with redis.pipeline(transaction=False) as pipe:
+        for index_key in index_keys:
+            pipe.zrangebyscore(index_key, min_ts, "+inf")
+        results = pipe.execute()
+
+    return [
+        (index_key, log_key)
+        for index_key, log_keys in zip(index_keys, results)
+        for log_key in log_keys
+    ]
+
+
+def _get_project_logs(redis: Redis, project, namespace, action, article, start_dt):
+    entries = _indexed_log_keys(redis, project, start_dt)
+    index_of = dict((log_key, index_key) for index_key, log_key in entries)
+
+    logs: list[Log] = []
+    expired = []
+    for log_key, data in _read_hashes(redis, [log_key for _, log_key in entries]):
+        if not data:
+            expired.append(log_key)
+            continue
+        log = _to_log(data)
+        if namespace not in ("*", b"*") and log.l_namespace != int(namespace):
+            continue
+        if action not in ("*", b"*") and log.l_action != _to_bytes(action):
+            continue
+        if article not in ("*", b"*") and log.l_article != _to_bytes(article):
+            continue
+        logs.append(log)
+
+    if expired:
+        with redis.pipeline(transaction=False) as pipe:
+            for log_key in expired:
+                pipe.zrem(index_of[log_key], log_key)
+            pipe.execute()
+
+    return logs
+
+
+def _scan_logs(redis: Redis, project, namespace, action, article, start_dt):
     # Keys written since the date suffix was added end in :YYYYMMDD; keys
     # written before it do not. A wildcard article already matches both
     # forms with no suffix; an exact article needs the ':*' to match dated
@@ -52,20 +210,52 @@ def get_logs(
         article=article,
         date="*" if exact_article else None,
     )
+    keys = list(redis.scan_iter(match=key, _type="HASH"))
     logs: list[Log] = []
-    for log_key in redis.scan_iter(match=key, _type="HASH"):
-        data = redis.hgetall(log_key)
-        # convert the data according to the field types of the Log object
-        log_dict = {
-            k.decode("utf-8"): v if v != REDIS_NULL else None for k, v in data.items()
-        }
-        if log_dict["l_namespace"] is not None:
-            log_dict["l_namespace"] = int(log_dict["l_namespace"])
-
-        log = Log(**log_dict)
+    for _, data in _read_hashes(redis, keys):
+        if not data:
+            continue
+        log = _to_log(data)
         # skip logs that are not newer than start_dt
         if start_dt is not None and log.timestamp_dt < start_dt:
             continue
         logs.append(log)
-
     return logs
+
+
+def get_logs(
+    redis: Redis,
+    *,
+    project: str | bytes = "*",
+    namespace: str | bytes = "*",
+    action: str | bytes = "*",
+    article: str | bytes = "*",
+    start_dt: datetime.datetime | None = None,
+) -> list[Log]:
+    """Retrieve logs from Redis matching the given filters.
+
+    With a project, only that project's indexes and logs are read. Without
+    one, every log key is SCANned, which is only meant for tests and
+    debugging.
+    """
+    if project in ("*", b"*"):
+        return _scan_logs(redis, project, namespace, action, article, start_dt)
+    return _get_project_logs(redis, project, namespace, action, article, start_dt)
+
+
+def index_existing_logs(redis: Redis) -> int:
+    """Indexes every log hash in Redis, including those written before the
+    indexes existed. Returns the number of logs indexed.
+
+    Indexing is idempotent, so this can run while logs are being written.
+    """
+    count = 0
+    keys = list(redis.scan_iter(match="wp1:logs:*", _type="HASH"))
+    for log_key, data in _read_hashes(redis, keys):
+        if not data:
+            continue
+        with redis.pipeline() as pipe:
+            _index(pipe, log_key, _to_log(data))
+            pipe.execute()
+        count += 1
+    return count
@@ -0,0 +1,236 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import attr
+import fakeredis
+
+from wp1.logic import log as logic_log
+from wp1.models.wp10.log import Log
+from wp1.redis_db import (
+    gen_redis_log_dates_key,
+    gen_redis_log_index_key,
+    gen_redis_log_key,
+)
+
+
+class LogTest(unittest.TestCase):
+    log = Log(
+        l_project=b"Alpha",
+        l_namespace=0,
+        l_article=b"Apple",
+        l_action=b"quality",
+        l_timestamp=b"20181225112233",
+        l_old=b"NotA-Class",
+        l_new=b"B-Class",
+        l_revision_timestamp=b"2018-12-25T08:22:33Z",
+    )
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+
+    def _insert(self, *logs):
+        for log in logs:
+            logic_log.insert_or_update(self.redis, log)
+
+    def test_insert_indexes_log(self):
+        self._insert(self.log)
+
+        self.assertEqual(
+            [b"20181225"],
+            self.redis.zrange(gen_redis_log_dates_key(project=b"Alpha"), 0, -1),
+        )
+        index_key = gen_redis_log_index_key(project=b"Alpha", date=b"20181225")
+        self.assertEqual(
+            [
+                (
+                    gen_redis_log_key(
+                        project=b"Alpha",
+                        namespace=0,
+                        action=b"quality",
+                        article=b"Apple",
+                        date=b"20181225",
+                    ).encode("utf-8"),
+                    20181225112233.0,
+                )
+            ],
+            self.redis.zrange(index_key, 0, -1, withscores=True),
+        )
+        self.assertGreater(self.redis.ttl(index_key), 0)
+
+    def test_get_logs_for_project(self):
+        other = attr.evolve(self.log, l_project=b"Beta")
+        null_new = attr.evolve(self.log, l_article=b"Banana", l_new=None)
+        self._insert(self.log, other, null_new)
+
+        actual = logic_log.get_logs(self.redis, project=b"Alpha")
+
+        self.assertEqual(sorted([self.log, null_new]), sorted(actual))
+
+    def test_get_logs_does_not_scan(self):
+        self._insert(self.log)
+
+        with patch.object(self.redis, "scan_iter") as patched_scan:
+            actual = logic_log.get_logs(self.redis, project="Alpha")
+
+        patched_scan.assert_not_called()
+        self.assertEqual([self.log], actual)
+
+    def test_get_logs_start_dt(self):
+        earlier = attr.evolve(
+            self.log, l_article=b"Banana", l_timestamp=b"20181224235959"
+        )
+        later = attr.evolve(
+            self.log, l_article=b"Cherry", l_timestamp=b"20181226000000"
+        )
+        self._insert(self.log, earlier, later)
+
+        actual = logic_log.get_logs(
+            self.redis, project=b"Alpha", start_dt=datetime(2018, 12, 25, 11, 22, 33)
+        )
+
+        self.assertEqual(sorted([self.log, later]), sorted(actual))
+
+    def test_get_logs_filters(self):
+        talk = attr.evolve(self.log, l_namespace=1)
+        importance = attr.evolve(self.log, l_action=b"importance")
+        banana = attr.evolve(self.log, l_article=b"Banana")
+        self._insert(self.log, talk, importance, banana)
+
+        actual = logic_log.get_logs(
+            self.redis,
+            project=b"Alpha",
+            namespace=b"0",
+            action="quality",
+            article=b"Apple",
+        )
+
+        self.assertEqual([self.log], actual)
+
+    def test_get_logs_batches(self):
+        logs = [attr.evolve(self.log, l_article=b"Article %d" % i) for i in range(7)]
+        self._insert(*logs)
+
+        with patch.object(logic_log, "LOG_READ_BATCH_SIZE", 3):
+            actual = logic_log.get_logs(self.redis, project=b"Alpha")
+
+        self.assertEqual(sorted(logs), sorted(actual))
+
+    def test_insert_drops_expired_dates(self):
+        old = attr.evolve(self.log, l_timestamp=b"20181217112233")
+        kept = attr.evolve(self.log, l_timestamp=b"20181218112233")
+        self._insert(old, kept)
+        dates_key = gen_redis_log_dates_key(project=b"Alpha")
+        self.assertEqual(
+            [b"20181217", b"20181218"], self.redis.zrange(dates_key, 0, -1)
+        )
+
+        self._insert(self.log)
+
+        self.assertEqual(
+            [b"20181218", b"20181225"], self.redis.zrange(dates_key, 0, -1)
+        )
+
+    def test_get_logs_removes_expired_from_index(self):
+        banana = attr.evolve(self.log, l_article=b"Banana")
+        self._insert(self.log, banana)
+        banana_key = gen_redis_log_key(
+            project=b"Alpha",
+            namespace=0,
+            action=b"quality",
+            article=b"Banana",
+            date=b"20181225",
+        )
+        self.redis.delete(banana_key)
+
+        actual = logic_log.get_logs(self.redis, project=b"Alpha")
+
+        self.assertEqual([self.log], actual)
+        index_key = gen_redis_log_index_key(project=b"Alpha", date=b"20181225")
+        self.assertEqual(1, self.redis.zcard(index_key))
+
+    def test_get_logs_without_project(self):
+        other = attr.evolve(self.log, l_project=b"Beta")
+        self._insert(self.log, other)
+
+        actual = logic_log.get_logs(self.redis, article=b"Apple")
+
+        self.assertEqual(sorted([self.log, other]), sorted(actual))
+
+    def test_index_existing_logs(self):
+        mapping = {
+            k: logic_log.REDIS_NULL if v is None else v
+            for k, v in attr.asdict(self.log).items()
+        }
+        self.redis.hset("wp1:logs:Alpha:0:quality:Apple", mapping=mapping)
+
+        self.assertEqual(1, logic_log.index_existing_logs(self.redis))
+
+        self.assertEqual([self.log], logic_log.get_logs(self.redis, project=b"Alpha"))
+
+
+class LogWriterTest(unittest.TestCase):
+    log = LogTest.log
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+
+    def _logs(self):
+        return logic_log.get_logs(self.redis, project=b"Alpha")
+
+    def test_buffers_until_flush(self):
+        writer = logic_log.LogWriter(self.redis)
+
+        writer.add(self.log)
+
+        self.assertEqual([], self._logs())
+        writer.flush()
+        self.assertEqual([self.log], self._logs())
+        self.assertEqual(1, writer.written)
+
+    def test_flushes_full_batch(self):
+        writer = logic_log.LogWriter(self.redis, batch_size=2)
+        logs = [attr.evolve(self.log, l_article=b"Article %d" % i) for i in range(3)]
+
+        for log in logs:
+            writer.add(log)
+
+        self.assertEqual(sorted(logs[:2]), sorted(self._logs()))
+        self.assertEqual(2, writer.written)
+        writer.flush()
+        self.assertEqual(sorted(logs), sorted(self._logs()))
+        self.assertEqual(3, writer.written)
+
+    def test_later_log_of_same_day_wins(self):
+        writer = logic_log.LogWriter(self.redis)
+        later = attr.evolve(
+            self.log, l_old=b"B-Class", l_new=b"A-Class", l_timestamp=b"20181225180000"
+        )
+
+        writer.add(self.log)
+        writer.add(later)
+        writer.flush()
+
+        self.assertEqual([later], self._logs())
+
+    def test_snapshots_added_log(self):
+        writer = logic_log.LogWriter(self.redis)
+        log = attr.evolve(self.log)
+
+        writer.add(log)
+        log.l_new = b"FA-Class"
+        writer.flush()
+
+        self.assertEqual([self.log], self._logs())
+
+    def test_flush_empty(self):
+        writer = logic_log.LogWriter(self.redis)
+
+        writer.flush()
+
+        self.assertEqual([], self.redis.keys())
+        self.assertEqual(0, writer.written)
+
+    def test_invalid_batch_size(self):
+        with self.assertRaises(ValueError):
+            logic_log.LogWriter(self.redis, batch_size=0)
@@ -1,10 +1,21 @@
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import requests
 
 import wp1.logic.util as logic_util
-from wp1.constants import GLOBAL_TIMESTAMP, TS_FORMAT, TS_FORMAT_WP10
+from wp1.api import login as api_login
+from wp1.constants import (
+    API_TITLES_PER_QUERY,
+    GLOBAL_TIMESTAMP,
+    MOVE_LOOKUP_CACHE_MAX_SIZE,
+    MOVE_LOOKUP_CONCURRENCY,
+    TS_FORMAT,
+    TS_FORMAT_WP10,
+)
 from wp1.logic import log as logic_log
 from wp1.logic import move as logic_move
 from wp1.logic.api import page as api_page
@@ -48,8 +59,133 @@ def get_pages_by_category(wikidb, category, ns=None):
             yield Page(**result)
 
 
+def get_pages_by_categories(
+    wikidb,
+    categories,
+    ordered=True,
+    page_id_range=None,
+    changed_since=None,
+    page_ids=None,
+):
+    """Yields (category, Page) for every page in any of the given categories.
+
+    Everything is fetched with a single query. If ordered is True, the rows are
+    ordered by (page_namespace, page_title), so that a page that is in more
+    than one of the categories comes out as consecutive rows. This is the order
+    of the ratings table primary key, which lets callers merge the two. Callers
+    that don't need the order should pass ordered=False, which saves the
+    replica a sort over every row.
+
+    The rows can be narrowed down to pages with start <= page_id < end
+    (page_id_range), to category memberships with a cl_timestamp after the
+    changed_since datetime, or to the given page_ids.
+    """
+    categories = list(categories)
+    if not categories:
+        return
+
+    query = """
+      SELECT
+          p.page_namespace,
+          p.page_title,
+          p.page_id,
+          cl.cl_sortkey,
+          cl.cl_timestamp,
+          lt.lt_title AS category
+      FROM
+          page p
+      JOIN
+          categorylinks cl ON p.page_id = cl.cl_from
+      JOIN
+          linktarget lt ON cl.cl_target_id = lt.lt_id
+      WHERE
+          lt.lt_namespace = 14
+          AND lt.lt_title IN %(categories)s
+  """
+    params = {"categories": categories}
+    if page_id_range is not None:
+        query += " AND cl.cl_from >= %(start)s AND cl.cl_from < %(end)s"
+        params["start"], params["end"] = page_id_range
+    if changed_since is not None:
+        query += " AND cl.cl_timestamp > %(changed_since)s"
+        params["changed_since"] = changed_since
+    if page_ids is not None:
+        if not page_ids:
+            return
+        query += " AND cl.cl_from IN %(page_ids)s"
+        params["page_ids"] = list(page_ids)
+    if ordered:
+        query += " ORDER BY p.page_namespace, p.page_title"
+
+    with wikidb.cursor() as cursor:
+        cursor.execute(query, params)
+        while True:
+            result = cursor.fetchone()
+            if not result:
+                break
+            category = result.pop("category")
+            yield category, Page(**result)
+
+
+def get_category_page_id_bounds(wikidb, categories):
+    """Returns (min, max) page_id of the members of the given categories.
+
+    Returns None if the categories have no members.
+    """
+    categories = list(categories)
+    if not categories:
+        return None
+
+    with wikidb.cursor() as cursor:
+        cursor.execute(
+            """
+      SELECT MIN(cl.cl_from) AS min_id, MAX(cl.cl_from) AS max_id
+      FROM categorylinks cl
+      JOIN linktarget lt ON cl.cl_target_id = lt.lt_id
+      WHERE lt.lt_namespace = 14 AND lt.lt_title IN %(categories)s
+    """,
+            {"categories": categories},
+        )
+        row = cursor.fetchone()
+
+    if row is None or row["min_id"] is None:
+        return None
+    return row["min_id"], row["max_id"]
+
+
+def get_pages_by_categories_sharded(wikidb, categories, shard_size):
+    """Same as get_pages_by_categories(ordered=False), one page_id range at a time.
+
+    The members of very large categories are fetched with one query per
+    shard_size page ids, so that no single replica query has to produce every
+    row. The output is not ordered.
+    """
+    if shard_size < 1:
+        raise ValueError("shard_size must be at least 1, got %r" % shard_size)
+
+    categories = list(categories)
+    bounds = get_category_page_id_bounds(wikidb, categories)
+    if bounds is None:
+        return
+
+    min_id, max_id = bounds
+    for start in range(min_id, max_id + 1, shard_size):
+        yield from get_pages_by_categories(
+            wikidb, categories, ordered=False, page_id_range=(start, start + shard_size)
+        )
+
+
 def update_page_moved(
-    wp10db, redis, project, old_ns, old_title, new_ns, new_title, move_timestamp_dt
+    wp10db,
+    redis,
+    project,
+    old_ns,
+    old_title,
+    new_ns,
+    new_title,
+    move_timestamp_dt,
+    log_writer=None,
+    update_dt=None,
 ):
     logger.debug(
         "Updating moves table for %s -> %s",
@@ -76,12 +212,19 @@ def update_page_moved(
         l_namespace=old_ns,
         l_article=old_title,
         l_action=b"moved",
-        l_timestamp=GLOBAL_TIMESTAMP,
+        l_timestamp=(
+            GLOBAL_TIMESTAMP
+            if update_dt is None
+            else update_dt.strftime(TS_FORMAT_WP10).encode("utf-8")
+        ),
         l_old=b"",
         l_new=b"",
         l_revision_timestamp=db_timestamp,
     )
-    logic_log.insert_or_update(redis, new_log)
+    if log_writer is not None:
+        log_writer.add(new_log)
+    else:
+        logic_log.insert_or_update(redis, new_log)
 
 
 def _get_redirects_from_db(wikidb, namespace, title, timestamp_dt):
@@ -156,3 +299,198 @@ def get_move_data(wp10db, wikidb, namespace, title, timestamp_dt):
 
     moves = _get_redirects_from_api(wp10db, namespace, title, timestamp_dt)
     return moves
+
+
+class _LookupResults:
+    """Results of one kind of lookup, keyed by (namespace, title).
+
+    Safe to share between threads. Holds at most max_size results, the oldest
+    ones are dropped first.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+
+    def __contains__(self, article):
+        with self._lock:
+            return article in self._results
+
+    def __len__(self):
+        with self._lock:
+            return len(self._results)
+
+    def get(self, article):
+        with self._lock:
+            return self._results.get(article)
+
+    def update(self, results):
+        with self._lock:
+            for article, value in results.items():
+                self._results[article] = value
+                self._results.move_to_end(article)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+
+class MoveLookupCache:
+    """Raw results of the lookups done by get_move_data_many.
+
+    The lookups only depend on the article, the timestamp filtering is applied
+    to them afterwards, so one cache can serve every project updated in the
+    same run, from any thread. Each kind of lookup keeps its results for at
+    most max_size articles, with a None value for articles that turned out to
+    have no moves or not to be redirects. Lookups that failed aren't cached,
+    so that they are retried.
+    """
+
+    def __init__(self, max_size=MOVE_LOOKUP_CACHE_MAX_SIZE):
+        if max_size < 1:
+            raise ValueError("max_size must be positive: %s" % max_size)
+        self.moves = _LookupResults(max_size)
+        self.db_redirects = _LookupResults(max_size)
+        self.api_redirects = _LookupResults(max_size)
+
+
+def _lookup_moves(wp10db, articles, cache):
+    missing = [article for article in articles if article not in cache.moves]
+    if not missing:
+        return {}
+
+    titles = [logic_util.title_for_api(wp10db, ns, title) for ns, title in missing]
+    # Log in once up front, instead of racing to do it from every thread.
+    api_login()
+    with ThreadPoolExecutor(max_workers=MOVE_LOOKUP_CONCURRENCY) as executor:
+        results = dict(zip(missing, executor.map(api_page.get_moves, titles)))
+    cache.moves.update(
+        {article: moves for article, moves in results.items() if moves is not None}
+    )
+    return results
+
+
+def _lookup_db_redirects(wikidb, articles, cache):
+    missing = [article for article in articles if article not in cache.db_redirects]
+    if not missing:
+        return {}
+
+    db_articles = {
+        (ns, title.decode("utf-8").replace(" ", "_").encode("utf-8")): (ns, title)
+        for ns, title in missing
+    }
+    results = dict.fromkeys(missing)
+
+    wikidb.ping()
+    with wikidb.cursor() as cursor:
+        cursor.execute(
+            """
+        SELECT page_namespace, page_title, rd_namespace, rd_title, page_touched
+        FROM page
+        JOIN redirect ON page_id = rd_from
+        WHERE (page_namespace, page_title) IN %(articles)s
+    """,
+            {"articles": list(db_articles)},
+        )
+        for row in cursor.fetchall():
+            article = db_articles.get((row["page_namespace"], row["page_title"]))
+            if article is None:
+                continue
+            results[article] = {
+                "dest_ns": row["rd_namespace"],
+                "dest_title": row["rd_title"],
+                "timestamp_dt": datetime.strptime(
+                    row["page_touched"].decode("utf-8"), TS_FORMAT_WP10
+                ),
+            }
+    cache.db_redirects.update(results)
+    return results
+
+
+def _lookup_api_redirects(wp10db, articles, cache):
+    missing = [article for article in articles if article not in cache.api_redirects]
+    results = {}
+    for i in range(0, len(missing), API_TITLES_PER_QUERY):
+        batch = {
+            logic_util.title_for_api(wp10db, ns, title): (ns, title)
+            for ns, title in missing[i : i + API_TITLES_PER_QUERY]
+        }
+        try:
+            redirects = api_page.get_redirects(batch.keys())
+        except requests.exceptions.ReadTimeout:
+            logger.exception("Timeout while reading from API, skipping")
+            continue
+        if redirects is None:
+            # The API couldn't be queried, so these titles aren't cached and
+            # a later lookup retries them.
+            continue
+        batch_results = {
+            article: redirects.get(title_with_ns)
+            for title_with_ns, article in batch.items()
+        }
+        cache.api_redirects.update(batch_results)
+        results.update(batch_results)
+    return results
+
+
+def get_move_data_many(wp10db, wikidb, articles, timestamp_dt, cache=None):
+    """Same as get_move_data, for many (namespace, title) pairs at once.
+
+    The sources are tried in the same order as get_move_data, each only for
+    the articles that the previous ones didn't resolve: the move logs (looked
+    up concurrently, since the API can't batch them), then one replica query
+    for the redirects of all remaining articles, then the API in batches of
+    API_TITLES_PER_QUERY titles. Lookups already in cache, a MoveLookupCache,
+    aren't repeated.
+
+    Returns a dict mapping each article to its move data, or None.
+    """
+    if cache is None:
+        cache = MoveLookupCache()
+    articles = list(dict.fromkeys(articles))
+    result = dict.fromkeys(articles)
+
+    # The results of this call are used as they are, since another thread can
+    # evict them from the cache in the meantime.
+    moves = _lookup_moves(wp10db, articles, cache)
+    remaining = []
+    for article in articles:
+        found = moves[article] if article in moves else cache.moves.get(article)
+        for move in found or ():
+            if move["timestamp_dt"] > timestamp_dt:
+                result[article] = {
+                    "dest_ns": move["ns"],
+                    "dest_title": move["title"].encode("utf-8"),
+                    "timestamp_dt": move["timestamp_dt"],
+                }
+                break
+        else:
+            remaining.append(article)
+
+    db_redirects = {}
+    if remaining:
+        db_redirects = _lookup_db_redirects(wikidb, remaining, cache)
+    unresolved = []
+    for article in remaining:
+        if article in db_redirects:
+            redirect = db_redirects[article]
+        else:
+            redirect = cache.db_redirects.get(article)
+        if redirect is not None and redirect["timestamp_dt"] > timestamp_dt:
+            result[article] = redirect
+        else:
+            unresolved.append(article)
+
+    api_redirects = _lookup_api_redirects(wp10db, unresolved, cache)
+    for article in unresolved:
+        if article in api_redirects:
+            redir = api_redirects[article]
+        else:
+            redir = cache.api_redirects.get(article)
+        if redir is not None and redir["timestamp_dt"] > timestamp_dt:
+            result[article] = {
+                "dest_ns": redir["ns"],
+                "dest_title": redir["title"].encode("utf-8"),
+                "timestamp_dt": redir["timestamp_dt"],
+            }
+
+    return result
@@ -1,11 +1,12 @@
 from datetime import datetime
 from unittest.mock import patch
 import time
+import unittest
 
 import attr
 
 from wp1.base_db_test import BaseWikiDbTest, BaseWpOneDbTest, BaseCombinedDbTest
-from wp1.constants import TS_FORMAT
+from wp1.constants import API_TITLES_PER_QUERY, TS_FORMAT
 from wp1.logic import page as logic_page
 from wp1.logic import project as logic_project
 from wp1.logic import log as logic_log
@@ -119,6 +120,111 @@ class LogicPageCategoryTest(BaseWikiDbTest):
         self.assertTrue(b"Superman Facts" in titles)
         self.assertTrue(b"Places Superman vacations" in titles)
 
+    def test_get_pages_by_categories(self):
+        with self.wikidb.cursor() as cursor:
+            cursor.execute(
+                """
+            INSERT INTO linktarget
+              (lt_id, lt_namespace, lt_title)
+            VALUES
+              (502, 14, %(title)s)
+        """,
+                {"title": b"Superman"},
+            )
+            cursor.execute(
+                """
+            INSERT INTO categorylinks
+              (cl_from, cl_to, cl_timestamp, cl_target_id)
+            VALUES
+              (100, %(to)s, %(timestamp)s, 502)
+        """,
+                {"to": b"Superman", "timestamp": datetime(2018, 9, 30, 12, 30, 0)},
+            )
+        self.wikidb.commit()
+
+        actual = list(
+            logic_page.get_pages_by_categories(
+                self.wikidb, [b"Articles about Superman", b"Superman"]
+            )
+        )
+
+        # Sorted by namespace and title, so the two categories of the cape
+        # article are next to each other.
+        self.assertEqual(
+            [
+                (0, b"Powers of Superman"),
+                (0, b"The cape of Superman"),
+                (0, b"The cape of Superman"),
+                (14, b"Places Superman vacations"),
+                (14, b"Superman Facts"),
+            ],
+            [(page.page_namespace, page.page_title) for _, page in actual],
+        )
+        self.assertEqual(
+            {b"Articles about Superman", b"Superman"},
+            set(category for category, _ in actual[1:3]),
+        )
+
+    def test_get_pages_by_categories_empty(self):
+        self.assertEqual([], list(logic_page.get_pages_by_categories(self.wikidb, [])))
+
+    def test_get_pages_by_categories_unordered(self):
+        actual = logic_page.get_pages_by_categories(
+            self.wikidb, [b"Articles about Superman"], ordered=False
+        )
+
+        self.assertEqual(
+            [100, 101, 102, 103], sorted(page.page_id for _, page in actual)
+        )
+
+    def test_get_pages_by_categories_page_id_range(self):
+        actual = logic_page.get_pages_by_categories(
+            self.wikidb, [b"Articles about Superman"], page_id_range=(101, 103)
+        )
+
+        self.assertEqual([101, 102], sorted(page.page_id for _, page in actual))
+
+    def test_get_category_page_id_bounds(self):
+        self.assertEqual(
+            (100, 103),
+            logic_page.get_category_page_id_bounds(
+                self.wikidb, [b"Articles about Superman"]
+            ),
+        )
+
+    def test_get_category_page_id_bounds_no_members(self):
+        self.assertIsNone(
+            logic_page.get_category_page_id_bounds(self.wikidb, [b"Not a category"])
+        )
+
+    def test_get_pages_by_categories_sharded(self):
+        for shard_size in (1, 2, 3, 4, 100):
+            actual = logic_page.get_pages_by_categories_sharded(
+                self.wikidb, [b"Articles about Superman"], shard_size
+            )
+
+            self.assertEqual(
+                [100, 101, 102, 103], sorted(page.page_id for _, page in actual)
+            )
+
+    def test_get_pages_by_categories_sharded_no_members(self):
+        self.assertEqual(
+            [],
+            list(
+                logic_page.get_pages_by_categories_sharded(
+                    self.wikidb, [b"Not a category"], 10
+                )
+            ),
+        )
+
+    def test_get_pages_by_categories_sharded_invalid_shard_size(self):
+        with self.assertRaises(ValueError):
+            list(
+                logic_page.get_pages_by_categories_sharded(
+                    self.wikidb, [b"Articles about Superman"], 0
+                )
+            )
+
 
 class LogicPageMovesTest(BaseCombinedDbTest):
 
@@ -276,6 +382,171 @@ class LogicPageMovesTest(BaseCombinedDbTest):
         self.assertEqual(b"Destination_Article", move_data["dest_title"])
         self.assertEqual(datetime(2023, 3, 15, 14, 23, 0), move_data["timestamp_dt"])
 
+    def _insert_redirect(self, page_id, title, touched, dest_title):
+        with self.wikidb.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO page (page_id, page_namespace, page_title, page_touched)
+                VALUES (%s, 0, %s, %s)
+            """,
+                (page_id, title, touched),
+            )
+            cursor.execute(
+                """
+                INSERT INTO redirect (rd_from, rd_namespace, rd_title)
+                VALUES (%s, 0, %s)
+            """,
+                (page_id, dest_title),
+            )
+        self.wikidb.commit()
+
+    @patch("wp1.logic.api.page.site")
+    def test_get_move_data_many(self, patched_site):
+        moved = (0, b"Some Moved Article")
+        redirected = (0, b"Some Redirected Article")
+        missing = (0, b"Some Deleted Article")
+
+        def logevents(title=None, type=None):
+            if title == ":Some Moved Article":
+                return self.le_return
+            return []
+
+        patched_site.logevents.side_effect = logevents
+        self._insert_redirect(
+            202, b"Some_Redirected_Article", b"20230315142300", b"Destination_Article"
+        )
+
+        actual = logic_page.get_move_data_many(
+            self.wp10db,
+            self.wikidb,
+            [moved, redirected, missing],
+            datetime(2010, 1, 1),
+        )
+
+        self.assertEqual(
+            self.expected_title.encode("utf-8"), actual[moved]["dest_title"]
+        )
+        self.assertEqual(self.expected_dt, actual[moved]["timestamp_dt"])
+        self.assertEqual(b"Destination_Article", actual[redirected]["dest_title"])
+        self.assertEqual(
+            datetime(2023, 3, 15, 14, 23), actual[redirected]["timestamp_dt"]
+        )
+        self.assertIsNone(actual[missing])
+        # Only the article that wasn't resolved by a move or the replica is
+        # looked up with the API.
+        self.assertEqual(1, patched_site.api.call_count)
+        self.assertEqual(
+            ":Some Deleted Article", patched_site.api.call_args.kwargs["titles"]
+        )
+
+    @patch("wp1.logic.api.page.site")
+    def test_get_move_data_many_api_batches(self, patched_site):
+        articles = [(0, b"Article %d" % i) for i in range(API_TITLES_PER_QUERY + 1)]
+
+        def api(*args, **kwargs):
+            if ":Article 0" in kwargs["titles"].split("|"):
+                return {
+                    "query": {
+                        "normalized": [{"from": ":Article 0", "to": "Article 0"}],
+                        "redirects": [{"from": "Article 0", "to": "Article Zero"}],
+                        "pages": {
+                            "1": {
+                                "ns": 0,
+                                "title": "Article Zero",
+                                "revisions": [{"timestamp": self.timestamp_str}],
+                            }
+                        },
+                    }
+                }
+            return {}
+
+        patched_site.api.side_effect = api
+
+        actual = logic_page.get_move_data_many(
+            self.wp10db, self.wikidb, articles, datetime(2010, 1, 1)
+        )
+
+        self.assertEqual(2, patched_site.api.call_count)
+        self.assertEqual(b"Article_Zero", actual[(0, b"Article 0")]["dest_title"])
+        self.assertEqual(
+            [None] * API_TITLES_PER_QUERY,
+            [actual[article] for article in articles[1:]],
+        )
+
+    @patch("wp1.logic.api.page.site")
+    def test_get_move_data_many_too_old(self, patched_site):
+        patched_site.logevents.side_effect = lambda *args, **kwargs: self.le_return
+        self._insert_redirect(
+            203, b"Some_Moved_Article", b"20160315142300", b"Destination_Article"
+        )
+
+        actual = logic_page.get_move_data_many(
+            self.wp10db, self.wikidb, [(0, b"Some Moved Article")], datetime(2022, 1, 1)
+        )
+
+        self.assertEqual({(0, b"Some Moved Article"): None}, actual)
+
+    @patch("wp1.logic.api.page.site")
+    def test_get_move_data_many_cache(self, patched_site):
+        patched_site.logevents.side_effect = lambda *args, **kwargs: self.le_return
+        cache = logic_page.MoveLookupCache()
+        article = (0, b"Some Moved Article")
+
+        first = logic_page.get_move_data_many(
+            self.wp10db, self.wikidb, [article], datetime(1970, 1, 1), cache=cache
+        )
+        # Same lookups, filtered for a later project timestamp.
+        second = logic_page.get_move_data_many(
+            self.wp10db, self.wikidb, [article], datetime(2014, 1, 1), cache=cache
+        )
+
+        self.assertEqual(self.expected_dt, first[article]["timestamp_dt"])
+        self.assertIsNone(second[article])
+        self.assertEqual(1, patched_site.logevents.call_count)
+        self.assertEqual(1, patched_site.api.call_count)
+
+    @patch("wp1.logic.api.page.site")
+    def test_get_move_data_many_failures_not_cached(self, patched_site):
+        patched_site.logevents.side_effect = Exception("API error")
+        patched_site.api.side_effect = Exception("API error")
+        cache = logic_page.MoveLookupCache()
+        article = (0, b"Some Moved Article")
+
+        actual = logic_page.get_move_data_many(
+            self.wp10db, self.wikidb, [article], datetime(1970, 1, 1), cache=cache
+        )
+
+        self.assertEqual({article: None}, actual)
+        self.assertNotIn(article, cache.moves)
+        self.assertNotIn(article, cache.api_redirects)
+        # The replica query succeeded, so its result is kept.
+        self.assertIn(article, cache.db_redirects)
+
+        patched_site.logevents.side_effect = lambda *args, **kwargs: self.le_return
+        actual = logic_page.get_move_data_many(
+            self.wp10db, self.wikidb, [article], datetime(1970, 1, 1), cache=cache
+        )
+
+        self.assertEqual(self.expected_dt, actual[article]["timestamp_dt"])
+
+
+class MoveLookupCacheTest(unittest.TestCase):
+
+    def test_max_size(self):
+        cache = logic_page.MoveLookupCache(max_size=2)
+
+        cache.moves.update({(0, b"A"): None, (0, b"B"): []})
+        cache.moves.update({(0, b"C"): []})
+
+        self.assertEqual(2, len(cache.moves))
+        self.assertNotIn((0, b"A"), cache.moves)
+        self.assertIn((0, b"B"), cache.moves)
+        self.assertIn((0, b"C"), cache.moves)
+
+    def test_max_size_not_positive(self):
+        with self.assertRaises(ValueError):
+            logic_page.MoveLookupCache(max_size=0)
+
 
 class LogicPageMoveDbTest(BaseWpOneDbTest):
 
@@ -1,23 +1,45 @@
+import itertools
 import logging
 import math
 import re
 import time
+import zlib
 from collections import defaultdict
+from datetime import timedelta
 
 import attr
 
-from wp1 import api, app_logging, tables
+from wp1 import (
+    api,
+    app_logging,
+    comparison_cache,
+    rating_sample_cache,
+    table_cache,
+    tables,
+)
 from wp1.conf import get_conf
 from wp1.constants import (
+    CATEGORY_FETCH_SHARD_MIN_RATINGS,
+    CATEGORY_FETCH_SHARD_SIZE,
     CATEGORY_NS_INT,
+    FULL_UPDATE_INTERVAL_DAYS,
     GLOBAL_TIMESTAMP,
     GLOBAL_TIMESTAMP_WIKI,
+    INCREMENTAL_UPDATE_OVERLAP_SECONDS,
+    INCREMENTAL_UPDATE_PAGE_CHUNK_SIZE,
     MAX_ARTICLES_BEFORE_COMMIT,
+    MOVE_LOOKUP_BATCH_SIZE,
+    STREAMING_UPDATE_MIN_RATINGS,
+    TS_FORMAT,
+    TS_FORMAT_WP10,
     AssessmentKind,
 )
 from wp1.logic import category as logic_category
+from wp1.logic import log as logic_log
 from wp1.logic import page as logic_page
+from wp1.logic import project_stats as logic_project_stats
 from wp1.logic import rating as logic_rating
+from wp1.logic import title_search as logic_title_search
 from wp1.logic import util as logic_util
 from wp1.logic.api import project as api_project
 from wp1.models.wiki.page import Page
@@ -25,6 +47,7 @@ from wp1.models.wp10.category import Category
 from wp1.models.wp10.project import Project
 from wp1.models.wp10.rating import Rating
 from wp1.redis_db import connect as redis_connect
+from wp1.timestamp import utcnow
 from wp1.wiki_db import connect as wiki_connect
 from wp1.wp10_db import connect as wp10_connect
 
@@ -67,7 +90,9 @@ def update_global_project_count():
         wp10db.close()
 
 
-def update_project_by_name(project_name, track_progress=False):
+def update_project_by_name(
+    project_name, track_progress=False, streaming=None, incremental=True
+):
     wp10db = wp10_connect()
     wikidb = wiki_connect()
     redis = redis_connect()
@@ -79,57 +104,59 @@ def update_project_by_name(project_name, track_progress=False):
     logging.getLogger("oauthlib").setLevel(logging.CRITICAL)
 
     try:
-        project = get_project_by_name(wp10db, project_name)
-        if not project:
-            project = Project(p_project=project_name, p_timestamp=GLOBAL_TIMESTAMP_WIKI)
-
-        update_project(wikidb, wp10db, redis, project, track_progress=track_progress)
-
-        if track_progress:
-            redis.expire(_project_progress_key(project_name), 600)
+        update_project_by_name_with_connections(
+            wikidb,
+            wp10db,
+            redis,
+            project_name,
+            track_progress=track_progress,
+            streaming=streaming,
+            incremental=incremental,
+        )
     finally:
         wp10db.close()
         wikidb.close()
 
 
-def update_global_articles_for_project_name(wp10db, project_name):
-    logger.info("Executing global update for: %s" % project_name.decode("utf-8"))
-    with wp10db.cursor() as cursor:
-        cursor.execute(
-            """
-        REPLACE INTO global_articles
-        SELECT art, max(qrating), max(irating), max(score)
-        FROM (
-          SELECT art, qrating, irating, score FROM
-            (SELECT a_article AS art, a_quality AS qrating,
-                    a_importance AS irating, a_score AS score
-             FROM global_articles
-             JOIN ratings
-               ON r_namespace = 0 AND r_project = %(project)s AND
-                  a_article = r_article
-            ) as t1
-            UNION
-            (SELECT r_article AS art, qual.gr_ranking AS qrating,
-                    imp.gr_ranking AS irating, r_score AS score
-             FROM ratings
-             JOIN categories AS ci
-               ON r_project = ci.c_project AND ci.c_type = 'importance' AND
-                  r_importance = ci.c_rating
-             JOIN categories AS cq
-               ON r_project = cq.c_project AND
-                  cq.c_type = 'quality' AND r_quality = cq.c_rating
-             JOIN global_rankings AS qual
-               ON qual.gr_type = 'quality' AND qual.gr_rating = cq.c_replacement
-             JOIN global_rankings AS imp
-               ON imp.gr_type = 'importance' AND
-                  imp.gr_rating = ci.c_replacement
-             WHERE r_namespace = 0 AND r_project = %(project)s)
-        ) as t2
-        GROUP BY art
-    """,
-            {"project": project_name},
+def update_project_by_name_with_connections(
+    wikidb,
+    wp10db,
+    redis,
+    project_name,
+    track_progress=False,
+    streaming=None,
+    incremental=True,
+    move_cache=None,
+    update_dt=None,
+):
+    """Same as update_project_by_name, using connections owned by the caller.
+
+    The logs, ratings and record of the project are timestamped with update_dt,
+    which defaults to the time the update starts. A long running process
+    updating many projects gets a fresh timestamp for each of them.
+    """
+    if update_dt is None:
+        update_dt = utcnow()
+    project = get_project_by_name(wp10db, project_name)
+    if not project:
+        project = Project(
+            p_project=project_name, p_timestamp=_update_timestamp(update_dt, TS_FORMAT)
         )
-    wp10db.commit()
+
+    update_project(
+        wikidb,
+        wp10db,
+        redis,
+        project,
+        track_progress=track_progress,
+        streaming=streaming,
+        incremental=incremental,
+        move_cache=move_cache,
+        update_dt=update_dt,
+    )
+
+    if track_progress:
+        redis.expire(_project_progress_key(project_name), 600)
 
 
 def project_names_to_update(wikidb):
@@ -349,8 +376,10 @@ def count_initial_work(redis, wp10db, project_name):
 
     count = logic_rating.get_all_ratings_count_for_project(wp10db, project_name)
     # Not all articles have both quality and importance.
-    work = int(count * 1.9)
+    set_project_work(redis, project_name, int(count * 1.9))
 
+
+def set_project_work(redis, project_name, work):
     key = _project_progress_key(project_name)
     redis.hset(key, "work", work)
     redis.hset(key, "progress", 0)
@@ -365,7 +394,15 @@ def increment_progress_count(redis, project_name):
 
 
 def update_project_assessments(
-    wikidb, wp10db, redis, project, extra_assessments, track_progress=False
+    wikidb,
+    wp10db,
+    redis,
+    project,
+    extra_assessments,
+    track_progress=False,
+    move_cache=None,
+    update_dt=None,
+    changed_articles=None,
 ):
     old_ratings = {}
     for rating in logic_rating.get_project_ratings(wp10db, project.p_project):
@@ -377,6 +414,8 @@ def update_project_assessments(
 
     seen = set()
     all_deferred_logs = []
+    rating_writer = logic_rating.RatingWriter(wp10db, changed_articles=changed_articles)
+    log_writer = logic_log.LogWriter(redis)
     for kind in (AssessmentKind.QUALITY, AssessmentKind.IMPORTANCE):
         logger.debug(
             "Updating %s assessments by %s", project.p_project.decode("utf-8"), kind
@@ -393,19 +432,456 @@ def update_project_assessments(
             track_progress=track_progress,
         )
         deferred = store_new_ratings(
-            wp10db, redis, new_ratings, old_ratings, rating_to_category
+            wp10db,
+            redis,
+            new_ratings,
+            old_ratings,
+            rating_to_category,
+            rating_writer=rating_writer,
+            log_writer=log_writer,
+            update_dt=update_dt,
         )
         all_deferred_logs.extend(deferred)
 
     moved_articles = process_unseen_articles(
-        wikidb, wp10db, redis, project, old_ratings, seen
+        wikidb,
+        wp10db,
+        redis,
+        project,
+        old_ratings,
+        seen,
+        rating_writer=rating_writer,
+        move_cache=move_cache,
+        log_writer=log_writer,
+        update_dt=update_dt,
+    )
+    rating_writer.flush()
+    logger.info(
+        "Wrote %s ratings for %s",
+        rating_writer.written,
+        project.p_project.decode("utf-8"),
     )
 
     # Write deferred logs for articles that were not moved.
     for rating, kind, old_rating_value in all_deferred_logs:
         article_ref = str(rating.r_namespace).encode("utf-8") + b":" + rating.r_article
         if article_ref not in moved_articles:
-            logic_rating.add_log_for_rating(redis, rating, kind, old_rating_value)
+            logic_rating.add_log_for_rating(
+                redis,
+                rating,
+                kind,
+                old_rating_value,
+                log_writer=log_writer,
+                update_dt=update_dt,
+            )
+    _flush_logs(log_writer, project)
+
+
+def _flush_logs(log_writer, project):
+    log_writer.flush()
+    logger.info(
+        "Wrote %s logs for %s",
+        log_writer.written,
+        project.p_project.decode("utf-8"),
+    )
+
+
+def _iter_category_assessments(
+    pages, project, category_to_ratings, redis, track_progress=False
+):
+    """Yields ((namespace, article), assessments) for every rated article.
+
+    pages is the output of logic_page.get_pages_by_categories (ordered), and the
+    articles come out in the same order. assessments maps each AssessmentKind
+    the article is tagged with to a (rating, ranking, cl_timestamp) tuple. When
+    an article is in several categories of the same kind, the one with the
+    highest ranking wins, as in store_new_ratings.
+    """
+    by_page = lambda row: (row[1].page_namespace, row[1].page_title)
+
+    n = 0
+    for (page_namespace, page_title), rows in itertools.groupby(pages, key=by_page):
+        # Talk pages are tagged, we want the NS of the article itself.
+        namespace = page_namespace - 1
+        assessments = {}
+        for category, page in rows:
+            n += 1
+            if track_progress:
+                increment_progress_count(redis, project.p_project)
+
+            for kind, rating, ranking in category_to_ratings[category]:
+                if kind not in assessments or ranking > assessments[kind][1]:
+                    assessments[kind] = (rating, ranking, page.cl_timestamp)
+
+        if not logic_util.is_namespace_acceptable(namespace):
+            logger.debug("Skipping %s with namespace=%s", page_title, namespace)
+            continue
+
+        if n % 5000 == 0:
+            logger.debug(
+                "Processed %s articles for %s", n, project.p_project.decode("utf-8")
+            )
+
+        yield (namespace, page_title), assessments
+
+
+def _merge_by_article(old_ratings, new_assessments):
+    """Merge-joins ratings with _iter_category_assessments output.
+
+    Both inputs must be sorted by (namespace, article). Yields
+    (old_rating, new_assessment) pairs where either side is None if the article
+    only appears in the other input.
+
+    The next old rating is always read before the current pair is yielded, so
+    ratings the caller writes for a yielded article can never be read back as
+    an old rating later in the merge.
+    """
+    old = next(old_ratings, None)
+    new = next(new_assessments, None)
+    while old is not None or new is not None:
+        old_key = None if old is None else (old.r_namespace, old.r_article)
+        if new is None or (old is not None and old_key < new[0]):
+            current, old = old, next(old_ratings, None)
+            yield current, None
+        elif old is None or new[0] < old_key:
+            current, new = new, next(new_assessments, None)
+            yield None, current
+        else:
+            current_old, old = old, next(old_ratings, None)
+            current_new, new = new, next(new_assessments, None)
+            yield current_old, current_new
+
+
+def _update_project_categories(wikidb, wp10db, project, extra_assessments):
+    """Updates the project's categories of both kinds.
+
+    Returns a dict mapping each category to a list of (kind, rating, ranking)
+    tuples, the format _iter_category_assessments expects.
+    """
+    category_to_ratings = defaultdict(list)
+    for kind in (AssessmentKind.QUALITY, AssessmentKind.IMPORTANCE):
+        rating_to_category = update_project_categories_by_kind(
+            wikidb, wp10db, project, extra_assessments, kind
+        )
+        for rating, (category, ranking) in rating_to_category.items():
+            category_to_ratings[category].append(
+                (kind, rating.encode("utf-8"), ranking)
+            )
+    return category_to_ratings
+
+
+def _store_article_assessments(
+    redis,
+    project,
+    namespace,
+    article,
+    assessments,
+    old_rating,
+    rating_writer,
+    deferred_logs,
+    log_writer=None,
+    update_dt=None,
+):
+    """Writes and logs the changes between old_rating and assessments.
+
+    assessments is a value yielded by _iter_category_assessments, old_rating is
+    None for an article that isn't rated yet. Logs for new articles are appended
+    to deferred_logs instead of being written, since they might turn out to be
+    renamed pages (see update_project_assessments).
+    """
+    if old_rating is None:
+        rating = Rating(
+            r_project=project.p_project,
+            r_namespace=namespace,
+            r_article=article,
+            r_score=0,
+        )
+    else:
+        rating = Rating(**attr.asdict(old_rating))
+
+    changed = []
+    for kind, (current_rating, _, cl_timestamp) in assessments.items():
+        if kind == AssessmentKind.QUALITY:
+            old_rating_value = rating.r_quality
+            rating.r_quality = current_rating
+            rating.set_quality_timestamp_dt(cl_timestamp)
+        else:
+            old_rating_value = rating.r_importance
+            rating.r_importance = current_rating
+            rating.set_importance_timestamp_dt(cl_timestamp)
+
+        if old_rating is None:
+            old_rating_value = NOT_A_CLASS.encode("utf-8")
+        if old_rating is None or current_rating != old_rating_value:
+            changed.append((kind, old_rating_value))
+
+    if not changed:
+        return
+
+    if len(changed) == 2:
+        rating_writer.add(rating, AssessmentKind.BOTH)
+    else:
+        rating_writer.add(rating, changed[0][0])
+
+    for kind, old_rating_value in changed:
+        if old_rating is None:
+            deferred_logs.append((rating, kind, old_rating_value))
+        else:
+            logic_rating.add_log_for_rating(
+                redis,
+                rating,
+                kind,
+                old_rating_value,
+                log_writer=log_writer,
+                update_dt=update_dt,
+            )
+
+
+def update_project_assessments_streaming(
+    wikidb,
+    wp10db,
+    redis,
+    project,
+    extra_assessments,
+    track_progress=False,
+    move_cache=None,
+    update_dt=None,
+    changed_articles=None,
+):
+    """Same as update_project_assessments, without holding the project in memory.
+
+    The project's category pages (sorted, from a single replica query) are
+    merge-joined against its ratings (read in primary key order), and only the
+    differences are acted on. Memory use depends on the number of new and
+    removed articles, rather than on the size of the project.
+    """
+    if track_progress:
+        count_initial_work(redis, wp10db, project.p_project)
+
+    category_to_ratings = _update_project_categories(
+        wikidb, wp10db, project, extra_assessments
+    )
+
+    new_assessments = _iter_category_assessments(
+        logic_page.get_pages_by_categories(wikidb, category_to_ratings.keys()),
+        project,
+        category_to_ratings,
+        redis,
+        track_progress=track_progress,
+    )
+    first = next(new_assessments, None)
+    if first is None:
+        # Without any category pages, every rating would look removed. This is
+        # much more likely to be a problem with the replica than a real empty
+        # project, so leave the ratings alone.
+        logger.warning(
+            "No articles found in project %s, skipping update",
+            project.p_project.decode("utf-8"),
+        )
+        return
+    new_assessments = itertools.chain([first], new_assessments)
+
+    rating_writer = logic_rating.RatingWriter(wp10db, changed_articles=changed_articles)
+    log_writer = logic_log.LogWriter(redis)
+    deferred_logs = []
+    unseen = []
+    old_ratings = logic_rating.iter_project_ratings(wp10db, project.p_project)
+    for old_rating, new_assessment in _merge_by_article(old_ratings, new_assessments):
+        if new_assessment is None:
+            # The moves lookup needs the replica connection, which is busy
+            # streaming category pages until the merge is done.
+            unseen.append(old_rating)
+            continue
+
+        (namespace, article), assessments = new_assessment
+        _store_article_assessments(
+            redis,
+            project,
+            namespace,
+            article,
+            assessments,
+            old_rating,
+            rating_writer,
+            deferred_logs,
+            log_writer=log_writer,
+            update_dt=update_dt,
+        )
+
+    logger.debug(
+        "Found %s unseen articles for %s",
+        len(unseen),
+        project.p_project.decode("utf-8"),
+    )
+    moved_articles = set()
+    _process_unseen_ratings(
+        wikidb,
+        wp10db,
+        redis,
+        project,
+        unseen,
+        rating_writer,
+        moved_articles,
+        move_cache=move_cache,
+        log_writer=log_writer,
+        update_dt=update_dt,
+    )
+
+    rating_writer.flush()
+    logger.info(
+        "Wrote %s ratings for %s",
+        rating_writer.written,
+        project.p_project.decode("utf-8"),
+    )
+
+    for rating, kind, old_rating_value in deferred_logs:
+        article_ref = str(rating.r_namespace).encode("utf-8") + b":" + rating.r_article
+        if article_ref not in moved_articles:
+            logic_rating.add_log_for_rating(
+                redis,
+                rating,
+                kind,
+                old_rating_value,
+                log_writer=log_writer,
+                update_dt=update_dt,
+            )
+    _flush_logs(log_writer, project)
+
+
+def incremental_update_since(project, today=None):
+    """Returns the datetime an incremental update of the project starts from.
+
+    Returns None when the project needs a full update instead: when it has
+    never been updated, and on its reconciliation day, which comes around every
+    FULL_UPDATE_INTERVAL_DAYS. Only a full update notices articles that were
+    removed from the project's categories, since a removed membership leaves
+    no categorylinks row behind. Reconciliation days are spread over the
+    interval by project name, so that they don't all fall on the same night.
+    """
+    if project.p_count is None or project.p_timestamp is None:
+        return None
+
+    if today is None:
+        today = utcnow().date()
+    day = today.toordinal() % FULL_UPDATE_INTERVAL_DAYS
+    if zlib.crc32(project.p_project) % FULL_UPDATE_INTERVAL_DAYS == day:
+        return None
+
+    try:
+        last_update = project.timestamp_dt
+    except ValueError:
+        return None
+    return last_update - timedelta(seconds=INCREMENTAL_UPDATE_OVERLAP_SECONDS)
+
+
+def update_project_assessments_incremental(
+    wikidb,
+    wp10db,
+    redis,
+    project,
+    extra_assessments,
+    since,
+    track_progress=False,
+    update_dt=None,
+    changed_articles=None,
+):
+    """Updates the assessments of the articles whose categories changed since.
+
+    Only the category memberships with a cl_timestamp after since are looked
+    up, and then the full set of project categories of just those pages. This
+    can't notice articles removed from the project, see
+    incremental_update_since.
+
+    Returns False, without touching any rating, if the project has categories
+    that weren't known before: their members can have any cl_timestamp, so a
+    full update is needed to pick them up.
+    """
+    known_categories = logic_category.get_project_category_names(
+        wp10db, project.p_project
+    )
+    category_to_ratings = _update_project_categories(
+        wikidb, wp10db, project, extra_assessments
+    )
+    new_categories = set(category_to_ratings) - known_categories
+    if new_categories:
+        logger.info(
+            "Project %s has %s new categories, incremental update not possible",
+            project.p_project.decode("utf-8"),
+            len(new_categories),
+        )
+        return False
+
+    changed_page_ids = sorted(
+        set(
+            page.page_id
+            for _, page in logic_page.get_pages_by_categories(
+                wikidb, category_to_ratings.keys(), ordered=False, changed_since=since
+            )
+        )
+    )
+    logger.info(
+        "Found %s pages with category changes since %s for %s",
+        len(changed_page_ids),
+        since,
+        project.p_project.decode("utf-8"),
+    )
+    if track_progress:
+        set_project_work(redis, project.p_project, len(changed_page_ids))
+
+    rating_writer = logic_rating.RatingWriter(wp10db, changed_articles=changed_articles)
+    log_writer = logic_log.LogWriter(redis)
+    deferred_logs = []
+    for start in range(0, len(changed_page_ids), INCREMENTAL_UPDATE_PAGE_CHUNK_SIZE):
+        page_ids = changed_page_ids[start : start + INCREMENTAL_UPDATE_PAGE_CHUNK_SIZE]
+        new_assessments = list(
+            _iter_category_assessments(
+                logic_page.get_pages_by_categories(
+                    wikidb, category_to_ratings.keys(), page_ids=page_ids
+                ),
+                project,
+                category_to_ratings,
+                redis,
+            )
+        )
+        old_ratings = logic_rating.get_project_ratings_by_articles(
+            wp10db, project.p_project, [article for article, _ in new_assessments]
+        )
+        for (namespace, article), assessments in new_assessments:
+            _store_article_assessments(
+                redis,
+                project,
+                namespace,
+                article,
+                assessments,
+                old_ratings.get((namespace, article)),
+                rating_writer,
+                deferred_logs,
+                log_writer=log_writer,
+                update_dt=update_dt,
+            )
+            if track_progress:
+                increment_progress_count(redis, project.p_project)
+
+    rating_writer.flush()
+    logger.info(
+        "Wrote %s ratings for %s",
+        rating_writer.written,
+        project.p_project.decode("utf-8"),
+    )
+
+    # Moves are only detected when the old name of a page is found to have left
+    # the project, which only full updates look for.
+    for rating, kind, old_rating_value in deferred_logs:
+        logic_rating.add_log_for_rating(
+            redis,
+            rating,
+            kind,
+            old_rating_value,
+            log_writer=log_writer,
+            update_dt=update_dt,
+        )
+    _flush_logs(log_writer, project)
+
+    return True
 
 
 def update_project_assessments_by_kind(
@@ -427,62 +903,76 @@ def update_project_assessments_by_kind(
         wikidb, wp10db, project, extra_assessments, kind
     )
 
+    category_to_rating = {
+        category: current_rating.encode("utf-8")
+        for current_rating, (category, _) in rating_to_category.items()
+    }
+    logger.info(
+        "Fetching article lists for %s %s categories",
+        len(category_to_rating),
+        kind,
+    )
+    if (project.p_count or 0) >= CATEGORY_FETCH_SHARD_MIN_RATINGS:
+        category_pages = logic_page.get_pages_by_categories_sharded(
+            wikidb, category_to_rating, CATEGORY_FETCH_SHARD_SIZE
+        )
+    else:
+        category_pages = logic_page.get_pages_by_categories(
+            wikidb, category_to_rating, ordered=False
+        )
+
     n = 0
     new_ratings = defaultdict(list)
-    for current_rating, (category, ranking) in rating_to_category.items():
-        logger.info("Fetching article list for %r" % category.decode("utf-8"))
-        current_rating = current_rating.encode("utf-8")
-
-        for page in logic_page.get_pages_by_category(wikidb, category):
-            # Talk pages are tagged, we want the NS of the article itself.
-            namespace = page.page_namespace - 1
-            if not logic_util.is_namespace_acceptable(namespace):
-                logger.debug(
-                    "Skipping %s with namespace=%s", page.page_title, namespace
-                )
-                continue
+    for category, page in category_pages:
+        current_rating = category_to_rating[category]
 
-            article_ref = str(namespace).encode("utf-8") + b":" + page.page_title
-            seen.add(article_ref)
+        # Talk pages are tagged, we want the NS of the article itself.
+        namespace = page.page_namespace - 1
+        if not logic_util.is_namespace_acceptable(namespace):
+            logger.debug("Skipping %s with namespace=%s", page.page_title, namespace)
+            continue
 
-            old_rating = old_ratings.get(article_ref)
-            old_rating_value = None
+        article_ref = str(namespace).encode("utf-8") + b":" + page.page_title
+        seen.add(article_ref)
 
-            if old_rating:
-                rating = Rating(**attr.asdict(old_rating))
-                if kind == AssessmentKind.QUALITY:
-                    old_rating_value = rating.r_quality
-                elif kind == AssessmentKind.IMPORTANCE:
-                    old_rating_value = rating.r_importance
-            else:
-                rating = Rating(
-                    r_project=project.p_project,
-                    r_namespace=namespace,
-                    r_article=page.page_title,
-                    r_score=0,
-                )
-                old_rating_value = NOT_A_CLASS.encode("utf-8")
+        old_rating = old_ratings.get(article_ref)
+        old_rating_value = None
 
+        if old_rating:
+            rating = Rating(**attr.asdict(old_rating))
             if kind == AssessmentKind.QUALITY:
-                rating.r_quality = current_rating
-                rating.set_quality_timestamp_dt(page.cl_timestamp)
+                old_rating_value = rating.r_quality
             elif kind == AssessmentKind.IMPORTANCE:
-                rating.r_importance = current_rating
-                rating.set_importance_timestamp_dt(page.cl_timestamp)
+                old_rating_value = rating.r_importance
+        else:
+            rating = Rating(
+                r_project=project.p_project,
+                r_namespace=namespace,
+                r_article=page.page_title,
+                r_score=0,
+            )
+            old_rating_value = NOT_A_CLASS.encode("utf-8")
 
-            new_ratings[article_ref].append((rating, kind, old_rating_value))
-            n += 1
-            if n >= MAX_ARTICLES_BEFORE_COMMIT:
-                wp10db.ping()
-                wp10db.commit()
+        if kind == AssessmentKind.QUALITY:
+            rating.r_quality = current_rating
+            rating.set_quality_timestamp_dt(page.cl_timestamp)
+        elif kind == AssessmentKind.IMPORTANCE:
+            rating.r_importance = current_rating
+            rating.set_importance_timestamp_dt(page.cl_timestamp)
 
-            if n % 5000 == 0:
-                logger.debug(
-                    "Processed %s articles for %s", n, project.p_project.decode("utf-8")
-                )
+        new_ratings[article_ref].append((rating, kind, old_rating_value))
+        n += 1
+        if n >= MAX_ARTICLES_BEFORE_COMMIT:
+            wp10db.ping()
+            wp10db.commit()
 
-            if track_progress:
-                increment_progress_count(redis, project.p_project)
+        if n % 5000 == 0:
+            logger.debug(
+                "Processed %s articles for %s", n, project.p_project.decode("utf-8")
+            )
+
+        if track_progress:
+            increment_progress_count(redis, project.p_project)
 
     if n < 5000:
         logger.debug(
@@ -502,7 +992,22 @@ def update_project_assessments_by_kind(
     return (new_ratings, rating_to_category)
 
 
-def store_new_ratings(wp10db, redis, new_ratings, old_ratings, rating_to_category):
+def store_new_ratings(
+    wp10db,
+    redis,
+    new_ratings,
+    old_ratings,
+    rating_to_category,
+    rating_writer=None,
+    log_writer=None,
+    update_dt=None,
+):
+    # Without a writer from the caller, use a private one and flush it before
+    # returning, so that the ratings are stored once this function is done.
+    owns_writer = rating_writer is None
+    if owns_writer:
+        rating_writer = logic_rating.RatingWriter(wp10db)
+
     deferred_logs = []
 
     def sort_rating_tuples(rating_tuple):
@@ -522,116 +1027,226 @@ def store_new_ratings(wp10db, redis, new_ratings, old_ratings, rating_to_categor
             rating_changed = rating.r_importance != old_rating_value
 
         if article_ref not in old_ratings or rating_changed:
-            logic_rating.insert_or_update(wp10db, rating, kind)
+            rating_writer.add(rating, kind)
             if article_ref not in old_ratings:
                 # Defer logging — this might be a renamed page. The log will
                 # be written after process_unseen_articles identifies moves.
                 deferred_logs.append((rating, kind, old_rating_value))
             else:
-                logic_rating.add_log_for_rating(redis, rating, kind, old_rating_value)
+                logic_rating.add_log_for_rating(
+                    redis,
+                    rating,
+                    kind,
+                    old_rating_value,
+                    log_writer=log_writer,
+                    update_dt=update_dt,
+                )
+
+    if owns_writer:
+        rating_writer.flush()
 
     return deferred_logs
 
 
-def process_unseen_articles(wikidb, wp10db, redis, project, old_ratings, seen):
-    moved_articles = set()
-    if len(seen) == 0:
-        logger.warning(
-            "Did not find any articles for %s, skipping unseen processing",
-            project.p_project.decode("utf-8"),
+def _unseen_rating_kind(old_rating):
+    """Returns the AssessmentKind to clear for a rating that is no longer seen.
+
+    Returns None if the rating has nothing to clear.
+    """
+    # By default, we evaluate both assessment kinds.
+    kind = AssessmentKind.BOTH
+    if old_rating.r_quality == NOT_A_CLASS or old_rating.r_quality is None:
+        # The quality rating is not set, so just evaluate importance
+        kind = AssessmentKind.IMPORTANCE
+        if old_rating.r_importance == NOT_A_CLASS or old_rating.r_importance is None:
+            # The importance rating is also not set, so don't do anything.
+            return None
+    return kind
+
+
+def _process_unseen_rating(
+    wp10db,
+    redis,
+    project,
+    old_rating,
+    kind,
+    move_data,
+    rating_writer,
+    moved_articles,
+    log_writer=None,
+    update_dt=None,
+):
+    """Handles a rating whose article is no longer in any project category.
+
+    kind comes from _unseen_rating_kind and move_data from
+    logic_page.get_move_data_many. Articles that turned out to have been moved
+    are added to moved_articles as b"ns:title" refs of their new name.
+    """
+    ns = old_rating.r_namespace
+    title = old_rating.r_article
+    logger.debug("Processing unseen article %s:%s", ns, title.decode("utf-8"))
+
+    if move_data is not None:
+        # Track the new name so deferred logs can be skipped for it.
+        new_ref = (
+            str(move_data["dest_ns"]).encode("utf-8") + b":" + move_data["dest_title"]
+        )
+        moved_articles.add(new_ref)
+        logic_page.update_page_moved(
+            wp10db,
+            redis,
+            project,
+            ns,
+            title,
+            move_data["dest_ns"],
+            move_data["dest_title"],
+            move_data["timestamp_dt"],
+            log_writer=log_writer,
+            update_dt=update_dt,
         )
-        return moved_articles
 
-    denom = len(old_ratings.keys())
-    ratio = len(seen) / denom if denom != 0 else "NaN"
+    # Mark this article as having NOT_A_CLASS for it's quality or importance.
+    # This probably means the article was deleted, but could in fact mean that
+    # we just failed to find its move data. Either way, the new article would
+    # have already been picked up by the assessment updater, assuming it was
+    # tagged correctly.
+    rating = Rating(
+        r_project=project.p_project, r_namespace=ns, r_article=title, r_score=0
+    )
+    if kind in (AssessmentKind.QUALITY, AssessmentKind.BOTH):
+        rating.quality = NOT_A_CLASS.encode("utf-8")
+        if move_data:
+            rating.set_quality_timestamp_dt(move_data["timestamp_dt"])
+        else:
+            rating.r_quality_timestamp = _update_timestamp(update_dt, TS_FORMAT)
+    if kind in (AssessmentKind.IMPORTANCE, AssessmentKind.BOTH):
+        rating.importance = NOT_A_CLASS.encode("utf-8")
+        if move_data:
+            rating.set_importance_timestamp_dt(move_data["timestamp_dt"])
+        else:
+            rating.r_importance_timestamp = _update_timestamp(update_dt, TS_FORMAT)
+
+    rating_writer.add(rating, kind)
+
+    if kind in (AssessmentKind.QUALITY, AssessmentKind.BOTH):
+        logic_rating.add_log_for_rating(
+            redis,
+            rating,
+            AssessmentKind.QUALITY,
+            old_rating.r_quality,
+            log_writer=log_writer,
+            update_dt=update_dt,
+        )
+    if kind in (AssessmentKind.IMPORTANCE, AssessmentKind.BOTH):
+        logic_rating.add_log_for_rating(
+            redis,
+            rating,
+            AssessmentKind.IMPORTANCE,
+            old_rating.r_importance,
+            log_writer=log_writer,
+            update_dt=update_dt,
+        )
 
-    logger.debug("Looking for unseen articles, ratio was: %s", ratio)
-    in_seen = 0
-    skipped = 0
-    processed = 0
-    n = 0
-    for ref, old_rating in old_ratings.items():
-        if ref in seen:
-            in_seen += 1
-            continue
 
-        # By default, we evaluate both assessment kinds.
-        kind = AssessmentKind.BOTH
-        if old_rating.r_quality == NOT_A_CLASS or old_rating.r_quality is None:
-            # The quality rating is not set, so just evaluate importance
-            kind = AssessmentKind.IMPORTANCE
-            if (
-                old_rating.r_importance == NOT_A_CLASS
-                or old_rating.r_importance is None
-            ):
-                # The importance rating is also not set, so don't do anything.
-                skipped += 1
-                continue
-
-        logger.debug("Processing unseen article %s", ref.decode("utf-8"))
-        processed += 1
-        ns, title = ref.decode("utf-8").split(":", 1)
-        ns = int(ns.encode("utf-8"))
-        title = title.encode("utf-8")
-
-        move_data = logic_page.get_move_data(
-            wp10db, wikidb, ns, title, project.timestamp_dt
+def _process_unseen_ratings(
+    wikidb,
+    wp10db,
+    redis,
+    project,
+    old_ratings,
+    rating_writer,
+    moved_articles,
+    move_cache=None,
+    log_writer=None,
+    update_dt=None,
+):
+    """Handles ratings whose articles are no longer in any project category.
+
+    The moves of the articles are resolved MOVE_LOOKUP_BATCH_SIZE at a time with
+    logic_page.get_move_data_many, sharing move_cache if given. Returns the
+    number of (processed, skipped) ratings, where skipped ones had nothing to
+    clear.
+    """
+    if move_cache is None:
+        move_cache = logic_page.MoveLookupCache()
+
+    to_process = []
+    for old_rating in old_ratings:
+        kind = _unseen_rating_kind(old_rating)
+        if kind is not None:
+            to_process.append((old_rating, kind))
+
+    for start in range(0, len(to_process), MOVE_LOOKUP_BATCH_SIZE):
+        batch = to_process[start : start + MOVE_LOOKUP_BATCH_SIZE]
+        move_data = logic_page.get_move_data_many(
+            wp10db,
+            wikidb,
+            [(r.r_namespace, r.r_article) for r, _ in batch],
+            project.timestamp_dt,
+            cache=move_cache,
         )
-        if move_data is not None:
-            # Track the new name so deferred logs can be skipped for it.
-            new_ref = (
-                str(move_data["dest_ns"]).encode("utf-8")
-                + b":"
-                + move_data["dest_title"]
-            )
-            moved_articles.add(new_ref)
-            logic_page.update_page_moved(
+        for old_rating, kind in batch:
+            _process_unseen_rating(
                 wp10db,
                 redis,
                 project,
-                ns,
-                title,
-                move_data["dest_ns"],
-                move_data["dest_title"],
-                move_data["timestamp_dt"],
+                old_rating,
+                kind,
+                move_data[(old_rating.r_namespace, old_rating.r_article)],
+                rating_writer,
+                moved_articles,
+                log_writer=log_writer,
+                update_dt=update_dt,
             )
 
-        # Mark this article as having NOT_A_CLASS for it's quality or importance.
-        # This probably means the article was deleted, but could in fact mean that
-        # we just failed to find its move data. Either way, the new article would
-        # have already been picked up by the assessment updater, assuming it was
-        # tagged correctly.
-        rating = Rating(
-            r_project=project.p_project, r_namespace=ns, r_article=title, r_score=0
+    return len(to_process), len(old_ratings) - len(to_process)
+
+
+def process_unseen_articles(
+    wikidb,
+    wp10db,
+    redis,
+    project,
+    old_ratings,
+    seen,
+    rating_writer=None,
+    move_cache=None,
+    log_writer=None,
+    update_dt=None,
+):
+    owns_writer = rating_writer is None
+    if owns_writer:
+        rating_writer = logic_rating.RatingWriter(wp10db)
+
+    moved_articles = set()
+    if len(seen) == 0:
+        logger.warning(
+            "Did not find any articles for %s, skipping unseen processing",
+            project.p_project.decode("utf-8"),
         )
-        if kind in (AssessmentKind.QUALITY, AssessmentKind.BOTH):
-            rating.quality = NOT_A_CLASS.encode("utf-8")
-            if move_data:
-                rating.set_quality_timestamp_dt(move_data["timestamp_dt"])
-            else:
-                rating.r_quality_timestamp = GLOBAL_TIMESTAMP_WIKI
-        if kind in (AssessmentKind.IMPORTANCE, AssessmentKind.BOTH):
-            rating.importance = NOT_A_CLASS.encode("utf-8")
-            if move_data:
-                rating.set_importance_timestamp_dt(move_data["timestamp_dt"])
-            else:
-                rating.r_importance_timestamp = GLOBAL_TIMESTAMP_WIKI
+        return moved_articles
 
-        logic_rating.insert_or_update(wp10db, rating, kind)
+    denom = len(old_ratings.keys())
+    ratio = len(seen) / denom if denom != 0 else "NaN"
 
-        if kind in (AssessmentKind.QUALITY, AssessmentKind.BOTH):
-            logic_rating.add_log_for_rating(
-                redis, rating, AssessmentKind.QUALITY, old_rating.r_quality
-            )
-        if kind in (AssessmentKind.IMPORTANCE, AssessmentKind.BOTH):
-            logic_rating.add_log_for_rating(
-                redis, rating, AssessmentKind.IMPORTANCE, old_rating.r_importance
-            )
+    logger.debug("Looking for unseen articles, ratio was: %s", ratio)
+    unseen = [rating for ref, rating in old_ratings.items() if ref not in seen]
+    in_seen = len(old_ratings) - len(unseen)
+    processed, skipped = _process_unseen_ratings(
+        wikidb,
+        wp10db,
+        redis,
+        project,
+        unseen,
+        rating_writer,
+        moved_articles,
+        move_cache=move_cache,
+        log_writer=log_writer,
+        update_dt=update_dt,
+    )
 
-        n += 1
-        if n >= MAX_ARTICLES_BEFORE_COMMIT:
-            wp10db.ping()
-            wp10db.commit()
+    if owns_writer:
+        rating_writer.flush()
     logger.info("End, committing db")
     wp10db.ping()
     wp10db.commit()
@@ -678,20 +1293,26 @@ def cleanup_project(wp10db, project):
     )
 
 
-def update_project_record(wp10db, project, metadata):
-    project_display = project.p_project.decode("utf-8")
-    logger.info("Updating project record: %r", project_display)
+def _update_timestamp(update_dt, fmt):
+    """Returns update_dt in the format, or the start of the process if it is
+    None."""
+    if update_dt is None:
+        return GLOBAL_TIMESTAMP if fmt == TS_FORMAT_WP10 else GLOBAL_TIMESTAMP_WIKI
+    return update_dt.strftime(fmt).encode("utf-8")
 
-    num_ratings = logic_rating.count_for_project(wp10db, project)
 
-    n_quality = logic_rating.count_unassessed_quality_for_project(wp10db, project)
-    quality_count = num_ratings - n_quality
+def update_project_record(
+    wp10db, project, metadata, update_dt=None, changed_articles=None
+):
+    project_display = project.p_project.decode("utf-8")
+    logger.info("Updating project record: %r", project_display)
 
-    n_importance = logic_rating.count_unassessed_importance_for_project(wp10db, project)
-    importance_count = num_ratings - n_importance
+    # Rebuild the count matrix once per update, and take the totals from it.
+    stats = logic_project_stats.refresh_project_stats(wp10db, project.p_project)
+    num_ratings, quality_count, importance_count = logic_project_stats.summarize(stats)
 
     # Okay, update the fields of the project, warning if we're setting NULLs.
-    project.p_timestamp = GLOBAL_TIMESTAMP
+    project.p_timestamp = _update_timestamp(update_dt, TS_FORMAT_WP10)
     wikipage = metadata.get("homepage")
     if wikipage is None:
         logger.warning("Setting NULL wikipage for project: %s", project_display)
@@ -715,23 +1336,85 @@ def update_project_record(wp10db, project, metadata):
 
     insert_or_update(wp10db, project)
 
+    # Add the titles of new ratings to the articlePattern search index. With
+    # changed_articles, the articles whose ratings this update wrote, only those
+    # are checked.
+    logic_title_search.index_project_titles(
+        wp10db, project.p_project, articles=changed_articles
+    )
 
-def update_project(wikidb, wp10db, redis, project, track_progress=False):
+
+def update_project(
+    wikidb,
+    wp10db,
+    redis,
+    project,
+    track_progress=False,
+    streaming=None,
+    incremental=True,
+    move_cache=None,
+    update_dt=None,
+):
     extra_assessments = api_project.get_extra_assessments(project.p_project)
 
-    update_project_assessments(
-        wikidb, wp10db, redis, project, extra_assessments, track_progress=track_progress
-    )
+    # The articles whose ratings are written, so that only their titles need
+    # to be checked by the search index.
+    changed_articles = set()
+    updated = False
+    since = incremental_update_since(project) if incremental else None
+    if since is not None:
+        updated = update_project_assessments_incremental(
+            wikidb,
+            wp10db,
+            redis,
+            project,
+            extra_assessments,
+            since,
+            track_progress=track_progress,
+            update_dt=update_dt,
+            changed_articles=changed_articles,
+        )
+
+    if not updated:
+        # By default, only projects big enough for memory to matter are streamed.
+        if streaming is None:
+            streaming = (project.p_count or 0) >= STREAMING_UPDATE_MIN_RATINGS
+        if streaming:
+            update_assessments = update_project_assessments_streaming
+        else:
+            update_assessments = update_project_assessments
+        update_assessments(
+            wikidb,
+            wp10db,
+            redis,
+            project,
+            extra_assessments,
+            track_progress=track_progress,
+            move_cache=move_cache,
+            update_dt=update_dt,
+            changed_articles=changed_articles,
+        )
 
     cleanup_project(wp10db, project)
 
-    update_project_record(wp10db, project, extra_assessments)
+    update_project_record(
+        wp10db,
+        project,
+        extra_assessments,
+        update_dt=update_dt,
+        changed_articles=changed_articles,
+    )
+    if redis is not None:
+        # The updated ratings are committed, so the next table request sees them.
+        table_cache.invalidate_project_table(redis, project.p_project)
+        comparison_cache.bump_generation(redis, project.p_project)
+        rating_sample_cache.invalidate_project(redis, project.p_project)
 
     ## This is where the old code would update the project scores. However, since
     ## we don't have reliable selection_data at the moment, and we're not sure if
     ## the score metrics will be changing, skip it for now.
     # update_project_scores(wp10_session, project)
 
-    # This is commented out because it can't be done in parallel with other
-    # project updates. See https://github.com/openzim/wikimedia_wp1_bot/issues/71
-    # update_global_articles_table(wp10db, project)
+    # global_articles isn't updated here: the rating writes log their changed
+    # articles, and maintenance.update_global_articles merges them daily (see
+    # logic.global_articles).
@@ -0,0 +1,92 @@
+"""Materialized quality x importance count matrix of each project.
+
+The project_stats table holds one row per (quality, importance) pair that
+occurs in a project's ratings, with the number of ratings in that cell. It is
+rebuilt at the end of every update of the project, so that the assessment
+table, the project record and custom tables read a handful of cells instead of
+grouping the project's ratings on each request.
+"""
+
+import logging
+
+from wp1.conf import get_conf
+
+config = get_conf()
+NOT_A_CLASS = config["NOT_A_CLASS"]
+UNASSESSED_CLASS = config["UNASSESSED_CLASS"]
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_project_stats(wp10db, project_name):
+    """Rebuilds the count matrix of the project from its ratings.
+
+    Ratings with a NULL quality or importance are counted as NotA-Class, like
+    cleanup_project would leave them, so summarize counts them as unassessed.
+    The COUNT queries that p_qcount and p_icount used to come from counted
+    them as assessed. Does not commit. Returns the new rows,
+    as returned by get_project_stats.
+    """
+    not_a_class_db = NOT_A_CLASS.encode("utf-8")
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM project_stats WHERE pst_project = %s", (project_name,)
+        )
+        cursor.execute(
+            """
+        INSERT INTO project_stats
+          (pst_project, pst_quality, pst_importance, pst_count)
+        SELECT r_project, COALESCE(r_quality, %(not_a_class)s),
+               COALESCE(r_importance, %(not_a_class)s), COUNT(*)
+        FROM ratings
+        WHERE r_project = %(r_project)s
+        GROUP BY 1, 2, 3
+    """,
+            {"r_project": project_name, "not_a_class": not_a_class_db},
+        )
+    return get_project_stats(wp10db, project_name)
+
+
+def get_project_stats(wp10db, project_name):
+    """Returns the non-empty cells of the project's count matrix.
+
+    Each row is a dict of n (count), q (quality), i (importance) and project.
+    The list is empty if the project has no ratings, or if its matrix was
+    never built.
+    """
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            """
+        SELECT pst_count AS n, pst_quality AS q, pst_importance AS i,
+               pst_project AS project
+        FROM project_stats
+        WHERE pst_project = %s
+    """,
+            (project_name,),
+        )
+        return list(cursor.fetchall())
+
+
+def get_quality_counts(wp10db, project_name):
+    """Returns {quality: number of ratings} for the project."""
+    counts = {}
+    for row in get_project_stats(wp10db, project_name):
+        counts[row["q"]] = counts.get(row["q"], 0) + row["n"]
+    return counts
+
+
+def summarize(stats):
+    """Returns (total, quality assessed, importance assessed) counts of stats.
+
+    A rating is unassessed for a kind if it is NotA-Class or Unassessed-Class,
+    which includes a NULL rating (see refresh_project_stats).
+    """
+    unassessed = (NOT_A_CLASS.encode("utf-8"), UNASSESSED_CLASS.encode("utf-8"))
+    total = quality = importance = 0
+    for row in stats:
+        total += row["n"]
+        if row["q"] not in unassessed:
+            quality += row["n"]
+        if row["i"] not in unassessed:
+            importance += row["n"]
+    return total, quality, importance
@@ -0,0 +1,104 @@
+from wp1.base_db_test import BaseWpOneDbTest
+from wp1.logic import project_stats as logic_project_stats
+
+
+class ProjectStatsTest(BaseWpOneDbTest):
+    ratings = (
+        (b"Test", b"Art of testing", b"FA-Class", b"High-Class"),
+        (b"Test", b"Testing mechanics", b"FA-Class", b"High-Class"),
+        (b"Test", b"Rules of testing", b"FA-Class", b"NotA-Class"),
+        (b"Test", b"Test frameworks", b"NotA-Class", b"Mid-Class"),
+        (b"Test", b"Test practices", b"Unassessed-Class", b"Mid-Class"),
+        (b"Test", b"Testing history", None, b"Mid-Class"),
+        (b"Other", b"Art of testing", b"B-Class", b"Low-Class"),
+    )
+
+    def setUp(self):
+        super().setUp()
+        with self.wp10db.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO ratings"
+                "  (r_project, r_namespace, r_article, r_quality, r_importance)"
+                " VALUES (%s, 0, %s, %s, %s)",
+                self.ratings,
+            )
+
+    def _sorted(self, stats):
+        return sorted((s["q"], s["i"], s["n"]) for s in stats)
+
+    def test_refresh(self):
+        actual = logic_project_stats.refresh_project_stats(self.wp10db, b"Test")
+
+        self.assertEqual(
+            [
+                (b"FA-Class", b"High-Class", 2),
+                (b"FA-Class", b"NotA-Class", 1),
+                (b"NotA-Class", b"Mid-Class", 2),
+                (b"Unassessed-Class", b"Mid-Class", 1),
+            ],
+            self._sorted(actual),
+        )
+        self.assertTrue(all(s["project"] == b"Test" for s in actual))
+
+    def test_refresh_replaces_cells(self):
+        logic_project_stats.refresh_project_stats(self.wp10db, b"Test")
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM ratings WHERE r_project = 'Test' AND"
+                " r_quality = 'FA-Class'"
+            )
+
+        logic_project_stats.refresh_project_stats(self.wp10db, b"Test")
+
+        self.assertEqual(
+            [
+                (b"NotA-Class", b"Mid-Class", 2),
+                (b"Unassessed-Class", b"Mid-Class", 1),
+            ],
+            self._sorted(logic_project_stats.get_project_stats(self.wp10db, b"Test")),
+        )
+
+    def test_refresh_leaves_other_projects(self):
+        logic_project_stats.refresh_project_stats(self.wp10db, b"Other")
+
+        logic_project_stats.refresh_project_stats(self.wp10db, b"Test")
+
+        self.assertEqual(
+            [(b"B-Class", b"Low-Class", 1)],
+            self._sorted(logic_project_stats.get_project_stats(self.wp10db, b"Other")),
+        )
+
+    def test_get_project_stats_not_built(self):
+        self.assertEqual(
+            [], logic_project_stats.get_project_stats(self.wp10db, b"Test")
+        )
+
+    def test_get_quality_counts(self):
+        logic_project_stats.refresh_project_stats(self.wp10db, b"Test")
+
+        actual = logic_project_stats.get_quality_counts(self.wp10db, b"Test")
+
+        self.assertEqual(
+            {b"FA-Class": 3, b"NotA-Class": 2, b"Unassessed-Class": 1}, actual
+        )
+
+    def test_summarize(self):
+        stats = logic_project_stats.refresh_project_stats(self.wp10db, b"Test")
+
+        self.assertEqual((6, 3, 5), logic_project_stats.summarize(stats))
+
+    def test_summarize_null_is_unassessed(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO ratings"
+                "  (r_project, r_namespace, r_article, r_quality, r_importance)"
+                " VALUES ('Null', 0, 'A', NULL, NULL), ('Null', 0, 'B', 'B-Class',"
+                " 'Low-Class')"
+            )
+
+        stats = logic_project_stats.refresh_project_stats(self.wp10db, b"Null")
+
+        self.assertEqual((2, 1, 1), logic_project_stats.summarize(stats))
+
+    def test_summarize_empty(self):
+        self.assertEqual((0, 0, 0), logic_project_stats.summarize([]))
@@ -1,15 +1,27 @@
 import time
-from datetime import datetime
+import unittest
+import zlib
+from datetime import date, datetime, timedelta
 from unittest.mock import MagicMock, patch
 
 import attr
 import fakeredis
 
+from wp1 import table_cache
 from wp1.base_db_test import BaseCombinedDbTest, BaseWikiDbTest, BaseWpOneDbTest
 from wp1.conf import get_conf
-from wp1.constants import CATEGORY_NS_INT, TS_FORMAT, AssessmentKind
+from wp1.constants import (
+    CATEGORY_NS_INT,
+    FULL_UPDATE_INTERVAL_DAYS,
+    INCREMENTAL_UPDATE_OVERLAP_SECONDS,
+    STREAMING_UPDATE_MIN_RATINGS,
+    TS_FORMAT,
+    AssessmentKind,
+)
 from wp1.logic import log as logic_log
 from wp1.logic import project as logic_project
+from wp1.logic import project_stats as logic_project_stats
+from wp1.logic import rating as logic_rating
 from wp1.models.wiki.page import Page
 from wp1.models.wp10.category import Category
 from wp1.models.wp10.project import Project
@@ -45,12 +57,6 @@ def _get_all_logs(redis):
     return logic_log.get_logs(redis)
 
 
-def _get_all_global_article_scores(wp10db):
-    with wp10db.cursor() as cursor:
-        cursor.execute("SELECT * FROM global_articles")
-        return cursor.fetchall()
-
-
 class UpdateCategoryTest(BaseWpOneDbTest):
 
     def setUp(self):
@@ -409,30 +415,6 @@ class ArticlesTest(BaseCombinedDbTest):
     old_ts_wiki = b"2018-07-04T05:05:05Z"
     expected_ts_wiki = b"2018-12-25T11:22:33Z"
 
-    global_article_scores = [
-        (225, 100, 475),
-        (150, 0, 625),
-        (100, 100, 229),
-        (150, 100, 589),
-        (150, 200, 596),
-        (150, 100, 398),
-        (0, 0, 109),
-        (225, 100, 434),
-        (150, 300, 629),
-        (150, 300, 629),
-        (150, 300, 629),
-        (100, 100, 461),
-        (225, 0, 288),
-        (0, 0, 35),
-        (150, 100, 665),
-        (150, 100, 527),
-        (100, 0, 176),
-        (150, 100, 37),
-        (15, 100, 279),
-        (150, 100, 279),
-        (100, 100, 415),
-    ]
-
     custom_quality_pages = (
         (107, b"Draft-Class_Test_articles", b"Test_articles_by_quality", None, 14),
         (270, b"Starting out testing", b"Draft-Class_Test_articles", b"Draft-Class", 1),
@@ -590,22 +572,6 @@ class ArticlesTest(BaseCombinedDbTest):
                 )
         self.wp10db.commit()
 
-    def _insert_global_scores(self):
-        article_scores = [
-            (art[1],) + score
-            for score, art in zip(self.global_article_scores, self.quality_pages[6:])
-        ]
-        with self.wp10db.cursor() as cursor:
-            cursor.executemany(
-                """
-          INSERT INTO global_articles
-            (a_article, a_quality, a_importance, a_score)
-          VALUES (%s, %s, %s, %s)
-      """,
-                article_scores,
-            )
-        self.wp10db.commit()
-
     def setUp(self):
         super().setUp()
         self.project = Project(p_project=b"Test", p_timestamp=b"20100101000000")
@@ -623,7 +589,8 @@ class UpdateProjectAssessmentsTest(ArticlesTest):
 
         self.api_return = {
             "query": {
-                "redirects": [{"to": self.expected_title}],
+                "normalized": [{"from": ":How to test", "to": "How to test"}],
+                "redirects": [{"from": "How to test", "to": self.expected_title}],
                 "pages": {
                     123: {
                         "ns": self.expected_ns,
@@ -634,6 +601,11 @@ class UpdateProjectAssessmentsTest(ArticlesTest):
             },
         }
 
+    def _fake_redirects_api(self, *args, **kwargs):
+        if ":How to test" in kwargs["titles"].split("|"):
+            return self.api_return
+        return {}
+
     def test_old_rating_same_quality(self):
         self._insert_pages(self.quality_pages)
         self._insert_ratings(self.quality_pages[6:], 0, AssessmentKind.QUALITY)
@@ -984,18 +956,14 @@ class UpdateProjectAssessmentsTest(ArticlesTest):
         self._insert_pages(self.quality_pages[:-2])
         self._insert_ratings(self.quality_pages[6:], 0, AssessmentKind.QUALITY)
 
-        def fake_api(*args, **kwargs):
-            if kwargs["titles"] == ":How to test":
-                return self.api_return
-            return {}
-
-        patched_site.api.side_effect = fake_api
+        patched_site.api.side_effect = self._fake_redirects_api
 
         logic_project.update_project_assessments(
             self.wikidb, self.wp10db, self.redis, self.project, {}
         )
 
-        self.assertEqual(2, len(patched_site.api.call_args_list))
+        # Both unseen articles are looked up in the same API query.
+        self.assertEqual(1, len(patched_site.api.call_args_list))
 
         ratings = _get_all_ratings(self.wp10db)
         self.assertNotEqual(0, len(ratings))
@@ -1017,18 +985,14 @@ class UpdateProjectAssessmentsTest(ArticlesTest):
         self._insert_pages(self.importance_pages[:-2])
         self._insert_ratings(self.importance_pages[4:], 0, AssessmentKind.IMPORTANCE)
 
-        def fake_api(*args, **kwargs):
-            if kwargs["titles"] == ":How to test":
-                return self.api_return
-            return {}
-
-        patched_site.api.side_effect = fake_api
+        patched_site.api.side_effect = self._fake_redirects_api
 
         logic_project.update_project_assessments(
             self.wikidb, self.wp10db, self.redis, self.project, {}
         )
 
-        self.assertEqual(2, len(patched_site.api.call_args_list))
+        # Both unseen articles are looked up in the same API query.
+        self.assertEqual(1, len(patched_site.api.call_args_list))
 
         ratings = _get_all_ratings(self.wp10db)
         self.assertNotEqual(0, len(ratings))
@@ -1052,12 +1016,7 @@ class UpdateProjectAssessmentsTest(ArticlesTest):
             self.quality_pages[6:], 0, AssessmentKind.QUALITY, override_rating=None
         )
 
-        def fake_api(*args, **kwargs):
-            if kwargs["titles"] == ":How to test":
-                return self.api_return
-            return {}
-
-        patched_site.api.side_effect = fake_api
+        patched_site.api.side_effect = self._fake_redirects_api
 
         logic_project.update_project_assessments(
             self.wikidb, self.wp10db, self.redis, self.project, {}
@@ -1075,12 +1034,7 @@ class UpdateProjectAssessmentsTest(ArticlesTest):
             override_rating=None,
         )
 
-        def fake_api(*args, **kwargs):
-            if kwargs["titles"] == ":How to test":
-                return self.api_return
-            return {}
-
-        patched_site.api.side_effect = fake_api
+        patched_site.api.side_effect = self._fake_redirects_api
 
         logic_project.update_project_assessments(
             self.wikidb, self.wp10db, self.redis, self.project, {}
@@ -1097,147 +1051,430 @@ class UpdateProjectAssessmentsTest(ArticlesTest):
             self.wikidb, self.wp10db, self.redis, self.project, {}, {}
         )
 
-        mock_logic_rating.insert_or_update.assert_not_called()
+        mock_logic_rating.RatingWriter.return_value.add.assert_not_called()
         mock_logic_rating.add_log_for_rating.assert_not_called()
 
 
-class GlobalArticlesTest(ArticlesTest):
+class UpdateProjectAssessmentsShardedTest(UpdateProjectAssessmentsTest):
+    """Runs the UpdateProjectAssessmentsTest cases with sharded category fetches."""
+
+    def setUp(self):
+        super().setUp()
+        for name, value in (
+            ("CATEGORY_FETCH_SHARD_MIN_RATINGS", 0),
+            ("CATEGORY_FETCH_SHARD_SIZE", 3),
+        ):
+            patcher = patch.object(logic_project, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class UpdateProjectAssessmentsStreamingTest(UpdateProjectAssessmentsTest):
+    """Runs the UpdateProjectAssessmentsTest cases through the streaming mode."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch.object(
+            logic_project,
+            "update_project_assessments",
+            logic_project.update_project_assessments_streaming,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch("wp1.logic.project.logic_rating")
+    def test_no_pages_skips_update(self, mock_logic_rating):
+        self._insert_ratings(self.quality_pages[6:], 0, AssessmentKind.QUALITY)
+
+        logic_project.update_project_assessments_streaming(
+            self.wikidb, self.wp10db, self.redis, self.project, {}
+        )
+
+        mock_logic_rating.iter_project_ratings.assert_not_called()
+        mock_logic_rating.RatingWriter.return_value.add.assert_not_called()
+
+
+class MergeByArticleTest(unittest.TestCase):
+
+    def _rating(self, namespace, article):
+        return Rating(r_project=b"Test", r_namespace=namespace, r_article=article)
+
+    def test_merge(self):
+        old = [
+            self._rating(0, b"A"),
+            self._rating(0, b"C"),
+            self._rating(4, b"A"),
+        ]
+        new = [((0, b"B"), "b"), ((0, b"C"), "c"), ((4, b"A"), "a"), ((4, b"D"), "d")]
+
+        actual = [
+            (
+                None if o is None else (o.r_namespace, o.r_article),
+                None if n is None else n[1],
+            )
+            for o, n in logic_project._merge_by_article(iter(old), iter(new))
+        ]
+
+        self.assertEqual(
+            [
+                ((0, b"A"), None),
+                (None, "b"),
+                ((0, b"C"), "c"),
+                ((4, b"A"), "a"),
+                (None, "d"),
+            ],
+            actual,
+        )
+
+    def test_merge_empty(self):
+        self.assertEqual([], list(logic_project._merge_by_article(iter([]), iter([]))))
+
+    def test_reads_old_before_yielding(self):
+        reads = []
+
+        def old_ratings():
+            for rating in (self._rating(0, b"A"), self._rating(0, b"C")):
+                reads.append(rating.r_article)
+                yield rating
+
+        merge = logic_project._merge_by_article(old_ratings(), iter([((0, b"B"), 1)]))
+        old, new = next(merge)
+
+        self.assertEqual(b"A", old.r_article)
+        self.assertIsNone(new)
+        self.assertEqual([b"A", b"C"], reads)
+
+
+class UpdateProjectStreamingTest(BaseCombinedDbTest):
+
+    def setUp(self):
+        super().setUp()
+        self.project = Project(p_project=b"Test", p_timestamp=b"20100101000000")
+
+    @patch("wp1.logic.project.update_project_record")
+    @patch("wp1.logic.project.cleanup_project")
+    @patch("wp1.logic.project.update_project_assessments_streaming")
+    @patch("wp1.logic.project.update_project_assessments")
+    @patch("wp1.logic.project.api_project")
+    def test_small_project_not_streamed(
+        self, mock_api_project, mock_update, mock_streaming, *_
+    ):
+        mock_api_project.get_extra_assessments.return_value = {}
+        self.project.p_count = 10
+
+        logic_project.update_project(
+            self.wikidb, self.wp10db, self.redis, self.project, incremental=False
+        )
+
+        mock_update.assert_called_once()
+        mock_streaming.assert_not_called()
+
+    @patch("wp1.logic.project.update_project_record")
+    @patch("wp1.logic.project.cleanup_project")
+    @patch("wp1.logic.project.update_project_assessments_streaming")
+    @patch("wp1.logic.project.update_project_assessments")
+    @patch("wp1.logic.project.api_project")
+    def test_large_project_streamed(
+        self, mock_api_project, mock_update, mock_streaming, *_
+    ):
+        mock_api_project.get_extra_assessments.return_value = {}
+        self.project.p_count = STREAMING_UPDATE_MIN_RATINGS
+
+        logic_project.update_project(
+            self.wikidb, self.wp10db, self.redis, self.project, incremental=False
+        )
+
+        mock_streaming.assert_called_once()
+        mock_update.assert_not_called()
+
+    @patch("wp1.logic.project.update_project_record")
+    @patch("wp1.logic.project.cleanup_project")
+    @patch("wp1.logic.project.update_project_assessments_streaming")
+    @patch("wp1.logic.project.update_project_assessments")
+    @patch("wp1.logic.project.api_project")
+    def test_streaming_forced(self, mock_api_project, mock_update, mock_streaming, *_):
+        mock_api_project.get_extra_assessments.return_value = {}
+
+        logic_project.update_project(
+            self.wikidb, self.wp10db, self.redis, self.project, streaming=True
+        )
+
+        mock_streaming.assert_called_once()
+        mock_update.assert_not_called()
+
+    @patch("wp1.logic.project.update_project_record")
+    @patch("wp1.logic.project.cleanup_project")
+    @patch("wp1.logic.project.update_project_assessments")
+    @patch("wp1.logic.project.api_project")
+    def test_indexes_changed_articles(
+        self, mock_api_project, mock_update, mock_cleanup, mock_record
+    ):
+        mock_api_project.get_extra_assessments.return_value = {}
+
+        def update(*args, changed_articles=None, **kwargs):
+            changed_articles.add((0, b"Changed"))
+
+        mock_update.side_effect = update
+
+        logic_project.update_project(
+            self.wikidb, self.wp10db, self.redis, self.project, incremental=False
+        )
+
+        self.assertEqual(
+            {(0, b"Changed")}, mock_record.call_args.kwargs["changed_articles"]
+        )
+
+
+class IncrementalUpdateSinceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.project = Project(
+            p_project=b"Test", p_timestamp=b"20181225112233", p_count=10
+        )
+        reconciliation_day = zlib.crc32(b"Test") % FULL_UPDATE_INTERVAL_DAYS
+        base = date(2018, 12, 1)
+        offset = (reconciliation_day - base.toordinal()) % FULL_UPDATE_INTERVAL_DAYS
+        self.reconciliation_date = base + timedelta(days=offset)
+        self.other_date = self.reconciliation_date + timedelta(days=1)
+
+    def test_since_last_update(self):
+        actual = logic_project.incremental_update_since(
+            self.project, today=self.other_date
+        )
+
+        self.assertEqual(
+            datetime(2018, 12, 25, 11, 22, 33)
+            - timedelta(seconds=INCREMENTAL_UPDATE_OVERLAP_SECONDS),
+            actual,
+        )
+
+    def test_reconciliation_day(self):
+        self.assertIsNone(
+            logic_project.incremental_update_since(
+                self.project, today=self.reconciliation_date
+            )
+        )
+        self.assertIsNone(
+            logic_project.incremental_update_since(
+                self.project,
+                today=self.reconciliation_date
+                + timedelta(days=FULL_UPDATE_INTERVAL_DAYS),
+            )
+        )
+
+    def test_never_updated(self):
+        project = Project(p_project=b"Test", p_timestamp=b"2018-12-25T11:22:33Z")
+
+        self.assertIsNone(
+            logic_project.incremental_update_since(project, today=self.other_date)
+        )
+
+    def test_invalid_timestamp(self):
+        self.project.p_timestamp = b"2018-12-25T11:22:33Z"
+
+        self.assertIsNone(
+            logic_project.incremental_update_since(self.project, today=self.other_date)
+        )
+
+
+class UpdateProjectAssessmentsIncrementalTest(ArticlesTest):
 
     def setUp(self):
         super().setUp()
         self._insert_pages(self.quality_pages)
         self._insert_pages(self.importance_pages)
-        self._insert_ratings(
-            zip(self.quality_pages[6:], self.importance_pages[4:]), 0, "both"
+        # A full update first, so that the categories and ratings are known.
+        logic_project.update_project_assessments(
+            self.wikidb, self.wp10db, self.redis, self.project, {}
+        )
+        self.since = datetime(2019, 1, 1)
+
+    def _add_to_category(self, page_id, category, ts):
+        with self.wikidb.cursor() as cursor:
+            cursor.execute(
+                "SELECT lt_id FROM linktarget WHERE lt_title = %s", (category,)
+            )
+            target_id = cursor.fetchone()["lt_id"]
+            cursor.execute(
+                """
+            INSERT INTO categorylinks
+              (cl_from, cl_to, cl_timestamp, cl_target_id)
+            VALUES
+              (%(from)s, %(to)s, %(ts)s, %(target_id)s)
+        """,
+                {"from": page_id, "to": category, "ts": ts, "target_id": target_id},
+            )
+        self.wikidb.commit()
+
+    def _get_rating(self, article):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "SELECT * FROM ratings WHERE r_project = %s AND r_article = %s",
+                (self.project.p_project, article),
+            )
+            row = cursor.fetchone()
+        return None if row is None else Rating(**row)
+
+    def _delete_rating(self, article):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM ratings WHERE r_project = %s AND r_article = %s",
+                (self.project.p_project, article),
+            )
+        self.wp10db.commit()
+
+    def test_updates_changed_article(self):
+        # How to test (C-Class) is added to A-Class, which ranks higher.
+        self._add_to_category(252, b"A-Class_Test_articles", datetime(2019, 6, 1))
+
+        actual = logic_project.update_project_assessments_incremental(
+            self.wikidb, self.wp10db, self.redis, self.project, {}, self.since
         )
 
-        self._insert_global_scores()
+        self.assertTrue(actual)
+        rating = self._get_rating(b"How to test")
+        self.assertEqual(b"A-Class", rating.r_quality)
+        self.assertEqual(b"2019-06-01T00:00:00Z", rating.r_quality_timestamp)
+        self.assertEqual(b"Low-Class", rating.r_importance)
 
-    @patch(
-        "wp1.logic.project.api_project.get_extra_assessments",
-        return_value={"extra": {}},
-    )
-    def test_update_global_articles_table(self, mock_api_project):
-        expected = [
-            {
-                "a_article": b"Art of testing",
-                "a_importance": b"400",
-                "a_quality": b"500",
-                "a_score": 475,
-            },
-            {
-                "a_article": b"Failures of tests",
-                "a_importance": b"100",
-                "a_quality": b"225",
-                "a_score": 176,
-            },
-            {
-                "a_article": b"How to test",
-                "a_importance": b"100",
-                "a_quality": b"225",
-                "a_score": 37,
-            },
-            {
-                "a_article": b"Important tests",
-                "a_importance": b"300",
-                "a_quality": b"425",
-                "a_score": 434,
-            },
-            {
-                "a_article": b"Lesser-known tests",
-                "a_importance": b"100",
-                "a_quality": b"225",
-                "a_score": 527,
-            },
-            {
-                "a_article": b"Operation of tests",
-                "a_importance": b"100",
-                "a_quality": b"300",
-                "a_score": 665,
-            },
-            {
-                "a_article": b"Rules of testing",
-                "a_importance": b"400",
-                "a_quality": b"500",
-                "a_score": 229,
-            },
-            {
-                "a_article": b"Test frameworks",
-                "a_importance": b"300",
-                "a_quality": b"480",
-                "a_score": 398,
-            },
-            {
-                "a_article": b"Test main inheritance",
-                "a_importance": b"300",
-                "a_quality": b"400",
-                "a_score": 629,
-            },
-            {
-                "a_article": b"Test other inheritance",
-                "a_importance": b"200",
-                "a_quality": b"400",
-                "a_score": 461,
-            },
-            {
-                "a_article": b"Test practices",
-                "a_importance": b"400",
-                "a_quality": b"480",
-                "a_score": 589,
-            },
-            {
-                "a_article": b"Test results",
-                "a_importance": b"300",
-                "a_quality": b"425",
-                "a_score": 629,
-            },
-            {
-                "a_article": b"Test sub inheritance",
-                "a_importance": b"300",
-                "a_quality": b"400",
-                "a_score": 629,
-            },
-            {
-                "a_article": b"Testing best practices",
-                "a_importance": b"100",
-                "a_quality": b"300",
-                "a_score": 288,
-            },
-            {
-                "a_article": b"Testing figures",
-                "a_importance": b"300",
-                "a_quality": b"425",
-                "a_score": 109,
-            },
-            {
-                "a_article": b"Testing history",
-                "a_importance": b"300",
-                "a_quality": b"480",
-                "a_score": 596,
-            },
-            {
-                "a_article": b"Testing mechanics",
-                "a_importance": b"400",
-                "a_quality": b"500",
-                "a_score": 625,
-            },
-            {
-                "a_article": b"Testing tools",
-                "a_importance": b"100",
-                "a_quality": b"300",
-                "a_score": 35,
-            },
-        ]
+    def test_ignores_unchanged_articles(self):
+        self._delete_rating(b"Testing tools")
+        self._add_to_category(252, b"A-Class_Test_articles", datetime(2019, 6, 1))
+
+        logic_project.update_project_assessments_incremental(
+            self.wikidb, self.wp10db, self.redis, self.project, {}, self.since
+        )
+
+        # Only a full update would find the rating missing.
+        self.assertIsNone(self._get_rating(b"Testing tools"))
+
+    def test_logs_change(self):
+        self.redis.flushall()
+        self._add_to_category(252, b"A-Class_Test_articles", datetime(2019, 6, 1))
+
+        logic_project.update_project_assessments_incremental(
+            self.wikidb, self.wp10db, self.redis, self.project, {}, self.since
+        )
+
+        logs = logic_log.get_logs(self.redis)
+        self.assertEqual(1, len(logs))
+        self.assertEqual(b"How to test", logs[0].l_article)
+        self.assertEqual(b"C-Class", logs[0].l_old)
+        self.assertEqual(b"A-Class", logs[0].l_new)
+
+    def test_adds_new_article(self):
+        self._insert_pages(
+            ((280, b"Test coverage", b"B-Class_Test_articles", b"B-Class", 1),)
+        )
+        with self.wikidb.cursor() as cursor:
+            cursor.execute(
+                "UPDATE categorylinks SET cl_timestamp = %s WHERE cl_from = 280",
+                (datetime(2019, 6, 1),),
+            )
+        self.wikidb.commit()
+
+        logic_project.update_project_assessments_incremental(
+            self.wikidb, self.wp10db, self.redis, self.project, {}, self.since
+        )
+
+        rating = self._get_rating(b"Test coverage")
+        self.assertEqual(b"B-Class", rating.r_quality)
+
+    def test_no_changes(self):
+        with patch.object(logic_rating.RatingWriter, "add") as mock_add:
+            actual = logic_project.update_project_assessments_incremental(
+                self.wikidb, self.wp10db, self.redis, self.project, {}, self.since
+            )
+
+        self.assertTrue(actual)
+        mock_add.assert_not_called()
+
+    def test_new_category_not_incremental(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM categories WHERE c_category = %s",
+                (b"A-Class_Test_articles",),
+            )
+        self.wp10db.commit()
+        self._add_to_category(252, b"A-Class_Test_articles", datetime(2019, 6, 1))
+
+        actual = logic_project.update_project_assessments_incremental(
+            self.wikidb, self.wp10db, self.redis, self.project, {}, self.since
+        )
+
+        self.assertFalse(actual)
+        self.assertEqual(b"C-Class", self._get_rating(b"How to test").r_quality)
+
+
+class UpdateProjectIncrementalTest(BaseCombinedDbTest):
+
+    def setUp(self):
+        super().setUp()
+        self.project = Project(
+            p_project=b"Test", p_timestamp=b"20100101000000", p_count=10
+        )
+        for name in (
+            "update_project_record",
+            "cleanup_project",
+            "api_project",
+        ):
+            patcher = patch("wp1.logic.project.%s" % name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch("wp1.logic.project.update_project_assessments")
+    @patch("wp1.logic.project.update_project_assessments_incremental")
+    @patch("wp1.logic.project.incremental_update_since")
+    def test_incremental(self, mock_since, mock_incremental, mock_full):
+        mock_since.return_value = datetime(2010, 1, 1)
+        mock_incremental.return_value = True
 
         logic_project.update_project(self.wikidb, self.wp10db, self.redis, self.project)
-        logic_project.update_global_articles_for_project_name(
-            self.wp10db, self.project.p_project
+
+        self.assertEqual(datetime(2010, 1, 1), mock_incremental.call_args.args[5])
+        mock_full.assert_not_called()
+
+    @patch("wp1.logic.project.update_project_assessments")
+    @patch("wp1.logic.project.update_project_assessments_incremental")
+    @patch("wp1.logic.project.incremental_update_since")
+    def test_reconciliation(self, mock_since, mock_incremental, mock_full):
+        mock_since.return_value = None
+
+        logic_project.update_project(self.wikidb, self.wp10db, self.redis, self.project)
+
+        mock_incremental.assert_not_called()
+        mock_full.assert_called_once()
+
+    @patch("wp1.logic.project.update_project_assessments")
+    @patch("wp1.logic.project.update_project_assessments_incremental")
+    @patch("wp1.logic.project.incremental_update_since")
+    def test_incremental_not_possible(self, mock_since, mock_incremental, mock_full):
+        mock_since.return_value = datetime(2010, 1, 1)
+        mock_incremental.return_value = False
+
+        logic_project.update_project(self.wikidb, self.wp10db, self.redis, self.project)
+
+        mock_incremental.assert_called_once()
+        mock_full.assert_called_once()
+
+    @patch("wp1.logic.project.update_project_assessments")
+    @patch("wp1.logic.project.incremental_update_since", return_value=None)
+    def test_invalidates_table_cache(self, mock_since, mock_full):
+        table_cache.set_project_table(self.redis, b"Test", {"data": {}})
+
+        logic_project.update_project(self.wikidb, self.wp10db, self.redis, self.project)
+
+        self.assertIsNone(table_cache.get_project_table(self.redis, b"Test"))
+
+    @patch("wp1.logic.project.update_project_assessments")
+    @patch("wp1.logic.project.update_project_assessments_incremental")
+    def test_incremental_disabled(self, mock_incremental, mock_full):
+        logic_project.update_project(
+            self.wikidb, self.wp10db, self.redis, self.project, incremental=False
         )
 
-        actual = _get_all_global_article_scores(self.wp10db)
-        actual = sorted(sorted(list(a.items())) for a in actual)
-        expected = sorted(sorted(list(e.items())) for e in expected)
-        self.assertEqual(expected, actual)
+        mock_incremental.assert_not_called()
+        mock_full.assert_called_once()
 
 
 class CleanupProjectTest(BaseWpOneDbTest):
@@ -1382,6 +1619,14 @@ class UpdateProjectRecordTest(BaseWpOneDbTest):
     def test_importance_count(self):
         self.assertEqual(6, self.project.p_icount)
 
+    def test_refreshes_project_stats(self):
+        actual = logic_project_stats.get_project_stats(
+            self.wp10db, self.project.p_project
+        )
+
+        self.assertEqual(8, len(actual))
+        self.assertEqual(8, sum(s["n"] for s in actual))
+
 
 class ProjectNamesTest(ArticlesTest):
 
@@ -1717,6 +1962,38 @@ class StoreNewRatingsTest(BaseCombinedDbTest):
         logs = _get_all_logs(self.redis)
         self.assertEqual(0, len(logs))
 
+    def test_uses_given_rating_writer(self):
+        """A writer passed in by the caller is not flushed by store_new_ratings."""
+        rating = Rating(
+            r_project=b"Test",
+            r_namespace=0,
+            r_article=b"Brand_New_Article",
+            r_score=0,
+            r_quality=b"FA-Class",
+            r_quality_timestamp=b"2018-12-25T11:22:33Z",
+        )
+        new_ratings = {
+            b"0:Brand_New_Article": [
+                (rating, AssessmentKind.QUALITY, NOT_A_CLASS.encode("utf-8"))
+            ]
+        }
+        writer = logic_rating.RatingWriter(self.wp10db)
+
+        logic_project.store_new_ratings(
+            self.wp10db,
+            self.redis,
+            new_ratings,
+            {},
+            self.rating_to_category,
+            rating_writer=writer,
+        )
+        self.assertEqual(0, len(_get_all_ratings(self.wp10db)))
+
+        writer.flush()
+        ratings = _get_all_ratings(self.wp10db)
+        self.assertEqual(1, len(ratings))
+        self.assertEqual(b"FA-Class", ratings[0].r_quality)
+
 
 class ProcessUnseenArticlesMovedTest(BaseCombinedDbTest):
     """Tests for process_unseen_articles returning moved_articles set."""
@@ -1729,7 +2006,7 @@ class ProcessUnseenArticlesMovedTest(BaseCombinedDbTest):
         self.timestamp_str = "2011-04-28T12:30:00Z"
         self.move_dt = datetime.strptime(self.timestamp_str, TS_FORMAT)
 
-    @patch("wp1.logic.project.logic_page.get_move_data")
+    @patch("wp1.logic.project.logic_page.get_move_data_many")
     def test_returns_moved_article_refs(self, mock_get_move_data):
         """A detected move should return the destination ref in moved_articles."""
         old_rating = Rating(
@@ -1746,9 +2023,11 @@ class ProcessUnseenArticlesMovedTest(BaseCombinedDbTest):
         seen.add(b"0:Some_Other_Article")
 
         mock_get_move_data.return_value = {
-            "dest_ns": 0,
-            "dest_title": b"New_Title",
-            "timestamp_dt": self.move_dt,
+            (0, b"Old_Title"): {
+                "dest_ns": 0,
+                "dest_title": b"New_Title",
+                "timestamp_dt": self.move_dt,
+            }
         }
 
         with patch(
@@ -1762,7 +2041,7 @@ class ProcessUnseenArticlesMovedTest(BaseCombinedDbTest):
         mock_get_move_data.assert_called_once()
         mock_update_page_moved.assert_called_once()
 
-    @patch("wp1.logic.project.logic_page.get_move_data")
+    @patch("wp1.logic.project.logic_page.get_move_data_many")
     def test_no_move_returns_empty_set(self, mock_get_move_data):
         """No move data means the moved_articles set should stay empty."""
         old_rating = Rating(
@@ -1776,7 +2055,7 @@ class ProcessUnseenArticlesMovedTest(BaseCombinedDbTest):
         old_ratings = {b"0:Deleted_Article": old_rating}
         seen = {b"0:Some_Other_Article"}
 
-        mock_get_move_data.return_value = None
+        mock_get_move_data.return_value = {(0, b"Deleted_Article"): None}
 
         moved_articles = logic_project.process_unseen_articles(
             self.wikidb, self.wp10db, self.redis, self.project, old_ratings, seen
@@ -1813,7 +2092,7 @@ class DeferredLogMovedArticleTest(ArticlesTest):
         self.timestamp_str = "2011-04-28T12:30:00Z"
         self.move_dt = datetime.strptime(self.timestamp_str, TS_FORMAT)
 
-    @patch("wp1.logic.project.logic_page.get_move_data")
+    @patch("wp1.logic.project.logic_page.get_move_data_many")
     @patch("wp1.logic.project.logic_page.update_page_moved")
     def test_renamed_article_no_spurious_log(
         self, mock_update_page_moved, mock_get_move_data
@@ -1857,14 +2136,15 @@ class DeferredLogMovedArticleTest(ArticlesTest):
         self.wp10db.commit()
 
         # When process_unseen_articles looks up the old name, it finds a move
-        def fake_get_move_data(wp10db, wikidb, ns, title, timestamp_dt):
-            if title == b"Old_Art_of_testing":
-                return {
+        def fake_get_move_data(wp10db, wikidb, articles, timestamp_dt, cache=None):
+            move_data = dict.fromkeys(articles)
+            if (0, b"Old_Art_of_testing") in move_data:
+                move_data[(0, b"Old_Art_of_testing")] = {
                     "dest_ns": 0,
                     "dest_title": b"Art of testing",
                     "timestamp_dt": self.move_dt,
                 }
-            return None
+            return move_data
 
         mock_get_move_data.side_effect = fake_get_move_data
 
@@ -1921,7 +2201,7 @@ class DeferredLogMovedArticleTest(ArticlesTest):
         for log_entry in quality_logs:
             self.assertEqual(NOT_A_CLASS.encode("utf-8"), log_entry.l_old)
 
-    @patch("wp1.logic.project.logic_page.get_move_data")
+    @patch("wp1.logic.project.logic_page.get_move_data_many")
     @patch("wp1.logic.project.logic_page.update_page_moved")
     def test_mix_of_new_and_renamed_articles(
         self, mock_update_page_moved, mock_get_move_data
@@ -1954,14 +2234,15 @@ class DeferredLogMovedArticleTest(ArticlesTest):
             )
         self.wp10db.commit()
 
-        def fake_get_move_data(wp10db, wikidb, ns, title, timestamp_dt):
-            if title == b"Old_Art_of_testing":
-                return {
+        def fake_get_move_data(wp10db, wikidb, articles, timestamp_dt, cache=None):
+            move_data = dict.fromkeys(articles)
+            if (0, b"Old_Art_of_testing") in move_data:
+                move_data[(0, b"Old_Art_of_testing")] = {
                     "dest_ns": 0,
                     "dest_title": b"Art of testing",
                     "timestamp_dt": self.move_dt,
                 }
-            return None
+            return move_data
 
         mock_get_move_data.side_effect = fake_get_move_data
 
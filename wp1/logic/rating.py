@@ -1,113 +1,213 @@
+import base64
+import binascii
+import json
 import logging
-import pickle
-from datetime import timedelta
+import random
+from collections import defaultdict
 
 import attr
-from redis import Redis
 
+from wp1 import rating_sample_cache
 from wp1.conf import get_conf
-from wp1.constants import GLOBAL_TIMESTAMP, AssessmentKind
+from wp1.constants import (
+    GLOBAL_TIMESTAMP,
+    RANDOM_ARTICLE_SAMPLE_ATTEMPTS,
+    RATING_READ_CHUNK_SIZE,
+    RATING_WRITE_BATCH_SIZE,
+    TS_FORMAT_WP10,
+    UNRANKED,
+    AssessmentKind,
+)
+from wp1.logic import global_articles as logic_global_articles
 from wp1.logic import log as logic_log
+from wp1.logic import project_stats as logic_project_stats
+from wp1.logic import title_search as logic_title_search
 from wp1.models.wp10.log import Log
 from wp1.models.wp10.rating import Rating
 
 config = get_conf()
 NOT_A_CLASS = config["NOT_A_CLASS"]
-UNASSESSED_CLASS = config["UNASSESSED_CLASS"]
-ALL_ASSESSMENTS_CACHE_KEY = "all_assessment_numbers"
 
 logger = logging.getLogger(__name__)
 
 
-def get_cached_assessment_numbers(redis):
-    if redis is None:
-        return
-
-    pkl = redis.get(ALL_ASSESSMENTS_CACHE_KEY)
-    if pkl is None:
-        return None
-    return pickle.loads(pkl)  # nosec
-
-
-def cache_assessment_numbers(redis, data):
-    if redis is None:
-        return
-
-    pkl = pickle.dumps(data)
-    # The warming job (registered in cron_config.py) refreshes
-    # this once a day at noon UTC. The TTL is a bit over 24h so the entry never
-    # expires before the next day's run overwrites it (which would otherwise open
-    # a daily window where a web request hits the slow query directly).
-    redis.setex(ALL_ASSESSMENTS_CACHE_KEY, timedelta(hours=25), value=pkl)
-
-
-def get_all_assessment_numbers(wp10db, redis: Redis = None):
+def get_all_assessment_numbers(wp10db):
     """
     Get the number of assessed/unassessed articles for every project.
     Returns a list of (project, unassessed, assessed) tuples, ordered by the
-    number of unassessed articles descending (as returned by the database).
-    """
-    if redis is not None:
-        cached = get_cached_assessment_numbers(redis)
-        if cached is not None:
-            return cached
+    number of unassessed articles descending.
 
+    The numbers are the p_count and p_qcount rollup that
+    logic.project.update_project_record stores with each project, so this
+    reads one row per project instead of scanning every rating. A rating with
+    no quality counts as unassessed (see logic.project_stats.summarize).
+    """
     with wp10db.cursor() as cursor:
         cursor.execute("""
-              SELECT r_project,
-                CAST(SUM(r_quality = 'NotA-Class' OR r_quality = 'Unassessed-Class') AS UNSIGNED) as unassessed,
-                CAST(SUM(r_quality != 'NotA-Class' AND r_quality != 'Unassessed-Class') AS UNSIGNED) as assessed
-              FROM ratings
-              GROUP BY r_project
-              ORDER BY unassessed DESC;
+              SELECT p_project, p_count, p_qcount
+              FROM projects
+              WHERE p_count > 0
             """)
         results = cursor.fetchall()
 
     results = [
-        (row["r_project"].decode("utf-8"), row["unassessed"], row["assessed"])
+        (
+            row["p_project"].decode("utf-8"),
+            row["p_count"] - (row["p_qcount"] or 0),
+            row["p_qcount"] or 0,
+        )
         for row in results
     ]
-    if redis is not None:
-        cache_assessment_numbers(redis, results)
-
+    results.sort(key=lambda r: (-r[1], r[0]))
     return results
 
 
-def update_assessment_cache():
-    """Recompute the assessment numbers and refresh the cache.
-
-    This is the entry point for the recurring cache-warming job (registered in
-    cron_config.py). It runs in its own RQ worker,
-    so it opens its own database and Redis connections. The underlying query is
-    slow (minutes in production), which is exactly why it runs here on a
-    schedule rather than in a web request.
-
-    It passes no Redis handle to get_all_assessment_numbers so that the
-    read-through cache is bypassed and the numbers are always recomputed, then
-    writes the fresh result to the cache.
-    """
-    from wp1.redis_db import connect as redis_connect
-    from wp1.wp10_db import connect as wp10_connect
+def get_project_ratings(wp10db, project_name):
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            "SELECT * FROM " + Rating.table_name + """
+      WHERE r_project = %(r_project)s
+    """,
+            {"r_project": project_name},
+        )
+        return [Rating(**db_rating) for db_rating in cursor.fetchall()]
 
-    wp10db = wp10_connect()
-    redis = redis_connect()
 
-    logger.info("Refreshing cached assessment numbers")
-    data = get_all_assessment_numbers(wp10db)
-    cache_assessment_numbers(redis, data)
-    logger.info("Refreshed cached assessment numbers for %d projects", len(data))
-    return data
+def get_project_ratings_by_articles(wp10db, project_name, articles):
+    """Returns the project's ratings of the given (namespace, article) pairs.
 
+    The result is a dict keyed by (r_namespace, r_article). Articles without a
+    rating are left out.
+    """
+    articles = list(articles)
+    if not articles:
+        return {}
 
-def get_project_ratings(wp10db, project_name):
     with wp10db.cursor() as cursor:
         cursor.execute(
             "SELECT * FROM " + Rating.table_name + """
       WHERE r_project = %(r_project)s
+        AND (r_namespace, r_article) IN %(articles)s
     """,
-            {"r_project": project_name},
+            {"r_project": project_name, "articles": articles},
         )
-        return [Rating(**db_rating) for db_rating in cursor.fetchall()]
+        return {
+            (db_rating["r_namespace"], db_rating["r_article"]): Rating(**db_rating)
+            for db_rating in cursor.fetchall()
+        }
+
+
+def iter_project_ratings(wp10db, project_name, chunk_size=RATING_READ_CHUNK_SIZE):
+    """Yields every rating of the project, ordered by (r_namespace, r_article).
+
+    The ratings are read in chunks that are each fetched completely, using the
+    primary key to resume after the last row of the previous chunk. That keeps
+    memory bounded and, unlike a single streaming cursor, leaves the connection
+    free for writes between chunks.
+    """
+    last = None
+    while True:
+        query = (
+            "SELECT * FROM " + Rating.table_name + " WHERE r_project = %(r_project)s"
+        )
+        params = {"r_project": project_name, "limit": chunk_size}
+        if last is not None:
+            query += (
+                " AND (r_namespace > %(r_namespace)s OR"
+                " (r_namespace = %(r_namespace)s AND r_article > %(r_article)s))"
+            )
+            params["r_namespace"] = last.r_namespace
+            params["r_article"] = last.r_article
+        query += " ORDER BY r_namespace, r_article LIMIT %(limit)s"
+
+        with wp10db.cursor() as cursor:
+            cursor.execute(query, params)
+            ratings = [Rating(**db_rating) for db_rating in cursor.fetchall()]
+
+        yield from ratings
+        if len(ratings) < chunk_size:
+            break
+        last = ratings[-1]
+
+
+# Sort key expressions of the articles listing. A rating with no global
+# ranking has UNRANKED, which sorts after every real one.
+_QUALITY_RANK = "rating_a.r_quality_rank"
+_IMPORTANCE_RANK = "rating_a.r_importance_rank"
+
+
+def _sort_keys(quality=None, importance=None, project_b_name=None):
+    """Returns the (expression, descending, token field) sort keys of a listing.
+
+    The article and namespace come last, so that every rating has a unique
+    position and can be resumed from with an after token.
+    """
+    keys = []
+    if project_b_name is None:
+        if quality is None:
+            keys.append((_QUALITY_RANK, True, "quality_rank"))
+        if importance is None:
+            keys.append((_IMPORTANCE_RANK, True, "importance_rank"))
+    keys.append(("rating_a.r_article", False, "article"))
+    keys.append(("rating_a.r_namespace", False, "namespace"))
+    return keys
+
+
+def _keyset_clause(keys):
+    """Returns the condition selecting the rows after the %(after_*)s values."""
+    alternatives = []
+    for n, (expr, descending, field) in enumerate(keys):
+        terms = [
+            "%s = %%(after_%s)s" % (prev_expr, prev_field)
+            for prev_expr, _, prev_field in keys[:n]
+        ]
+        terms.append("%s %s %%(after_%s)s" % (expr, "<" if descending else ">", field))
+        alternatives.append("(" + " AND ".join(terms) + ")")
+    return " AND (" + " OR ".join(alternatives) + ")"
+
+
+def encode_after(quality_rank, importance_rank, article, namespace):
+    """Returns the opaque token of the listing position after the given rating.
+
+    The rankings are None when the listing isn't sorted by them.
+    """
+    payload = json.dumps(
+        [
+            quality_rank,
+            importance_rank,
+            article.decode("utf-8", "surrogateescape"),
+            namespace,
+        ],
+        separators=(",", ":"),
+    )
+    token = base64.urlsafe_b64encode(payload.encode("ascii")).decode("ascii")
+    return token.rstrip("=")
+
+
+def decode_after(token):
+    """Returns the dict of sort key values in an after token.
+
+    Raises ValueError if the token is malformed.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = base64.urlsafe_b64decode(padded.encode("ascii"))
+        quality_rank, importance_rank, article, namespace = json.loads(payload)
+    except (binascii.Error, UnicodeError, ValueError, TypeError) as e:
+        raise ValueError("Invalid after token: %r" % token) from e
+
+    for rank in (quality_rank, importance_rank):
+        if rank is not None and type(rank) is not int:
+            raise ValueError("Invalid after token: %r" % token)
+    if type(namespace) is not int or not isinstance(article, str):
+        raise ValueError("Invalid after token: %r" % token)
+
+    return {
+        "quality_rank": quality_rank,
+        "importance_rank": importance_rank,
+        "article": article.encode("utf-8", "surrogateescape"),
+        "namespace": namespace,
+    }
 
 
 def _project_rating_query(
@@ -121,7 +221,11 @@ def _project_rating_query(
     page=None,
     count=False,
     limit=100,
+    after=None,
+    pattern_trigrams=None,
 ):
+    keys = _sort_keys(quality, importance, project_b_name)
+
     if count:
         query = "SELECT COUNT(*) as count FROM " + Rating.table_name + " as rating_a"
     else:
@@ -129,7 +233,8 @@ def _project_rating_query(
             query = (
                 "SELECT r_project, r_namespace, r_article,"
                 " r_score, r_quality, r_quality_timestamp,"
-                " r_importance, r_importance_timestamp"
+                " r_importance, r_importance_timestamp,"
+                " r_quality_rank, r_importance_rank"
                 " FROM " + Rating.table_name + " as rating_a"
             )
         else:
@@ -149,23 +254,15 @@ def _project_rating_query(
             " AND rating_a.r_namespace = rating_b.r_namespace"
         )
 
-    if project_b_name is None:
-        if importance is None:
-            query += (
-                " LEFT JOIN global_rankings gri ON gri.gr_rating = r_importance"
-                '   AND gri.gr_type = "importance"'
-            )
-        if quality is None:
-            query += (
-                " LEFT JOIN global_rankings grq ON grq.gr_rating = rating_a.r_quality"
-                '   AND grq.gr_type = "quality" '
-            )
-
     query += " WHERE rating_a.r_project = %(r_project)s"
     if project_b_name is not None:
         query += " AND rating_b.r_project = %(r_project_b)s"
 
     if pattern is not None:
+        if pattern_trigrams:
+            query += logic_title_search.search_clause(
+                len(pattern_trigrams), "rating_a.r_article", "rating_a.r_namespace"
+            )
         query += " AND rating_a.r_article LIKE %(article_pattern_compiled)s"
 
     if quality is not None:
@@ -185,17 +282,18 @@ def _project_rating_query(
         if importance_b is not None:
             query += " AND rating_b.r_importance = %(r_importance_b)s"
 
-    if project_b_name is None:
-        if quality is None and importance is None:
-            query += (
-                " ORDER BY grq.gr_ranking DESC, gri.gr_ranking DESC, rating_a.r_article"
-            )
-        elif quality is None:
-            query += " ORDER BY grq.gr_ranking DESC, rating_a.r_article"
-        elif importance is None:
-            query += " ORDER BY gri.gr_ranking DESC, rating_a.r_article"
+    if count:
+        logger.debug(query)
+        return query
+
+    if after is not None:
+        query += _keyset_clause(keys)
+
+    query += " ORDER BY " + ", ".join(
+        expr + (" DESC" if descending else "") for expr, descending, _ in keys
+    )
 
-    if page is not None:
+    if page is not None and after is None:
         page = int(page) - 1
         query += " LIMIT %s,%s" % (page * limit, limit)
     else:
@@ -205,6 +303,48 @@ def _project_rating_query(
     return query
 
 
+def _pattern_params(wp10db, project_name, pattern):
+    """Returns the trigrams to look up and the query params for pattern.
+
+    There are no trigrams if the pattern is too short, or if the project's
+    titles aren't in the search index yet (see logic.title_search).
+    """
+    if pattern is None:
+        return [], {}
+
+    pattern = logic_title_search.normalize_pattern(pattern)
+    params = {"article_pattern_compiled": logic_title_search.like_pattern(pattern)}
+    trigrams = logic_title_search.search_trigrams(pattern)
+    if trigrams and not logic_title_search.is_project_indexed(wp10db, project_name):
+        trigrams = []
+    for n, trigram in enumerate(trigrams):
+        params["trigram_%d" % n] = trigram
+    return trigrams, params
+
+
+def _count_from_project_stats(wp10db, project_name, quality, importance):
+    """Returns the number of ratings from the project's count matrix.
+
+    Returns None if the project has no matrix yet, which is the case until
+    the end of its first update.
+    """
+    stats = logic_project_stats.get_project_stats(wp10db, project_name)
+    if not stats:
+        return None
+
+    total = 0
+    for row in stats:
+        if quality == b"Assessed-Class":
+            if row["q"] == b"Unassessed-Class":
+                continue
+        elif quality is not None and row["q"] != quality:
+            continue
+        if importance is not None and row["i"] != importance:
+            continue
+        total += row["n"]
+    return total
+
+
 def get_project_rating_count_by_type(
     wp10db,
     project_name,
@@ -215,6 +355,14 @@ def get_project_rating_count_by_type(
     importance_b=None,
     pattern=None,
 ):
+    if project_b_name is None and pattern is None:
+        # Unfiltered listings are counted from the materialized count matrix
+        # instead of a COUNT(*) over the project's ratings.
+        total = _count_from_project_stats(wp10db, project_name, quality, importance)
+        if total is not None:
+            return total
+
+    pattern_trigrams, pattern_params = _pattern_params(wp10db, project_name, pattern)
     query = _project_rating_query(
         project_name,
         quality=quality,
@@ -224,6 +372,7 @@ def get_project_rating_count_by_type(
         importance_b=importance_b,
         pattern=pattern,
         count=True,
+        pattern_trigrams=pattern_trigrams,
     )
 
     params = {
@@ -232,8 +381,7 @@ def get_project_rating_count_by_type(
         "r_importance": importance,
     }
 
-    if pattern is not None:
-        params["article_pattern_compiled"] = "%" + pattern + "%"
+    params.update(pattern_params)
     if project_b_name is not None:
         params["r_project_b"] = project_b_name
     if quality_b is not None:
@@ -247,7 +395,7 @@ def get_project_rating_count_by_type(
         return res["count"]
 
 
-def get_project_rating_by_type(
+def get_project_rating_page(
     wp10db,
     project_name,
     quality=None,
@@ -258,7 +406,15 @@ def get_project_rating_by_type(
     pattern=None,
     page=None,
     limit=100,
+    after=None,
 ):
+    """Returns a page of the project's ratings and the token of the next page.
+
+    The page starts after the position in the after token if it is given
+    (see decode_after), and at the given page number otherwise. The returned
+    token is None on the last page. Raises ValueError if after is invalid, or
+    was made for a listing with a different sort order.
+    """
     try:
         limit = int(limit)
     except ValueError:
@@ -268,6 +424,15 @@ def get_project_rating_by_type(
     if limit > 500:
         limit = 500
 
+    keys = _sort_keys(quality, importance, project_b_name)
+    after_values = None
+    if after is not None:
+        after_values = decode_after(after)
+        for _, _, field in keys:
+            if after_values[field] is None:
+                raise ValueError("after token doesn't match the listing: %r" % after)
+
+    pattern_trigrams, pattern_params = _pattern_params(wp10db, project_name, pattern)
     query = _project_rating_query(
         project_name,
         quality=quality,
@@ -278,6 +443,8 @@ def get_project_rating_by_type(
         pattern=pattern,
         page=page,
         limit=limit,
+        after=after_values,
+        pattern_trigrams=pattern_trigrams,
     )
     params = {
         "r_project": project_name,
@@ -285,32 +452,186 @@ def get_project_rating_by_type(
         "r_importance": importance,
     }
 
-    if pattern is not None:
-        params["article_pattern_compiled"] = "%" + pattern + "%"
+    params.update(pattern_params)
     if project_b_name is not None:
         params["r_project_b"] = project_b_name
     if quality_b is not None:
         params["r_quality_b"] = quality_b
     if importance_b is not None:
         params["r_importance_b"] = importance_b
+    if after_values is not None:
+        for _, _, field in keys:
+            params["after_" + field] = after_values[field]
 
     with wp10db.cursor() as cursor:
         cursor.execute(query, params)
         if project_b_name is None:
-            return [Rating(**db_rating) for db_rating in cursor.fetchall()]
-
-        results = []
-        for res in cursor.fetchall():
-            rating_b = Rating(
-                r_project=res.pop("rating_b.r_project"),
-                r_article=res.pop("rating_b.r_article"),
-                r_namespace=res.pop("rating_b.r_namespace"),
-                r_quality=res.pop("rating_b.r_quality"),
-                r_importance=res.pop("rating_b.r_importance"),
+            results = [Rating(**db_rating) for db_rating in cursor.fetchall()]
+            last = results[-1] if results else None
+        else:
+            results = []
+            for res in cursor.fetchall():
+                rating_b = Rating(
+                    r_project=res.pop("rating_b.r_project"),
+                    r_article=res.pop("rating_b.r_article"),
+                    r_namespace=res.pop("rating_b.r_namespace"),
+                    r_quality=res.pop("rating_b.r_quality"),
+                    r_importance=res.pop("rating_b.r_importance"),
+                )
+                rating_a = Rating(**res)
+                results.append((rating_a, rating_b))
+            last = results[-1][0] if results else None
+
+    next_after = None
+    if len(results) == limit and last is not None:
+        fields = set(field for _, _, field in keys)
+        next_after = encode_after(
+            last.r_quality_rank if "quality_rank" in fields else None,
+            last.r_importance_rank if "importance_rank" in fields else None,
+            last.r_article,
+            last.r_namespace,
+        )
+    return results, next_after
+
+
+def get_project_rating_by_type(
+    wp10db,
+    project_name,
+    quality=None,
+    importance=None,
+    project_b_name=None,
+    quality_b=None,
+    importance_b=None,
+    pattern=None,
+    page=None,
+    limit=100,
+    after=None,
+):
+    results, _ = get_project_rating_page(
+        wp10db,
+        project_name,
+        quality=quality,
+        importance=importance,
+        project_b_name=project_b_name,
+        quality_b=quality_b,
+        importance_b=importance_b,
+        pattern=pattern,
+        page=page,
+        limit=limit,
+        after=after,
+    )
+    return results
+
+
+def _iter_cell_titles(
+    wp10db, project_name, quality, importance, chunk_size=RATING_READ_CHUNK_SIZE
+):
+    """Yields the (namespace, article) of every rating in the cell.
+
+    Reads in chunks, in the order of the (project, quality, importance) index.
+    """
+    last = (b"", -1)
+    while True:
+        with wp10db.cursor() as cursor:
+            cursor.execute(
+                """
+            SELECT r_namespace, r_article FROM ratings
+            WHERE r_project = %(r_project)s AND r_quality = %(r_quality)s AND
+                  r_importance = %(r_importance)s AND
+                  (r_article > %(r_article)s OR
+                   (r_article = %(r_article)s AND r_namespace > %(r_namespace)s))
+            ORDER BY r_article, r_namespace
+            LIMIT %(limit)s
+        """,
+                {
+                    "r_project": project_name,
+                    "r_quality": quality,
+                    "r_importance": importance,
+                    "r_article": last[0],
+                    "r_namespace": last[1],
+                    "limit": chunk_size,
+                },
+            )
+            rows = cursor.fetchall()
+
+        for row in rows:
+            yield row["r_namespace"], row["r_article"]
+        if len(rows) < chunk_size:
+            break
+        last = (rows[-1]["r_article"], rows[-1]["r_namespace"])
+
+
+def _pick_cell(stats, quality, importance):
+    """Returns a random cell of the count matrix, weighted by its count.
+
+    Only the cells matching quality and importance are picked. Returns None if
+    none of them has ratings.
+    """
+    cells = [
+        row
+        for row in stats
+        if (not quality or row["q"] == quality)
+        and (not importance or row["i"] == importance)
+    ]
+    total = sum(row["n"] for row in cells)
+    if total == 0:
+        return None
+
+    pick = random.randrange(total)
+    for row in cells:
+        if pick < row["n"]:
+            return row
+        pick -= row["n"]
+
+
+def _sample_random_article(wp10db, redis, project_name, quality, importance):
+    """Returns (sampled, rating) from the cached sets of rating_sample_cache.
+
+    sampled is False if no rating could be sampled, because the project has
+    no count matrix yet, a set is being built or the sets are out of date.
+    """
+    stats = logic_project_stats.get_project_stats(wp10db, project_name)
+    if not stats:
+        return False, None
+
+    for _ in range(RANDOM_ARTICLE_SAMPLE_ATTEMPTS):
+        cell = _pick_cell(stats, quality, importance)
+        if cell is None:
+            return True, None
+
+        title = rating_sample_cache.sample(redis, project_name, cell["q"], cell["i"])
+        if title is None:
+            built = rating_sample_cache.build_cell(
+                redis,
+                project_name,
+                cell["q"],
+                cell["i"],
+                _iter_cell_titles(wp10db, project_name, cell["q"], cell["i"]),
+            )
+            if built is None:
+                # Another request is building the cell, don't wait for it.
+                return False, None
+            title = rating_sample_cache.sample(
+                redis, project_name, cell["q"], cell["i"]
             )
-            rating_a = Rating(**res)
-            results.append((rating_a, rating_b))
-        return results
+            if title is None:
+                continue
+
+        rating = get_project_ratings_by_articles(wp10db, project_name, [title]).get(
+            title
+        )
+        if (
+            rating is not None
+            and rating.r_quality == cell["q"]
+            and rating.r_importance == cell["i"]
+        ):
+            return True, rating
+        # Deleted or reassessed by an update since the set was built.
+        rating_sample_cache.discard(
+            redis, project_name, cell["q"], cell["i"], title[0], title[1]
+        )
+
+    return False, None
 
 
 def get_random_article(
@@ -318,17 +639,22 @@ def get_random_article(
     project_name,
     quality=None,
     importance=None,
+    redis=None,
 ):
     """
     Get a random article matching the given criteria.
-    Uses COUNT + OFFSET to avoid ORDER BY RAND().
 
-    The existing PRIMARY KEY (r_project, r_namespace, r_article) ensures
-    efficient index usage without requiring additional indices.
+    With redis, the article is sampled in constant time from cached sets of
+    the project's ratings (see rating_sample_cache). Otherwise, or if that
+    fails, uses COUNT + OFFSET, which avoids ORDER BY RAND() but still walks
+    every skipped rating.
     """
-    import random
-
-    from wp1.models.wp10.rating import Rating
+    if redis is not None:
+        sampled, rating = _sample_random_article(
+            wp10db, redis, project_name, quality, importance
+        )
+        if sampled:
+            return rating
 
     # Build WHERE clause
     conditions = ["r_project = %s"]
@@ -385,147 +711,296 @@ def get_all_ratings_count_for_project(wp10db, project_name):
         return res["count"]
 
 
-def insert_or_update(wp10db, rating, kind):
-    duplicate_clause = ""
-    if kind == AssessmentKind.QUALITY:
-        duplicate_clause = """
-      ON DUPLICATE KEY UPDATE r_quality=%(r_quality)s,
-                              r_quality_timestamp=%(r_quality_timestamp)s
-    """
-    elif kind == AssessmentKind.IMPORTANCE:
-        duplicate_clause = """
-      ON DUPLICATE KEY UPDATE r_importance=%(r_importance)s,
-                              r_importance_timestamp=%(r_importance_timestamp)s
-    """
-    elif kind == AssessmentKind.BOTH:
-        duplicate_clause = """
-      ON DUPLICATE KEY UPDATE r_quality=%(r_quality)s,
-                              r_quality_timestamp=%(r_quality_timestamp)s,
-                              r_importance=%(r_importance)s,
-                              r_importance_timestamp=%(r_importance_timestamp)s
+_INSERT_RATING = """
+        INSERT INTO ratings
+          (r_project, r_namespace, r_article, r_score, r_quality,
+           r_quality_timestamp, r_importance, r_importance_timestamp,
+           r_quality_rank, r_importance_rank)
+        VALUES
+          (%(r_project)s, %(r_namespace)s, %(r_article)s, %(r_score)s,
+           %(r_quality)s, %(r_quality_timestamp)s, %(r_importance)s,
+           %(r_importance_timestamp)s, %(r_quality_rank)s, %(r_importance_rank)s)
     """
-    else:
-        raise ValueError("AssessmentKind was not QUALITY or IMPORTANCE: %s", kind)
 
-    with wp10db.cursor() as cursor:
-        cursor.execute(
-            """
+# Same as _INSERT_RATING, with the ranks looked up in global_rankings.
+_INSERT_RATING_LOOKUP_RANKS = """
         INSERT INTO ratings
           (r_project, r_namespace, r_article, r_score, r_quality,
-           r_quality_timestamp, r_importance, r_importance_timestamp)
+           r_quality_timestamp, r_importance, r_importance_timestamp,
+           r_quality_rank, r_importance_rank)
         VALUES
           (%(r_project)s, %(r_namespace)s, %(r_article)s, %(r_score)s,
            %(r_quality)s, %(r_quality_timestamp)s, %(r_importance)s,
-           %(r_importance_timestamp)s)
-    """ + duplicate_clause,
-            attr.asdict(rating),
-        )
+           %(r_importance_timestamp)s,
+           COALESCE((SELECT gr_ranking FROM global_rankings
+                     WHERE gr_type = 'quality' AND gr_rating = %(r_quality)s),
+                    %(unranked)s),
+           COALESCE((SELECT gr_ranking FROM global_rankings
+                     WHERE gr_type = 'importance' AND gr_rating = %(r_importance)s),
+                    %(unranked)s))
+    """
 
 
-def delete_empty_for_project(wp10db, project):
-    not_a_class_db = NOT_A_CLASS.encode("utf-8")
+def get_global_rankings(wp10db):
+    """Returns {(kind, rating): global ranking}, kind being like gr_type."""
     with wp10db.cursor() as cursor:
-        args = {"r_project": project.p_project, "not_a_class": not_a_class_db}
-        cursor.execute(
-            """
-        DELETE FROM ratings
-        WHERE r_project=%(r_project)s AND
-              (r_quality IS NULL OR r_quality=%(not_a_class)s) AND
-              (r_importance IS NULL OR r_importance=%(not_a_class)s)
-    """,
-            args,
-        )
-        return cursor.rowcount
+        cursor.execute("SELECT gr_type, gr_rating, gr_ranking FROM global_rankings")
+        return {
+            (row["gr_type"], row["gr_rating"]): row["gr_ranking"]
+            for row in cursor.fetchall()
+        }
 
 
-def update_null_quality_for_project(wp10db, project):
-    not_a_class_db = NOT_A_CLASS.encode("utf-8")
+def _set_ranks(rankings, row):
+    """Sets the ranking columns of the rating row from its quality/importance."""
+    row["r_quality_rank"] = rankings.get((b"quality", row["r_quality"]), UNRANKED)
+    row["r_importance_rank"] = rankings.get(
+        (b"importance", row["r_importance"]), UNRANKED
+    )
+
+
+def update_ranks_for_project(wp10db, project_name):
+    """Recomputes the ranking columns of every rating of the project.
+
+    Rating writes keep these columns up to date, this is only needed when
+    global_rankings itself changes, see update-rating-ranks.py. Does not
+    commit. Returns the number of ratings changed.
+    """
     with wp10db.cursor() as cursor:
-        args = {"r_project": project.p_project, "not_a_class": not_a_class_db}
         cursor.execute(
             """
         UPDATE ratings
-          SET r_quality = %(not_a_class)s,
-              r_quality_timestamp=r_importance_timestamp
-        WHERE r_project=%(r_project)s AND
-              r_quality IS NULL
+        LEFT JOIN global_rankings AS grq
+          ON grq.gr_type = 'quality' AND grq.gr_rating = r_quality
+        LEFT JOIN global_rankings AS gri
+          ON gri.gr_type = 'importance' AND gri.gr_rating = r_importance
+        SET r_quality_rank = COALESCE(grq.gr_ranking, %(unranked)s),
+            r_importance_rank = COALESCE(gri.gr_ranking, %(unranked)s)
+        WHERE r_project = %(r_project)s
     """,
-            args,
+            {"r_project": project_name, "unranked": UNRANKED},
         )
         return cursor.rowcount
 
 
-def update_null_importance_for_project(wp10db, project):
+_DUPLICATE_CLAUSES = {
+    AssessmentKind.QUALITY: """
+      ON DUPLICATE KEY UPDATE r_quality=VALUES(r_quality),
+                              r_quality_timestamp=VALUES(r_quality_timestamp),
+                              r_quality_rank=VALUES(r_quality_rank)
+    """,
+    AssessmentKind.IMPORTANCE: """
+      ON DUPLICATE KEY UPDATE r_importance=VALUES(r_importance),
+                              r_importance_timestamp=VALUES(r_importance_timestamp),
+                              r_importance_rank=VALUES(r_importance_rank)
+    """,
+    AssessmentKind.BOTH: """
+      ON DUPLICATE KEY UPDATE r_quality=VALUES(r_quality),
+                              r_quality_timestamp=VALUES(r_quality_timestamp),
+                              r_quality_rank=VALUES(r_quality_rank),
+                              r_importance=VALUES(r_importance),
+                              r_importance_timestamp=VALUES(r_importance_timestamp),
+                              r_importance_rank=VALUES(r_importance_rank)
+    """,
+}
+
+
+def insert_or_update(wp10db, rating, kind, rankings=None):
+    """Writes the rating, overwriting the columns of kind if it exists.
+
+    rankings is the result of get_global_rankings. If it isn't given, the ranks
+    are looked up by the INSERT itself, so that a single write is still a
+    single round trip. Callers writing many ratings should use a RatingWriter.
+    """
+    duplicate_clause = _DUPLICATE_CLAUSES.get(kind)
+    if duplicate_clause is None:
+        raise ValueError("AssessmentKind was not QUALITY or IMPORTANCE: %s", kind)
+
+    row = attr.asdict(rating)
+    if rankings is None:
+        insert = _INSERT_RATING_LOOKUP_RANKS
+        row["unranked"] = UNRANKED
+    else:
+        insert = _INSERT_RATING
+        _set_ranks(rankings, row)
+    with wp10db.cursor() as cursor:
+        cursor.execute(insert + duplicate_clause, row)
+    if rating.r_namespace == 0:
+        logic_global_articles.log_changed_articles(wp10db, [rating.r_article])
+
+
+def _upsert_rows(wp10db, rows, kind, rankings):
+    """Writes the rating rows, without logging them as changed articles."""
+    duplicate_clause = _DUPLICATE_CLAUSES.get(kind)
+    if duplicate_clause is None:
+        raise ValueError("AssessmentKind was not QUALITY or IMPORTANCE: %s", kind)
+
+    if not rows:
+        return
+
+    for row in rows:
+        _set_ranks(rankings, row)
+
+    # pymysql rewrites executemany on an INSERT ... VALUES statement into
+    # multi-row INSERTs, so this is a handful of round trips instead of one
+    # per rating.
+    with wp10db.cursor() as cursor:
+        cursor.executemany(_INSERT_RATING + duplicate_clause, rows)
+
+
+class RatingWriter:
+    """Buffers rating writes and flushes them to the database in batches.
+
+    Ratings are grouped by AssessmentKind, since the kind decides which columns
+    are overwritten when the row already exists. Every flush commits, so the
+    batch size also bounds the size of the open transaction. If changed_articles
+    is a set, the (namespace, article) of every written rating is added to it.
+    """
+
+    def __init__(
+        self, wp10db, batch_size=RATING_WRITE_BATCH_SIZE, changed_articles=None
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive: %s" % batch_size)
+        self.wp10db = wp10db
+        self.batch_size = batch_size
+        self.written = 0
+        self.changed_articles = changed_articles
+        self._pending = defaultdict(list)
+        self._num_pending = 0
+        # Loaded on the first flush, global_rankings doesn't change during an
+        # update.
+        self._rankings = None
+
+    def add(self, rating, kind):
+        if kind not in _DUPLICATE_CLAUSES:
+            raise ValueError("AssessmentKind was not QUALITY or IMPORTANCE: %s", kind)
+
+        # Snapshot the row now, so that later changes by the caller to the
+        # rating object don't leak into the buffered write.
+        self._pending[kind].append(attr.asdict(rating))
+        self._num_pending += 1
+        if self._num_pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._num_pending == 0:
+            return
+
+        self.wp10db.ping()
+        if self._rankings is None:
+            self._rankings = get_global_rankings(self.wp10db)
+        for kind, rows in self._pending.items():
+            _upsert_rows(self.wp10db, rows, kind, self._rankings)
+        # The rows of global_article_changes are shared by every project, so
+        # they are written once per flush, in sorted order (see
+        # log_changed_articles). Concurrent writers then lock them in the same
+        # order and can't deadlock each other.
+        logic_global_articles.log_changed_articles(
+            self.wp10db,
+            [
+                row["r_article"]
+                for rows in self._pending.values()
+                for row in rows
+                if row["r_namespace"] == 0
+            ],
+        )
+        self.wp10db.commit()
+
+        if self.changed_articles is not None:
+            self.changed_articles.update(
+                (row["r_namespace"], row["r_article"])
+                for rows in self._pending.values()
+                for row in rows
+            )
+        self.written += self._num_pending
+        self._pending = defaultdict(list)
+        self._num_pending = 0
+
+
+def delete_empty_for_project(wp10db, project):
     not_a_class_db = NOT_A_CLASS.encode("utf-8")
     with wp10db.cursor() as cursor:
         args = {"r_project": project.p_project, "not_a_class": not_a_class_db}
         cursor.execute(
             """
-        UPDATE ratings
-          SET r_importance = %(not_a_class)s,
-              r_importance_timestamp=r_quality_timestamp
+        DELETE FROM ratings
         WHERE r_project=%(r_project)s AND
-              r_importance IS NULL
+              (r_quality IS NULL OR r_quality=%(not_a_class)s) AND
+              (r_importance IS NULL OR r_importance=%(not_a_class)s)
     """,
             args,
         )
         return cursor.rowcount
 
 
-def count_for_project(wp10db, project):
-    with wp10db.cursor() as cursor:
-        cursor.execute(
-            """
-        SELECT COUNT(*) as cnt FROM ratings
-        WHERE r_project=%(r_project)s
-    """,
-            {"r_project": project.p_project},
-        )
-        return cursor.fetchone()["cnt"]
-
-
-def count_unassessed_quality_for_project(wp10db, project):
+def update_null_quality_for_project(wp10db, project):
     not_a_class_db = NOT_A_CLASS.encode("utf-8")
-    unassessed_db = UNASSESSED_CLASS.encode("utf-8")
+    # NotA-Class can map to a global ranking where NULL didn't.
+    logic_global_articles.log_project_rating_changed(
+        wp10db, project.p_project, "quality", None
+    )
     with wp10db.cursor() as cursor:
         args = {
             "r_project": project.p_project,
             "not_a_class": not_a_class_db,
-            "unassessed": unassessed_db,
+            "unranked": UNRANKED,
         }
         cursor.execute(
             """
-        SELECT COUNT(*) as cnt FROM ratings
-        WHERE (r_quality = %(not_a_class)s OR r_quality = %(unassessed)s) AND
-              r_project = %(r_project)s
+        UPDATE ratings
+          SET r_quality = %(not_a_class)s,
+              r_quality_timestamp=r_importance_timestamp,
+              r_quality_rank = COALESCE(
+                (SELECT gr_ranking FROM global_rankings
+                 WHERE gr_type = 'quality' AND gr_rating = %(not_a_class)s),
+                %(unranked)s)
+        WHERE r_project=%(r_project)s AND
+              r_quality IS NULL
     """,
             args,
         )
-        return cursor.fetchone()["cnt"]
+        return cursor.rowcount
 
 
-def count_unassessed_importance_for_project(wp10db, project):
+def update_null_importance_for_project(wp10db, project):
     not_a_class_db = NOT_A_CLASS.encode("utf-8")
-    unassessed_db = UNASSESSED_CLASS.encode("utf-8")
+    # NotA-Class can map to a global ranking where NULL didn't.
+    logic_global_articles.log_project_rating_changed(
+        wp10db, project.p_project, "importance", None
+    )
     with wp10db.cursor() as cursor:
         args = {
             "r_project": project.p_project,
             "not_a_class": not_a_class_db,
-            "unassessed": unassessed_db,
+            "unranked": UNRANKED,
         }
         cursor.execute(
             """
-        SELECT COUNT(*) as cnt FROM ratings
-        WHERE (r_importance = %(not_a_class)s OR
-               r_importance = %(unassessed)s) AND
-              r_project = %(r_project)s
+        UPDATE ratings
+          SET r_importance = %(not_a_class)s,
+              r_importance_timestamp=r_quality_timestamp,
+              r_importance_rank = COALESCE(
+                (SELECT gr_ranking FROM global_rankings
+                 WHERE gr_type = 'importance' AND gr_rating = %(not_a_class)s),
+                %(unranked)s)
+        WHERE r_project=%(r_project)s AND
+              r_importance IS NULL
     """,
             args,
         )
-        return cursor.fetchone()["cnt"]
+        return cursor.rowcount
 
 
-def add_log_for_rating(redis, new_rating, kind, old_rating_value):
+def add_log_for_rating(
+    redis, new_rating, kind, old_rating_value, log_writer=None, update_dt=None
+):
+    """Logs the change of the rating of kind from old_rating_value.
+
+    The log is added to log_writer if given, and written to redis otherwise.
+    It is timestamped with update_dt, the start of the project update, or the
+    start of the process if that isn't given.
+    """
     if kind == AssessmentKind.QUALITY:
         action = b"quality"
         timestamp = new_rating.r_quality_timestamp
@@ -541,10 +1016,17 @@ def add_log_for_rating(redis, new_rating, kind, old_rating_value):
         l_project=new_rating.r_project,
         l_namespace=new_rating.r_namespace,
         l_article=new_rating.r_article,
-        l_timestamp=GLOBAL_TIMESTAMP,
+        l_timestamp=(
+            GLOBAL_TIMESTAMP
+            if update_dt is None
+            else update_dt.strftime(TS_FORMAT_WP10).encode("utf-8")
+        ),
         l_action=action,
         l_old=old_rating_value,
         l_new=new,
         l_revision_timestamp=timestamp,
     )
-    logic_log.insert_or_update(redis, log)
+    if log_writer is not None:
+        log_writer.add(log)
+    else:
+        logic_log.insert_or_update(redis, log)
@@ -1,7 +1,16 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from wp1 import rating_sample_cache
 from wp1.base_db_test import BaseWpOneDbTest
-from wp1.constants import AssessmentKind
+from wp1.constants import UNRANKED, AssessmentKind
 from wp1.logic import log as logic_log
+from wp1.logic import project as logic_project
+from wp1.logic import project_stats as logic_project_stats
 from wp1.logic import rating as logic_rating
+from wp1.logic import title_search as logic_title_search
+from wp1.models.wp10.project import Project
 from wp1.models.wp10.rating import Rating
 
 
@@ -51,6 +60,49 @@ class LogicRatingTest(BaseWpOneDbTest):
         self.assertEqual(b"NotA-Class", log.l_old)
         self.assertEqual(b"importance", log.l_action)
 
+    def test_add_log_for_rating_with_log_writer(self):
+        rating = Rating(
+            r_project=b"Test Project",
+            r_namespace=0,
+            r_article=b"Testing Stuff",
+            r_quality=b"GA-Class",
+            r_quality_timestamp=b"2018-04-01T12:30:00Z",
+        )
+        log_writer = logic_log.LogWriter(self.redis)
+
+        logic_rating.add_log_for_rating(
+            self.redis,
+            rating,
+            AssessmentKind.QUALITY,
+            b"NotA-Class",
+            log_writer=log_writer,
+        )
+
+        self.assertEqual([], logic_log.get_logs(self.redis, article=b"Testing Stuff"))
+        log_writer.flush()
+        logs = logic_log.get_logs(self.redis, article=b"Testing Stuff")
+        self.assertEqual(1, len(logs))
+        self.assertEqual(b"GA-Class", logs[0].l_new)
+
+    def test_add_log_for_rating_update_dt(self):
+        rating = Rating(
+            r_project=b"Test Project",
+            r_namespace=0,
+            r_article=b"Testing Stuff",
+            r_quality=b"GA-Class",
+            r_quality_timestamp=b"2018-04-01T12:30:00Z",
+        )
+        logic_rating.add_log_for_rating(
+            self.redis,
+            rating,
+            AssessmentKind.QUALITY,
+            b"NotA-Class",
+            update_dt=datetime(2026, 10, 19, 0, 5, 30),
+        )
+
+        logs = logic_log.get_logs(self.redis, article=b"Testing Stuff")
+        self.assertEqual(b"20261019000530", logs[0].l_timestamp)
+
 
 class GetProjectRatingByTypeTest(BaseWpOneDbTest):
 
@@ -112,6 +164,8 @@ class GetProjectRatingByTypeTest(BaseWpOneDbTest):
                 " %(r_importance_timestamp)s)",
                 ratings,
             )
+        for i in range(10):
+            logic_rating.update_ranks_for_project(self.wp10db, b"Project %d" % i)
         self.wp10db.commit()
 
     def test_no_quality_or_importance(self):
@@ -250,6 +304,43 @@ class GetProjectRatingByTypeTest(BaseWpOneDbTest):
 
         self.assertEqual(0, len(ratings))
 
+    def test_article_pattern_indexed(self):
+        self._add_ratings()
+        logic_title_search.index_project_titles(self.wp10db, b"Project 0")
+
+        ratings = logic_rating.get_project_rating_by_type(
+            self.wp10db, b"Project 0", pattern="A-Class High", limit=500
+        )
+        count = logic_rating.get_project_rating_count_by_type(
+            self.wp10db, b"Project 0", pattern="A-Class High"
+        )
+
+        # Matches the FA-Class articles too.
+        self.assertEqual(50, len(ratings))
+        self.assertEqual(50, count)
+        for rating in ratings:
+            self.assertIn(b"A-Class_High-Class_", rating.r_article)
+
+    def test_article_pattern_indexed_short(self):
+        self._add_ratings()
+        logic_title_search.index_project_titles(self.wp10db, b"Project 0")
+
+        ratings = logic_rating.get_project_rating_by_type(
+            self.wp10db, b"Project 0", pattern="_1", limit=500
+        )
+
+        # _10 to _19 and _1 of each of the 6 classes.
+        self.assertEqual(66, len(ratings))
+
+    def test_article_pattern_is_literal(self):
+        self._add_ratings()
+
+        ratings = logic_rating.get_project_rating_by_type(
+            self.wp10db, b"Project 0", pattern="Class%High", limit=500
+        )
+
+        self.assertEqual(0, len(ratings))
+
     def test_with_project_b_no_quality_importance(self):
         self._add_ratings()
         ratings = logic_rating.get_project_rating_by_type(
@@ -419,6 +510,145 @@ class GetProjectRatingByTypeTest(BaseWpOneDbTest):
             self.assertEqual(b"Project 0", r[0].r_project)
             self.assertEqual(b"Project 1", r[1].r_project)
 
+    def _all_pages(self, limit, **kwargs):
+        ratings, after = logic_rating.get_project_rating_page(
+            self.wp10db, b"Project 0", limit=limit, **kwargs
+        )
+        pages = [ratings]
+        while after is not None:
+            ratings, after = logic_rating.get_project_rating_page(
+                self.wp10db, b"Project 0", limit=limit, after=after, **kwargs
+            )
+            pages.append(ratings)
+        return pages
+
+    def test_after_pages_through_listing(self):
+        self._add_ratings()
+        expected = logic_rating.get_project_rating_by_type(
+            self.wp10db, b"Project 0", limit=500
+        )
+
+        pages = self._all_pages(40)
+
+        self.assertEqual([40, 40, 40, 30], [len(p) for p in pages])
+        self.assertEqual(expected, [r for page in pages for r in page])
+
+    def test_after_pages_through_quality(self):
+        self._add_ratings()
+        expected = logic_rating.get_project_rating_by_type(
+            self.wp10db, b"Project 0", quality=b"FA-Class", limit=500
+        )
+
+        pages = self._all_pages(20, quality=b"FA-Class")
+
+        self.assertEqual(expected, [r for page in pages for r in page])
+
+    def test_after_pages_through_quality_and_importance(self):
+        self._add_ratings()
+
+        pages = self._all_pages(10, quality=b"A-Class", importance=b"Low-Class")
+
+        articles = [r.r_article for page in pages for r in page]
+        self.assertEqual(25, len(articles))
+        self.assertEqual(sorted(articles), articles)
+
+    def test_after_pages_through_project_b(self):
+        self._add_ratings()
+
+        pages = self._all_pages(60, project_b_name=b"Project 1", quality_b="B-Class")
+
+        articles = [r[0].r_article for page in pages for r in page]
+        self.assertEqual(50, len(articles))
+        self.assertEqual(sorted(articles), articles)
+
+    def test_page_next_none_on_last_page(self):
+        self._add_ratings()
+
+        _, after = logic_rating.get_project_rating_page(
+            self.wp10db, b"Project 0", page=2
+        )
+
+        self.assertIsNone(after)
+
+    def test_after_invalid(self):
+        self._add_ratings()
+
+        with self.assertRaises(ValueError):
+            logic_rating.get_project_rating_page(
+                self.wp10db, b"Project 0", after="not a token"
+            )
+
+    def test_after_from_other_listing(self):
+        self._add_ratings()
+        _, after = logic_rating.get_project_rating_page(
+            self.wp10db, b"Project 0", quality=b"FA-Class", limit=10
+        )
+
+        # The token has no quality ranking to resume the unfiltered listing.
+        with self.assertRaises(ValueError):
+            logic_rating.get_project_rating_page(self.wp10db, b"Project 0", after=after)
+
+    def test_count_from_project_stats(self):
+        self._add_ratings(use_unassessed=True)
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO project_stats"
+                "  (pst_project, pst_quality, pst_importance, pst_count)"
+                " VALUES ('Project 0', 'FA-Class', 'High-Class', 7),"
+                "   ('Project 0', 'Unassessed-Class', 'High-Class', 2),"
+                "   ('Project 0', 'B-Class', 'Low-Class', 3)"
+            )
+
+        count = logic_rating.get_project_rating_count_by_type
+        self.assertEqual(12, count(self.wp10db, b"Project 0"))
+        self.assertEqual(7, count(self.wp10db, b"Project 0", quality=b"FA-Class"))
+        self.assertEqual(9, count(self.wp10db, b"Project 0", importance=b"High-Class"))
+        self.assertEqual(
+            10, count(self.wp10db, b"Project 0", quality=b"Assessed-Class")
+        )
+
+    def test_count_without_project_stats(self):
+        self._add_ratings()
+
+        actual = logic_rating.get_project_rating_count_by_type(
+            self.wp10db, b"Project 0", quality=b"FA-Class"
+        )
+
+        self.assertEqual(50, actual)
+
+
+class AfterTokenTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        token = logic_rating.encode_after(500, None, b"Caf\xc3\xa9 / \xff", 1)
+
+        self.assertEqual(
+            {
+                "quality_rank": 500,
+                "importance_rank": None,
+                "article": b"Caf\xc3\xa9 / \xff",
+                "namespace": 1,
+            },
+            logic_rating.decode_after(token),
+        )
+
+    def test_token_is_url_safe(self):
+        token = logic_rating.encode_after(1, 2, b"???>>>~~~", 0)
+
+        self.assertRegex(token, r"^[A-Za-z0-9_-]+$")
+
+    def test_decode_invalid(self):
+        for token in (
+            "",
+            "not a token",
+            logic_rating.encode_after(1, 2, b"A", 0)[:-3],
+            "WzEsMl0",  # [1,2]
+            "WyJ4IiwyLCJBIiwwXQ",  # ["x",2,"A",0]
+        ):
+            with self.subTest(token=token):
+                with self.assertRaises(ValueError):
+                    logic_rating.decode_after(token)
+
 
 class GetRandomArticleTest(BaseWpOneDbTest):
 
@@ -529,14 +759,111 @@ class GetRandomArticleTest(BaseWpOneDbTest):
         article = logic_rating.get_random_article(self.wp10db, b"Nonexistent Project")
         self.assertIsNone(article)
 
+    def _add_ratings_with_stats(self):
+        self._add_ratings()
+        logic_project_stats.refresh_project_stats(self.wp10db, b"Project 0")
+        self.wp10db.commit()
+
+    def test_sampled(self):
+        self._add_ratings_with_stats()
+
+        article = logic_rating.get_random_article(
+            self.wp10db, b"Project 0", quality=b"B-Class", redis=self.redis
+        )
+
+        self.assertEqual(b"Project 0", article.r_project)
+        self.assertEqual(b"B-Class", article.r_quality)
+        self.assertEqual(
+            25,
+            self.redis.scard(
+                rating_sample_cache.cell_key(
+                    b"Project 0", b"B-Class", article.r_importance
+                )
+            ),
+        )
+
+    def test_sampled_quality_and_importance(self):
+        self._add_ratings_with_stats()
+
+        for _ in range(5):
+            article = logic_rating.get_random_article(
+                self.wp10db,
+                b"Project 0",
+                quality=b"A-Class",
+                importance=b"Low-Class",
+                redis=self.redis,
+            )
+            self.assertEqual(b"A-Class", article.r_quality)
+            self.assertEqual(b"Low-Class", article.r_importance)
+
+    def test_sampled_no_results(self):
+        self._add_ratings_with_stats()
+
+        article = logic_rating.get_random_article(
+            self.wp10db, b"Project 0", quality=b"Foo-Class", redis=self.redis
+        )
+
+        self.assertIsNone(article)
+
+    def test_sampled_skips_reassessed(self):
+        self._add_ratings_with_stats()
+        logic_rating.get_random_article(
+            self.wp10db,
+            b"Project 0",
+            quality=b"FA-Class",
+            importance=b"High-Class",
+            redis=self.redis,
+        )
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE ratings SET r_quality = 'C-Class' WHERE r_project = "
+                "'Project 0' AND r_article != 'FA-Class_High-Class_0'"
+            )
+        self.wp10db.commit()
+
+        article = logic_rating.get_random_article(
+            self.wp10db,
+            b"Project 0",
+            quality=b"FA-Class",
+            importance=b"High-Class",
+            redis=self.redis,
+        )
+
+        self.assertEqual(b"FA-Class_High-Class_0", article.r_article)
+
+    def test_sampled_without_stats_uses_sql(self):
+        self._add_ratings()
+
+        article = logic_rating.get_random_article(
+            self.wp10db, b"Project 0", quality=b"B-Class", redis=self.redis
+        )
+
+        self.assertEqual(b"B-Class", article.r_quality)
+        self.assertEqual([], self.redis.keys())
+
+    def test_sampled_while_building_uses_sql(self):
+        self._add_ratings_with_stats()
+        cell_key = rating_sample_cache.cell_key(b"Project 0", b"B-Class", b"Low-Class")
+        self.redis.set(rating_sample_cache._build_lock_key(cell_key), b"other")
+
+        article = logic_rating.get_random_article(
+            self.wp10db,
+            b"Project 0",
+            quality=b"B-Class",
+            importance=b"Low-Class",
+            redis=self.redis,
+        )
+
+        self.assertEqual(b"B-Class", article.r_quality)
+        self.assertEqual(b"Low-Class", article.r_importance)
+        self.assertEqual(0, self.redis.scard(cell_key))
 
-class GetAllAssessmentNumbersTest(BaseWpOneDbTest):
 
-    # A rating is "unassessed" iff its quality is one of these; everything else
-    # counts as "assessed".
-    UNASSESSED = ("NotA-Class", "Unassessed-Class")
+class GetAllAssessmentNumbersTest(BaseWpOneDbTest):
 
-    def _add_ratings(self, project, qualities):
+    def _add_project(self, project, qualities):
+        """Adds ratings for the project and refreshes its record, as an update
+        does."""
         ratings = []
         for i, quality in enumerate(qualities):
             ratings.append(
@@ -562,14 +889,17 @@ class GetAllAssessmentNumbersTest(BaseWpOneDbTest):
                 " %(r_importance_timestamp)s)",
                 ratings,
             )
+        logic_project.update_project_record(
+            self.wp10db, Project(p_project=project.encode("utf-8")), {}
+        )
         self.wp10db.commit()
 
     def test_counts_assessed_and_unassessed(self):
-        self._add_ratings(
+        self._add_project(
             "Alpha",
             ("FA-Class", "A-Class", "B-Class", "NotA-Class", "Unassessed-Class"),
         )
-        self._add_ratings("Beta", ("GA-Class", "Unassessed-Class"))
+        self._add_project("Beta", ("GA-Class", "Unassessed-Class"))
 
         result = logic_rating.get_all_assessment_numbers(self.wp10db)
 
@@ -583,8 +913,8 @@ class GetAllAssessmentNumbersTest(BaseWpOneDbTest):
         )
 
     def test_orders_by_unassessed_descending(self):
-        self._add_ratings("Few", ("FA-Class", "Unassessed-Class"))
-        self._add_ratings(
+        self._add_project("Few", ("FA-Class", "Unassessed-Class"))
+        self._add_project(
             "Many", ("Unassessed-Class", "NotA-Class", "Unassessed-Class")
         )
 
@@ -592,12 +922,8 @@ class GetAllAssessmentNumbersTest(BaseWpOneDbTest):
 
         self.assertEqual([p for p, _, _ in result], ["Many", "Few"])
 
-    def test_returns_plain_ints_not_decimal(self):
-        # Regression test: the query casts SUM() to UNSIGNED so values come back
-        # as ints. Without the cast, the DECIMAL result is handed to pymysql as
-        # raw bytes on a use_unicode=False connection and Decimal(bytes) raises
-        # "conversion from bytes to Decimal is not supported" on Python 3.14.
-        self._add_ratings("Alpha", ("FA-Class", "Unassessed-Class"))
+    def test_returns_plain_ints(self):
+        self._add_project("Alpha", ("FA-Class", "Unassessed-Class"))
 
         result = logic_rating.get_all_assessment_numbers(self.wp10db)
 
@@ -606,7 +932,7 @@ class GetAllAssessmentNumbersTest(BaseWpOneDbTest):
         self.assertIsInstance(assessed, int)
 
     def test_decodes_project_name_to_str(self):
-        self._add_ratings("Alpha", ("FA-Class",))
+        self._add_project("Alpha", ("FA-Class",))
 
         result = logic_rating.get_all_assessment_numbers(self.wp10db)
 
@@ -616,76 +942,304 @@ class GetAllAssessmentNumbersTest(BaseWpOneDbTest):
         result = logic_rating.get_all_assessment_numbers(self.wp10db)
         self.assertEqual([], result)
 
-    def test_caches_result_in_redis(self):
-        self._add_ratings("Alpha", ("FA-Class", "Unassessed-Class"))
+    def test_skips_projects_without_ratings(self):
+        self._add_project("Empty", ())
 
-        result = logic_rating.get_all_assessment_numbers(self.wp10db, self.redis)
+        result = logic_rating.get_all_assessment_numbers(self.wp10db)
 
-        self.assertEqual(result, logic_rating.get_cached_assessment_numbers(self.redis))
+        self.assertEqual([], result)
 
-    def test_returns_cached_value_without_querying_db(self):
-        sentinel = [("Cached Project", 9, 99)]
-        logic_rating.cache_assessment_numbers(self.redis, sentinel)
-        # The DB has different (in fact, no) ratings, so a cache miss would
-        # return [] instead of the sentinel.
-        self._add_ratings("Alpha", ("FA-Class",))
+    def test_reflects_latest_project_update(self):
+        self._add_project("Alpha", ("FA-Class",))
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE ratings SET r_quality = 'Unassessed-Class' "
+                "WHERE r_project = 'Alpha'"
+            )
+        self.assertEqual(
+            [("Alpha", 0, 1)], logic_rating.get_all_assessment_numbers(self.wp10db)
+        )
 
-        result = logic_rating.get_all_assessment_numbers(self.wp10db, self.redis)
+        logic_project.update_project_record(
+            self.wp10db, Project(p_project=b"Alpha"), {}
+        )
 
-        self.assertEqual(sentinel, result)
+        self.assertEqual(
+            [("Alpha", 1, 0)], logic_rating.get_all_assessment_numbers(self.wp10db)
+        )
 
-    def test_no_redis_skips_cache(self):
-        self._add_ratings("Alpha", ("FA-Class",))
 
-        result = logic_rating.get_all_assessment_numbers(self.wp10db, None)
+class RatingWriterTest(BaseWpOneDbTest):
 
-        self.assertEqual([("Alpha", 0, 1)], result)
+    def _rating(self, article, quality=None, importance=None):
+        return Rating(
+            r_project=b"Project 0",
+            r_namespace=0,
+            r_article=article,
+            r_quality=quality,
+            r_quality_timestamp=b"2018-04-01T12:30:00Z" if quality else None,
+            r_importance=importance,
+            r_importance_timestamp=b"2018-04-01T12:30:00Z" if importance else None,
+        )
+
+    def _get_all_ratings(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SELECT * FROM ratings ORDER BY r_article")
+            return [Rating(**db_rating) for db_rating in cursor.fetchall()]
+
+    def test_writer_inserts(self):
+        ratings = [
+            self._rating(b"Article %d" % i, quality=b"B-Class") for i in range(5)
+        ]
+        writer = logic_rating.RatingWriter(self.wp10db)
+        for rating in ratings:
+            writer.add(rating, AssessmentKind.QUALITY)
+
+        writer.flush()
+
+        self.assertEqual(ratings, self._get_all_ratings())
+
+    def test_writer_only_updates_kind(self):
+        logic_rating.insert_or_update(
+            self.wp10db,
+            self._rating(b"Article", quality=b"B-Class", importance=b"Low-Class"),
+            AssessmentKind.BOTH,
+        )
+        writer = logic_rating.RatingWriter(self.wp10db)
+        writer.add(
+            self._rating(b"Article", importance=b"High-Class"),
+            AssessmentKind.IMPORTANCE,
+        )
+
+        writer.flush()
+
+        actual = self._get_all_ratings()
+        self.assertEqual(1, len(actual))
+        self.assertEqual(b"B-Class", actual[0].r_quality)
+        self.assertEqual(b"High-Class", actual[0].r_importance)
+
+    def test_writer_invalid_kind(self):
+        writer = logic_rating.RatingWriter(self.wp10db)
+        with self.assertRaises(ValueError):
+            writer.add(self._rating(b"Article"), "quality")
+
+    def test_writer_buffers_until_batch_size(self):
+        writer = logic_rating.RatingWriter(self.wp10db, batch_size=3)
+
+        writer.add(self._rating(b"A", quality=b"B-Class"), AssessmentKind.QUALITY)
+        writer.add(self._rating(b"B", quality=b"C-Class"), AssessmentKind.QUALITY)
+        self.assertEqual([], self._get_all_ratings())
+        self.assertEqual(0, writer.written)
+
+        writer.add(
+            self._rating(b"C", importance=b"Mid-Class"), AssessmentKind.IMPORTANCE
+        )
+        self.assertEqual(
+            [b"A", b"B", b"C"], [r.r_article for r in self._get_all_ratings()]
+        )
+        self.assertEqual(3, writer.written)
+
+    def test_writer_flush_writes_remainder(self):
+        writer = logic_rating.RatingWriter(self.wp10db, batch_size=100)
+        writer.add(self._rating(b"A", quality=b"B-Class"), AssessmentKind.QUALITY)
+
+        writer.flush()
+
+        self.assertEqual([b"A"], [r.r_article for r in self._get_all_ratings()])
+        self.assertEqual(1, writer.written)
+
+    def test_writer_snapshots_rating(self):
+        writer = logic_rating.RatingWriter(self.wp10db)
+        rating = self._rating(b"A", quality=b"B-Class")
+        writer.add(rating, AssessmentKind.QUALITY)
+        rating.r_quality = b"FA-Class"
+
+        writer.flush()
+
+        self.assertEqual(b"B-Class", self._get_all_ratings()[0].r_quality)
+
+    def test_writer_logs_changed_articles_once_per_flush(self):
+        writer = logic_rating.RatingWriter(self.wp10db)
+        writer.add(self._rating(b"C", quality=b"B-Class"), AssessmentKind.QUALITY)
+        writer.add(
+            self._rating(b"A", importance=b"Low-Class"), AssessmentKind.IMPORTANCE
+        )
+        writer.add(self._rating(b"B", quality=b"C-Class"), AssessmentKind.QUALITY)
+
+        with patch(
+            "wp1.logic.rating.logic_global_articles.log_changed_articles"
+        ) as patched_log:
+            writer.flush()
+
+        # One write for the ratings of both kinds.
+        patched_log.assert_called_once()
+        self.assertEqual([b"A", b"B", b"C"], sorted(patched_log.call_args.args[1]))
+
+    def test_writer_collects_changed_articles(self):
+        changed = set()
+        writer = logic_rating.RatingWriter(
+            self.wp10db, batch_size=2, changed_articles=changed
+        )
+        writer.add(self._rating(b"A", quality=b"B-Class"), AssessmentKind.QUALITY)
+        writer.add(
+            self._rating(b"B", importance=b"Low-Class"), AssessmentKind.IMPORTANCE
+        )
+        writer.add(self._rating(b"C", quality=b"C-Class"), AssessmentKind.QUALITY)
+        self.assertEqual({(0, b"A"), (0, b"B")}, changed)
+
+        writer.flush()
+
+        self.assertEqual({(0, b"A"), (0, b"B"), (0, b"C")}, changed)
+
+    def test_writer_invalid_batch_size(self):
+        with self.assertRaises(ValueError):
+            logic_rating.RatingWriter(self.wp10db, batch_size=0)
+
+    def test_insert_or_update_sets_ranks(self):
+        logic_rating.insert_or_update(
+            self.wp10db,
+            self._rating(b"Article", quality=b"B-Class", importance=b"Foo-Class"),
+            AssessmentKind.BOTH,
+        )
+        logic_rating.insert_or_update(
+            self.wp10db,
+            self._rating(b"Article", quality=b"FA-Class"),
+            AssessmentKind.QUALITY,
+        )
+
+        actual = self._get_all_ratings()[0]
+        self.assertEqual(500, actual.r_quality_rank)
+        self.assertEqual(UNRANKED, actual.r_importance_rank)
+
+    def test_insert_or_update_does_not_query_rankings(self):
+        with patch("wp1.logic.rating.get_global_rankings") as patched_rankings:
+            logic_rating.insert_or_update(
+                self.wp10db,
+                self._rating(b"Article", quality=b"FA-Class"),
+                AssessmentKind.QUALITY,
+            )
+
+        patched_rankings.assert_not_called()
+        self.assertEqual(500, self._get_all_ratings()[0].r_quality_rank)
+
+    def test_insert_or_update_given_rankings(self):
+        rankings = {(b"quality", b"B-Class"): 123}
+
+        with patch("wp1.logic.rating.get_global_rankings") as patched_rankings:
+            logic_rating.insert_or_update(
+                self.wp10db,
+                self._rating(b"Article", quality=b"B-Class"),
+                AssessmentKind.QUALITY,
+                rankings=rankings,
+            )
 
-    def test_get_cached_returns_none_when_empty(self):
-        self.assertIsNone(logic_rating.get_cached_assessment_numbers(self.redis))
+        patched_rankings.assert_not_called()
+        self.assertEqual(123, self._get_all_ratings()[0].r_quality_rank)
 
-    def test_get_cached_returns_none_for_none_redis(self):
-        self.assertIsNone(logic_rating.get_cached_assessment_numbers(None))
+    def test_writer_sets_ranks(self):
+        writer = logic_rating.RatingWriter(self.wp10db)
+        writer.add(
+            self._rating(b"A", quality=b"B-Class", importance=b"Low-Class"),
+            AssessmentKind.BOTH,
+        )
+        writer.add(
+            self._rating(b"A", importance=b"Top-Class"), AssessmentKind.IMPORTANCE
+        )
+        writer.add(self._rating(b"B", quality=b"Foo-Class"), AssessmentKind.QUALITY)
+
+        writer.flush()
+
+        actual = self._get_all_ratings()
+        self.assertEqual(
+            [(300, 400), (UNRANKED, UNRANKED)],
+            [(r.r_quality_rank, r.r_importance_rank) for r in actual],
+        )
 
-    def test_cache_roundtrips_through_redis(self):
-        data = [("Alpha", 2, 3)]
-        logic_rating.cache_assessment_numbers(self.redis, data)
-        self.assertEqual(data, logic_rating.get_cached_assessment_numbers(self.redis))
+    def test_update_ranks_for_project(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO ratings"
+                "  (r_project, r_namespace, r_article, r_quality, r_importance)"
+                " VALUES ('Project 0', 0, 'A', 'GA-Class', 'Mid-Class'),"
+                "   ('Project 0', 0, 'B', 'Foo-Class', NULL),"
+                "   ('Project 1', 0, 'C', 'GA-Class', 'Mid-Class')"
+            )
 
-    def test_cache_none_redis_is_noop(self):
-        # Should not raise.
-        logic_rating.cache_assessment_numbers(None, [("Alpha", 0, 0)])
+        logic_rating.update_ranks_for_project(self.wp10db, b"Project 0")
+
+        actual = self._get_all_ratings()
+        self.assertEqual(
+            [(400, 200), (UNRANKED, UNRANKED), (UNRANKED, UNRANKED)],
+            [(r.r_quality_rank, r.r_importance_rank) for r in actual],
+        )
+
+
+class IterProjectRatingsTest(BaseWpOneDbTest):
+
+    def setUp(self):
+        super().setUp()
+        ratings = []
+        for project in (b"Project 0", b"Project 1"):
+            for namespace in (0, 4):
+                for article in (b"C", b"A", b"B"):
+                    ratings.append(
+                        {
+                            "r_project": project,
+                            "r_namespace": namespace,
+                            "r_article": article,
+                        }
+                    )
+        with self.wp10db.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO ratings (r_project, r_namespace, r_article) "
+                "VALUES (%(r_project)s, %(r_namespace)s, %(r_article)s)",
+                ratings,
+            )
+        self.wp10db.commit()
 
-    def test_cache_sets_expiry(self):
-        logic_rating.cache_assessment_numbers(self.redis, [("Alpha", 0, 1)])
-        ttl = self.redis.ttl(logic_rating.ALL_ASSESSMENTS_CACHE_KEY)
-        # A bit over 24h, so the daily refresh overwrites before expiry.
-        self.assertGreater(ttl, 24 * 60 * 60)
-        self.assertLessEqual(ttl, 25 * 60 * 60)
+    def test_sorted_by_key(self):
+        actual = [
+            (r.r_namespace, r.r_article)
+            for r in logic_rating.iter_project_ratings(self.wp10db, b"Project 0")
+        ]
 
-    def test_update_assessment_cache_populates_cache(self):
-        # update_assessment_cache() opens its own connections (it's the recurring
-        # job entry point), which in the test env are the same test DB/Redis.
-        self._add_ratings("Alpha", ("FA-Class", "Unassessed-Class"))
-        self.assertIsNone(logic_rating.get_cached_assessment_numbers(self.redis))
+        self.assertEqual(
+            [(0, b"A"), (0, b"B"), (0, b"C"), (4, b"A"), (4, b"B"), (4, b"C")],
+            actual,
+        )
 
-        result = logic_rating.update_assessment_cache()
+    def test_chunked(self):
+        for chunk_size in (1, 2, 3, 6, 7):
+            actual = [
+                (r.r_namespace, r.r_article)
+                for r in logic_rating.iter_project_ratings(
+                    self.wp10db, b"Project 1", chunk_size=chunk_size
+                )
+            ]
+
+            self.assertEqual(
+                [(0, b"A"), (0, b"B"), (0, b"C"), (4, b"A"), (4, b"B"), (4, b"C")],
+                actual,
+            )
 
-        self.assertEqual([("Alpha", 1, 1)], result)
+    def test_no_ratings(self):
         self.assertEqual(
-            [("Alpha", 1, 1)],
-            logic_rating.get_cached_assessment_numbers(self.redis),
+            [], list(logic_rating.iter_project_ratings(self.wp10db, b"Project 2"))
         )
 
-    def test_update_assessment_cache_overwrites_stale_cache(self):
-        # A read-through call would return this stale value; the warming job must
-        # bypass it and recompute from the database.
-        logic_rating.cache_assessment_numbers(self.redis, [("Stale", 5, 6)])
-        self._add_ratings("Alpha", ("FA-Class",))
 
-        logic_rating.update_assessment_cache()
+class GetProjectRatingsByArticlesTest(IterProjectRatingsTest):
+
+    def test_get_by_articles(self):
+        actual = logic_rating.get_project_ratings_by_articles(
+            self.wp10db, b"Project 0", [(0, b"B"), (4, b"C"), (4, b"Z")]
+        )
+
+        self.assertEqual([(0, b"B"), (4, b"C")], sorted(actual.keys()))
+        self.assertEqual(b"Project 0", actual[(0, b"B")].r_project)
 
+    def test_get_by_articles_empty(self):
         self.assertEqual(
-            [("Alpha", 0, 1)],
-            logic_rating.get_cached_assessment_numbers(self.redis),
+            {},
+            logic_rating.get_project_ratings_by_articles(self.wp10db, b"Project 0", []),
         )
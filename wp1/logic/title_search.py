@@ -0,0 +1,289 @@
+"""Trigram index of article titles, for the articlePattern filter.
+
+The index is kept per project: title_trigrams holds one row for every distinct
+3-byte substring of every indexed title of a project, and
+title_search_articles the indexed titles of each project. A search for a
+pattern of at least 3 bytes reads the project's rows of a few of the pattern's
+trigrams, and keeps the titles that have all of them, instead of scanning every
+rating of the project. A title with all the trigrams doesn't necessarily
+contain the pattern, so the candidates are still checked with LIKE.
+
+Titles are indexed in their database form, with underscores for spaces, and
+patterns are normalized the same way (see normalize_pattern). Each project's
+index is brought up to date at the end of its update (see
+logic.project.update_project_record): the titles that lost their rating, for
+example because the article left the project or was moved, are removed, and
+the new ones are added. Once a project is indexed, only the articles whose
+ratings the update wrote are checked. title_search_projects records the projects whose
+titles are all indexed. Other projects are searched with a plain LIKE scan.
+"""
+
+import logging
+
+from wp1.constants import TITLE_INDEX_CHUNK_SIZE, TITLE_SEARCH_MAX_TRIGRAMS
+
+logger = logging.getLogger(__name__)
+
+TRIGRAM_LENGTH = 3
+
+
+def normalize_pattern(pattern):
+    """Returns the pattern as bytes in title form, spaces as underscores."""
+    if isinstance(pattern, str):
+        pattern = pattern.encode("utf-8")
+    return pattern.strip().replace(b" ", b"_")
+
+
+def like_pattern(pattern):
+    """Returns the LIKE pattern matching titles that contain pattern.
+
+    The pattern is matched literally, % and _ are not wildcards.
+    """
+    escaped = (
+        pattern.replace(b"\\", b"\\\\").replace(b"%", b"\\%").replace(b"_", b"\\_")
+    )
+    return b"%" + escaped + b"%"
+
+
+def trigrams(title):
+    """Returns the distinct trigrams of the title, in order of occurrence."""
+    seen = {}
+    for i in range(len(title) - TRIGRAM_LENGTH + 1):
+        seen.setdefault(title[i : i + TRIGRAM_LENGTH], None)
+    return list(seen)
+
+
+def search_trigrams(pattern, max_trigrams=TITLE_SEARCH_MAX_TRIGRAMS):
+    """Returns the trigrams to look up for a normalized pattern.
+
+    Picks at most max_trigrams, spread evenly over the pattern. Returns an
+    empty list if the pattern is too short to be searched in the index.
+    """
+    grams = trigrams(pattern)
+    if len(grams) <= max_trigrams:
+        return grams
+    step = (len(grams) - 1) / (max_trigrams - 1)
+    return [grams[round(n * step)] for n in range(max_trigrams)]
+
+
+def search_clause(num_trigrams, article_column, namespace_column):
+    """Returns the condition on the title columns for the %(trigram_N)s params.
+
+    Selects the titles of the %(r_project)s project that have every one of the
+    num_trigrams trigrams.
+    """
+    placeholders = ", ".join("%%(trigram_%d)s" % n for n in range(num_trigrams))
+    return (
+        " AND (%s, %s) IN ("
+        "SELECT tt_namespace, tt_article FROM title_trigrams"
+        " WHERE tt_project = %%(r_project)s AND tt_trigram IN (%s)"
+        " GROUP BY tt_namespace, tt_article"
+        " HAVING COUNT(*) = %d)"
+        % (namespace_column, article_column, placeholders, num_trigrams)
+    )
+
+
+def is_project_indexed(wp10db, project_name):
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM title_search_projects WHERE tsp_project = %s",
+            (project_name,),
+        )
+        return cursor.fetchone() is not None
+
+
+def _read_unindexed(wp10db, project_name, after, chunk_size):
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            """
+        SELECT r_namespace, r_article FROM ratings
+        LEFT JOIN title_search_articles
+          ON tsa_project = r_project AND tsa_namespace = r_namespace AND
+             tsa_article = r_article
+        WHERE r_project = %(r_project)s AND tsa_article IS NULL AND
+              (r_namespace > %(r_namespace)s OR
+               (r_namespace = %(r_namespace)s AND r_article > %(r_article)s))
+        ORDER BY r_namespace, r_article
+        LIMIT %(limit)s
+    """,
+            {
+                "r_project": project_name,
+                "r_namespace": after[0],
+                "r_article": after[1],
+                "limit": chunk_size,
+            },
+        )
+        return [(row["r_namespace"], row["r_article"]) for row in cursor.fetchall()]
+
+
+def _read_stale(wp10db, project_name, chunk_size):
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            """
+        SELECT tsa_namespace, tsa_article FROM title_search_articles
+        LEFT JOIN ratings
+          ON r_project = tsa_project AND r_namespace = tsa_namespace AND
+             r_article = tsa_article
+        WHERE tsa_project = %(r_project)s AND r_article IS NULL
+        LIMIT %(limit)s
+    """,
+            {"r_project": project_name, "limit": chunk_size},
+        )
+        return [(row["tsa_namespace"], row["tsa_article"]) for row in cursor.fetchall()]
+
+
+def _trigram_rows(project_name, titles):
+    return [
+        (project_name, gram, namespace, article)
+        for namespace, article in titles
+        for gram in trigrams(article)
+    ]
+
+
+def _index_titles(wp10db, project_name, titles):
+    rows = _trigram_rows(project_name, titles)
+    with wp10db.cursor() as cursor:
+        if rows:
+            cursor.executemany(
+                "INSERT IGNORE INTO title_trigrams"
+                " (tt_project, tt_trigram, tt_namespace, tt_article)"
+                " VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+        cursor.executemany(
+            "INSERT IGNORE INTO title_search_articles"
+            " (tsa_project, tsa_namespace, tsa_article) VALUES (%s, %s, %s)",
+            [(project_name, namespace, article) for namespace, article in titles],
+        )
+
+
+def _unindex_titles(wp10db, project_name, titles):
+    rows = _trigram_rows(project_name, titles)
+    with wp10db.cursor() as cursor:
+        if rows:
+            cursor.executemany(
+                "DELETE FROM title_trigrams WHERE tt_project = %s AND"
+                " tt_trigram = %s AND tt_namespace = %s AND tt_article = %s",
+                rows,
+            )
+        cursor.executemany(
+            "DELETE FROM title_search_articles WHERE tsa_project = %s AND"
+            " tsa_namespace = %s AND tsa_article = %s",
+            [(project_name, namespace, article) for namespace, article in titles],
+        )
+
+
+def _read_rated(wp10db, project_name, titles):
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            """
+        SELECT r_namespace, r_article FROM ratings
+        WHERE r_project = %(r_project)s AND
+              (r_namespace, r_article) IN %(titles)s
+    """,
+            {"r_project": project_name, "titles": titles},
+        )
+        return set((row["r_namespace"], row["r_article"]) for row in cursor.fetchall())
+
+
+def _read_indexed(wp10db, project_name, titles):
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            """
+        SELECT tsa_namespace, tsa_article FROM title_search_articles
+        WHERE tsa_project = %(r_project)s AND
+              (tsa_namespace, tsa_article) IN %(titles)s
+    """,
+            {"r_project": project_name, "titles": titles},
+        )
+        return set(
+            (row["tsa_namespace"], row["tsa_article"]) for row in cursor.fetchall()
+        )
+
+
+def _index_changed_titles(wp10db, project_name, articles, chunk_size):
+    """Indexes or unindexes each of the articles, depending on whether the
+    project still has a rating for it. Returns (indexed, removed)."""
+    articles = sorted(set(articles))
+    indexed = removed = 0
+    for start in range(0, len(articles), chunk_size):
+        titles = articles[start : start + chunk_size]
+        rated = _read_rated(wp10db, project_name, titles)
+        already_indexed = _read_indexed(wp10db, project_name, titles)
+
+        stale = [t for t in titles if t in already_indexed and t not in rated]
+        if stale:
+            _unindex_titles(wp10db, project_name, stale)
+        new = [t for t in titles if t in rated and t not in already_indexed]
+        if new:
+            _index_titles(wp10db, project_name, new)
+        wp10db.commit()
+        indexed += len(new)
+        removed += len(stale)
+    return indexed, removed
+
+
+def _index_all_titles(wp10db, project_name, chunk_size):
+    """Brings every title of the project up to date with its ratings. Returns
+    (indexed, removed)."""
+    removed = 0
+    while True:
+        titles = _read_stale(wp10db, project_name, chunk_size)
+        if not titles:
+            break
+        _unindex_titles(wp10db, project_name, titles)
+        wp10db.commit()
+        removed += len(titles)
+
+    indexed = 0
+    after = (-1, b"")
+    while True:
+        titles = _read_unindexed(wp10db, project_name, after, chunk_size)
+        if not titles:
+            break
+        _index_titles(wp10db, project_name, titles)
+        wp10db.commit()
+        indexed += len(titles)
+        after = titles[-1]
+    return indexed, removed
+
+
+def index_project_titles(
+    wp10db, project_name, chunk_size=TITLE_INDEX_CHUNK_SIZE, articles=None
+):
+    """Brings the project's part of the index up to date with its ratings.
+
+    Removes the indexed titles that the project no longer has a rating for,
+    then adds its titles that aren't indexed yet. Commits after every chunk of
+    chunk_size titles, then marks the project as indexed. Returns the number
+    of titles added.
+
+    If articles is given, as the (namespace, article) pairs whose ratings were
+    written since the project was last indexed, only those are checked. The
+    whole project is still checked if it isn't indexed yet.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive: %s" % chunk_size)
+
+    if articles is not None and is_project_indexed(wp10db, project_name):
+        indexed, removed = _index_changed_titles(
+            wp10db, project_name, articles, chunk_size
+        )
+    else:
+        indexed, removed = _index_all_titles(wp10db, project_name, chunk_size)
+
+    with wp10db.cursor() as cursor:
+        cursor.execute(
+            "INSERT IGNORE INTO title_search_projects (tsp_project) VALUES (%s)",
+            (project_name,),
+        )
+    wp10db.commit()
+
+    if indexed or removed:
+        logger.info(
+            "Indexed %s titles and removed %s titles of project %s",
+            indexed,
+            removed,
+            project_name.decode("utf-8"),
+        )
+    return indexed
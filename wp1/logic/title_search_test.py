@@ -0,0 +1,194 @@
+import unittest
+
+from wp1.base_db_test import BaseWpOneDbTest
+from wp1.logic import title_search as logic_title_search
+
+
+class TitleSearchTermsTest(unittest.TestCase):
+
+    def test_normalize_pattern(self):
+        self.assertEqual(
+            b"New_York", logic_title_search.normalize_pattern(" New York ")
+        )
+
+    def test_normalize_pattern_bytes(self):
+        self.assertEqual(
+            b"Caf\xc3\xa9_au_lait",
+            logic_title_search.normalize_pattern(b"Caf\xc3\xa9 au_lait"),
+        )
+
+    def test_like_pattern_is_literal(self):
+        self.assertEqual(
+            b"%50\\%\\_off\\\\%", logic_title_search.like_pattern(b"50%_off\\")
+        )
+
+    def test_trigrams(self):
+        self.assertEqual([b"aba", b"bab"], logic_title_search.trigrams(b"ababa"))
+
+    def test_trigrams_short(self):
+        self.assertEqual([], logic_title_search.trigrams(b"ab"))
+
+    def test_search_trigrams_spread(self):
+        actual = logic_title_search.search_trigrams(b"abcdefghij", max_trigrams=3)
+
+        self.assertEqual([b"abc", b"efg", b"hij"], actual)
+
+    def test_search_clause(self):
+        actual = logic_title_search.search_clause(2, "r_article", "r_namespace")
+
+        self.assertIn("(r_namespace, r_article) IN", actual)
+        self.assertIn("tt_project = %(r_project)s", actual)
+        self.assertIn("tt_trigram IN (%(trigram_0)s, %(trigram_1)s)", actual)
+        self.assertIn("HAVING COUNT(*) = 2", actual)
+
+
+class IndexProjectTitlesTest(BaseWpOneDbTest):
+    ratings = (
+        (b"Alpha", 0, b"Apple"),
+        (b"Alpha", 1, b"Apple"),
+        (b"Alpha", 0, b"Grape"),
+        (b"Beta", 0, b"Apple"),
+        (b"Beta", 0, b"Lime"),
+    )
+
+    def setUp(self):
+        super().setUp()
+        with self.wp10db.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO ratings (r_project, r_namespace, r_article)"
+                " VALUES (%s, %s, %s)",
+                self.ratings,
+            )
+        self.wp10db.commit()
+
+    def _indexed_titles(self, project_name=b"Alpha"):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "SELECT tsa_namespace, tsa_article FROM title_search_articles"
+                " WHERE tsa_project = %s",
+                (project_name,),
+            )
+            return sorted(
+                (r["tsa_namespace"], r["tsa_article"]) for r in cursor.fetchall()
+            )
+
+    def _postings(self, trigram, project_name=b"Alpha"):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "SELECT tt_namespace, tt_article FROM title_trigrams"
+                " WHERE tt_project = %s AND tt_trigram = %s",
+                (project_name, trigram),
+            )
+            return sorted(
+                (r["tt_namespace"], r["tt_article"]) for r in cursor.fetchall()
+            )
+
+    def test_index_project_titles(self):
+        actual = logic_title_search.index_project_titles(self.wp10db, b"Alpha")
+
+        self.assertEqual(3, actual)
+        self.assertEqual(
+            [(0, b"Apple"), (0, b"Grape"), (1, b"Apple")], self._indexed_titles()
+        )
+        self.assertEqual([(0, b"Apple"), (1, b"Apple")], self._postings(b"ppl"))
+        self.assertEqual([(0, b"Grape")], self._postings(b"ape"))
+
+    def test_index_skips_indexed_titles(self):
+        logic_title_search.index_project_titles(self.wp10db, b"Alpha")
+
+        actual = logic_title_search.index_project_titles(self.wp10db, b"Alpha")
+
+        self.assertEqual(0, actual)
+        self.assertEqual(3, len(self._indexed_titles()))
+
+    def test_index_per_project(self):
+        logic_title_search.index_project_titles(self.wp10db, b"Alpha")
+
+        actual = logic_title_search.index_project_titles(self.wp10db, b"Beta")
+
+        self.assertEqual(2, actual)
+        self.assertEqual([(0, b"Apple"), (0, b"Lime")], self._indexed_titles(b"Beta"))
+        self.assertEqual([(0, b"Lime")], self._postings(b"ime", b"Beta"))
+        self.assertEqual([], self._postings(b"ime", b"Alpha"))
+
+    def test_index_removes_stale_titles(self):
+        logic_title_search.index_project_titles(self.wp10db, b"Alpha")
+        logic_title_search.index_project_titles(self.wp10db, b"Beta")
+        with self.wp10db.cursor() as cursor:
+            # Grape was moved to Green grape.
+            cursor.execute(
+                "UPDATE ratings SET r_article = 'Green_grape'"
+                " WHERE r_project = 'Alpha' AND r_article = 'Grape'"
+            )
+            cursor.execute(
+                "DELETE FROM ratings WHERE r_project = 'Alpha' AND"
+                " r_namespace = 0 AND r_article = 'Apple'"
+            )
+        self.wp10db.commit()
+
+        actual = logic_title_search.index_project_titles(
+            self.wp10db, b"Alpha", chunk_size=1
+        )
+
+        self.assertEqual(1, actual)
+        self.assertEqual([(0, b"Green_grape"), (1, b"Apple")], self._indexed_titles())
+        self.assertEqual([(0, b"Green_grape")], self._postings(b"ape"))
+        self.assertEqual([(1, b"Apple")], self._postings(b"ppl"))
+        # Beta still has its Apple.
+        self.assertEqual([(0, b"Apple")], self._postings(b"ppl", b"Beta"))
+
+    def test_index_changed_articles(self):
+        logic_title_search.index_project_titles(self.wp10db, b"Alpha")
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM ratings WHERE r_project = 'Alpha' AND"
+                " r_namespace = 0 AND r_article = 'Apple'"
+            )
+            cursor.executemany(
+                "INSERT INTO ratings (r_project, r_namespace, r_article)"
+                " VALUES ('Alpha', 0, %s)",
+                (b"Melon", b"Kiwi"),
+            )
+        self.wp10db.commit()
+
+        actual = logic_title_search.index_project_titles(
+            self.wp10db,
+            b"Alpha",
+            chunk_size=1,
+            articles={(0, b"Apple"), (0, b"Melon"), (0, b"Grape")},
+        )
+
+        self.assertEqual(1, actual)
+        # Kiwi wasn't written by the update, so it isn't looked at.
+        self.assertEqual(
+            [(0, b"Grape"), (0, b"Melon"), (1, b"Apple")], self._indexed_titles()
+        )
+        self.assertEqual([(1, b"Apple")], self._postings(b"ppl"))
+
+    def test_index_changed_articles_of_unindexed_project(self):
+        actual = logic_title_search.index_project_titles(
+            self.wp10db, b"Alpha", articles=set()
+        )
+
+        self.assertEqual(3, actual)
+        self.assertEqual(3, len(self._indexed_titles()))
+
+    def test_index_chunked(self):
+        actual = logic_title_search.index_project_titles(
+            self.wp10db, b"Alpha", chunk_size=1
+        )
+
+        self.assertEqual(3, actual)
+        self.assertEqual(3, len(self._indexed_titles()))
+
+    def test_is_project_indexed(self):
+        self.assertFalse(logic_title_search.is_project_indexed(self.wp10db, b"Alpha"))
+
+        logic_title_search.index_project_titles(self.wp10db, b"Alpha")
+
+        self.assertTrue(logic_title_search.is_project_indexed(self.wp10db, b"Alpha"))
+        self.assertFalse(logic_title_search.is_project_indexed(self.wp10db, b"Beta"))
+
+    def test_index_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            logic_title_search.index_project_titles(self.wp10db, b"Alpha", chunk_size=0)
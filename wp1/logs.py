@@ -1,14 +1,20 @@
 import logging
+import os
 import re
-from collections import defaultdict
+import shutil
+import tempfile
+from collections import defaultdict, namedtuple
 from datetime import datetime, timedelta
 
-from wp1 import api, app_logging
+from wp1 import api, app_logging, log_section_cache
 from wp1.conf import get_conf
 from wp1.constants import (
     LOG_DATE_FORMAT,
     LOG_NS,
+    LOG_RENDER_CHUNK_SIZE,
+    LOG_SUBPAGE_MAX_SIZE,
     MAX_LOGS_PER_DAY,
+    REVID_LOOKUP_BATCH_SIZE,
     TS_FORMAT,
     TS_FORMAT_WP10,
 )
@@ -34,6 +40,14 @@ RE_SECTION_DATE = re.compile(r"^===\s*([^=\n]+?)\s*===\s*$", re.MULTILINE)
 # %d parses both padded and unpadded day numbers.
 LOG_DATE_PARSE_FORMAT = "%B %d, %Y"
 
+# The kinds of section entries, in the order of log_section.jinja2.
+SECTION_HEADINGS = (
+    ("renamed", "Renamed"),
+    ("reassessed", "Reassessed"),
+    ("assessed", "Assessed"),
+    ("removed", "Removed"),
+)
+
 
 def log_page_name(project_name):
     return (
@@ -72,6 +86,108 @@ def get_revid(wikidb, name, namespace, revision_dt):
             return res["rev_id"]
 
 
+class LogLookupCache:
+    """Results of the lookups done by get_move_targets and get_revids.
+
+    One cache is shared by every section of a log page upload, so an article
+    logged on several days, or twice on the same day, is only looked up once.
+    Each dict is keyed by the lookup tuple, with a None value for lookups that
+    found nothing.
+    """
+
+    def __init__(self):
+        self.move_targets = {}
+        self.revids = {}
+
+
+def get_move_targets(wp10db, moves, cache=None):
+    """Like move_target, for many (ns, article, db_timestamp) moves at once.
+
+    Returns a dict mapping each move to a dict of its new ns and article, or
+    None if it isn't in the moves table.
+    """
+    if cache is None:
+        cache = LogLookupCache()
+    moves = list(dict.fromkeys(moves))
+    missing = [move for move in moves if move not in cache.move_targets]
+
+    for start in range(0, len(missing), REVID_LOOKUP_BATCH_SIZE):
+        batch = missing[start : start + REVID_LOOKUP_BATCH_SIZE]
+        for move in batch:
+            cache.move_targets[move] = None
+
+        wp10db.ping()
+        with wp10db.cursor() as cursor:
+            cursor.execute(
+                """
+          SELECT m_old_namespace, m_old_article, m_timestamp,
+                 m_new_namespace as ns, m_new_article as article
+          FROM moves
+          WHERE (m_old_namespace, m_old_article, m_timestamp) IN %s
+        """,
+                (batch,),
+            )
+            for row in cursor.fetchall():
+                move = (
+                    row["m_old_namespace"],
+                    row["m_old_article"],
+                    row["m_timestamp"],
+                )
+                cache.move_targets[move] = {"ns": row["ns"], "article": row["article"]}
+
+    return {move: cache.move_targets[move] for move in moves}
+
+
+def _revids_query(size):
+    # Each requested (namespace, title, timestamp) is a row of a derived table,
+    # tagged with its index in the batch. The correlated subquery reads the
+    # latest revision at the timestamp from the (rev_page, rev_timestamp)
+    # index, like get_revid, without touching the page's earlier history.
+    requests = " UNION ALL ".join(
+        ["SELECT %s AS i, %s AS ns, %s AS title, %s AS ts"] * size
+    )
+    return (
+        """
+      SELECT req.i AS i,
+             (SELECT rev_id FROM revision
+              WHERE rev_page = page_id AND rev_timestamp <= req.ts
+              ORDER BY rev_timestamp DESC LIMIT 1) AS rev_id
+      FROM ("""
+        + requests
+        + """) AS req
+      JOIN page ON page_namespace = req.ns AND page_title = req.title
+    """
+    )
+
+
+def get_revids(wikidb, pages, cache=None):
+    """Like get_revid, for many (name, namespace, revision_dt) pages at once.
+
+    The pages are resolved REVID_LOOKUP_BATCH_SIZE at a time, one replica query
+    per batch, and lookups already in cache, a LogLookupCache, aren't repeated.
+    Returns a dict mapping each page to its revision id, or None.
+    """
+    if cache is None:
+        cache = LogLookupCache()
+    pages = list(dict.fromkeys(pages))
+    missing = [page for page in pages if page not in cache.revids]
+
+    for start in range(0, len(missing), REVID_LOOKUP_BATCH_SIZE):
+        batch = missing[start : start + REVID_LOOKUP_BATCH_SIZE]
+        params = []
+        for i, (name, namespace, revision_dt) in enumerate(batch):
+            cache.revids[(name, namespace, revision_dt)] = None
+            params.extend((i, namespace, name, revision_dt.strftime(TS_FORMAT_WP10)))
+
+        wikidb.ping()
+        with wikidb.cursor() as cursor:
+            cursor.execute(_revids_query(len(batch)), params)
+            for row in cursor.fetchall():
+                cache.revids[batch[row["i"]]] = row["rev_id"]
+
+    return {page: cache.revids[page] for page in pages}
+
+
 def name_for_article(wp10db, name, namespace):
     format_str = "%s"
     if namespace != 0:
@@ -135,38 +251,51 @@ def get_section_categories(logs_for_article):
     }
 
 
-def get_section_data(wikidb, wp10db, project_name, dt, logs):
+def get_section_data(wikidb, wp10db, project_name, dt, logs, cache=None):
+    if cache is None:
+        cache = LogLookupCache()
+
     l = defaultdict(defaultdict)
     for log in logs:
         l[log.l_article][log.l_action.decode("utf-8")] = log
 
-    moved_name = {}
-    for article, sublogs in l.items():
-        if "moved" not in sublogs:
-            continue
-        log = sublogs["moved"]
-        move = move_target(
-            wp10db, log.l_namespace, log.l_article, log.l_revision_timestamp
+    moves = {
+        article: (
+            sublogs["moved"].l_namespace,
+            sublogs["moved"].l_article,
+            sublogs["moved"].l_revision_timestamp,
         )
-        moved_name[article] = name_for_article(wp10db, move["article"], move["ns"])
+        for article, sublogs in l.items()
+        if "moved" in sublogs
+    }
+    targets = get_move_targets(wp10db, moves.values(), cache=cache)
+    moved_name = {}
+    for article, move in moves.items():
+        target = targets[move]
+        moved_name[article] = name_for_article(wp10db, target["article"], target["ns"])
 
     uniq_names = set((log.l_article, log.l_namespace) for log in logs)
     name = dict((n[0], name_for_article(wp10db, n[0], n[1])) for n in uniq_names)
     talk = dict((n[0], talk_page_for_article(wp10db, n[0], n[1])) for n in uniq_names)
 
+    unmoved = [log for log in logs if log.l_article not in moved_name]
+    pages = []
+    for log in unmoved:
+        pages.append((log.l_article, log.l_namespace, log.rev_timestamp_dt))
+        pages.append((log.l_article, log.l_namespace + 1, log.rev_timestamp_dt))
+    revids = get_revids(wikidb, pages, cache=cache)
+
     revid = defaultdict(defaultdict)
     talk_revid = defaultdict(defaultdict)
-    for log in logs:
+    for log in unmoved:
         art = log.l_article
         action = log.l_action.decode("utf-8")
-        if art in moved_name:
-            continue
-        revid[art][action] = get_revid(
-            wikidb, log.l_article, log.l_namespace, log.rev_timestamp_dt
-        )
-        talk_revid[art][action] = get_revid(
-            wikidb, log.l_article, log.l_namespace + 1, log.rev_timestamp_dt
-        )
+        revid[art][action] = revids[
+            (log.l_article, log.l_namespace, log.rev_timestamp_dt)
+        ]
+        talk_revid[art][action] = revids[
+            (log.l_article, log.l_namespace + 1, log.rev_timestamp_dt)
+        ]
 
     categories = get_section_categories(l)
     # Sort the articles so that the output is idempotent.
@@ -185,29 +314,294 @@ def get_section_data(wikidb, wp10db, project_name, dt, logs):
     }
 
 
-def section_for_date(wikidb, wp10db, project_name, dt, logs):
+def unresolved_articles(template_data):
+    """Returns the articles of the section data with a revision id that
+    couldn't be found, for example because of replication lag."""
+    return {
+        art
+        for revids in (template_data["revid"], template_data["talk_revid"])
+        for art, by_action in revids.items()
+        if any(revid is None for revid in by_action.values())
+    }
+
+
+def log_subpage_name(project_name, dt, number):
+    return "%s/%s/%d" % (log_page_name(project_name), dt.strftime("%Y-%m-%d"), number)
+
+
+def _iter_section_entries(wikidb, wp10db, project_name, dt, logs, unresolved=None):
+    """Yields (heading, entry) for every line of the section of the date.
+
+    The articles of each heading are rendered LOG_RENDER_CHUNK_SIZE at a time,
+    each chunk with its own section data and lookup cache, so that memory use
+    doesn't grow with the number of logs beyond the logs themselves. If
+    unresolved is a set, the unresolved_articles of every chunk are added to
+    it.
+    """
+    l = defaultdict(dict)
+    for log in logs:
+        l[log.l_article][log.l_action.decode("utf-8")] = log
+
+    categories = get_section_categories(l)
+    template = jinja_env.get_template("log_section_entries.jinja2")
+    for kind, heading in SECTION_HEADINGS:
+        articles = sorted(categories[kind])
+        for start in range(0, len(articles), LOG_RENDER_CHUNK_SIZE):
+            chunk = articles[start : start + LOG_RENDER_CHUNK_SIZE]
+            chunk_logs = [log for art in chunk for log in l[art].values()]
+            template_data = get_section_data(
+                wikidb, wp10db, project_name, dt, chunk_logs
+            )
+            if unresolved is not None:
+                unresolved.update(unresolved_articles(template_data))
+            rendered = template.render(
+                {**template_data, "kind": kind, "articles": chunk}
+            )
+            for entry in rendered.splitlines(keepends=True):
+                yield heading, entry
+
+
+def iter_section_pages(
+    wikidb,
+    wp10db,
+    project_name,
+    dt,
+    logs,
+    max_size=None,
+    unresolved=None,
+):
+    """Yields the wikitext of the section of the date, split into pages.
+
+    Each page starts with the date and the heading it continues, and is at
+    most max_size (by default LOG_SUBPAGE_MAX_SIZE) characters long, unless a
+    single entry doesn't fit. See _iter_section_entries for unresolved.
+    """
+    if max_size is None:
+        max_size = LOG_SUBPAGE_MAX_SIZE
+    title = "=== %s ===\n" % dt.strftime(LOG_DATE_FORMAT)
+    page = []
+    size = 0
+    current = None
+    for heading, entry in _iter_section_entries(
+        wikidb, wp10db, project_name, dt, logs, unresolved=unresolved
+    ):
+        lines = []
+        if not page:
+            lines.append(title)
+        if heading != current or not page:
+            lines.append("==== %s ====\n" % heading)
+        lines.append(entry)
+        added = sum(len(line) for line in lines)
+
+        if page and size + added > max_size:
+            yield "".join(page)
+            page = [title, "==== %s ====\n" % heading, entry]
+            size = sum(len(line) for line in page)
+        else:
+            page.extend(lines)
+            size += added
+        current = heading
+
+    if page:
+        yield "".join(page)
+
+
+# The subpages of a date with too many logs for the log page, as [(name, path)]
+# of the files they are spooled to, and the section of the log page that links
+# to them.
+SectionSubpages = namedtuple("SectionSubpages", ["section", "pages", "unresolved"])
+
+
+def render_section_subpages(
+    wikidb, wp10db, project_name, dt, logs, spool_dir, unresolved=None
+):
+    """Renders the section of the date split into numbered subpages of the log
+    page, and returns them as [(name, path)].
+
+    Each subpage is written to a file in spool_dir as soon as it is rendered,
+    so that the whole section is never held in memory. See
+    _iter_section_entries for unresolved.
+    """
+    pages = []
+    for number, text in enumerate(
+        iter_section_pages(
+            wikidb, wp10db, project_name, dt, logs, unresolved=unresolved
+        ),
+        start=1,
+    ):
+        path = os.path.join(spool_dir, "%s-%d.wiki" % (dt.strftime("%Y-%m-%d"), number))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        pages.append((log_subpage_name(project_name, dt, number), path))
+    return pages
+
+
+def subpages_section(dt, num_logs, pages):
+    """Returns the section of the log page that links to the subpages."""
+    links = "".join(
+        "* [[%s|Part %d]]\n" % (name, i) for i, (name, _) in enumerate(pages, start=1)
+    )
+    return (
+        "=== %s ===\nThe log for this date has %s entries, split across %d "
+        "pages:\n%s"
+        % (dt.strftime(LOG_DATE_FORMAT), "{:,d}".format(num_logs), len(pages), links)
+    )
+
+
+def _blank_stale_subpages(project_name, dt, number, summary):
+    """Blanks the subpages of the date from number on, left over from an update
+    that split the date across more pages. Returns False if one of them couldn't
+    be read or saved."""
+    while True:
+        page = api.get_page(log_subpage_name(project_name, dt, number))
+        if page is None:
+            return False
+        # Subpages are blanked in order, so the first one that is missing or
+        # already blank is the end of them.
+        if not page.exists or not page.text().strip():
+            return True
+        logger.info("Blanking stale log subpage %s", page.name)
+        if not api.save_page(page, "", summary):
+            return False
+        number += 1
+
+
+def save_section_subpages(project_name, dt, pages):
+    """Saves the spooled subpages of the date, one at a time, skipping those
+    whose text is already live, and blanks any higher-numbered ones left over
+    from an earlier update.
+
+    Returns True only if every subpage is now live, so that the section linking
+    to them can be cached.
+    """
+    summary = "Update logs for %s" % dt.strftime("%Y-%m-%d")
+    for name, path in pages:
+        page = api.get_page(name)
+        if page is None:
+            logger.warning("Could not get log subpage %s, not saving it", name)
+            return False
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        # The wiki strips trailing whitespace from saved pages.
+        if page.text().rstrip() == text.rstrip():
+            continue
+        logger.info("Saving log subpage %s", name)
+        if not api.save_page(page, text, summary):
+            return False
+    return _blank_stale_subpages(project_name, dt, len(pages) + 1, summary)
+
+
+def _cache_section(redis, project_name, dt, logs, section, unresolved):
+    """Caches the section of the date, unless it has unresolved revisions, so
+    that they are looked up again by the next update."""
+    if unresolved:
+        logger.info(
+            "Not caching the log section of %s for %s, %s articles have "
+            "unresolved revisions",
+            dt.strftime("%Y-%m-%d"),
+            project_name.decode("utf-8"),
+            len(unresolved),
+        )
+        return
+    log_section_cache.set_section(
+        redis, project_name, dt, log_section_cache.logs_digest(logs), section
+    )
+
+
+def section_for_date(
+    wikidb,
+    wp10db,
+    project_name,
+    dt,
+    logs,
+    cache=None,
+    subpages=None,
+    spool_dir=None,
+    unresolved=None,
+):
+    """Returns the rendered section of the date for the log page.
+
+    A date with more than MAX_LOGS_PER_DAY logs is too large for the log page.
+    If subpages is a list, the date is rendered into it as subpages spooled to
+    spool_dir (see render_section_subpages) and the returned section links to
+    them; saving them is left to the caller. If unresolved is a set, the articles with a
+    revision id that couldn't be found are added to it.
+    """
     if len(logs) > MAX_LOGS_PER_DAY:
-        return [
+        if subpages is not None:
+            subpages.extend(
+                render_section_subpages(
+                    wikidb,
+                    wp10db,
+                    project_name,
+                    dt,
+                    logs,
+                    spool_dir,
+                    unresolved=unresolved,
+                )
+            )
+            return subpages_section(dt, len(logs), subpages)
+        return (
             "The log for today is too large to upload. It contains %s entries."
             % len(logs)
-        ]
+        )
 
-    template_data = get_section_data(wikidb, wp10db, project_name, dt, logs)
+    template_data = get_section_data(
+        wikidb, wp10db, project_name, dt, logs, cache=cache
+    )
+    if unresolved is not None:
+        unresolved.update(unresolved_articles(template_data))
     template = jinja_env.get_template("log_section.jinja2")
     return template.render(template_data)
 
 
-def generate_log_edits(wikidb, wp10db, project_name, log_map):
+def generate_log_edits(
+    wikidb, wp10db, project_name, log_map, redis=None, subpages=None, spool_dir=None
+):
+    """Returns the rendered log sections of log_map, newest date first.
+
+    With redis, the section of a date is reused from log_section_cache if the
+    date's logs haven't changed since it was rendered. A section with a
+    revision id that couldn't be found on the replica isn't cached, so that it
+    is looked up again by the next update.
+
+    If subpages is a dict, each date with too many logs for the log page is
+    rendered into subpages spooled to spool_dir, and added to it as a
+    SectionSubpages. Those are
+    neither saved nor cached here: the caller saves the ones that make it onto
+    the log page, and then caches their sections.
+    """
+    cache = LogLookupCache()
     dt_to_sections = {}
     for dt, logs in log_map.items():
-        dt_to_sections[dt] = section_for_date(wikidb, wp10db, project_name, dt, logs)
+        if redis is not None:
+            digest = log_section_cache.logs_digest(logs)
+            section = log_section_cache.get_section(redis, project_name, dt, digest)
+            if section is not None:
+                dt_to_sections[dt] = section
+                continue
+
+        unresolved = set()
+        pages = [] if subpages is not None else None
+        section = section_for_date(
+            wikidb,
+            wp10db,
+            project_name,
+            dt,
+            logs,
+            cache=cache,
+            subpages=pages,
+            spool_dir=spool_dir,
+            unresolved=unresolved,
+        )
+        if pages:
+            subpages[dt] = SectionSubpages(section, pages, unresolved)
+        elif redis is not None and len(logs) <= MAX_LOGS_PER_DAY:
+            _cache_section(redis, project_name, dt, logs, section, unresolved)
+        dt_to_sections[dt] = section
 
     dt_sorted = sorted(dt_to_sections.keys(), reverse=True)
-    sorted_sections = [dt_to_sections[dt] for dt in dt_sorted]
-
-    # Put in logic to check the length of the sections and break them across
-    # multiple pages as appropriate
-    return sorted_sections
+    return [dt_to_sections[dt] for dt in dt_sorted]
 
 
 def live_page_dates_missing_from_logs(page_text, log_dates, from_dt):
@@ -237,11 +631,11 @@ def update_log_page_for_project(project_name):
     wikidb = wiki_connect()
     wp10db = wp10_connect()
     redis = redis_connect()
+    spool_dir = tempfile.mkdtemp(prefix="wp1-log-subpages-")
     app_logging.configure_logging()
 
     try:
         log_map = calculate_logs_to_update(redis, project_name)
-        edits = generate_log_edits(wikidb, wp10db, project_name, log_map)
 
         p = api.get_page(log_page_name(project_name))
 
@@ -261,6 +655,16 @@ def update_log_page_for_project(project_name):
             )
             return
 
+        subpages = {}
+        edits = generate_log_edits(
+            wikidb,
+            wp10db,
+            project_name,
+            log_map,
+            redis=redis,
+            subpages=subpages,
+            spool_dir=spool_dir,
+        )
         header = "<noinclude>{{Log}}\n{{Automatically generated}}</noinclude>\n"
 
         if len(edits) == 0:
@@ -270,20 +674,50 @@ def update_log_page_for_project(project_name):
                 today.strftime(LOG_DATE_FORMAT),
             )
         else:
+            # Drop the oldest sections until the page fits.
+            kept = len(edits)
             update = header + "\n".join(edits)
-            i = 1
             while len(update) > 2048 * 1024:
-                update = header + "\n".join(edits[: -1 * i])
-                i += 1
-                if i == len(edits):
+                kept -= 1
+                if kept == 0:
                     update = (
                         header + "Sorry, all of the logs for this date were too "
                         "large to upload."
                     )
+                    break
+                update = header + "\n".join(edits[:kept])
+
+            # Only the subpages of the sections left on the page are saved, so
+            # that none are left unlinked. A section is only cached once all of
+            # its subpages are live, or later updates would never save them.
+            for dt in sorted(log_map, reverse=True)[:kept]:
+                if dt not in subpages:
+                    continue
+                if not save_section_subpages(project_name, dt, subpages[dt].pages):
+                    logger.warning(
+                        "Could not save every log subpage of %s for %s",
+                        dt.strftime("%Y-%m-%d"),
+                        project_name.decode("utf-8"),
+                    )
+                    continue
+                _cache_section(
+                    redis,
+                    project_name,
+                    dt,
+                    log_map[dt],
+                    subpages[dt].section,
+                    subpages[dt].unresolved,
+                )
+
+        # The wiki strips trailing whitespace from saved pages.
+        if update.rstrip() == page_text.rstrip():
+            logger.info("Logs for %s are unchanged, skipping edit", project_name)
+            return
 
         logger.info("Updating logs for %s", project_name)
         api.save_page(p, update, "Update logs for past 7 days")
     finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
         if wikidb:
             wikidb.close()
         if wp10db:
@@ -1,6 +1,9 @@
+import os
+import shutil
+import tempfile
 from collections import defaultdict
 from datetime import datetime
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import attr
 
@@ -594,7 +597,8 @@ class LogsTest(BaseCombinedDbTest):
 
     def test_get_logs_matches_legacy_undated_keys(self):
         # Keys written before the :YYYYMMDD suffix existed must still be
-        # returned by wildcard-article reads until their TTL expires.
+        # returned by wildcard-article reads until their TTL expires, once
+        # the keys written before the indexes existed are indexed.
         legacy = Log(
             l_project=self.project,
             l_article=b"Legacy article",
@@ -613,6 +617,7 @@ class LogsTest(BaseCombinedDbTest):
             "wp1:logs:%s:0:quality:Legacy article" % self.project.decode("utf-8"),
             mapping=mapping,
         )
+        logic_log.index_existing_logs(self.redis)
 
         actual = logic_log.get_logs(self.redis, project=self.project)
         self.assertIn(legacy, actual)
@@ -641,6 +646,46 @@ class LogsTest(BaseCombinedDbTest):
             )
             self.assertEqual(int("%s000" % len(l.l_article)), actual, l)
 
+    def test_get_revids(self):
+        pages = [
+            (l.l_article, l.l_namespace + talk, l.rev_timestamp_dt)
+            for l in self._logs()
+            for talk in (0, 1)
+        ]
+        pages.append((b"Non-existant", 0, datetime(2018, 1, 1)))
+
+        with patch("wp1.logs.REVID_LOOKUP_BATCH_SIZE", 4):
+            actual = logs.get_revids(self.wikidb, pages)
+
+        expected = {
+            page: logs.get_revid(self.wikidb, *page) for page in dict.fromkeys(pages)
+        }
+        self.assertEqual(expected, actual)
+
+    def test_get_revids_uses_cache(self):
+        page = (b"Art of testing", 0, datetime(2018, 12, 26))
+        cache = logs.LogLookupCache()
+        logs.get_revids(self.wikidb, [page], cache=cache)
+
+        with patch.object(self.wikidb, "cursor") as patched_cursor:
+            actual = logs.get_revids(self.wikidb, [page], cache=cache)
+
+        patched_cursor.assert_not_called()
+        self.assertEqual({page: 14000}, actual)
+
+    def test_get_move_targets(self):
+        moves = [
+            (0, m[0], self.wiki_timestamps[i % len(self.wiki_timestamps)])
+            for i, m in enumerate(self.moves)
+        ]
+        moves.append((0, b"Never moved", self.wiki_timestamps[0]))
+
+        actual = logs.get_move_targets(self.wp10db, moves)
+
+        for i, m in enumerate(self.moves):
+            self.assertEqual({"ns": 0, "article": m[1]}, actual[moves[i]])
+        self.assertIsNone(actual[moves[-1]])
+
     def test_name_for_article_normal(self):
         actual = logs.name_for_article(self.wp10db, b"Test Article", 0)
         self.assertEqual("Test Article", actual)
@@ -909,6 +954,160 @@ class LogsTest(BaseCombinedDbTest):
         )
         self.assertEqual(expected, actual)
 
+    def _day_logs(self):
+        day_logs = [
+            l for l in self._logs() if l.l_revision_timestamp.startswith(b"2018-12-25")
+        ]
+        day_logs.extend(
+            l
+            for l in self._move_logs()
+            if l.l_revision_timestamp.startswith(b"2018-12-25")
+        )
+        return day_logs
+
+    def test_iter_section_pages(self):
+        day_logs = self._day_logs()
+        section = logs.section_for_date(
+            self.wikidb,
+            self.wp10db,
+            b"Catholicism",
+            datetime(2018, 12, 25).date(),
+            day_logs,
+        )
+
+        with patch("wp1.logs.LOG_RENDER_CHUNK_SIZE", 2):
+            pages = list(
+                logs.iter_section_pages(
+                    self.wikidb,
+                    self.wp10db,
+                    b"Catholicism",
+                    datetime(2018, 12, 25).date(),
+                    day_logs,
+                    max_size=1000,
+                )
+            )
+
+        self.assertGreater(len(pages), 1)
+        for page in pages:
+            self.assertTrue(page.startswith("=== December 25, 2018 ===\n"))
+            self.assertLessEqual(len(page), 1000)
+        entries = lambda text: [
+            line for line in text.splitlines() if line.startswith("* ")
+        ]
+        self.assertEqual(entries(section), [e for page in pages for e in entries(page)])
+
+    def test_section_for_date_too_large(self):
+        with patch("wp1.logs.MAX_LOGS_PER_DAY", 3):
+            actual = logs.section_for_date(
+                self.wikidb,
+                self.wp10db,
+                b"Catholicism",
+                datetime(2018, 12, 25).date(),
+                self._day_logs(),
+            )
+
+        self.assertTrue(actual.startswith("The log for today is too large"))
+
+    def _spool_dir(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+        return spool_dir
+
+    def _spool(self, spool_dir, name, text):
+        path = os.path.join(spool_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def _live_subpages(self, patched_api, live):
+        patched_api.get_page.side_effect = lambda name: (
+            MagicMock(text=MagicMock(return_value=live[name]))
+            if name in live
+            else MagicMock(exists=False)
+        )
+
+    def test_section_for_date_renders_subpages(self):
+        day_logs = self._day_logs()
+        spool_dir = self._spool_dir()
+        subpages = []
+        with patch("wp1.logs.MAX_LOGS_PER_DAY", 3):
+            with patch("wp1.logs.LOG_SUBPAGE_MAX_SIZE", 1000):
+                actual = logs.section_for_date(
+                    self.wikidb,
+                    self.wp10db,
+                    b"Catholicism",
+                    datetime(2018, 12, 25).date(),
+                    day_logs,
+                    subpages=subpages,
+                    spool_dir=spool_dir,
+                )
+
+        self.assertGreater(len(subpages), 1)
+        subpage = (
+            "Wikipedia:Version_1.0_Editorial_Team/Catholicism_articles_by_quality_log"
+            "/2018-12-25/%d"
+        )
+        for i, (name, path) in enumerate(subpages, start=1):
+            self.assertEqual(subpage % i, name)
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            self.assertTrue(text.startswith("=== December 25, 2018 ==="))
+            self.assertLessEqual(len(text), 1000)
+        self.assertTrue(actual.startswith("=== December 25, 2018 ===\n"))
+        self.assertIn("[[%s|Part 1]]" % (subpage % 1), actual)
+        self.assertIn("has %s entries" % len(day_logs), actual)
+
+    @patch("wp1.logs.api")
+    def test_save_section_subpages_skips_unchanged(self, patched_api):
+        dt = datetime(2018, 12, 25).date()
+        spool_dir = self._spool_dir()
+        pages = [
+            ("Log/1", self._spool(spool_dir, "1", "one")),
+            ("Log/2", self._spool(spool_dir, "2", "new")),
+        ]
+        self._live_subpages(patched_api, {"Log/1": "one\n", "Log/2": "old"})
+        patched_api.save_page.return_value = True
+
+        self.assertTrue(logs.save_section_subpages(b"Catholicism", dt, pages))
+
+        patched_api.save_page.assert_called_once()
+        self.assertEqual("new", patched_api.save_page.call_args[0][1])
+
+    @patch("wp1.logs.api")
+    def test_save_section_subpages_blanks_stale(self, patched_api):
+        dt = datetime(2018, 12, 25).date()
+        name = lambda number: logs.log_subpage_name(b"Catholicism", dt, number)
+        pages = [(name(1), self._spool(self._spool_dir(), "1", "one"))]
+        self._live_subpages(
+            patched_api, {name(1): "one", name(2): "two", name(3): "three", name(4): ""}
+        )
+        patched_api.save_page.return_value = True
+
+        self.assertTrue(logs.save_section_subpages(b"Catholicism", dt, pages))
+
+        self.assertEqual(
+            ["", ""], [call[0][1] for call in patched_api.save_page.call_args_list]
+        )
+        patched_api.get_page.assert_any_call(name(4))
+
+    @patch("wp1.logs.api")
+    def test_save_section_subpages_save_fails(self, patched_api):
+        dt = datetime(2018, 12, 25).date()
+        pages = [("Log/1", self._spool(self._spool_dir(), "1", "one"))]
+        self._live_subpages(patched_api, {"Log/1": ""})
+        patched_api.save_page.return_value = False
+
+        self.assertFalse(logs.save_section_subpages(b"Catholicism", dt, pages))
+
+    @patch("wp1.logs.api")
+    def test_save_section_subpages_no_page(self, patched_api):
+        dt = datetime(2018, 12, 25).date()
+        pages = [("Log/1", self._spool(self._spool_dir(), "1", "one"))]
+        patched_api.get_page.return_value = None
+
+        self.assertFalse(logs.save_section_subpages(b"Catholicism", dt, pages))
+        patched_api.save_page.assert_not_called()
+
     def test_generate_log_edits(self):
         log_map = {}
         dates = ((25, b"2018-12-25"), (26, b"2018-12-26"), (27, b"2018-12-27"))
@@ -930,6 +1129,74 @@ class LogsTest(BaseCombinedDbTest):
         self.assertTrue(actual[1].startswith("=== December 26, 2018 ==="))
         self.assertTrue(actual[2].startswith("=== December 25, 2018 ==="))
 
+    def test_generate_log_edits_reuses_cached_sections(self):
+        day_logs = [
+            l for l in self._logs() if l.l_revision_timestamp.startswith(b"2018-12-25")
+        ]
+        log_map = {datetime(2018, 12, 25).date(): day_logs}
+        expected = logs.generate_log_edits(
+            self.wikidb, self.wp10db, b"Catholicism", log_map, redis=self.redis
+        )
+
+        with patch("wp1.logs.section_for_date") as patched_section:
+            actual = logs.generate_log_edits(
+                self.wikidb, self.wp10db, b"Catholicism", log_map, redis=self.redis
+            )
+
+        patched_section.assert_not_called()
+        self.assertEqual(expected, actual)
+
+    def test_generate_log_edits_renders_changed_sections(self):
+        day_logs = [
+            l for l in self._logs() if l.l_revision_timestamp.startswith(b"2018-12-25")
+        ]
+        logs.generate_log_edits(
+            self.wikidb,
+            self.wp10db,
+            b"Catholicism",
+            {datetime(2018, 12, 25).date(): day_logs},
+            redis=self.redis,
+        )
+
+        with patch(
+            "wp1.logs.section_for_date", return_value="=== December 25, 2018 ==="
+        ) as patched_section:
+            logs.generate_log_edits(
+                self.wikidb,
+                self.wp10db,
+                b"Catholicism",
+                {datetime(2018, 12, 25).date(): day_logs[1:]},
+                redis=self.redis,
+            )
+
+        patched_section.assert_called_once()
+
+    def test_generate_log_edits_does_not_cache_unresolved_revids(self):
+        day_logs = [
+            l for l in self._logs() if l.l_revision_timestamp.startswith(b"2018-12-25")
+        ]
+        log_map = {datetime(2018, 12, 25).date(): day_logs}
+        # As if the replica was lagging behind.
+        with patch(
+            "wp1.logs.get_revids",
+            side_effect=lambda wikidb, pages, cache=None: dict.fromkeys(pages),
+        ):
+            logs.generate_log_edits(
+                self.wikidb, self.wp10db, b"Catholicism", log_map, redis=self.redis
+            )
+
+        actual = logs.generate_log_edits(
+            self.wikidb, self.wp10db, b"Catholicism", log_map, redis=self.redis
+        )
+
+        self.assertNotIn("oldid=None", actual[0])
+        self.assertEqual(
+            actual,
+            logs.generate_log_edits(
+                self.wikidb, self.wp10db, b"Catholicism", log_map, redis=self.redis
+            ),
+        )
+
     @patch("wp1.logs.redis_connect")
     @patch("wp1.logs.wiki_connect")
     @patch("wp1.logs.wp10_connect")
@@ -1066,6 +1333,32 @@ class LogsTest(BaseCombinedDbTest):
         logs.update_log_page_for_project(b"Catholicism")
         patched_api.save_page.assert_called_once()
 
+    @patch("wp1.logs.redis_connect")
+    @patch("wp1.logs.wiki_connect")
+    @patch("wp1.logs.wp10_connect")
+    @patch("wp1.logs.api")
+    @patch("wp1.logs.generate_log_edits")
+    @patch("wp1.logs.calculate_logs_to_update")
+    @patch("wp1.logs.get_current_datetime", return_value=datetime(2018, 12, 28, 12))
+    def test_upload_log_page_unchanged_skips(
+        self,
+        patched_datetime,
+        patched_calculate,
+        patched_generate,
+        patched_api,
+        patched_wp10,
+        patched_wiki,
+        patched_redis,
+    ):
+        patched_calculate.return_value = {datetime(2018, 12, 27).date(): ["some log"]}
+        patched_generate.return_value = ["=== December 27, 2018 ===\ncontent\n"]
+        patched_api.get_page.return_value.text.return_value = (
+            "<noinclude>{{Log}}\n{{Automatically generated}}</noinclude>\n"
+            "=== December 27, 2018 ===\ncontent"
+        )
+        logs.update_log_page_for_project(b"Catholicism")
+        patched_api.save_page.assert_not_called()
+
     @patch("wp1.logs.redis_connect")
     @patch("wp1.logs.wiki_connect")
     @patch("wp1.logs.wp10_connect")
@@ -1100,3 +1393,70 @@ class LogsTest(BaseCombinedDbTest):
         logs.update_log_page_for_project(b"Catholicism")
         call = patched_api.save_page.call_args[0]
         self.assertEqual(header + sorry_msg, call[1])
+
+    @patch("wp1.logs.redis_connect")
+    @patch("wp1.logs.wiki_connect")
+    @patch("wp1.logs.wp10_connect")
+    @patch("wp1.logs.api")
+    @patch("wp1.logs.calculate_logs_to_update")
+    @patch("wp1.logs.generate_log_edits")
+    def test_upload_log_page_for_project_skips_subpages_of_dropped_sections(
+        self,
+        patched_generate,
+        patched_calculate,
+        patched_api,
+        patched_wp10,
+        patched_wiki,
+        patched_redis,
+    ):
+        patched_api.get_page.return_value.text.return_value = ""
+        patched_api.save_page.return_value = True
+        old, new = datetime(2018, 12, 25).date(), datetime(2018, 12, 26).date()
+        patched_calculate.return_value = {old: [], new: []}
+        patched_generate.side_effect = self._generate_subpages(old, new)
+
+        with patch("wp1.logs.log_section_cache") as patched_cache:
+            logs.update_log_page_for_project(b"Catholicism")
+
+        saved = [call[0][1] for call in patched_api.save_page.call_args_list]
+        self.assertIn("n", saved)
+        self.assertNotIn("o", saved)
+        patched_cache.set_section.assert_called_once()
+        self.assertEqual(new, patched_cache.set_section.call_args[0][2])
+
+    def _generate_subpages(self, old, new):
+        text = "a" * 1500 * 1024
+
+        def generate(*args, subpages=None, spool_dir=None, **kwargs):
+            for dt, t in ((old, "o"), (new, "n")):
+                pages = [("Log/%s/1" % t, self._spool(spool_dir, t, t))]
+                subpages[dt] = logs.SectionSubpages(t, pages, set())
+            return [text, text]
+
+        return generate
+
+    @patch("wp1.logs.redis_connect")
+    @patch("wp1.logs.wiki_connect")
+    @patch("wp1.logs.wp10_connect")
+    @patch("wp1.logs.api")
+    @patch("wp1.logs.calculate_logs_to_update")
+    @patch("wp1.logs.generate_log_edits")
+    def test_upload_log_page_for_project_subpages_not_saved_not_cached(
+        self,
+        patched_generate,
+        patched_calculate,
+        patched_api,
+        patched_wp10,
+        patched_wiki,
+        patched_redis,
+    ):
+        patched_api.get_page.return_value.text.return_value = ""
+        patched_api.save_page.return_value = False
+        old, new = datetime(2018, 12, 25).date(), datetime(2018, 12, 26).date()
+        patched_calculate.return_value = {old: [], new: []}
+        patched_generate.side_effect = self._generate_subpages(old, new)
+
+        with patch("wp1.logs.log_section_cache") as patched_cache:
+            logs.update_log_page_for_project(b"Catholicism")
+
+        patched_cache.set_section.assert_not_called()
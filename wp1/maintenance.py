@@ -8,34 +8,27 @@ executed by the single-worker 'maintenance' queue, which serializes them.
 import logging
 import subprocess
 
-from redis import Redis
 from rq import Queue
-from rq.command import send_stop_job_command
-from rq.registry import StartedJobRegistry
 
 import wp1.logic.project as logic_project
-from wp1 import constants, queues, tables
+from wp1 import constants, queues, scores, tables
+from wp1.logic import global_articles as logic_global_articles
 from wp1.credentials import ENV
 from wp1.environment import Environment
 from wp1.redis_db import connect as redis_connect
-from wp1.wiki_db import connect as wiki_connect
 from wp1.wp10_db import connect as wp10_connect
 
 logger = logging.getLogger(__name__)
 
-# Must cover the global articles rebuild itself.
+# Must cover the merge of a day's worth of global article changes.
 UPDATE_GLOBAL_JOB_TIMEOUT = 60 * 60 * 6
+# Must cover the download of the pageview dump and its split into spool files.
+UPDATE_PAGEVIEWS_JOB_TIMEOUT = 60 * 60 * 6
 
 # Everything in the workers container runs from this supervisord config,
 # including the maintenance-queue worker these jobs execute on.
 SUPERVISORD_CONF = "/usr/src/app/supervisord.conf"
 
-# The supervisord groups of workers that execute project update jobs, and the
-# queues they serve. The maintenance worker must never be part of these
-# groups, or update_global_articles would kill its own worker.
-UPDATE_WORKER_GROUPS = ("wp1-update:*", "wp1-manual-update:*")
-_UPDATE_QUEUE_NAMES = ("update", "manual-update")
-
 
 def enqueue_all():
     """Nightly (midnight UTC): enqueue update + upload jobs for all projects."""
@@ -46,25 +39,17 @@ def enqueue_all():
 
 
 def update_global_articles():
-    """Daily (04:00 UTC): rebuild the global articles table.
-
-    The rebuild needs the update workers quiet so that project updates aren't
-    writing ratings data while it runs, and it supersedes any per-project
-    update jobs that are still in flight. Those jobs are sent a stop command
-    (so they die cleanly instead of via supervisord's 10s SIGKILL) and then
-    the update and manual-update worker processes are stopped for the
-    duration of the rebuild. All other queues (materializer, zimfile-*,
-    upload) keep serving users throughout.
+    """Daily (04:00 UTC): merge the day's rating changes into global articles.
+
+    Only the articles that project updates logged as changed are recomputed
+    (see logic.global_articles), so the update workers keep running.
     """
-    redis = redis_connect()
-    _stop_inflight_update_jobs(redis)
-    # If the workers can't be stopped, this raises and the rebuild is
-    # aborted: rebuilding while update jobs run risks inconsistent data.
-    _supervisorctl("stop", *UPDATE_WORKER_GROUPS)
+    wp10db = wp10_connect()
     try:
-        rebuild_global_articles()
+        merged = logic_global_articles.merge_changes(wp10db)
     finally:
-        _supervisorctl("start", *UPDATE_WORKER_GROUPS)
+        wp10db.close()
+    logger.info("Updated global articles for %s changed articles", merged)
 
 
 def enqueue_global():
@@ -82,30 +67,32 @@ def enqueue_global():
     )
 
 
-def rebuild_global_articles():
-    """Update the global articles table for every project, with no locking.
+def update_pageviews_sharded(processes=constants.PAGEVIEW_DECOMPRESS_PROCESSES):
+    """Monthly (5th, 06:00 UTC): refresh the pageview scores with one load job
+    per language.
 
-    Callers are responsible for quiescing the update workers first if needed
-    (see update_global_articles).
+    The dump is downloaded if needed and split into per-language spool files
+    in a single pass, then a retryable load job is enqueued for each language
+    on the 'pageviews' queue (see scores.update_pageviews_for_lang). Unlike
+    scores.update_pageviews, a failing language doesn't hold up the others.
     """
-    wikidb = wiki_connect()
-    wp10db = wp10_connect()
+    scores.download_pageviews()
+    spools = scores.spool_pageviews(processes=processes)
+    logger.info("Spooled pageviews for %s languages", len(spools))
+
+    redis = redis_connect()
+    queues.enqueue_pageview_lang_updates(redis, spools)
 
-    for project_name in logic_project.project_names_to_update(wikidb):
-        logic_project.update_global_articles_for_project_name(wp10db, project_name)
 
+def rebuild_global_articles(workers=constants.GLOBAL_ARTICLES_REBUILD_WORKERS):
+    """Rebuild the global articles table from scratch.
 
-def _stop_inflight_update_jobs(redis: Redis):
-    """Tell the workers to kill any currently-executing update jobs."""
-    for queue_name in _UPDATE_QUEUE_NAMES:
-        registry = StartedJobRegistry(queue=Queue(queue_name, connection=redis))
-        for job_id in registry.get_job_ids():
-            try:
-                send_stop_job_command(redis, job_id)
-                logger.info("Sent stop command to in-flight update job %s", job_id)
-            except Exception as e:
-                # Typically the job finished between listing and stopping.
-                logger.info("Could not stop update job %s: %s", job_id, e)
+    The new table is filled as a shadow table and swapped in atomically, so
+    update workers and readers keep running. Day to day, update_global_articles
+    merges just the changed articles instead. Enqueue this on the maintenance
+    queue (see rebuild-global-articles.py) so that it never overlaps a merge.
+    """
+    logic_global_articles.rebuild(wp10_connect, workers)
 
 
 def _restart_upload_workers():
@@ -124,7 +111,7 @@ def _supervisorctl(*args: str):
         check=True,
         capture_output=True,
         text=True,
-        # Stopping the update worker group can take up to ~10s per busy
+        # Restarting a worker group can take up to ~10s per busy
         # worker (supervisord's TERM-then-kill window).
         timeout=300,
     )
@@ -1,8 +1,6 @@
-import time
-from unittest.mock import call, patch
+from unittest.mock import patch
 
 from rq import Queue
-from rq.registry import StartedJobRegistry
 
 from wp1 import maintenance
 from wp1.base_db_test import BaseWpOneDbTest
@@ -26,6 +24,23 @@ class MaintenanceTest(BaseWpOneDbTest):
         mock_restart.assert_called_once_with()
         mock_enqueue_all.assert_called_once_with(self.redis, self.wp10db)
 
+    @patch("wp1.maintenance.queues.enqueue_pageview_lang_updates")
+    @patch("wp1.maintenance.scores.spool_pageviews")
+    @patch("wp1.maintenance.scores.download_pageviews")
+    @patch("wp1.maintenance.redis_connect")
+    def test_update_pageviews_sharded(
+        self, mock_redis_connect, mock_download, mock_spool, mock_enqueue
+    ):
+        mock_redis_connect.return_value = self.redis
+        spools = {b"en": ("/tmp/spool/en.tsv", 10)}
+        mock_spool.return_value = spools
+
+        maintenance.update_pageviews_sharded(processes=2)
+
+        mock_download.assert_called_once_with()
+        mock_spool.assert_called_once_with(processes=2)
+        mock_enqueue.assert_called_once_with(self.redis, spools)
+
     @patch("wp1.maintenance.ENV", Environment.PRODUCTION)
     def test_enqueue_global_production(self):
         with patch("wp1.maintenance.redis_connect", return_value=self.redis):
@@ -43,87 +58,26 @@ class MaintenanceTest(BaseWpOneDbTest):
         self.assertEqual(1, Queue("upload", connection=self.redis).count)
 
     @patch("wp1.maintenance._supervisorctl")
-    @patch("wp1.maintenance.rebuild_global_articles")
-    @patch("wp1.maintenance.redis_connect")
-    def test_update_global_articles_stops_workers_during_rebuild(
-        self, mock_redis_connect, mock_rebuild, mock_supervisorctl
-    ):
-        mock_redis_connect.return_value = self.redis
-        events = []
-        mock_supervisorctl.side_effect = lambda *args: events.append(args)
-        mock_rebuild.side_effect = lambda: events.append("rebuild")
-
-        maintenance.update_global_articles()
-
-        self.assertEqual(
-            [
-                ("stop", *maintenance.UPDATE_WORKER_GROUPS),
-                "rebuild",
-                ("start", *maintenance.UPDATE_WORKER_GROUPS),
-            ],
-            events,
-        )
-
-    @patch("wp1.maintenance._supervisorctl")
-    @patch("wp1.maintenance.rebuild_global_articles")
-    @patch("wp1.maintenance.redis_connect")
-    def test_update_global_articles_restarts_workers_after_failure(
-        self, mock_redis_connect, mock_rebuild, mock_supervisorctl
-    ):
-        mock_redis_connect.return_value = self.redis
-        mock_rebuild.side_effect = RuntimeError("rebuild blew up")
-
-        with self.assertRaises(RuntimeError):
-            maintenance.update_global_articles()
-
-        mock_supervisorctl.assert_has_calls(
-            [call("start", *maintenance.UPDATE_WORKER_GROUPS)]
-        )
-
-    @patch("wp1.maintenance._supervisorctl")
-    @patch("wp1.maintenance.rebuild_global_articles")
-    @patch("wp1.maintenance.redis_connect")
-    def test_update_global_articles_aborts_if_workers_cannot_be_stopped(
-        self, mock_redis_connect, mock_rebuild, mock_supervisorctl
+    @patch("wp1.maintenance.wp10_connect")
+    def test_update_global_articles_merges_changes(
+        self, mock_wp10_connect, mock_supervisorctl
     ):
-        mock_redis_connect.return_value = self.redis
-        mock_supervisorctl.side_effect = OSError("no supervisord")
+        orig_close = self.wp10db.close
+        self.wp10db.close = lambda: True
+        self.addCleanup(setattr, self.wp10db, "close", orig_close)
+        mock_wp10_connect.return_value = self.wp10db
 
-        with self.assertRaises(OSError):
+        with patch(
+            "wp1.maintenance.logic_global_articles.merge_changes", return_value=3
+        ) as mock_merge:
             maintenance.update_global_articles()
 
-        mock_rebuild.assert_not_called()
-
-    @patch("wp1.maintenance.send_stop_job_command")
-    @patch("wp1.maintenance._supervisorctl")
-    @patch("wp1.maintenance.rebuild_global_articles")
-    @patch("wp1.maintenance.redis_connect")
-    def test_update_global_articles_stops_inflight_jobs(
-        self, mock_redis_connect, mock_rebuild, mock_supervisorctl, mock_send_stop
-    ):
-        mock_redis_connect.return_value = self.redis
-        registry = StartedJobRegistry(queue=Queue("update", connection=self.redis))
-        self.redis.zadd(registry.key, {"in-flight-job:execution": time.time() + 3600})
-
-        maintenance.update_global_articles()
-
-        mock_send_stop.assert_called_once_with(self.redis, "in-flight-job")
-        mock_rebuild.assert_called_once_with()
-
-    @patch("wp1.maintenance.send_stop_job_command")
-    @patch("wp1.maintenance._supervisorctl")
-    @patch("wp1.maintenance.rebuild_global_articles")
-    @patch("wp1.maintenance.redis_connect")
-    def test_update_global_articles_survives_stop_command_failure(
-        self, mock_redis_connect, mock_rebuild, mock_supervisorctl, mock_send_stop
-    ):
-        mock_redis_connect.return_value = self.redis
-        registry = StartedJobRegistry(queue=Queue("update", connection=self.redis))
-        self.redis.zadd(registry.key, {"finished-job:execution": time.time() + 3600})
-        # The job finished between listing and stopping; the rebuild proceeds
-        # because the worker processes get stopped regardless.
-        mock_send_stop.side_effect = Exception("job not currently executing")
+        mock_merge.assert_called_once_with(self.wp10db)
+        # The update workers keep running.
+        mock_supervisorctl.assert_not_called()
 
-        maintenance.update_global_articles()
+    @patch("wp1.maintenance.logic_global_articles.rebuild")
+    def test_rebuild_global_articles(self, mock_rebuild):
+        maintenance.rebuild_global_articles(workers=3)
 
-        mock_rebuild.assert_called_once_with()
+        mock_rebuild.assert_called_once_with(maintenance.wp10_connect, 3)
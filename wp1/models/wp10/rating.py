@@ -4,7 +4,7 @@ import urllib.parse
 
 import attr
 
-from wp1.constants import TS_FORMAT, FRONTEND_WIKI_BASE
+from wp1.constants import TS_FORMAT, FRONTEND_WIKI_BASE, UNRANKED
 import wp1.logic.util as logic_util
 
 logger = logging.getLogger(__name__)
@@ -22,6 +22,10 @@ class Rating:
     r_quality_timestamp = attr.ib(default=None)
     r_importance = attr.ib(default=None)
     r_importance_timestamp = attr.ib(default=None)
+    # Global rankings of r_quality and r_importance, denormalized from
+    # global_rankings for sorting. Derived data, so not compared.
+    r_quality_rank = attr.ib(default=UNRANKED, eq=False)
+    r_importance_rank = attr.ib(default=UNRANKED, eq=False)
 
     # The timestamp parsed into a datetime.datetime object.
     @property
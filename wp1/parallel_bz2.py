@@ -0,0 +1,184 @@
+"""Decompresses bz2 files on several cores.
+
+A bz2 file is a sequence of independently compressed blocks of at most 900kB
+of input each. Every block starts with a 48 bit magic number, and every stream
+ends with another one, but neither is byte aligned. This module finds those
+magic numbers at any bit offset, turns each block into a standalone single
+block bz2 stream and decompresses the blocks in a process pool, yielding the
+output in file order.
+
+The block magic can also occur by chance inside compressed data. A segment
+that fails to decompress is therefore retried together with the segment that
+follows it before giving up.
+"""
+
+import bz2
+import heapq
+import mmap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from wp1.exceptions import Wp1ScoreProcessingError
+
+BLOCK_MAGIC = 0x314159265359
+EOS_MAGIC = 0x177245385090
+MAGIC_BITS = 48
+CRC_BITS = 32
+
+# Every block is decoded as a level 9 stream, the largest block size, so that
+# blocks from any compression level fit.
+STREAM_HEADER = int.from_bytes(b"BZh9", "big")
+STREAM_HEADER_BITS = 32
+
+
+def _magic_patterns(magic):
+    """Yields (byte pattern, bit shift) for the magic at each bit offset.
+
+    With the magic starting s bits into a byte, the 7 bytes that contain it
+    have 5 fully determined bytes in the middle, which are searched for.
+    """
+    for shift in range(8):
+        shifted = (magic << (8 - shift)).to_bytes(7, "big")
+        yield shifted[1:6], shift
+
+
+def _read_bits(data, bit_offset, length):
+    start = bit_offset // 8
+    end = (bit_offset + length + 7) // 8
+    value = int.from_bytes(data[start:end], "big")
+    trailing = (end - start) * 8 - (bit_offset % 8) - length
+    return (value >> trailing) & ((1 << length) - 1)
+
+
+def find_markers(data):
+    """Yields (bit offset, is_block) of every block and end of stream magic.
+
+    data can be bytes or an mmap. Markers are yielded in file order.
+    """
+    searches = []
+    for magic, is_block in ((BLOCK_MAGIC, True), (EOS_MAGIC, False)):
+        for pattern, shift in _magic_patterns(magic):
+            searches.append((0, pattern, shift, magic, is_block))
+
+    def advance(start, pattern, shift, magic, is_block):
+        while True:
+            idx = data.find(pattern, start)
+            if idx == -1:
+                return None
+            bit_offset = (idx - 1) * 8 + shift
+            if bit_offset >= 0 and _read_bits(data, bit_offset, MAGIC_BITS) == magic:
+                return (bit_offset, pattern, shift, magic, is_block)
+            start = idx + 1
+
+    candidates = []
+    for entry in searches:
+        found = advance(*entry)
+        if found is not None:
+            candidates.append(found)
+    heapq.heapify(candidates)
+
+    while candidates:
+        bit_offset, pattern, shift, magic, is_block = heapq.heappop(candidates)
+        yield bit_offset, is_block
+        # The pattern matched at byte bit_offset // 8 + 1, continue after it.
+        found = advance(bit_offset // 8 + 2, pattern, shift, magic, is_block)
+        if found is not None:
+            heapq.heappush(candidates, found)
+
+
+def block_segments(data):
+    """Yields the (start, end) bit range of every compressed block in data."""
+    start = None
+    for bit_offset, is_block in find_markers(data):
+        if start is not None:
+            yield start, bit_offset
+        start = bit_offset if is_block else None
+
+
+def decompress_block(data, bit_offset, length):
+    """Decompresses the block of length bits at bit_offset in data.
+
+    Returns None if those bits aren't a valid block.
+    """
+    if length <= MAGIC_BITS + CRC_BITS:
+        return None
+    block = _read_bits(data, bit_offset, length)
+    crc = (block >> (length - MAGIC_BITS - CRC_BITS)) & ((1 << CRC_BITS) - 1)
+
+    # A single block stream: its combined CRC is the block CRC.
+    stream = (STREAM_HEADER << length) | block
+    stream = (stream << MAGIC_BITS) | EOS_MAGIC
+    stream = (stream << CRC_BITS) | crc
+    total_bits = STREAM_HEADER_BITS + length + MAGIC_BITS + CRC_BITS
+    padding = -total_bits % 8
+    stream <<= padding
+
+    try:
+        return bz2.decompress(stream.to_bytes((total_bits + padding) // 8, "big"))
+    except (OSError, ValueError, EOFError):
+        return None
+
+
+def _segment_bytes(data, start, end):
+    """Returns the bytes holding bits [start, end) and start's offset in them."""
+    return data[start // 8 : (end + 7) // 8], start % 8, end - start
+
+
+def iter_decompressed(path, processes, with_offsets=False):
+    """Yields the decompressed contents of the bz2 file at path, in order.
+
+    Blocks are decompressed by a pool of `processes` worker processes, with at
+    most two blocks per worker in flight at a time. With with_offsets=True,
+    (data, compressed byte offset of the end of the block) pairs are yielded.
+    """
+    if processes < 1:
+        raise ValueError("processes must be at least 1, got %r" % processes)
+
+    with open(path, "rb") as f:
+        if not f.read(1):
+            return
+        f.seek(0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                for output, end in _iter_ordered(data, executor, processes * 2):
+                    if with_offsets:
+                        yield output, (end + 7) // 8
+                    else:
+                        yield output
+
+
+def _iter_ordered(data, executor, max_pending):
+    segments = block_segments(data)
+    pending = deque()
+
+    def refill():
+        while len(pending) < max_pending:
+            segment = next(segments, None)
+            if segment is None:
+                return
+            start, end = segment
+            future = executor.submit(
+                decompress_block, *_segment_bytes(data, start, end)
+            )
+            pending.append((start, end, future))
+
+    refill()
+    while pending:
+        start, end, future = pending.popleft()
+        output = future.result()
+        if output is None:
+            # A false block magic split a real block in two. Join the halves.
+            refill()
+            if not pending or pending[0][0] != end:
+                raise Wp1ScoreProcessingError(
+                    "Could not decompress bz2 block at bit %s" % start
+                )
+            _, end, following = pending.popleft()
+            following.cancel()
+            output = decompress_block(*_segment_bytes(data, start, end))
+            if output is None:
+                raise Wp1ScoreProcessingError(
+                    "Could not decompress bz2 block at bit %s" % start
+                )
+        yield output, end
+        refill()
@@ -0,0 +1,127 @@
+import bz2
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+
+from wp1 import parallel_bz2
+from wp1.exceptions import Wp1ScoreProcessingError
+
+TEXT = b"".join(
+    b"en.wikipedia Article_%d %d desktop %d A1\n" % (i, i * 7919 % 100003, i % 50)
+    for i in range(40000)
+)
+
+
+class ParallelBz2Test(unittest.TestCase):
+
+    def write_file(self, data):
+        fd, path = tempfile.mkstemp(suffix=".bz2")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_find_markers(self):
+        # Level 1 uses 100k blocks, so TEXT spans several of them.
+        compressed = bz2.compress(TEXT, 1)
+
+        markers = list(parallel_bz2.find_markers(compressed))
+
+        self.assertGreater(len(markers), 2)
+        self.assertEqual((32, True), markers[0])
+        self.assertTrue(all(is_block for _, is_block in markers[:-1]))
+        self.assertFalse(markers[-1][1])
+        self.assertEqual(sorted(markers), markers)
+
+    def test_block_segments_multi_stream(self):
+        compressed = bz2.compress(b"first\n") + bz2.compress(b"second\n")
+
+        segments = list(parallel_bz2.block_segments(compressed))
+
+        self.assertEqual(2, len(segments))
+        second_stream_bits = len(bz2.compress(b"first\n")) * 8
+        self.assertEqual(second_stream_bits + 32, segments[1][0])
+
+    def test_decompress_block(self):
+        compressed = bz2.compress(TEXT, 1)
+        start, end = next(parallel_bz2.block_segments(compressed))
+
+        actual = parallel_bz2.decompress_block(compressed, start, end - start)
+
+        self.assertTrue(TEXT.startswith(actual))
+        self.assertGreater(len(actual), 0)
+
+    def test_decompress_block_invalid(self):
+        compressed = bz2.compress(TEXT, 1)
+        start, end = next(parallel_bz2.block_segments(compressed))
+
+        self.assertIsNone(
+            parallel_bz2.decompress_block(compressed, start, (end - start) // 2)
+        )
+
+    def test_iter_decompressed(self):
+        path = self.write_file(bz2.compress(TEXT, 1))
+
+        actual = b"".join(parallel_bz2.iter_decompressed(path, 2))
+
+        self.assertEqual(TEXT, actual)
+
+    def test_iter_decompressed_with_offsets(self):
+        compressed = bz2.compress(TEXT, 1)
+        path = self.write_file(compressed)
+
+        chunks = list(parallel_bz2.iter_decompressed(path, 2, with_offsets=True))
+
+        self.assertEqual(TEXT, b"".join(data for data, _ in chunks))
+        offsets = [offset for _, offset in chunks]
+        self.assertEqual(sorted(offsets), offsets)
+        # The end of stream marker and CRC follow the last block.
+        self.assertEqual(len(compressed) - 10, offsets[-1])
+
+    def test_iter_decompressed_multi_stream(self):
+        path = self.write_file(bz2.compress(TEXT, 1) + bz2.compress(TEXT[:1000], 9))
+
+        actual = b"".join(parallel_bz2.iter_decompressed(path, 2))
+
+        self.assertEqual(TEXT + TEXT[:1000], actual)
+
+    def test_iter_decompressed_empty(self):
+        path = self.write_file(b"")
+
+        self.assertEqual([], list(parallel_bz2.iter_decompressed(path, 2)))
+
+    def test_iter_decompressed_invalid_processes(self):
+        with self.assertRaises(ValueError):
+            list(parallel_bz2.iter_decompressed("/dev/null", 0))
+
+    def completed(self, result):
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def test_iter_ordered_joins_split_block(self):
+        compressed = bz2.compress(TEXT, 1)
+        start, end = next(parallel_bz2.block_segments(compressed))
+        middle = (start + end) // 2
+        executor = MagicMock()
+        executor.submit.side_effect = lambda fn, *args: self.completed(fn(*args))
+        segments = [(start, middle), (middle, end)]
+
+        with patch.object(parallel_bz2, "block_segments", return_value=iter(segments)):
+            actual = list(parallel_bz2._iter_ordered(compressed, executor, 4))
+
+        self.assertEqual(1, len(actual))
+        self.assertTrue(TEXT.startswith(actual[0][0]))
+        self.assertEqual(end, actual[0][1])
+
+    def test_iter_ordered_raises_on_bad_block(self):
+        executor = MagicMock()
+        executor.submit.return_value = self.completed(None)
+
+        with patch.object(
+            parallel_bz2, "block_segments", return_value=iter([(0, 100)])
+        ):
+            with self.assertRaises(Wp1ScoreProcessingError):
+                list(parallel_bz2._iter_ordered(b"\0" * 20, executor, 4))
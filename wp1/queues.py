@@ -2,7 +2,7 @@ from datetime import timedelta
 import logging
 
 from redis import Redis
-from rq import Queue
+from rq import Queue, Retry
 from rq.command import send_stop_job_command
 import rq.exceptions
 from rq.job import Job, JobStatus
@@ -13,10 +13,10 @@ from wp1 import custom_tables
 from wp1.environment import Environment
 import wp1.logic.builder as logic_builder
 import wp1.logic.project as logic_project
-import wp1.logic.rating as logic_rating
 from wp1.models.wp10.zim_schedule import ZimSchedule
 from wp1.wiki_db import connect as wiki_connect
 from wp1 import logs
+from wp1 import scores
 from wp1 import tables
 from wp1.timestamp import utcnow
 from wp1.credentials import ENV
@@ -41,25 +41,8 @@ def _get_zimfile_scheduling_queue(redis):
     return Queue("zimfile-scheduling", connection=redis)
 
 
-def _get_assessment_cache_queue(redis):
-    return Queue("assessment-cache", connection=redis)
-
-
-def enqueue_assessment_cache_warming(redis: Redis):
-    """Enqueue a one-off assessment-cache warming job to run immediately.
-
-    Called on container boot (see warm-assessment-cache.py) so that a fresh
-    deploy or a Redis restart seeds the cache right away instead of leaving the
-    slow query to run inline on the first web request until the next scheduled
-    (noon UTC, see cron_config.py) run.
-    """
-    queue = _get_assessment_cache_queue(redis)
-    return queue.enqueue(
-        logic_rating.update_assessment_cache,
-        # Matches the scheduled job: the query takes minutes, so override RQ's
-        # 180s default timeout with the repo-wide job timeout.
-        job_timeout=constants.JOB_TIMEOUT,
-    )
+def _get_pageviews_queue(redis):
+    return Queue("pageviews", connection=redis)
 
 
 def enqueue_all_projects(redis, wp10db):
@@ -171,12 +154,16 @@ def enqueue_project(project_name, update_q, upload_q, redis=None, track_progress
         failure_ttl=constants.JOB_FAILURE_TTL,
     )
     set_project_update_job_id(redis, project_name, update_job.id)
+    enqueue_project_uploads(project_name, upload_q, depends_on=update_job)
+
+
+def enqueue_project_uploads(project_name, upload_q, depends_on=None):
     if ENV == Environment.PRODUCTION:
         logger.info("Enqueuing upload (dependent) %s", project_name)
         upload_q.enqueue(
             tables.upload_project_table,
             project_name,
-            depends_on=update_job,
+            depends_on=depends_on,
             job_timeout=constants.JOB_TIMEOUT,
             failure_ttl=constants.JOB_FAILURE_TTL,
         )
@@ -184,7 +171,7 @@ def enqueue_project(project_name, update_q, upload_q, redis=None, track_progress
         upload_q.enqueue(
             logs.update_log_page_for_project,
             project_name,
-            depends_on=update_job,
+            depends_on=depends_on,
             job_timeout=constants.JOB_TIMEOUT,
             failure_ttl=constants.JOB_FAILURE_TTL,
         )
@@ -194,6 +181,33 @@ def enqueue_project(project_name, update_q, upload_q, redis=None, track_progress
         )
 
 
+def enqueue_pageview_lang_updates(redis, spools):
+    """Enqueues one pageview load job per language.
+
+    spools is a dict of language code to (spool file path, number of rows), as
+    returned by scores.spool_pageviews. The biggest languages are enqueued
+    first so that they don't end up running alone at the end.
+    """
+    pageviews_q = _get_pageviews_queue(redis)
+    by_size = sorted(spools.items(), key=lambda item: item[1][1], reverse=True)
+    jobs = []
+    for lang, (spool_path, _) in by_size:
+        jobs.append(
+            pageviews_q.enqueue(
+                scores.update_pageviews_for_lang,
+                lang,
+                spool_path,
+                retry=Retry(
+                    max=len(constants.PAGEVIEW_LOAD_RETRY_INTERVALS),
+                    interval=constants.PAGEVIEW_LOAD_RETRY_INTERVALS,
+                ),
+                job_timeout=constants.JOB_TIMEOUT,
+                failure_ttl=constants.JOB_FAILURE_TTL,
+            )
+        )
+    return jobs
+
+
 def enqueue_materialize(redis, builder_cls, builder, content_type):
     materialize_q = _get_materializer_queue(redis)
     materialize_q.enqueue(
@@ -3,6 +3,8 @@ from unittest.mock import patch, MagicMock
 
 from rq import Queue
 from rq.registry import ScheduledJobRegistry
+from rq.scheduler import RQScheduler
+from rq.utils import current_timestamp
 
 from wp1 import constants, queues
 from wp1.base_db_test import BaseWpOneDbTest
@@ -10,7 +12,6 @@ from wp1.environment import Environment
 from wp1 import queues
 from wp1.selection.models.simple import Builder as SimpleBuilder
 import wp1.logic.builder as logic_builder
-import wp1.logic.rating as logic_rating
 
 
 class QueuesTest(BaseWpOneDbTest):
@@ -297,14 +298,39 @@ class QueuesTest(BaseWpOneDbTest):
 
         self.assertFalse(result)
 
-    @patch("wp1.queues.Queue")
-    def test_enqueue_assessment_cache_warming(self, mock_queue):
-        queue_mock = MagicMock()
-        mock_queue.return_value = queue_mock
+    def test_enqueue_pageview_lang_updates(self):
+        spools = {
+            b"af": ("/tmp/spool/af.tsv", 10),
+            b"en": ("/tmp/spool/en.tsv", 1000),
+        }
 
-        queues.enqueue_assessment_cache_warming(self.redis)
+        jobs = queues.enqueue_pageview_lang_updates(self.redis, spools)
 
-        queue_mock.enqueue.assert_called_once_with(
-            logic_rating.update_assessment_cache,
-            job_timeout=constants.JOB_TIMEOUT,
+        self.assertEqual(2, Queue("pageviews", connection=self.redis).count)
+        self.assertEqual([b"en", b"af"], [job.args[0] for job in jobs])
+        self.assertEqual("/tmp/spool/en.tsv", jobs[0].args[1])
+        self.assertEqual(
+            len(constants.PAGEVIEW_LOAD_RETRY_INTERVALS), jobs[0].retries_left
         )
+
+    def test_enqueue_pageview_lang_updates_failed_job_is_retried(self):
+        spools = {b"af": ("/tmp/spool/af.tsv", 10)}
+        job = queues.enqueue_pageview_lang_updates(self.redis, spools)[0]
+        queue = Queue("pageviews", connection=self.redis)
+
+        # What a worker does when the job raises.
+        queue.remove(job.id)
+        with self.redis.pipeline() as pipe:
+            job.retry(queue, pipe)
+            pipe.execute()
+        self.assertEqual(0, queue.count)
+        self.assertIn(job.id, ScheduledJobRegistry(queue=queue).get_job_ids())
+
+        # The scheduler of a worker started with --with-scheduler.
+        scheduler = RQScheduler(["pageviews"], connection=self.redis)
+        scheduler.acquire_locks()
+        due = current_timestamp() + constants.PAGEVIEW_LOAD_RETRY_INTERVALS[0] + 1
+        with patch("rq.scheduler.current_timestamp", return_value=due):
+            scheduler.enqueue_scheduled_jobs()
+
+        self.assertEqual([job.id], queue.job_ids)
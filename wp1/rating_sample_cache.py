@@ -0,0 +1,127 @@
+"""Redis sets of a project's ratings, for sampling random articles.
+
+There is one set per (quality, importance) cell of the project's count matrix
+(see logic.project_stats), holding the (namespace, article) of every rating in
+the cell. SRANDMEMBER then picks a random member in constant time, wherever it
+is in the project, unlike an OFFSET that walks every skipped rating.
+
+A cell's set is built from the ratings the first time it is sampled. It is
+built under a temporary key and renamed into place, so a sample never sees a
+partial set. Only one build of a cell runs at a time: the builder holds a lock
+key for at most BUILD_LOCK_TTL, and other callers find the cell being built
+and fall back to the database in the meantime, instead of all building it. The keys of every built cell of a project are registered, and
+invalidate_project deletes them all at the end of each update of the project
+(see logic.project.update_project). Sets can still be out of date while an
+update runs, so callers check every sampled rating against the database, and
+discard members that are gone.
+"""
+
+import logging
+import uuid
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of the cached sets changes.
+RATING_SAMPLE_CACHE_VERSION = 1
+RATING_SAMPLE_CACHE_TTL = timedelta(days=1)
+KEY_PREFIX = b"wp1:rating_sample:v%d:" % RATING_SAMPLE_CACHE_VERSION
+
+# Members added per SADD while building a cell.
+BUILD_BATCH_SIZE = 1000
+# Longest time a build keeps the lock of its cell, in case the builder dies.
+BUILD_LOCK_TTL = timedelta(minutes=10)
+
+
+def _cells_key(project_name):
+    return KEY_PREFIX + b"cells:" + project_name
+
+
+def _length_prefixed(*parts):
+    return b"".join(b"%d:" % len(part) + part for part in parts)
+
+
+def cell_key(project_name, quality, importance):
+    return KEY_PREFIX + b"cell:" + _length_prefixed(project_name, quality, importance)
+
+
+def encode_member(namespace, article):
+    return b"%d:" % namespace + article
+
+
+def decode_member(member):
+    namespace, article = member.split(b":", 1)
+    return int(namespace), article
+
+
+def _build_lock_key(key):
+    return key + b":building"
+
+
+def build_cell(redis, project_name, quality, importance, titles):
+    """Replaces the set of the cell with the (namespace, article) titles.
+
+    Returns the number of members, or None without reading titles if the
+    cell is already being built. An empty cell has no key, so it is built
+    again the next time it is sampled.
+    """
+    key = cell_key(project_name, quality, importance)
+    lock_key = _build_lock_key(key)
+    token = uuid.uuid4().hex.encode("ascii")
+    if not redis.set(lock_key, token, nx=True, ex=BUILD_LOCK_TTL):
+        return None
+    try:
+        return _build_cell(redis, project_name, key, token, titles)
+    finally:
+        # Only release the lock if it wasn't taken over after expiring.
+        if redis.get(lock_key) == token:
+            redis.delete(lock_key)
+
+
+def _build_cell(redis, project_name, key, token, titles):
+    tmp_key = key + b":tmp:" + token
+    count = 0
+    batch = []
+    for namespace, article in titles:
+        batch.append(encode_member(namespace, article))
+        if len(batch) >= BUILD_BATCH_SIZE:
+            redis.sadd(tmp_key, *batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        redis.sadd(tmp_key, *batch)
+        count += len(batch)
+    if count == 0:
+        return 0
+
+    pipeline = redis.pipeline()
+    pipeline.rename(tmp_key, key)
+    pipeline.expire(key, RATING_SAMPLE_CACHE_TTL)
+    pipeline.sadd(_cells_key(project_name), key)
+    pipeline.expire(_cells_key(project_name), RATING_SAMPLE_CACHE_TTL)
+    pipeline.execute()
+    return count
+
+
+def sample(redis, project_name, quality, importance):
+    """Returns a random (namespace, article) of the cell.
+
+    Returns None if the cell isn't built.
+    """
+    member = redis.srandmember(cell_key(project_name, quality, importance))
+    if member is None:
+        return None
+    return decode_member(member)
+
+
+def discard(redis, project_name, quality, importance, namespace, article):
+    redis.srem(
+        cell_key(project_name, quality, importance), encode_member(namespace, article)
+    )
+
+
+def invalidate_project(redis, project_name):
+    """Deletes the sets of every built cell of the project."""
+    cells_key = _cells_key(project_name)
+    keys = redis.smembers(cells_key)
+    redis.unlink(cells_key, *keys)
@@ -0,0 +1,142 @@
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+
+from wp1 import rating_sample_cache
+
+TITLES = [(0, b"Apple"), (1, b"Caf\xc3\xa9_\xff"), (0, b"Banana:split")]
+
+
+class RatingSampleCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+
+    def _build(self, titles=TITLES, project=b"Alpha"):
+        return rating_sample_cache.build_cell(
+            self.redis, project, b"B-Class", b"High-Class", iter(titles)
+        )
+
+    def test_member_round_trip(self):
+        for namespace, article in TITLES:
+            with self.subTest(article=article):
+                self.assertEqual(
+                    (namespace, article),
+                    rating_sample_cache.decode_member(
+                        rating_sample_cache.encode_member(namespace, article)
+                    ),
+                )
+
+    def test_cell_key_unambiguous(self):
+        self.assertNotEqual(
+            rating_sample_cache.cell_key(b"A:1", b"B", b"C"),
+            rating_sample_cache.cell_key(b"A", b"1:B", b"C"),
+        )
+
+    def test_sample_not_built(self):
+        self.assertIsNone(
+            rating_sample_cache.sample(self.redis, b"Alpha", b"B-Class", b"High-Class")
+        )
+
+    def test_build_and_sample(self):
+        self.assertEqual(3, self._build())
+
+        actual = rating_sample_cache.sample(
+            self.redis, b"Alpha", b"B-Class", b"High-Class"
+        )
+
+        self.assertIn(actual, TITLES)
+
+    def test_build_batches(self):
+        titles = [(0, b"Article_%d" % i) for i in range(25)]
+        with patch.object(rating_sample_cache, "BUILD_BATCH_SIZE", 10):
+            self.assertEqual(25, self._build(titles))
+
+        key = rating_sample_cache.cell_key(b"Alpha", b"B-Class", b"High-Class")
+        self.assertEqual(25, self.redis.scard(key))
+
+    def test_build_sets_ttl(self):
+        self._build()
+
+        key = rating_sample_cache.cell_key(b"Alpha", b"B-Class", b"High-Class")
+        self.assertGreater(self.redis.ttl(key), 0)
+
+    def test_build_replaces_cell(self):
+        self._build()
+
+        self._build([(0, b"Cherry")])
+
+        self.assertEqual(
+            (0, b"Cherry"),
+            rating_sample_cache.sample(self.redis, b"Alpha", b"B-Class", b"High-Class"),
+        )
+
+    def test_build_empty(self):
+        self.assertEqual(0, self._build([]))
+
+        self.assertIsNone(
+            rating_sample_cache.sample(self.redis, b"Alpha", b"B-Class", b"High-Class")
+        )
+        self.assertEqual([], self.redis.keys())
+
+    def test_build_while_building(self):
+        key = rating_sample_cache.cell_key(b"Alpha", b"B-Class", b"High-Class")
+        self.redis.set(rating_sample_cache._build_lock_key(key), b"other")
+        titles = iter(TITLES)
+
+        self.assertIsNone(
+            rating_sample_cache.build_cell(
+                self.redis, b"Alpha", b"B-Class", b"High-Class", titles
+            )
+        )
+        # The titles weren't read, and the other build keeps its lock.
+        self.assertEqual(TITLES, list(titles))
+        self.assertEqual(
+            b"other", self.redis.get(rating_sample_cache._build_lock_key(key))
+        )
+
+    def test_build_releases_lock(self):
+        self._build()
+
+        self.assertEqual(3, self._build([(0, b"Apple"), (0, b"Banana"), (0, b"Fig")]))
+
+    def test_build_failure_releases_lock(self):
+        def titles():
+            yield (0, b"Apple")
+            raise ValueError("Database went away")
+
+        with self.assertRaises(ValueError):
+            self._build(titles())
+
+        self.assertEqual(3, self._build())
+
+    def test_discard(self):
+        self._build([(0, b"Apple"), (0, b"Banana")])
+
+        rating_sample_cache.discard(
+            self.redis, b"Alpha", b"B-Class", b"High-Class", 0, b"Apple"
+        )
+
+        self.assertEqual(
+            (0, b"Banana"),
+            rating_sample_cache.sample(self.redis, b"Alpha", b"B-Class", b"High-Class"),
+        )
+
+    def test_invalidate_project(self):
+        self._build()
+        self._build(project=b"Beta")
+
+        rating_sample_cache.invalidate_project(self.redis, b"Alpha")
+
+        self.assertIsNone(
+            rating_sample_cache.sample(self.redis, b"Alpha", b"B-Class", b"High-Class")
+        )
+        self.assertIsNotNone(
+            rating_sample_cache.sample(self.redis, b"Beta", b"B-Class", b"High-Class")
+        )
+
+    def test_invalidate_project_not_built(self):
+        rating_sample_cache.invalidate_project(self.redis, b"Alpha")
+
+        self.assertEqual([], self.redis.keys())
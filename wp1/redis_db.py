@@ -12,6 +12,10 @@ def connect():
     return Redis(**creds)
 
 
+def _to_str(value: str | bytes) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
 def gen_redis_log_key(
     *,
     project: str | bytes,
@@ -20,8 +24,17 @@ def gen_redis_log_key(
     article: str | bytes,
     date: str | bytes | None = None,
 ) -> str:
-    to_str = lambda x: x.decode("utf-8") if isinstance(x, bytes) else x
-    key = f"wp1:logs:{to_str(project)}:{to_str(namespace)}:{to_str(action)}:{to_str(article)}"
+    key = f"wp1:logs:{_to_str(project)}:{_to_str(namespace)}:{_to_str(action)}:{_to_str(article)}"
     if date is not None:
-        key += f":{to_str(date)}"
+        key += f":{_to_str(date)}"
     return key
+
+
+def gen_redis_log_index_key(*, project: str | bytes, date: str | bytes) -> str:
+    """Key of the sorted set of a project's log keys for one day."""
+    return f"wp1:log_index:{_to_str(project)}:{_to_str(date)}"
+
+
+def gen_redis_log_dates_key(*, project: str | bytes) -> str:
+    """Key of the sorted set of the days that a project has logs for."""
+    return f"wp1:log_dates:{_to_str(project)}"
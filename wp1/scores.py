@@ -1,24 +1,37 @@
 import csv
+import itertools
 import logging
 import os.path
+import re
+import shutil
+import tempfile
 from bz2 import BZ2Decompressor
-from collections import namedtuple
+from collections import OrderedDict
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 import requests
 
-from wp1 import app_logging
-from wp1.constants import WP1_USER_AGENT
+from wp1 import app_logging, parallel_bz2
+from wp1.constants import (
+    PAGEVIEW_DECOMPRESS_PROCESSES,
+    PAGEVIEW_SPOOL_MAX_OPEN_FILES,
+    WP1_USER_AGENT,
+)
 from wp1.credentials import CREDENTIALS, ENV
 from wp1.exceptions import Wp1ScoreProcessingError
+from wp1.redis_db import connect as redis_connect
 from wp1.time import get_current_datetime
 from wp1.wp10_db import connect as wp10_connect
 
-PageviewRecord = namedtuple("PageviewRecord", ["lang", "name", "page_id", "views"])
-
 logger = logging.getLogger(__name__)
 
+# Redis hash with the checkpoint of an unfinished update_pageviews run.
+PAGEVIEW_CHECKPOINT_KEY = b"pageviews:checkpoint"
+# Redis hash with the progress and work of the running update_pageviews, in the
+# same shape as the project update progress (see logic.project).
+PAGEVIEW_PROGRESS_KEY = b"pageviews:progress"
+
 
 def wiki_languages():
     r = requests.get(
@@ -91,28 +104,47 @@ def download_pageviews():
             raise Wp1ScoreProcessingError("Error downloading pageviews") from e
 
 
-def raw_pageviews(decode=False):
+def _serial_chunks(path):
+    """Yields (decompressed data, compressed bytes read so far) pairs."""
+    decompressor = BZ2Decompressor()
+    offset = 0
+    with open(path, "rb") as f:
+        while True:
+            # Read data in 1 MB chunks
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            offset += len(chunk)
+            yield decompressor.decompress(chunk), offset
+
+
+def raw_pageviews(decode=False, path=None, processes=1, position=None):
+    """Yields the lines of the pageview dump at path (default: this month's).
+
+    With processes > 1, the dump is decompressed in parallel by that many
+    worker processes (see wp1.parallel_bz2). If position is a dict, its
+    "bytes" key is kept up to date with the number of compressed bytes read.
+    """
+    if path is None:
+        path = get_cur_file_path()
 
     def as_bytes():
-        decompressor = BZ2Decompressor()
+        if processes > 1:
+            chunks = parallel_bz2.iter_decompressed(path, processes, with_offsets=True)
+        else:
+            chunks = _serial_chunks(path)
+
         trailing = b""
-        with open(get_cur_file_path(), "rb") as f:
-            while True:
-                # Read data in 1 MB chunks
-                chunk = f.read(1024 * 1024)
-                if not chunk:
-                    break
-                data = decompressor.decompress(chunk)
-                lines = [line for line in data.split(b"\n") if line]
-                if not lines:
-                    continue
-
-                # Reunite incomplete lines
-                yield trailing + lines[0]
-                yield from lines[1:-1]
-                trailing = lines[-1]
-
-            # Nothing left, yield the last line
+        for data, offset in chunks:
+            if position is not None:
+                position["bytes"] = offset
+            # Reunite incomplete lines
+            lines = (trailing + data).split(b"\n")
+            trailing = lines.pop()
+            yield from (line for line in lines if line)
+
+        # Nothing left, yield the last line
+        if trailing:
             yield trailing
 
     if decode:
@@ -122,47 +154,106 @@ def raw_pageviews(decode=False):
         yield from as_bytes()
 
 
-def pageview_components():
-    tally = None
-    for line in raw_pageviews():
+def pageview_components(path=None, processes=1, skip_lines=0, position=None):
+    """Yields (lang, article, page_id, views) for every page in the dump.
+
+    The first skip_lines lines of the dump are skipped without being parsed.
+    If position is a dict, its "lines" key holds, whenever a row is yielded,
+    the number of dump lines that went into that row and the ones before it,
+    which is where a later call can resume with skip_lines. See raw_pageviews
+    for its "bytes" key.
+    """
+    # The running tally is kept in plain locals rather than in a record object,
+    # since this loop runs for every line of a dump with hundreds of millions
+    # of lines.
+    lang = name = page_id = None
+    views = 0
+    lines = raw_pageviews(path=path, processes=processes, position=position)
+    line_no = skip_lines - 1
+    for line in itertools.islice(lines, skip_lines, None):
+        line_no += 1
         parts = line.split(b" ")
         if len(parts) != 6 or parts[2] == b"null":
             # Skip pages that don't have a pageid
             continue
 
-        if parts[1] == b"" or parts[1] == b"-":
+        line_name = parts[1]
+        if line_name == b"" or line_name == b"-":
             # Skip pages that don't have a title
             continue
 
-        lang = parts[0].split(b".")[0]
-        name = parts[1]
-        page_id = parts[2]
         try:
-            views = int(parts[4])
+            line_views = int(parts[4])
         except ValueError:
             logger.warning("Views field wasn't int in pageview dump: %r", line)
             continue
 
-        if (
-            tally is not None
-            and tally.lang == lang
-            and tally.name == name
-            and tally.page_id == page_id
-        ):
+        line_lang = parts[0].split(b".", 1)[0]
+        line_page_id = parts[2]
+        if line_page_id == page_id and line_name == name and line_lang == lang:
             # This is a view on the same page from a different interface (mobile v
             # desktop etc)
-            new_dict = {**tally._asdict(), "views": tally.views + views}
-            tally = PageviewRecord(**new_dict)
-        else:
-            # Language code, article name, article page id, views
-            if tally is not None:
-                yield tally.lang, tally.name, tally.page_id, tally.views
-            tally = PageviewRecord(lang, name, page_id, views)
-
-    yield tally.lang, tally.name, tally.page_id, tally.views
+            views += line_views
+            continue
 
+        # Language code, article name, article page id, views
+        if name is not None:
+            if position is not None:
+                position["lines"] = line_no
+            yield lang, name, page_id, views
+        lang, name, page_id, views = line_lang, line_name, line_page_id, line_views
+
+    if name is not None:
+        if position is not None:
+            position["lines"] = line_no + 1
+        yield lang, name, page_id, views
+
+
+def pageview_batches(
+    batch_size, filter_lang=None, path=None, processes=1, skip_lines=0, position=None
+):
+    """Yields lists of at most batch_size (lang, article, page_id, views) tuples.
+
+    Rows for languages other than filter_lang, if given, are dropped. See
+    pageview_components for skip_lines and position; when a batch is yielded,
+    position describes the end of that batch.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1, got %r" % batch_size)
+
+    batch = []
+    for row in pageview_components(
+        path=path, processes=processes, skip_lines=skip_lines, position=position
+    ):
+        if filter_lang is not None and row[0] != filter_lang:
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reset_missing_articles_pageviews(wp10db, lang=None):
+    if lang is not None:
+        # Other languages may be loading into temp_pageviews at the same time,
+        # so only match rows of this language.
+        with wp10db.cursor() as cursor:
+            cursor.execute(
+                """
+          UPDATE page_scores
+          LEFT JOIN temp_pageviews
+          ON page_scores.ps_lang = temp_pageviews.tp_lang
+            AND page_scores.ps_article = temp_pageviews.tp_article
+          SET page_scores.ps_views = 0
+          WHERE page_scores.ps_lang = %s AND temp_pageviews.tp_article IS NULL;
+          """,
+                (lang,),
+            )
+        wp10db.commit()
+        return
 
-def reset_missing_articles_pageviews(wp10db):
     with wp10db.cursor() as cursor:
         cursor.execute("""
       UPDATE page_scores
@@ -185,13 +276,63 @@ def insert_temp_pageviews(wp10db, lang, article, page_id, views):
         )
 
 
-def swap_temp_pageviews_to_scores(wp10db):
+def insert_temp_pageviews_many(wp10db, rows):
+    """Inserts (lang, article, page_id, views) rows into temp_pageviews.
+
+    pymysql rewrites the executemany below into multi-row INSERT statements, so
+    a whole batch costs a handful of round trips instead of one per row.
+    """
+    with wp10db.cursor() as cursor:
+        cursor.executemany(
+            """INSERT INTO temp_pageviews (tp_lang, tp_article, tp_page_id, tp_views)
+              VALUES (%s, %s, %s, %s)
+              ON DUPLICATE KEY UPDATE tp_views = VALUES(tp_views)
+          """,
+            rows,
+        )
+
+
+def load_temp_pageviews_infile(wp10db, rows):
+    """Bulk loads (lang, article, page_id, views) rows with LOAD DATA LOCAL INFILE.
+
+    The rows are written to a temporary TSV file first. The connection must have
+    been opened with local_infile=True, and the server must allow it.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".tsv") as f:
+        for lang, article, page_id, views in rows:
+            if b"\t" in article or b"\n" in article:
+                # Would break the TSV. MediaWiki titles can't contain these, so
+                # only a corrupt dump line can get here.
+                continue
+            f.write(b"%s\t%s\t%d\t%d\n" % (lang, article, int(page_id), views))
+        f.flush()
+
+        with wp10db.cursor() as cursor:
+            cursor.execute(
+                """LOAD DATA LOCAL INFILE %s REPLACE INTO TABLE temp_pageviews
+                  FIELDS TERMINATED BY '\\t' ESCAPED BY ''
+                  LINES TERMINATED BY '\\n'
+                  (tp_lang, tp_article, tp_page_id, tp_views)
+              """,
+                (f.name,),
+            )
+
+
+def swap_temp_pageviews_to_scores(wp10db, lang=None):
+    where = ""
+    params = ()
+    if lang is not None:
+        where = "WHERE tp_lang = %s"
+        params = (lang,)
+
     with wp10db.cursor() as cursor:
         cursor.execute(
             """INSERT INTO page_scores (ps_lang, ps_page_id, ps_article, ps_views)
         SELECT tp_lang, tp_page_id, tp_article, tp_views
         FROM temp_pageviews
-        ON DUPLICATE KEY UPDATE ps_views = VALUES(ps_views);"""
+        %s
+        ON DUPLICATE KEY UPDATE ps_views = VALUES(ps_views);""" % where,
+            params,
         )
         wp10db.commit()
 
@@ -202,7 +343,91 @@ def truncate_temp_pageviews(wp10db):
     wp10db.commit()
 
 
-def update_pageviews(filter_lang=None, commit_after=50000):
+def delete_temp_pageviews(wp10db, lang):
+    with wp10db.cursor() as cursor:
+        cursor.execute("DELETE FROM temp_pageviews WHERE tp_lang = %s", (lang,))
+    wp10db.commit()
+
+
+def get_pageview_checkpoint(redis):
+    """Returns the checkpoint of an unfinished update_pageviews run, or None.
+
+    The checkpoint is a dict with the dump file name, the filter_lang of the
+    run (b"" for all languages), the number of dump lines whose rows have been
+    committed to temp_pageviews and the number of those rows.
+    """
+    data = redis.hgetall(PAGEVIEW_CHECKPOINT_KEY)
+    if not data:
+        return None
+    return {
+        "dump": data[b"dump"],
+        "filter_lang": data[b"filter_lang"],
+        "lines": int(data[b"lines"]),
+        "rows": int(data[b"rows"]),
+    }
+
+
+def save_pageview_checkpoint(redis, dump, filter_lang, lines, rows):
+    redis.hset(
+        PAGEVIEW_CHECKPOINT_KEY,
+        mapping={
+            "dump": dump,
+            "filter_lang": filter_lang,
+            "lines": lines,
+            "rows": rows,
+        },
+    )
+
+
+def clear_pageview_checkpoint(redis):
+    redis.delete(PAGEVIEW_CHECKPOINT_KEY)
+
+
+def get_pageview_progress(redis):
+    """Returns the (progress, work) of the running import, in compressed bytes."""
+    if not redis.exists(PAGEVIEW_PROGRESS_KEY):
+        return None, None
+
+    return redis.hmget(PAGEVIEW_PROGRESS_KEY, ("progress", "work"))
+
+
+def _set_pageview_work(redis, path):
+    try:
+        work = os.path.getsize(path)
+    except OSError:
+        logger.warning("Could not get the size of %s, not tracking progress", path)
+        redis.delete(PAGEVIEW_PROGRESS_KEY)
+        return
+    redis.hset(PAGEVIEW_PROGRESS_KEY, mapping={"work": work, "progress": 0})
+
+
+def _set_pageview_progress(redis, progress):
+    if redis.exists(PAGEVIEW_PROGRESS_KEY):
+        redis.hset(PAGEVIEW_PROGRESS_KEY, "progress", progress)
+
+
+def update_pageviews(
+    filter_lang=None,
+    commit_after=50000,
+    load_data_infile=False,
+    processes=PAGEVIEW_DECOMPRESS_PROCESSES,
+    redis=None,
+    resume=True,
+):
+    """Loads the current pageview dump into page_scores.
+
+    Rows are loaded into temp_pageviews in batches of commit_after, with one
+    commit per batch. With load_data_infile=True, each batch goes through LOAD
+    DATA LOCAL INFILE instead of multi-row INSERTs, which is faster still but
+    needs local_infile to be enabled on the server. The dump is decompressed
+    by `processes` worker processes.
+
+    A checkpoint is saved in Redis after every commit. If a run fails, the
+    rows it committed are kept in temp_pageviews, and the next run for the
+    same dump and filter_lang picks up from the checkpoint instead of starting
+    over, unless resume is False. Progress, in compressed bytes read, can be
+    followed with get_pageview_progress.
+    """
     download_pageviews()
 
     # Convert filter lang to bytes if necessary
@@ -214,31 +439,190 @@ def update_pageviews(filter_lang=None, commit_after=50000):
     else:
         logger.info("Updating pageviews for %s", filter_lang.decode("utf-8"))
 
-    wp10db = wp10_connect()
+    if redis is None:
+        redis = redis_connect()
+    path = get_cur_file_path()
+    dump = os.path.basename(path).encode("utf-8")
+    checkpoint_lang = filter_lang or b""
+
+    checkpoint = get_pageview_checkpoint(redis) if resume else None
+    if checkpoint is not None and (
+        checkpoint["dump"] != dump or checkpoint["filter_lang"] != checkpoint_lang
+    ):
+        logger.info("Ignoring checkpoint of a different pageview import")
+        checkpoint = None
+
+    if load_data_infile:
+        wp10db = wp10_connect(local_infile=True)
+        load_batch = load_temp_pageviews_infile
+    else:
+        wp10db = wp10_connect()
+        load_batch = insert_temp_pageviews_many
+
     try:
-        truncate_temp_pageviews(wp10db)
-        n = 0
-        for lang, article, page_id, views in pageview_components():
-            if filter_lang is None or lang == filter_lang:
-                insert_temp_pageviews(wp10db, lang, article, page_id, views)
-
-            n += 1
-            if n >= commit_after:
-                logger.debug("Committing in temp db")
-                wp10db.commit()
-                n = 0
-        wp10db.commit()
+        if checkpoint is None:
+            clear_pageview_checkpoint(redis)
+            truncate_temp_pageviews(wp10db)
+            skip_lines = n = 0
+        else:
+            skip_lines = checkpoint["lines"]
+            n = checkpoint["rows"]
+            logger.info("Resuming after %s lines and %s committed rows", skip_lines, n)
+
+        _set_pageview_work(redis, path)
+        position = {"lines": skip_lines, "bytes": 0}
+        for batch in pageview_batches(
+            commit_after,
+            filter_lang=filter_lang,
+            path=path,
+            processes=processes,
+            skip_lines=skip_lines,
+            position=position,
+        ):
+            load_batch(wp10db, batch)
+            wp10db.commit()
+            n += len(batch)
+            save_pageview_checkpoint(redis, dump, checkpoint_lang, position["lines"], n)
+            _set_pageview_progress(redis, position["bytes"])
+            logger.debug("Committed %s rows in temp db", n)
         logger.debug("Swapping data from temp db to scores db")
         swap_temp_pageviews_to_scores(wp10db)
         reset_missing_articles_pageviews(wp10db)
         truncate_temp_pageviews(wp10db)
+        clear_pageview_checkpoint(redis)
         logger.info("Transaction Done")
     except Exception as e:
+        # The committed batches stay in temp_pageviews for the next run.
         wp10db.rollback()
-        truncate_temp_pageviews(wp10db)
-        logger.error("Transaction failed: %s", e)
+        logger.error("Transaction failed, will resume from checkpoint: %s", e)
+
+
+def get_spool_dir():
+    """Returns the directory holding the per-language spool files of this month."""
+    cur_filename = get_pageview_url().split("/")[-1]
+    return get_pageview_file_path(cur_filename.replace(".bz2", "-spool"))
+
+
+def _spool_filename(lang):
+    if re.fullmatch(rb"[a-z0-9_-]+", lang):
+        return "%s.tsv" % lang.decode("ascii")
+    # Not a real language code, but its rows are kept all the same.
+    return "x-%s.tsv" % lang.hex()
+
+
+def spool_pageviews(
+    spool_dir=None, processes=1, path=None, max_open=PAGEVIEW_SPOOL_MAX_OPEN_FILES
+):
+    """Splits the pageview dump into one spool file per language, in one pass.
+
+    Every spool file holds tab separated article, page id and views lines.
+    Spool files left over in spool_dir from an earlier run are removed first.
+    At most max_open spool files are open at a time: the least recently
+    written one is closed to make room, and reopened for appending when its
+    language comes up again.
+
+    Returns a dict of language code to (spool file path, number of rows).
+    """
+    if max_open < 1:
+        raise ValueError("max_open must be at least 1, got %r" % max_open)
+    if spool_dir is None:
+        spool_dir = get_spool_dir()
+    shutil.rmtree(spool_dir, ignore_errors=True)
+    os.makedirs(spool_dir)
+
+    paths = {}
+    counts = {}
+    files = OrderedDict()
+    try:
+        for lang, article, page_id, views in pageview_components(
+            path=path, processes=processes
+        ):
+            if b"\t" in article:
+                # MediaWiki titles can't contain tabs, so this is a corrupt line.
+                continue
+            f = files.get(lang)
+            if f is None:
+                if lang not in paths:
+                    paths[lang] = os.path.join(spool_dir, _spool_filename(lang))
+                    counts[lang] = 0
+                if len(files) >= max_open:
+                    files.popitem(last=False)[1].close()
+                f = open(paths[lang], "ab")
+                files[lang] = f
+            else:
+                files.move_to_end(lang)
+            f.write(b"%s\t%d\t%d\n" % (article, int(page_id), views))
+            counts[lang] += 1
+    finally:
+        for f in files.values():
+            f.close()
+
+    return {lang: (paths[lang], counts[lang]) for lang in paths}
+
+
+def spooled_pageview_batches(lang, spool_path, batch_size):
+    """Yields lists of at most batch_size rows from a spool file.
+
+    Rows are (lang, article, page_id, views) tuples, as from pageview_batches.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1, got %r" % batch_size)
+
+    batch = []
+    with open(spool_path, "rb") as f:
+        for line in f:
+            article, page_id, views = line.rstrip(b"\n").split(b"\t")
+            batch.append((lang, article, page_id, int(views)))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def update_pageviews_for_lang(lang, spool_path, commit_after=50000):
+    """Loads the spooled pageviews of one language into page_scores.
+
+    This is the RQ job enqueued for every language by
+    maintenance.update_pageviews_sharded. Only rows of this language are
+    touched, so jobs for different languages can run at the same time. A
+    failure is re-raised after cleaning up, so that RQ can retry the job; the
+    spool file is only removed once the language has been loaded.
+    """
+    if isinstance(lang, str):
+        lang = lang.encode("utf-8")
+
+    wp10db = wp10_connect()
+    try:
+        delete_temp_pageviews(wp10db, lang)
+        n = 0
+        for batch in spooled_pageview_batches(lang, spool_path, commit_after):
+            insert_temp_pageviews_many(wp10db, batch)
+            wp10db.commit()
+            n += len(batch)
+        swap_temp_pageviews_to_scores(wp10db, lang=lang)
+        reset_missing_articles_pageviews(wp10db, lang=lang)
+        delete_temp_pageviews(wp10db, lang)
+        logger.info("Loaded %s pageview rows for %s", n, lang.decode("utf-8"))
+    except Exception:
+        wp10db.rollback()
+        try:
+            delete_temp_pageviews(wp10db, lang)
+        except Exception:
+            # Don't hide the original error, the next attempt cleans up anyway.
+            logger.exception(
+                "Could not clean up the temp pageviews of %s", lang.decode("utf-8")
+            )
+        raise
+    finally:
+        wp10db.close()
+
+    os.remove(spool_path)
 
 
 if __name__ == "__main__":
+    # maintenance imports this module, so it can't be imported at the top.
+    from wp1 import maintenance
+
     app_logging.configure_logging()
-    update_pageviews()
+    maintenance.update_pageviews_sharded()
@@ -1,6 +1,8 @@
 import bz2
 from datetime import datetime
 import os.path
+import shutil
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock, mock_open
 
@@ -222,6 +224,16 @@ class ScoresTest(BaseWpOneDbTest):
 
         self.assertEqual(pageview_text.decode("utf-8"), actual)
 
+    def test_raw_pageviews_parallel(self):
+        fd, path = tempfile.mkstemp(suffix=".bz2")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pageview_bz2 + bz2.compress(b"\n" + pageview_text))
+        self.addCleanup(os.remove, path)
+
+        actual = list(scores.raw_pageviews(path=path, processes=2))
+
+        self.assertEqual(pageview_text.split(b"\n") * 2, actual)
+
     @patch("builtins.open", new_callable=mock_open, read_data=pageview_bz2)
     def test_pageview_components(self, mock_file_open):
         expected = [
@@ -261,6 +273,169 @@ class ScoresTest(BaseWpOneDbTest):
 
         self.assertEqual(expected, actual)
 
+    @patch("builtins.open", new_callable=mock_open, read_data=b"")
+    def test_pageview_components_empty(self, mock_file_open):
+        self.assertEqual([], list(scores.pageview_components()))
+
+    @patch("builtins.open", new_callable=mock_open, read_data=pageview_bz2)
+    def test_pageview_components_path(self, mock_file_open):
+        list(scores.pageview_components(path="/tmp/pageviews.bz2"))
+
+        mock_file_open.assert_called_once_with("/tmp/pageviews.bz2", "rb")
+
+    @patch("builtins.open", new_callable=mock_open, read_data=pageview_bz2)
+    def test_pageview_batches(self, mock_file_open):
+        batches = list(scores.pageview_batches(5))
+
+        self.assertEqual([5, 5, 2], [len(b) for b in batches])
+        self.assertEqual((b"af", b"1701", b"1402", 7), batches[0][0])
+        self.assertEqual((b"af", b"1712", b"753", 22), batches[2][1])
+
+    @patch("wp1.scores.pageview_components")
+    def test_pageview_batches_filter(self, mock_components):
+        mock_components.return_value = (
+            (b"en", b"Statue_of_Liberty", 100, 100),
+            (b"fr", b"Tour_Eiffel", 200, 200),
+            (b"en", b"Eiffel_Tower", 300, 300),
+        )
+
+        batches = list(scores.pageview_batches(10, filter_lang=b"en"))
+
+        self.assertEqual(
+            [
+                [
+                    (b"en", b"Statue_of_Liberty", 100, 100),
+                    (b"en", b"Eiffel_Tower", 300, 300),
+                ]
+            ],
+            batches,
+        )
+
+    @patch("builtins.open", new_callable=mock_open, read_data=pageview_bz2)
+    def test_pageview_components_position(self, mock_file_open):
+        position = {}
+        lines = []
+        for _ in scores.pageview_components(position=position):
+            lines.append(position["lines"])
+
+        self.assertEqual([2, 4, 6, 8, 10, 12, 14, 16, 18, 20, 22, 24], lines)
+        self.assertEqual(len(pageview_bz2), position["bytes"])
+
+    @patch("builtins.open", new_callable=mock_open, read_data=pageview_bz2)
+    def test_pageview_components_skip_lines(self, mock_file_open):
+        expected = [
+            (b"af", b"1711", b"752", 5),
+            (b"af", b"1712", b"753", 22),
+        ]
+
+        actual = list(scores.pageview_components(skip_lines=20))
+
+        self.assertEqual(expected, actual)
+
+    def test_pageview_batches_invalid_size(self):
+        with self.assertRaises(ValueError):
+            list(scores.pageview_batches(0))
+
+    def write_pageview_file(self, data):
+        fd, path = tempfile.mkstemp(suffix=".bz2")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_spool_pageviews(self):
+        path = self.write_pageview_file(
+            bz2.compress(
+                b"af.wikipedia 1701 1402 desktop 4 F1\n"
+                b"af.wikipedia 1701 1402 mobile-web 3 O2T1\n"
+                b"en.wikipedia Statue_of_Liberty 1234 desktop 10 A10\n"
+                b"af.wikipedia 1702 1404 desktop 1 P1\n"
+            )
+        )
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir, ignore_errors=True)
+
+        spools = scores.spool_pageviews(spool_dir=spool_dir, path=path)
+
+        self.assertEqual({b"af", b"en"}, set(spools))
+        af_path, af_rows = spools[b"af"]
+        self.assertEqual(os.path.join(spool_dir, "af.tsv"), af_path)
+        self.assertEqual(2, af_rows)
+        with open(af_path, "rb") as f:
+            self.assertEqual(b"1701\t1402\t7\n1702\t1404\t1\n", f.read())
+        with open(spools[b"en"][0], "rb") as f:
+            self.assertEqual(b"Statue_of_Liberty\t1234\t10\n", f.read())
+
+    def test_spool_pageviews_max_open(self):
+        path = self.write_pageview_file(
+            bz2.compress(
+                b"af.wikipedia 1701 1402 desktop 4 F1\n"
+                b"en.wikipedia Statue_of_Liberty 1234 desktop 10 A10\n"
+                b"af.wikipedia 1702 1404 desktop 1 P1\n"
+                b"en.wikipedia Liberty_Island 1235 desktop 2 A2\n"
+            )
+        )
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir, ignore_errors=True)
+
+        with patch("builtins.open", wraps=open) as patched_open:
+            spools = scores.spool_pageviews(spool_dir=spool_dir, path=path, max_open=1)
+
+        # Every change of language closes one spool file and reopens another.
+        spool_opens = [
+            c for c in patched_open.call_args_list if c.args[0].endswith(".tsv")
+        ]
+        self.assertEqual(4, len(spool_opens))
+        self.assertEqual((os.path.join(spool_dir, "af.tsv"), 2), spools[b"af"])
+        self.assertEqual((os.path.join(spool_dir, "en.tsv"), 2), spools[b"en"])
+        with open(spools[b"af"][0], "rb") as f:
+            self.assertEqual(b"1701\t1402\t4\n1702\t1404\t1\n", f.read())
+        with open(spools[b"en"][0], "rb") as f:
+            self.assertEqual(
+                b"Statue_of_Liberty\t1234\t10\nLiberty_Island\t1235\t2\n", f.read()
+            )
+
+    def test_spool_pageviews_invalid_max_open(self):
+        with self.assertRaises(ValueError):
+            scores.spool_pageviews(spool_dir=tempfile.mkdtemp(), max_open=0)
+
+    def test_spool_pageviews_removes_old_spools(self):
+        path = self.write_pageview_file(
+            bz2.compress(b"af.wikipedia 1701 1402 desktop 4 F1\n")
+        )
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir, ignore_errors=True)
+        with open(os.path.join(spool_dir, "de.tsv"), "wb") as f:
+            f.write(b"Old\t1\t1\n")
+
+        scores.spool_pageviews(spool_dir=spool_dir, path=path)
+
+        self.assertEqual(["af.tsv"], os.listdir(spool_dir))
+
+    def test_spool_filename(self):
+        self.assertEqual("zh-min-nan.tsv", scores._spool_filename(b"zh-min-nan"))
+        self.assertEqual("x-2e2e.tsv", scores._spool_filename(b".."))
+
+    def write_spool(self, data):
+        fd, path = tempfile.mkstemp(suffix=".tsv")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        return path
+
+    def test_spooled_pageview_batches(self):
+        path = self.write_spool(b"A\t1\t10\nB\t2\t20\nC\t3\t30\n")
+
+        batches = list(scores.spooled_pageview_batches(b"en", path, 2))
+
+        self.assertEqual(
+            [
+                [(b"en", b"A", b"1", 10), (b"en", b"B", b"2", 20)],
+                [(b"en", b"C", b"3", 30)],
+            ],
+            batches,
+        )
+
     def test_reset_missing_articles_pageviews(self):
         with self.wp10db.cursor() as cursor:
             cursor.execute(
@@ -295,6 +470,38 @@ class ScoresTest(BaseWpOneDbTest):
             self.assertEqual(result["ps_page_id"], 1234)
             self.assertEqual(result["ps_views"], 0)
 
+    def test_reset_missing_articles_pageviews_lang(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO page_scores (ps_lang, ps_article, ps_page_id, ps_views)"
+                """VALUES
+        ("en", "Statue_of_Liberty", 1234, 100),
+        ("en", "Eiffel_Tower", 1235, 100),
+        ("fr", "Statue_of_Liberty", 5678, 200)"""
+            )
+            cursor.execute(
+                "INSERT INTO temp_pageviews (tp_lang, tp_article, tp_page_id, tp_views)"
+                'VALUES ("fr", "Eiffel_Tower", 5679, 150)'
+            )
+
+        scores.reset_missing_articles_pageviews(self.wp10db, lang=b"en")
+
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SELECT ps_lang, ps_article, ps_views FROM page_scores")
+            actual = {
+                (r["ps_lang"], r["ps_article"]): r["ps_views"]
+                for r in cursor.fetchall()
+            }
+        self.assertEqual(
+            {
+                (b"en", b"Statue_of_Liberty"): 0,
+                # The fr temp row must not count for en.
+                (b"en", b"Eiffel_Tower"): 0,
+                (b"fr", b"Statue_of_Liberty"): 200,
+            },
+            actual,
+        )
+
     def test_insert_temp_pageviews(self):
         scores.insert_temp_pageviews(self.wp10db, "en", "Statue_of_Liberty", 1234, 100)
 
@@ -325,6 +532,38 @@ class ScoresTest(BaseWpOneDbTest):
             self.assertEqual(result["tp_page_id"], 1234)
             self.assertEqual(result["tp_views"], 200)
 
+    def test_insert_temp_pageviews_many(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO temp_pageviews (tp_lang, tp_article, tp_page_id, tp_views)"
+                'VALUES ("en", "Statue_of_Liberty", 1234, 100)'
+            )
+
+        scores.insert_temp_pageviews_many(
+            self.wp10db,
+            [
+                (b"en", b"Statue_of_Liberty", b"1234", 200),
+                (b"fr", b"Tour_Eiffel", b"5678", 300),
+            ],
+        )
+
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "SELECT tp_lang, tp_article, tp_page_id, tp_views FROM temp_pageviews"
+                " ORDER BY tp_page_id"
+            )
+            actual = [
+                (r["tp_lang"], r["tp_article"], r["tp_page_id"], r["tp_views"])
+                for r in cursor.fetchall()
+            ]
+        self.assertEqual(
+            [
+                (b"en", b"Statue_of_Liberty", 1234, 200),
+                (b"fr", b"Tour_Eiffel", 5678, 300),
+            ],
+            actual,
+        )
+
     def test_swap_temp_pageviews_to_scores(self):
         with self.wp10db.cursor() as cursor:
             cursor.execute(
@@ -351,6 +590,36 @@ class ScoresTest(BaseWpOneDbTest):
             self.assertEqual(result["ps_page_id"], 1234)
             self.assertEqual(result["ps_views"], 100)
 
+    def test_swap_temp_pageviews_to_scores_lang(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO temp_pageviews (tp_lang, tp_article, tp_page_id, tp_views)"
+                """VALUES
+        ("en", "Statue_of_Liberty", 1234, 100),
+        ("fr", "Tour_Eiffel", 5678, 200)"""
+            )
+
+        scores.swap_temp_pageviews_to_scores(self.wp10db, lang=b"fr")
+
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SELECT ps_lang FROM page_scores")
+            self.assertEqual([b"fr"], [r["ps_lang"] for r in cursor.fetchall()])
+
+    def test_delete_temp_pageviews(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO temp_pageviews (tp_lang, tp_article, tp_page_id, tp_views)"
+                """VALUES
+        ("en", "Statue_of_Liberty", 1234, 100),
+        ("fr", "Tour_Eiffel", 5678, 200)"""
+            )
+
+        scores.delete_temp_pageviews(self.wp10db, b"en")
+
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SELECT tp_lang FROM temp_pageviews")
+            self.assertEqual([b"fr"], [r["tp_lang"] for r in cursor.fetchall()])
+
     def test_truncate_temp_pageviews(self):
         with self.wp10db.cursor() as cursor:
             cursor.execute(
@@ -394,7 +663,7 @@ class ScoresTest(BaseWpOneDbTest):
             self.assertEqual(0, n)
 
     @patch("wp1.scores.wp10_connect")
-    @patch("wp1.scores.insert_temp_pageviews", side_effect=Exception("DB error"))
+    @patch("wp1.scores.insert_temp_pageviews_many", side_effect=Exception("DB error"))
     @patch("wp1.scores.download_pageviews")
     @patch("wp1.scores.pageview_components")
     def test_update_pageviews_rollback_on_error(
@@ -424,6 +693,27 @@ class ScoresTest(BaseWpOneDbTest):
             n = cursor.fetchone()["cnt"]
             self.assertEqual(0, n)
 
+    @patch("wp1.scores.wp10_connect")
+    @patch("wp1.scores.load_temp_pageviews_infile")
+    @patch("wp1.scores.download_pageviews")
+    @patch("wp1.scores.pageview_components")
+    def test_update_pageviews_load_data_infile(
+        self, mock_components, mock_download, mock_load, mock_db_connect
+    ):
+        mock_db = MagicMock()
+        mock_db_connect.return_value = mock_db
+        mock_components.return_value = (
+            (b"en", b"Statue_of_Liberty", 100, 100),
+            (b"en", b"Eiffel_Tower", 200, 200),
+            (b"fr", b"George-\xc3\x89tienne_Cartier_Monument", 300, 300),
+        )
+
+        scores.update_pageviews(commit_after=2, load_data_infile=True)
+
+        mock_db_connect.assert_called_once_with(local_infile=True)
+        self.assertEqual([2, 1], [len(c.args[1]) for c in mock_load.call_args_list])
+        mock_db.rollback.assert_not_called()
+
     @patch("wp1.scores.download_pageviews")
     @patch("wp1.scores.pageview_components")
     def test_update_pageviews_filter(self, mock_components, mock_download):
@@ -436,7 +726,184 @@ class ScoresTest(BaseWpOneDbTest):
         scores.update_pageviews(filter_lang="fr")
 
         mock_download.assert_called_once()
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SELECT ps_article FROM page_scores")
+            self.assertEqual(
+                b"George-\xc3\x89tienne_Cartier_Monument",
+                cursor.fetchone()["ps_article"],
+            )
         with self.wp10db.cursor() as cursor:
             cursor.execute("SELECT COUNT(*) as cnt FROM page_scores")
             n = cursor.fetchone()["cnt"]
             self.assertEqual(1, n)
+
+    @patch("wp1.scores.wp10_connect")
+    def test_update_pageviews_for_lang(self, mock_db_connect):
+        mock_db_connect.return_value = self.wp10db
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO page_scores (ps_lang, ps_article, ps_page_id, ps_views)"
+                """VALUES
+        ("en", "Statue_of_Liberty", 1234, 5),
+        ("en", "Gone", 1236, 50),
+        ("fr", "Tour_Eiffel", 5678, 200)"""
+            )
+        path = self.write_spool(
+            b"Statue_of_Liberty\t1234\t100\nEiffel_Tower\t1235\t7\n"
+        )
+
+        orig_close = self.wp10db.close
+        try:
+            self.wp10db.close = lambda: True
+            scores.update_pageviews_for_lang("en", path, commit_after=1)
+        finally:
+            self.wp10db.close = orig_close
+
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SELECT ps_lang, ps_article, ps_views FROM page_scores")
+            actual = {
+                (r["ps_lang"], r["ps_article"]): r["ps_views"]
+                for r in cursor.fetchall()
+            }
+        self.assertEqual(
+            {
+                (b"en", b"Statue_of_Liberty"): 100,
+                (b"en", b"Eiffel_Tower"): 7,
+                (b"en", b"Gone"): 0,
+                (b"fr", b"Tour_Eiffel"): 200,
+            },
+            actual,
+        )
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) as cnt FROM temp_pageviews")
+            self.assertEqual(0, cursor.fetchone()["cnt"])
+        self.assertFalse(os.path.exists(path))
+
+    @patch("wp1.scores.wp10_connect")
+    @patch("wp1.scores.insert_temp_pageviews_many", side_effect=Exception("DB error"))
+    def test_update_pageviews_for_lang_error(self, mock_insert, mock_db_connect):
+        mock_db = MagicMock()
+        mock_db_connect.return_value = mock_db
+        path = self.write_spool(b"Statue_of_Liberty\t1234\t100\n")
+
+        with self.assertRaises(Exception):
+            scores.update_pageviews_for_lang(b"en", path)
+
+        mock_db.rollback.assert_called_once()
+        mock_db.close.assert_called_once()
+        # Kept for the retry.
+        self.assertTrue(os.path.exists(path))
+
+    @patch("wp1.scores.wp10_connect")
+    @patch("wp1.scores.delete_temp_pageviews")
+    @patch("wp1.scores.insert_temp_pageviews_many", side_effect=ValueError("bad row"))
+    def test_update_pageviews_for_lang_error_cleanup_fails(
+        self, mock_insert, mock_delete, mock_db_connect
+    ):
+        mock_db_connect.return_value = MagicMock()
+        # The first delete, before loading, succeeds.
+        mock_delete.side_effect = [None, Exception("Lost connection")]
+        path = self.write_spool(b"Statue_of_Liberty\t1234\t100\n")
+
+        with self.assertRaisesRegex(ValueError, "bad row"):
+            scores.update_pageviews_for_lang(b"en", path)
+
+        self.assertEqual(2, mock_delete.call_count)
+
+    def test_pageview_checkpoint(self):
+        self.assertIsNone(scores.get_pageview_checkpoint(self.redis))
+
+        scores.save_pageview_checkpoint(self.redis, b"dump.bz2", b"", 120, 50)
+
+        self.assertEqual(
+            {"dump": b"dump.bz2", "filter_lang": b"", "lines": 120, "rows": 50},
+            scores.get_pageview_checkpoint(self.redis),
+        )
+        scores.clear_pageview_checkpoint(self.redis)
+        self.assertIsNone(scores.get_pageview_checkpoint(self.redis))
+
+    def test_get_pageview_progress_none(self):
+        self.assertEqual((None, None), scores.get_pageview_progress(self.redis))
+
+    def run_update_pageviews(self, path, **kwargs):
+        orig_close = self.wp10db.close
+        try:
+            self.wp10db.close = lambda: True
+            with patch("wp1.scores.download_pageviews"), patch(
+                "wp1.scores.get_cur_file_path", return_value=path
+            ), patch("wp1.scores.wp10_connect", return_value=self.wp10db):
+                scores.update_pageviews(redis=self.redis, processes=1, **kwargs)
+        finally:
+            self.wp10db.close = orig_close
+
+    def test_update_pageviews_checkpoint_on_error(self):
+        path = self.write_pageview_file(pageview_bz2)
+        real_insert = scores.insert_temp_pageviews_many
+        calls = []
+
+        def insert(wp10db, rows):
+            calls.append(rows)
+            if len(calls) > 2:
+                raise Exception("DB error")
+            real_insert(wp10db, rows)
+
+        with patch("wp1.scores.insert_temp_pageviews_many", side_effect=insert):
+            self.run_update_pageviews(path, commit_after=5)
+
+        self.assertEqual(
+            {
+                "dump": os.path.basename(path).encode("utf-8"),
+                "filter_lang": b"",
+                "lines": 20,
+                "rows": 10,
+            },
+            scores.get_pageview_checkpoint(self.redis),
+        )
+        progress, work = scores.get_pageview_progress(self.redis)
+        self.assertEqual(str(len(pageview_bz2)).encode("utf-8"), work)
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) as cnt FROM temp_pageviews")
+            self.assertEqual(10, cursor.fetchone()["cnt"])
+
+    def test_update_pageviews_resumes_from_checkpoint(self):
+        path = self.write_pageview_file(pageview_bz2)
+        scores.save_pageview_checkpoint(
+            self.redis, os.path.basename(path).encode("utf-8"), b"", 20, 10
+        )
+        with self.wp10db.cursor() as cursor:
+            # Stands in for the rows committed before the failure.
+            cursor.execute(
+                "INSERT INTO temp_pageviews (tp_lang, tp_article, tp_page_id, tp_views)"
+                'VALUES ("af", "1701", 1402, 1000)'
+            )
+
+        with patch(
+            "wp1.scores.insert_temp_pageviews_many",
+            wraps=scores.insert_temp_pageviews_many,
+        ) as mock_insert:
+            self.run_update_pageviews(path, commit_after=5)
+
+        self.assertEqual(
+            [[(b"af", b"1711", b"752", 5), (b"af", b"1712", b"753", 22)]],
+            [c.args[1] for c in mock_insert.call_args_list],
+        )
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SELECT ps_article, ps_views FROM page_scores")
+            actual = {r["ps_article"]: r["ps_views"] for r in cursor.fetchall()}
+        self.assertEqual({b"1701": 1000, b"1711": 5, b"1712": 22}, actual)
+        self.assertIsNone(scores.get_pageview_checkpoint(self.redis))
+
+    def test_update_pageviews_ignores_other_checkpoint(self):
+        path = self.write_pageview_file(pageview_bz2)
+        scores.save_pageview_checkpoint(self.redis, b"older-dump.bz2", b"", 20, 10)
+        with self.wp10db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO temp_pageviews (tp_lang, tp_article, tp_page_id, tp_views)"
+                'VALUES ("en", "Stale", 1, 1000)'
+            )
+
+        self.run_update_pageviews(path)
+
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) as cnt FROM page_scores")
+            self.assertEqual(12, cursor.fetchone()["cnt"])
@@ -0,0 +1,133 @@
+"""Redis cache of project assessment table data.
+
+Entries are JSON, stored under namespaced keys that include the schema version,
+so changing the layout of the table data only needs a bump of
+TABLE_CACHE_VERSION: entries in the old layout are then never read again and
+expire on their own. The entry of a project is invalidated as soon as an
+update of that project finishes (see logic.project.update_project).
+
+The table data (see tables.generate_table_data) uses bytes for rating names and
+the project name, which JSON can't represent. They are stored as str decoded
+with surrogateescape, which round trips any bytes value.
+"""
+
+import json
+import logging
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of the cached table data changes.
+TABLE_CACHE_VERSION = 1
+TABLE_CACHE_TTL = timedelta(days=1)
+KEY_PREFIX = b"wp1:table_cache:v%d:" % TABLE_CACHE_VERSION
+
+# Number of keys deleted per UNLINK in clear_all.
+CLEAR_BATCH_SIZE = 500
+
+# Fields of the table data holding bytes, and how they are nested.
+_BYTES_FIELDS = ("project",)
+_BYTES_LIST_FIELDS = ("ordered_cols", "ordered_rows")
+_BYTES_KEYED_FIELDS = ("row_totals", "col_totals", "row_labels", "col_labels")
+
+
+def project_key(project_name):
+    return KEY_PREFIX + b"project:" + project_name
+
+
+def _to_str(b):
+    return b.decode("utf-8", "surrogateescape")
+
+
+def _to_bytes(s):
+    return s.encode("utf-8", "surrogateescape")
+
+
+def serialize(data):
+    """Returns the table data as compact JSON bytes.
+
+    Raises TypeError if the data holds values that can't be cached.
+    """
+    encoded = dict(data)
+    for field in _BYTES_FIELDS:
+        if encoded.get(field) is not None:
+            encoded[field] = _to_str(encoded[field])
+    for field in _BYTES_LIST_FIELDS:
+        if field in encoded:
+            encoded[field] = [_to_str(v) for v in encoded[field]]
+    for field in _BYTES_KEYED_FIELDS:
+        if field in encoded:
+            encoded[field] = {_to_str(k): v for k, v in encoded[field].items()}
+    if "data" in encoded:
+        encoded["data"] = {
+            _to_str(row): {_to_str(col): n for col, n in cols.items()}
+            for row, cols in encoded["data"].items()
+        }
+
+    return json.dumps(
+        {"version": TABLE_CACHE_VERSION, "table": encoded}, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def deserialize(value):
+    """Returns the table data in value, or None if it isn't a valid entry."""
+    try:
+        entry = json.loads(value)
+    except ValueError:
+        logger.warning("Ignoring table cache entry that isn't valid JSON")
+        return None
+    if not isinstance(entry, dict) or entry.get("version") != TABLE_CACHE_VERSION:
+        return None
+
+    data = entry["table"]
+    for field in _BYTES_FIELDS:
+        if data.get(field) is not None:
+            data[field] = _to_bytes(data[field])
+    for field in _BYTES_LIST_FIELDS:
+        if field in data:
+            data[field] = [_to_bytes(v) for v in data[field]]
+    for field in _BYTES_KEYED_FIELDS:
+        if field in data:
+            data[field] = {_to_bytes(k): v for k, v in data[field].items()}
+    if "data" in data:
+        data["data"] = {
+            _to_bytes(row): {_to_bytes(col): n for col, n in cols.items()}
+            for row, cols in data["data"].items()
+        }
+    return data
+
+
+def get_project_table(redis, project_name):
+    value = redis.get(project_key(project_name))
+    if value is None:
+        return None
+    return deserialize(value)
+
+
+def set_project_table(redis, project_name, data):
+    try:
+        value = serialize(data)
+    except TypeError:
+        logger.exception(
+            "Could not serialize table data for %s", project_name.decode("utf-8")
+        )
+        return
+    redis.setex(project_key(project_name), TABLE_CACHE_TTL, value=value)
+
+
+def invalidate_project_table(redis, project_name):
+    redis.delete(project_key(project_name))
+
+
+def clear_all(redis):
+    """Deletes the cached tables of every project. Returns the number deleted."""
+    deleted = 0
+    batch = []
+    for key in redis.scan_iter(match=KEY_PREFIX + b"project:*", count=1000):
+        batch.append(key)
+        if len(batch) >= CLEAR_BATCH_SIZE:
+            deleted += redis.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += redis.unlink(*batch)
+    return deleted
@@ -0,0 +1,111 @@
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+
+from wp1 import table_cache, tables
+
+STATS = [
+    {"n": 3, "q": b"B-Class", "i": b"High-Class"},
+    {"n": 2, "q": b"B-Class", "i": b"Low-Class"},
+    {"n": 4, "q": b"Unassessed-Class", "i": b"Low-Class"},
+]
+
+CATEGORIES = {
+    "sort_qual": {b"B-Class": 300, tables.UNASSESSED_CLASS: 0},
+    "sort_imp": {b"High-Class": 300, b"Low-Class": 100},
+    "qual_labels": {
+        b"B-Class": "{{B-Class|category=Category:B-Class_Water_articles}}",
+        b"Unassessed-Class": "{{Unassessed-Class|category=Category:Unassessed}}",
+    },
+    "imp_labels": {b"High-Class": "High", b"Low-Class": "Low"},
+}
+
+
+def table_data(project_name=b"Water"):
+    return tables.generate_table_data(
+        STATS,
+        CATEGORIES,
+        {
+            "project": project_name,
+            "project_display": "Water",
+            "create_link": True,
+            "title": "Water articles by quality and importance",
+            "timestamp": 1546300800,
+        },
+    )
+
+
+class TableCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+
+    def test_round_trip(self):
+        data = table_data()
+
+        actual = table_cache.deserialize(table_cache.serialize(data))
+
+        self.assertEqual(data, actual)
+        self.assertEqual(
+            tables.convert_table_data_for_web(data),
+            tables.convert_table_data_for_web(actual),
+        )
+
+    def test_round_trip_non_utf8_bytes(self):
+        data = {"project": b"Bad_\xff", "data": {b"\xfe": {b"\xfd": 1}}}
+
+        self.assertEqual(data, table_cache.deserialize(table_cache.serialize(data)))
+
+    def test_serialize_is_json(self):
+        value = table_cache.serialize({"project": b"Water", "data": {}})
+
+        self.assertEqual(b'{"version":1,"table":{"project":"Water","data":{}}}', value)
+
+    def test_deserialize_other_version(self):
+        self.assertIsNone(table_cache.deserialize(b'{"version":0,"table":{}}'))
+
+    def test_deserialize_invalid(self):
+        self.assertIsNone(table_cache.deserialize(b"\x80\x04}\x94."))
+
+    def test_set_and_get(self):
+        data = table_data()
+
+        table_cache.set_project_table(self.redis, b"Water", data)
+
+        self.assertEqual(data, table_cache.get_project_table(self.redis, b"Water"))
+        self.assertGreater(self.redis.ttl(table_cache.project_key(b"Water")), 0)
+
+    def test_get_missing(self):
+        self.assertIsNone(table_cache.get_project_table(self.redis, b"Water"))
+
+    def test_key_is_namespaced(self):
+        table_cache.set_project_table(self.redis, b"Water", table_data())
+
+        self.assertIsNone(self.redis.get(b"Water"))
+
+    def test_set_unserializable(self):
+        table_cache.set_project_table(self.redis, b"Water", {"data": {}, "x": object()})
+
+        self.assertIsNone(table_cache.get_project_table(self.redis, b"Water"))
+
+    def test_invalidate(self):
+        table_cache.set_project_table(self.redis, b"Water", table_data())
+
+        table_cache.invalidate_project_table(self.redis, b"Water")
+
+        self.assertIsNone(table_cache.get_project_table(self.redis, b"Water"))
+
+    def test_clear_all(self):
+        names = [b"Project_%d" % i for i in range(7)]
+        for name in names:
+            table_cache.set_project_table(self.redis, name, table_data(name))
+        self.redis.set(b"unrelated", b"1")
+
+        with patch.object(table_cache, "CLEAR_BATCH_SIZE", 3):
+            deleted = table_cache.clear_all(self.redis)
+
+        self.assertEqual(7, deleted)
+        for name in names:
+            self.assertIsNone(table_cache.get_project_table(self.redis, name))
+        self.assertEqual(b"1", self.redis.get(b"unrelated"))
@@ -1,17 +1,16 @@
 import logging
-import pickle
 import re
 from collections import defaultdict
-from datetime import timedelta
 from pprint import pformat
 
 from redis import Redis
 
-from wp1 import api, app_logging
+from wp1 import api, app_logging, table_cache
 from wp1.conf import get_conf
 from wp1.constants import LIST_URL, LIST_V2_URL, WIKI_BASE
 from wp1.credentials import CREDENTIALS, ENV
 from wp1.logic import project as logic_project
+from wp1.logic import project_stats as logic_project_stats
 from wp1.logic import util as logic_util
 from wp1.templates import env as jinja_env
 from wp1.wp10_db import connect as wp10_connect
@@ -111,6 +110,12 @@ def get_global_stats(wp10db):
 
 def get_project_stats(wp10db, project_name):
     wp10db.ping()
+    stats = logic_project_stats.get_project_stats(wp10db, project_name)
+    if stats:
+        return stats
+
+    # A project has no count matrix until the end of its first update, until
+    # then group its ratings.
     with wp10db.cursor() as cursor:
         cursor.execute(
             """
@@ -218,10 +223,7 @@ def get_cached_table_data(project_name):
     if r is None:
         return
 
-    pkl = r.get(project_name)
-    if pkl is None:
-        return None
-    return pickle.loads(pkl)  # nosec
+    return table_cache.get_project_table(r, project_name)
 
 
 def cache_table_data(project_name, data):
@@ -229,12 +231,7 @@ def cache_table_data(project_name, data):
     if r is None:
         return
 
-    # The data nested dict is actually a defaultdict. Cast it back to a normal
-    # dictionary for pickling.
-    data["data"] = dict(data["data"])
-
-    pkl = pickle.dumps(data)
-    r.setex(project_name, timedelta(days=1), value=pkl)
+    table_cache.set_project_table(r, project_name, data)
 
 
 def get_project_categories(wp10db, project_name):
@@ -1,11 +1,9 @@
-import pickle
 import unittest
-from datetime import timedelta
 from unittest.mock import MagicMock, patch
 
 import attr
 
-from wp1 import tables, templates
+from wp1 import table_cache, tables, templates
 from wp1.base_db_test import BaseWpOneDbTest
 from wp1.constants import (
     CATEGORY_NS_INT,
@@ -438,6 +436,28 @@ class TablesDbTest(BaseWpOneDbTest):
         actual = [tuple(x.items()) for x in actual]
         self.assertEqual(sorted(expected), sorted(actual))
 
+    def test_get_project_stats_materialized(self):
+        with self.wp10db.cursor() as cursor:
+            cursor.execute("""
+          INSERT INTO project_stats
+            (pst_project, pst_quality, pst_importance, pst_count)
+          VALUES ('Test Project', 'FA-Class', 'Top-Class', 42)
+      """)
+
+        actual = tables.get_project_stats(self.wp10db, "Test Project")
+
+        self.assertEqual(
+            [
+                {
+                    "n": 42,
+                    "q": b"FA-Class",
+                    "i": b"Top-Class",
+                    "project": b"Test Project",
+                }
+            ],
+            actual,
+        )
+
     def test_db_project_categories(self):
         actual = tables.db_project_categories(self.wp10db, b"Catholicism")
         expected = sorted(self.project_categories, key=lambda x: x["c_ranking"])
@@ -782,7 +802,6 @@ class TestTableCaching(BaseWpOneDbTest):
     @patch("wp1.tables.generate_table_data")
     def test_empty_cache(self, patched_table_data, patched_redis):
         expected_table = {"data": {}}
-        expected_pkl = pickle.dumps(expected_table)
 
         redis_conn = MagicMock()
         redis_conn.get = MagicMock()
@@ -794,7 +813,9 @@ class TestTableCaching(BaseWpOneDbTest):
 
         patched_table_data.assert_called_once()
         redis_conn.setex.assert_called_once_with(
-            b"Water", timedelta(days=1), value=expected_pkl
+            table_cache.project_key(b"Water"),
+            table_cache.TABLE_CACHE_TTL,
+            value=table_cache.serialize(expected_table),
         )
         self.assertEqual(expected_table, actual)
 
@@ -804,17 +825,16 @@ class TestTableCaching(BaseWpOneDbTest):
     @patch("wp1.tables.generate_table_data")
     def test_full_cache(self, patched_table_data, patched_redis):
         expected_table = {"data": {}}
-        expected_pkl = pickle.dumps(expected_table)
 
         redis_conn = MagicMock()
         redis_conn.get = MagicMock()
-        redis_conn.get.return_value = expected_pkl
+        redis_conn.get.return_value = table_cache.serialize(expected_table)
         patched_redis.return_value = redis_conn
 
         actual = tables.generate_project_table_data(self.wp10db, b"Water")
 
         patched_table_data.assert_not_called()
-        redis_conn.get.assert_called_once()
+        redis_conn.get.assert_called_once_with(table_cache.project_key(b"Water"))
         self.assertEqual(expected_table, actual)
 
 
@@ -0,0 +1,158 @@
+"""Updates many projects concurrently from a single process.
+
+The nightly run normally enqueues one RQ job per project (see
+queues.enqueue_all_projects), and every job opens and closes its own database
+connections. This runner instead updates projects on a pool of worker threads,
+each of which keeps its replica and WP10 connections open for every project it
+processes. An update spends most of its time waiting on the replica, so the
+threads overlap well despite the GIL.
+
+See update-projects.py for the command line entry point.
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from rq import Queue
+
+import wp1.logic.page as logic_page
+import wp1.logic.project as logic_project
+from wp1 import queues
+from wp1.constants import UPDATE_RUNNER_CONCURRENCY
+from wp1.redis_db import connect as redis_connect
+from wp1.timestamp import utcnow
+from wp1.wiki_db import connect as wiki_connect
+from wp1.wp10_db import connect as wp10_connect
+
+logger = logging.getLogger(__name__)
+
+# error is the repr of the exception of a failed update, so that the run doesn't
+# hold on to its traceback.
+ProjectTiming = namedtuple("ProjectTiming", ["project_name", "seconds", "error"])
+
+# Number of slowest projects listed in the summary at the end of a run.
+SLOWEST_PROJECTS_REPORTED = 10
+
+
+class ConnectionPool:
+    """Hands each worker thread its own long-lived wiki and WP10 connections.
+
+    Connections are created the first time a thread asks for them and are
+    pinged (reconnecting if needed) on every later request, so a connection
+    dropped by the server between two projects is transparently replaced.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def get(self):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = (wiki_connect(), wp10_connect())
+            self._local.connections = connections
+            with self._lock:
+                self._connections.append(connections)
+        else:
+            for conn in connections:
+                conn.ping(reconnect=True)
+        return connections
+
+    def close_all(self):
+        with self._lock:
+            for connections in self._connections:
+                for conn in connections:
+                    if conn.open:
+                        conn.close()
+            self._connections = []
+
+
+def update_projects(
+    project_names,
+    concurrency=UPDATE_RUNNER_CONCURRENCY,
+    redis=None,
+    enqueue_uploads=False,
+    incremental=True,
+):
+    """Updates the given projects, at most `concurrency` at a time.
+
+    A failing project is logged and recorded, and doesn't stop the run. If
+    enqueue_uploads is True, the table and log upload jobs of each project are
+    enqueued as soon as its update succeeds. With incremental=False, every
+    project gets a full update (see logic.project.incremental_update_since).
+    Each project is timestamped with the time its own update starts.
+
+    Returns a list of ProjectTiming, in the order of project_names.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1, got %r" % concurrency)
+
+    if redis is None:
+        redis = redis_connect()
+    upload_q = Queue("upload", connection=redis) if enqueue_uploads else None
+    pool = ConnectionPool()
+    # Articles removed from one project are often removed from others too.
+    move_cache = logic_page.MoveLookupCache()
+
+    def update_one(project_name):
+        start = time.perf_counter()
+        error = None
+        wikidb, wp10db = pool.get()
+        try:
+            logic_project.update_project_by_name_with_connections(
+                wikidb,
+                wp10db,
+                redis,
+                project_name,
+                incremental=incremental,
+                move_cache=move_cache,
+                update_dt=utcnow(),
+            )
+        except Exception as e:
+            logger.exception("Update of %s failed", project_name.decode("utf-8"))
+            error = repr(e)
+            if wp10db.open:
+                wp10db.rollback()
+        seconds = time.perf_counter() - start
+
+        if error is None:
+            logger.info("Updated %s in %.1fs", project_name.decode("utf-8"), seconds)
+            if upload_q is not None:
+                queues.enqueue_project_uploads(project_name, upload_q)
+        return ProjectTiming(project_name, seconds, error)
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="wp1-update"
+        ) as executor:
+            timings = list(executor.map(update_one, project_names))
+    finally:
+        pool.close_all()
+
+    log_report(timings, time.perf_counter() - start)
+    return timings
+
+
+def log_report(timings, elapsed):
+    failed = [t for t in timings if t.error is not None]
+    per_minute = len(timings) / elapsed * 60 if elapsed > 0 else 0
+    logger.info(
+        "Updated %s projects (%s failed) in %.1fs, %.1f projects/min",
+        len(timings),
+        len(failed),
+        elapsed,
+        per_minute,
+    )
+
+    slowest = sorted(timings, key=lambda t: t.seconds, reverse=True)
+    for timing in slowest[:SLOWEST_PROJECTS_REPORTED]:
+        logger.info("  %8.1fs %s", timing.seconds, timing.project_name.decode("utf-8"))
+    for timing in failed:
+        logger.warning(
+            "Failed: %s (%s)", timing.project_name.decode("utf-8"), timing.error
+        )
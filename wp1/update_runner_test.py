@@ -0,0 +1,153 @@
+import unittest
+from unittest.mock import ANY, MagicMock, call, patch
+
+import fakeredis
+from rq import Queue
+
+from wp1 import update_runner
+from wp1.environment import Environment
+
+
+class UpdateRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        self.wikidbs = []
+        self.wp10dbs = []
+
+        def new_conn(conns):
+            conn = MagicMock()
+            conns.append(conn)
+            return conn
+
+        patchers = (
+            patch(
+                "wp1.update_runner.wiki_connect",
+                side_effect=lambda: new_conn(self.wikidbs),
+            ),
+            patch(
+                "wp1.update_runner.wp10_connect",
+                side_effect=lambda: new_conn(self.wp10dbs),
+            ),
+        )
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch("wp1.update_runner.logic_project.update_project_by_name_with_connections")
+    def test_updates_all_projects(self, mock_update):
+        names = [b"Project %d" % i for i in range(5)]
+
+        timings = update_runner.update_projects(names, concurrency=3, redis=self.redis)
+
+        self.assertEqual(names, [t.project_name for t in timings])
+        self.assertTrue(all(t.error is None for t in timings))
+        self.assertEqual(
+            sorted(names), sorted(c.args[3] for c in mock_update.call_args_list)
+        )
+
+    @patch("wp1.update_runner.logic_project.update_project_by_name_with_connections")
+    def test_reuses_connections(self, mock_update):
+        names = [b"Project %d" % i for i in range(3)]
+
+        update_runner.update_projects(names, concurrency=1, redis=self.redis)
+
+        self.assertEqual(1, len(self.wikidbs))
+        self.assertEqual(1, len(self.wp10dbs))
+        mock_update.assert_has_calls(
+            [
+                call(
+                    self.wikidbs[0],
+                    self.wp10dbs[0],
+                    self.redis,
+                    n,
+                    incremental=True,
+                    move_cache=ANY,
+                    update_dt=ANY,
+                )
+                for n in names
+            ]
+        )
+        self.assertEqual(2, self.wp10dbs[0].ping.call_count)
+
+    @patch("wp1.update_runner.logic_project.update_project_by_name_with_connections")
+    def test_closes_connections(self, mock_update):
+        update_runner.update_projects(
+            [b"Project 0", b"Project 1"], concurrency=2, redis=self.redis
+        )
+
+        for conn in self.wikidbs + self.wp10dbs:
+            conn.close.assert_called_once_with()
+
+    @patch("wp1.update_runner.logic_project.update_project_by_name_with_connections")
+    def test_failure_does_not_stop_run(self, mock_update):
+        error = Exception("replica went away")
+
+        def update(wikidb, wp10db, redis, project_name, **kwargs):
+            if project_name == b"Project 1":
+                raise error
+
+        mock_update.side_effect = update
+
+        timings = update_runner.update_projects(
+            [b"Project 0", b"Project 1", b"Project 2"], concurrency=1, redis=self.redis
+        )
+
+        self.assertEqual([None, repr(error), None], [t.error for t in timings])
+        self.wp10dbs[0].rollback.assert_called_once_with()
+
+    @patch("wp1.update_runner.utcnow")
+    @patch("wp1.update_runner.logic_project.update_project_by_name_with_connections")
+    def test_timestamp_per_project(self, mock_update, mock_utcnow):
+        mock_utcnow.side_effect = ["first", "second"]
+
+        update_runner.update_projects(
+            [b"Project 0", b"Project 1"], concurrency=1, redis=self.redis
+        )
+
+        self.assertEqual(
+            ["first", "second"],
+            [c.kwargs["update_dt"] for c in mock_update.call_args_list],
+        )
+
+    @patch("wp1.queues.ENV", Environment.PRODUCTION)
+    @patch("wp1.update_runner.logic_project.update_project_by_name_with_connections")
+    def test_enqueue_uploads(self, mock_update):
+        mock_update.side_effect = [None, Exception("failed")]
+
+        update_runner.update_projects(
+            [b"Project 0", b"Project 1"],
+            concurrency=1,
+            redis=self.redis,
+            enqueue_uploads=True,
+        )
+
+        # Table and log uploads for the successful project only.
+        self.assertEqual(2, Queue("upload", connection=self.redis).count)
+
+    @patch("wp1.update_runner.logic_project.update_project_by_name_with_connections")
+    def test_no_uploads_by_default(self, mock_update):
+        update_runner.update_projects([b"Project 0"], redis=self.redis)
+
+        self.assertEqual(0, Queue("upload", connection=self.redis).count)
+
+    @patch("wp1.update_runner.logic_project.update_project_by_name_with_connections")
+    def test_full_update(self, mock_update):
+        update_runner.update_projects(
+            [b"Project 0"], redis=self.redis, incremental=False
+        )
+
+        self.assertFalse(mock_update.call_args.kwargs["incremental"])
+
+    @patch("wp1.update_runner.logic_project.update_project_by_name_with_connections")
+    def test_shares_move_cache(self, mock_update):
+        update_runner.update_projects(
+            [b"Project 0", b"Project 1"], concurrency=2, redis=self.redis
+        )
+
+        caches = [c.kwargs["move_cache"] for c in mock_update.call_args_list]
+        self.assertIs(caches[0], caches[1])
+
+    def test_invalid_concurrency(self):
+        with self.assertRaises(ValueError):
+            update_runner.update_projects([b"Project 0"], concurrency=0)
@@ -3,6 +3,7 @@ import logging
 import attr
 import flask
 
+import wp1.logic.comparison as logic_comparison
 import wp1.logic.project as logic_project
 import wp1.logic.rating as logic_rating
 from wp1 import queues, tables
@@ -31,8 +32,7 @@ def count():
 @projects.route("/assessments")
 def assessments():
     wp10db = get_db("wp10db")
-    redis = get_redis()
-    assessments = logic_rating.get_all_assessment_numbers(wp10db, redis)
+    assessments = logic_rating.get_all_assessment_numbers(wp10db)
     return flask.jsonify(assessments)
 
 
@@ -117,6 +117,9 @@ def articles(project_name):
     importance = flask.request.args.get("importance")
     page = flask.request.args.get("page")
     page_int = 1
+    # Opaque position token from the "next" of the previous page. Takes
+    # precedence over page, which needs the database to skip every prior row.
+    after = flask.request.args.get("after")
     limit = flask.request.args.get("numRows")
     limit_int = 100
     if page is not None:
@@ -144,34 +147,70 @@ def articles(project_name):
 
     article_pattern = flask.request.args.get("articlePattern")
 
-    total = logic_rating.get_project_rating_count_by_type(
-        wp10db,
-        project_name_bytes,
-        quality=quality,
-        importance=importance,
-        project_b_name=project_b_name_bytes,
-        quality_b=quality_b,
-        importance_b=importance_b,
-        pattern=article_pattern,
-    )
+    comparison = None
+    if project_b_name is not None:
+        # Served from the cached overlap of the two projects, unless it's too
+        # large to be cached.
+        try:
+            comparison = logic_comparison.get_comparison_page(
+                wp10db,
+                get_redis(),
+                project,
+                project_b,
+                quality=quality,
+                importance=importance,
+                quality_b=quality_b,
+                importance_b=importance_b,
+                pattern=article_pattern,
+                page=page_int,
+                limit=limit_int,
+                after=after,
+            )
+        except ValueError:
+            return flask.abort(400)
+
+    if comparison is None:
+        total = logic_rating.get_project_rating_count_by_type(
+            wp10db,
+            project_name_bytes,
+            quality=quality,
+            importance=importance,
+            project_b_name=project_b_name_bytes,
+            quality_b=quality_b,
+            importance_b=importance_b,
+            pattern=article_pattern,
+        )
+    else:
+        total = comparison[0]
     total_pages = total // limit_int + (1 if total % limit_int != 0 else 0)
 
-    start = limit_int * (page_int - 1) + 1
-    end = min(limit_int - 1 + start, total)
+    if after is None:
+        start = limit_int * (page_int - 1) + 1
+        end = min(limit_int - 1 + start, total)
+    else:
+        page = None
+        start = end = None
     display = {"start": start, "end": end, "num_rows": limit_int}
 
-    articles = logic_rating.get_project_rating_by_type(
-        wp10db,
-        project_name_bytes,
-        quality=quality,
-        importance=importance,
-        project_b_name=project_b_name_bytes,
-        quality_b=quality_b,
-        importance_b=importance_b,
-        pattern=article_pattern,
-        page=page,
-        limit=limit_int,
-    )
+    if comparison is None:
+        try:
+            articles, next_after = logic_rating.get_project_rating_page(
+                wp10db,
+                project_name_bytes,
+                quality=quality,
+                importance=importance,
+                project_b_name=project_b_name_bytes,
+                quality_b=quality_b,
+                importance_b=importance_b,
+                pattern=article_pattern,
+                page=page,
+                limit=limit_int,
+                after=after,
+            )
+        except ValueError:
+            return flask.abort(400)
+    else:
+        _, articles, next_after = comparison
 
     if project_b_name is None:
         output_articles = list(article.to_web_dict(wp10db) for article in articles)
@@ -182,10 +221,11 @@ def articles(project_name):
 
     output = {
         "pagination": {
-            "page": page or 1,
+            "page": None if after is not None else page or 1,
             "total_pages": total_pages,
             "total": total,
             "display": display,
+            "next": next_after,
         },
         "articles": output_articles,
     }
@@ -213,6 +253,7 @@ def random_article(project_name):
         project_name_bytes,
         quality=quality,
         importance=importance,
+        redis=get_redis(),
     )
     if article is None:
         return "", 204
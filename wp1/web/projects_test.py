@@ -175,7 +175,15 @@ class ProjectTest(BaseWebTestcase):
             data = json.loads(rv.data)
             self.assertEqual(101, data["count"])
 
+    def _refresh_project_records(self):
+        for name in (b"Project 0", b"Project 1"):
+            logic_project.update_project_record(
+                self.wp10db, logic_project.get_project_by_name(self.wp10db, name), {}
+            )
+        self.wp10db.commit()
+
     def test_assessments(self):
+        self._refresh_project_records()
         with self.override_db(self.app), self.app.test_client() as client:
             rv = client.get("/v1/projects/assessments")
             self.assertEqual("200 OK", rv.status)
@@ -190,12 +198,11 @@ class ProjectTest(BaseWebTestcase):
                 sorted(data),
             )
 
-    def test_assessments_served_from_cache(self):
+    def test_assessments_updated_with_project_record(self):
+        self._refresh_project_records()
         with self.override_db(self.app), self.app.test_client() as client:
-            first = json.loads(client.get("/v1/projects/assessments").data)
-
-            # Add an unassessed rating *after* the first request populated the
-            # cache. A cached response will not reflect it; an uncached one would.
+            # A rating added since the last update isn't counted until the
+            # project record is refreshed by the next update.
             with self.wp10db.cursor() as cursor:
                 cursor.execute(
                     "INSERT INTO ratings "
@@ -205,10 +212,13 @@ class ProjectTest(BaseWebTestcase):
                     " '20191225T00:00:00', 'Low-Class', '20191226T00:00:00')"
                 )
             self.wp10db.commit()
+            first = json.loads(client.get("/v1/projects/assessments").data)
 
+            self._refresh_project_records()
             second = json.loads(client.get("/v1/projects/assessments").data)
 
-            self.assertEqual(first, second)
+            self.assertEqual([["Project 0", 0, 150], ["Project 1", 0, 150]], first)
+            self.assertEqual([["Project 0", 1, 150], ["Project 1", 0, 150]], second)
 
     def test_table(self):
         with self.override_db(self.app), self.app.test_client() as client:
@@ -291,6 +301,31 @@ class ProjectTest(BaseWebTestcase):
             data = json.loads(rv.data)
             self.assertEqual(50, len(data["articles"]))
 
+    def test_articles_after(self):
+        with self.override_db(self.app), self.app.test_client() as client:
+            rv = client.get("/v1/projects/Project 0/articles")
+            first = json.loads(rv.data)
+            self.assertIsNotNone(first["pagination"]["next"])
+
+            rv = client.get(
+                "/v1/projects/Project 0/articles?after=%s" % first["pagination"]["next"]
+            )
+            self.assertEqual("200 OK", rv.status)
+            data = json.loads(rv.data)
+
+            self.assertEqual(50, len(data["articles"]))
+            self.assertIsNone(data["pagination"]["next"])
+            self.assertIsNone(data["pagination"]["page"])
+            self.assertEqual(150, data["pagination"]["total"])
+            seen = set(a["article"] for a in first["articles"])
+            for article in data["articles"]:
+                self.assertNotIn(article["article"], seen)
+
+    def test_articles_400_invalid_after(self):
+        with self.override_db(self.app), self.app.test_client() as client:
+            rv = client.get("/v1/projects/Project 0/articles?after=foo")
+            self.assertEqual("400 BAD REQUEST", rv.status)
+
     def test_articles_num_rows(self):
         with self.override_db(self.app), self.app.test_client() as client:
             rv = client.get("/v1/projects/Project 0/articles?page=2&numRows=25")
@@ -364,6 +399,34 @@ class ProjectTest(BaseWebTestcase):
             )
             self.assertEqual("200 OK", rv.status)
 
+    def test_articles_project_b_pages(self):
+        with self.override_db(self.app), self.app.test_client() as client:
+            rv = client.get(
+                "/v1/projects/Project 0/articles?projectB=Project 1&numRows=100"
+            )
+            first = json.loads(rv.data)
+            rv = client.get(
+                "/v1/projects/Project 0/articles?projectB=Project 1&numRows=100"
+                "&after=%s" % first["pagination"]["next"]
+            )
+            second = json.loads(rv.data)
+
+            self.assertEqual(150, first["pagination"]["total"])
+            self.assertEqual(100, len(first["articles"]))
+            self.assertEqual(50, len(second["articles"]))
+            self.assertIsNone(second["pagination"]["next"])
+            articles = [a[0]["article"] for a in first["articles"]] + [
+                a[0]["article"] for a in second["articles"]
+            ]
+            self.assertEqual(150, len(set(articles)))
+
+    def test_articles_project_b_400_invalid_after(self):
+        with self.override_db(self.app), self.app.test_client() as client:
+            rv = client.get(
+                "/v1/projects/Project 0/articles?projectB=Project 1&after=foo"
+            )
+            self.assertEqual("400 BAD REQUEST", rv.status)
+
     def test_random_article(self):
         with self.override_db(self.app), self.app.test_client() as client:
             rv = client.get("/v1/projects/Project 0/articles/random")
@@ -5,6 +5,7 @@ DROP TABLE IF EXISTS `projects`;
 DROP TABLE IF EXISTS `namespacename`;
 DROP TABLE IF EXISTS `releases`;
 DROP TABLE IF EXISTS `global_articles`;
+DROP TABLE IF EXISTS `global_article_changes`;
 DROP TABLE IF EXISTS `global_rankings`;
 DROP TABLE IF EXISTS `users`;
 DROP TABLE IF EXISTS `builders`;
@@ -14,3 +15,7 @@ DROP TABLE IF EXISTS `zim_tasks`;
 DROP TABLE IF EXISTS `zim_schedules`;
 DROP TABLE IF EXISTS `page_scores`;
 DROP TABLE IF EXISTS `temp_pageviews`;
+DROP TABLE IF EXISTS `project_stats`;
+DROP TABLE IF EXISTS `title_trigrams`;
+DROP TABLE IF EXISTS `title_search_articles`;
+DROP TABLE IF EXISTS `title_search_projects`;
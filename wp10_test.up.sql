@@ -7,7 +7,14 @@ CREATE TABLE `ratings` (
   `r_importance` varbinary(63) DEFAULT NULL,
   `r_importance_timestamp` binary(20) DEFAULT NULL,
   `r_score` int(8) unsigned  NOT NULL DEFAULT '0',
-  PRIMARY KEY (`r_project`,`r_namespace`,`r_article`)
+  `r_quality_rank` int(11) NOT NULL DEFAULT -1,
+  `r_importance_rank` int(11) NOT NULL DEFAULT -1,
+  PRIMARY KEY (`r_project`,`r_namespace`,`r_article`),
+  KEY `r_namespace_article` (`r_namespace`,`r_article`),
+  KEY `r_project_quality_importance` (`r_project`,`r_quality`,`r_importance`,`r_article`,`r_namespace`),
+  KEY `r_project_rank` (`r_project`,`r_quality_rank` DESC,`r_importance_rank` DESC,`r_article`,`r_namespace`),
+  KEY `r_project_quality_rank` (`r_project`,`r_quality`,`r_importance_rank` DESC,`r_article`,`r_namespace`),
+  KEY `r_project_importance_rank` (`r_project`,`r_importance`,`r_quality_rank` DESC,`r_article`,`r_namespace`)
 );
 
 CREATE TABLE `categories` (
@@ -68,6 +75,12 @@ CREATE TABLE `global_articles` (
   PRIMARY KEY (`a_article`)
 );
 
+CREATE TABLE `global_article_changes` (
+  `gac_article` varbinary(255) NOT NULL,
+  `gac_version` int(10) unsigned NOT NULL DEFAULT 0,
+  PRIMARY KEY (`gac_article`)
+);
+
 CREATE TABLE `global_rankings` (
   `gr_type` varbinary(16) NOT NULL,
   `gr_rating` varbinary(63) NOT NULL,
@@ -164,6 +177,33 @@ CREATE TABLE `page_scores` (
   KEY `idx_ps_article` (ps_article)
 );
 
+CREATE TABLE `project_stats` (
+  `pst_project` varbinary(63) NOT NULL,
+  `pst_quality` varbinary(63) NOT NULL,
+  `pst_importance` varbinary(63) NOT NULL,
+  `pst_count` int(10) unsigned NOT NULL DEFAULT 0,
+  PRIMARY KEY (`pst_project`,`pst_quality`,`pst_importance`)
+);
+
+CREATE TABLE `title_trigrams` (
+  `tt_project` varbinary(63) NOT NULL,
+  `tt_trigram` varbinary(3) NOT NULL,
+  `tt_namespace` int(10) unsigned NOT NULL,
+  `tt_article` varbinary(255) NOT NULL,
+  PRIMARY KEY (`tt_project`,`tt_trigram`,`tt_namespace`,`tt_article`)
+);
+
+CREATE TABLE `title_search_articles` (
+  `tsa_project` varbinary(63) NOT NULL,
+  `tsa_namespace` int(10) unsigned NOT NULL,
+  `tsa_article` varbinary(255) NOT NULL,
+  PRIMARY KEY (`tsa_project`,`tsa_namespace`,`tsa_article`)
+);
+
+CREATE TABLE `title_search_projects` (
+  `tsp_project` varbinary(63) NOT NULL PRIMARY KEY
+);
+
 INSERT INTO `global_rankings` (gr_type, gr_rating, gr_ranking) VALUES ('importance', 'Unknown-Class', 0);
 INSERT INTO `global_rankings` (gr_type, gr_rating, gr_ranking) VALUES ('importance', 'NA-Class', 50);
 INSERT INTO `global_rankings` (gr_type, gr_rating, gr_ranking) VALUES ('importance', 'Low-Class', 100);